@@ -0,0 +1,756 @@
+#!/usr/bin/env python3
+"""
+autotuner.py - Búsqueda de -t/-b/-c para los servidores llama.cpp
+Universidad de Montevideo - Tesis 2025
+
+Relanza el servidor de un servicio de config/docker-compose.yml con
+distintas combinaciones de threads (-t), batch (-b) y contexto (-c),
+ejecuta en cada una una carga corta y fija (casos de CASOS_CLINICOS con el
+prompt baseline) y registra los TPS de prompt y de generación que reporta
+llama.cpp. La mejor configuración de cada modelo se emite como un
+override de docker-compose que reemplaza solo el `command` del servicio.
+
+Búsquedas:
+- grilla: producto cartesiano de los candidatos
+- adaptativa: ascenso por coordenadas desde la configuración actual del
+  compose; mueve un parámetro a la vez al candidato vecino mientras mejore
+  más que la tolerancia (evita perseguir ruido de medición)
+
+Lanzadores:
+- docker: `docker run` con la imagen, volúmenes y memoria del servicio
+  (detener antes el servicio del compose para liberar el puerto)
+- comando: proceso local, p. ej. llama-server o stub_server.py, que
+  permite probar la búsqueda sin hardware Power10
+
+El contexto más chico que entra la carga siempre gana en velocidad: por
+defecto no se baja del -c actual del servicio (--ctx-minimo lo cambia).
+La configuración actual solo se reemplaza si otra la supera por más de la
+tolerancia, también en la búsqueda en grilla.
+
+Uso:
+    python autotuner.py --servicio qwen-7b                       # Adaptativa con docker
+    python autotuner.py --servicio qwen-7b mistral-7b --busqueda grilla
+    python autotuner.py --servicio qwen-7b --threads 8 10 12 14 --batch 128 256 512
+    python autotuner.py --servicio qwen-7b --comando "python3 stub_server.py --escala-tiempo 0"
+"""
+
+import argparse
+import http.client
+import json
+import os
+import shlex
+import statistics
+import subprocess
+import sys
+import time
+from dataclasses import dataclass, field, replace
+from datetime import datetime
+from itertools import product
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from experiment_runner_v3 import CASOS_CLINICOS, PROMPT_STRATEGIES
+from http_transport import get_transport
+
+# =============================================================================
+# CONFIGURACIÓN
+# =============================================================================
+
+DEFAULT_COMPOSE = Path(__file__).parent.parent / "config" / "docker-compose.yml"
+RESULTS_DIR = Path(__file__).parent / "results"
+DEFAULT_OVERRIDE = RESULTS_DIR / "docker-compose.autotune.yml"
+
+DEFAULT_THREADS = (4, 8, 12, 16, 20, 24)
+DEFAULT_BATCH = (64, 128, 256, 512)
+DEFAULT_CTX = (2048, 4096, 8192)
+DEFAULT_CASES = ("A1", "A2", "B1")
+DEFAULT_N_PREDICT = 64
+DEFAULT_REPETITIONS = 2
+DEFAULT_TOLERANCE = 0.02
+DEFAULT_MAX_ROUNDS = 3
+STARTUP_TIMEOUT_S = 600
+REQUEST_TIMEOUT_S = 300
+
+OBJECTIVES = ("total", "generacion", "prompt")
+SEARCHES = ("adaptativa", "grilla")
+PARAMS = ("threads", "batch", "ctx")
+
+# Flags de llama-server de cada parámetro (corto, largo)
+PARAM_FLAGS = {
+    "threads": ("-t", "--threads"),
+    "batch": ("-b", "--batch-size"),
+    "ctx": ("-c", "--ctx-size"),
+}
+
+
+# =============================================================================
+# DATACLASSES
+# =============================================================================
+
+@dataclass(frozen=True)
+class LaunchConfig:
+    """Parámetros de lanzamiento que se buscan."""
+    threads: int
+    batch: int
+    ctx: int
+
+    @property
+    def label(self) -> str:
+        return f"-t {self.threads} -b {self.batch} -c {self.ctx}"
+
+    def apply(self, command: Sequence[str]) -> List[str]:
+        """Reemplaza (o agrega) -t/-b/-c en los argumentos de llama-server."""
+        args = list(command)
+        for param, flags in PARAM_FLAGS.items():
+            value = str(getattr(self, param))
+            for i, arg in enumerate(args[:-1]):
+                if arg in flags:
+                    args[i + 1] = value
+                    break
+            else:
+                args += [flags[0], value]
+        return args
+
+
+@dataclass
+class ServiceSpec:
+    """Servicio llama.cpp del docker-compose."""
+    name: str
+    image: str = ""
+    host_port: int = 8080
+    volumes: List[str] = field(default_factory=list)
+    command: List[str] = field(default_factory=list)
+    memory: Optional[str] = None
+
+    def _flag(self, flags: Tuple[str, str], default: int) -> int:
+        for i, arg in enumerate(self.command[:-1]):
+            if arg in flags:
+                return int(self.command[i + 1])
+        return default
+
+    @property
+    def config(self) -> LaunchConfig:
+        """Configuración actual del compose (defaults de llama-server si falta)."""
+        return LaunchConfig(
+            threads=self._flag(PARAM_FLAGS["threads"], os.cpu_count() or 1),
+            batch=self._flag(PARAM_FLAGS["batch"], 2048),
+            ctx=self._flag(PARAM_FLAGS["ctx"], 4096),
+        )
+
+
+@dataclass
+class Trial:
+    """Medición de una configuración sobre la carga fija."""
+    config: LaunchConfig
+    prompt_tps: List[float] = field(default_factory=list)
+    generation_tps: List[float] = field(default_factory=list)
+    total_tps: List[float] = field(default_factory=list)
+    startup_s: float = 0.0
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None and bool(self.generation_tps)
+
+    @property
+    def median_prompt_tps(self) -> float:
+        return statistics.median(self.prompt_tps) if self.prompt_tps else 0.0
+
+    @property
+    def median_generation_tps(self) -> float:
+        return statistics.median(self.generation_tps) if self.generation_tps else 0.0
+
+    @property
+    def median_total_tps(self) -> float:
+        return statistics.median(self.total_tps) if self.total_tps else 0.0
+
+    def score(self, objective: str) -> float:
+        """Valor a maximizar (0 si la configuración falló)."""
+        if not self.ok:
+            return 0.0
+        return {
+            "total": self.median_total_tps,
+            "generacion": self.median_generation_tps,
+            "prompt": self.median_prompt_tps,
+        }[objective]
+
+    def to_dict(self) -> Dict:
+        return {
+            "threads": self.config.threads,
+            "batch": self.config.batch,
+            "ctx": self.config.ctx,
+            "ok": self.ok,
+            "error": self.error,
+            "startup_s": round(self.startup_s, 2),
+            "tps_prompt": round(self.median_prompt_tps, 2),
+            "tps_generation": round(self.median_generation_tps, 2),
+            "tps_total": round(self.median_total_tps, 2),
+            "tps_prompt_samples": [round(v, 2) for v in self.prompt_tps],
+            "tps_generation_samples": [round(v, 2) for v in self.generation_tps],
+        }
+
+
+# =============================================================================
+# DOCKER-COMPOSE
+# =============================================================================
+
+def _indent(line: str) -> int:
+    return len(line) - len(line.lstrip(" "))
+
+
+def read_compose_services(path: Path) -> Dict[str, ServiceSpec]:
+    """
+    Lee los servicios de config/docker-compose.yml.
+
+    Parser mínimo para el formato del repo (sin depender de PyYAML):
+    image, ports, volumes, command en bloque plegado (>) y el límite
+    de memoria de deploy.
+    """
+    services: Dict[str, ServiceSpec] = {}
+    current: Optional[ServiceSpec] = None
+    section = None
+    section_indent = 0
+    in_services = False
+
+    for raw in Path(path).read_text(encoding="utf-8").splitlines():
+        line = raw.split(" #")[0].rstrip() if not raw.lstrip().startswith("#") else ""
+        if not line.strip():
+            continue
+        indent = _indent(line)
+        text = line.strip()
+
+        if indent == 0:
+            in_services = text == "services:"
+            current = None
+            continue
+        if not in_services:
+            continue
+        if indent == 2 and text.endswith(":"):
+            current = ServiceSpec(name=text[:-1])
+            services[current.name] = current
+            section = None
+            continue
+        if current is None:
+            continue
+
+        if section and indent > section_indent:
+            if section == "command":
+                current.command += shlex.split(text)
+            elif section in ("ports", "volumes") and text.startswith("- "):
+                value = text[2:].strip().strip("'\"")
+                if section == "ports" and current.host_port == 8080:
+                    current.host_port = int(value.split(":")[0])
+                elif section == "volumes":
+                    current.volumes.append(value)
+            elif section == "deploy" and text.startswith("memory:"):
+                current.memory = text.split(":", 1)[1].strip()
+            continue
+
+        key, _, value = text.partition(":")
+        value = value.strip()
+        section, section_indent = None, indent
+        if key == "image":
+            current.image = value
+        elif key == "command":
+            if value in (">", "|", ">-", "|-"):
+                section = "command"
+            else:
+                current.command = shlex.split(value)
+        elif key in ("ports", "volumes", "deploy"):
+            section = key
+
+    return services
+
+
+def write_compose_override(path: Path, best: Dict[str, Tuple[ServiceSpec, Trial, Trial]],
+                           objective: str) -> Path:
+    """
+    Escribe un override de docker-compose con el `command` óptimo de cada
+    servicio (compose reemplaza command completo al combinar archivos).
+
+    Args:
+        best: servicio -> (spec, trial de la configuración actual, mejor trial)
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    lines = [
+        f"# {path.name} - generado por autotuner.py el {datetime.now().isoformat(timespec='seconds')}",
+        f"# Objetivo: TPS {objective} (mediana sobre la carga fija)",
+        "#",
+        "# Uso:",
+        f"#   docker-compose -f docker-compose.yml -f {path.name} up -d",
+        "",
+        "services:",
+    ]
+    for name, (spec, baseline, trial) in best.items():
+        lines.append(f"  # {baseline.config.label} -> {trial.config.label}: "
+                     f"prompt {trial.median_prompt_tps:.1f} TPS, "
+                     f"generación {trial.median_generation_tps:.1f} TPS "
+                     f"({_gain(baseline, trial, objective)})")
+        lines.append(f"  {name}:")
+        lines.append("    command: >")
+        lines += [f"      {line}" for line in _command_lines(trial.config.apply(spec.command))]
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    return path
+
+
+def _command_lines(command: List[str]) -> List[str]:
+    """Una línea por flag con su valor, como en config/docker-compose.yml."""
+    lines, i = [], 0
+    while i < len(command):
+        if _is_flag(command[i]) and i + 1 < len(command) and not _is_flag(command[i + 1]):
+            lines.append(f"{command[i]} {shlex.quote(command[i + 1])}")
+            i += 2
+        else:
+            lines.append(shlex.quote(command[i]))
+            i += 1
+    return lines
+
+
+def _is_flag(arg: str) -> bool:
+    """Un flag de llama-server (no un valor negativo como -1)."""
+    return arg.startswith("-") and not arg.lstrip("-").replace(".", "", 1).isdigit()
+
+
+def _gain(baseline: Trial, trial: Trial, objective: str) -> str:
+    base = baseline.score(objective)
+    if base <= 0:
+        return "sin referencia"
+    return f"{(trial.score(objective) / base - 1) * 100:+.1f}%"
+
+
+# =============================================================================
+# LANZADORES
+# =============================================================================
+
+class DockerLauncher:
+    """Lanza el servicio con `docker run`, como lo haría el compose."""
+
+    def __init__(self, service: ServiceSpec, port: int):
+        self.service = service
+        self.port = port
+        self.container = f"autotune-{service.name}"
+
+    def start(self, command: List[str]):
+        self.stop()
+        args = ["docker", "run", "-d", "--rm", "--name", self.container,
+                "-p", f"{self.port}:8080"]
+        for volume in self.service.volumes:
+            args += ["-v", os.path.expanduser(volume)]
+        if self.service.memory:
+            args += ["--memory", self.service.memory]
+        subprocess.run(args + [self.service.image] + command, check=True,
+                       stdout=subprocess.DEVNULL)
+
+    def running(self) -> bool:
+        result = subprocess.run(
+            ["docker", "inspect", "-f", "{{.State.Running}}", self.container],
+            capture_output=True, text=True
+        )
+        return result.stdout.strip() == "true"
+
+    def stop(self):
+        subprocess.run(["docker", "rm", "-f", self.container],
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+class ProcessLauncher:
+    """Lanza llama-server (o stub_server.py) como proceso local."""
+
+    def __init__(self, base_command: str, port: int, models_dir: Optional[str] = None):
+        self.base_command = shlex.split(base_command)
+        self.port = port
+        self.models_dir = models_dir
+        self.process: Optional[subprocess.Popen] = None
+
+    def _localize(self, command: List[str]) -> List[str]:
+        """Escucha en localhost:port y remapea /models al directorio local."""
+        args = list(command)
+        for i, arg in enumerate(args[:-1]):
+            if arg == "--host":
+                args[i + 1] = "127.0.0.1"
+            elif arg == "--port":
+                args[i + 1] = str(self.port)
+            elif arg in ("-m", "--model") and self.models_dir and args[i + 1].startswith("/models/"):
+                args[i + 1] = os.path.join(self.models_dir, args[i + 1][len("/models/"):])
+        if "--port" not in args:
+            args += ["--port", str(self.port)]
+        return args
+
+    def start(self, command: List[str]):
+        self.stop()
+        self.process = subprocess.Popen(
+            self.base_command + self._localize(command),
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+
+    def running(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+
+    def stop(self):
+        if self.process is None:
+            return
+        if self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+        self.process = None
+
+
+def _health_ok(host: str, port: int) -> bool:
+    conn = http.client.HTTPConnection(host, port, timeout=2)
+    try:
+        conn.request("GET", "/health")
+        return conn.getresponse().status == 200
+    except (OSError, http.client.HTTPException):
+        return False
+    finally:
+        conn.close()
+
+
+def wait_until_ready(launcher, host: str, port: int, timeout_s: float) -> float:
+    """Espera a que /health responda 200 (el modelo terminó de cargar)."""
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout_s:
+        if _health_ok(host, port):
+            return time.perf_counter() - start
+        if not launcher.running():
+            raise RuntimeError("El servidor terminó antes de estar listo")
+        time.sleep(0.25)
+    raise TimeoutError(f"El servidor no estuvo listo en {timeout_s:.0f}s")
+
+
+# =============================================================================
+# CARGA DE TRABAJO
+# =============================================================================
+
+def build_workload(case_ids: Sequence[str]) -> List[str]:
+    """Prompts baseline de los casos clínicos elegidos."""
+    template = PROMPT_STRATEGIES["baseline"]["template"]
+    return [template.format(text=CASOS_CLINICOS[case_id]["texto"]) for case_id in case_ids]
+
+
+def run_workload(host: str, port: int, prompts: List[str], n_predict: int,
+                 repetitions: int, trial: Trial):
+    """
+    Ejecuta la carga y agrega los TPS de cada request al trial.
+
+    Sin cache_prompt, para que cada request evalúe el prompt completo. El
+    primer prompt se envía una vez antes como calentamiento.
+    """
+    transport = get_transport()
+
+    def complete(prompt: str) -> Dict:
+        payload = {"prompt": prompt, "n_predict": n_predict,
+                   "temperature": 0.1, "cache_prompt": False}
+        response = transport.post_json(host, port, "/completion", payload, REQUEST_TIMEOUT_S)
+        response.raise_for_status()
+        return response.json().get("timings", {})
+
+    complete(prompts[0])
+    for _ in range(repetitions):
+        for prompt in prompts:
+            timings = complete(prompt)
+            tokens = timings.get("prompt_n", 0) + timings.get("predicted_n", 0)
+            elapsed_ms = timings.get("prompt_ms", 0) + timings.get("predicted_ms", 0)
+            trial.prompt_tps.append(timings.get("prompt_per_second", 0.0))
+            trial.generation_tps.append(timings.get("predicted_per_second", 0.0))
+            trial.total_tps.append(tokens / (elapsed_ms / 1000) if elapsed_ms > 0 else 0.0)
+
+
+# =============================================================================
+# BÚSQUEDA
+# =============================================================================
+
+class Autotuner:
+    """Evalúa configuraciones de un servicio y busca la de mayor TPS."""
+
+    def __init__(self, service: ServiceSpec, launcher, prompts: List[str],
+                 host: str = "localhost", port: int = 8080,
+                 objective: str = "total", n_predict: int = DEFAULT_N_PREDICT,
+                 repetitions: int = DEFAULT_REPETITIONS,
+                 tolerance: float = DEFAULT_TOLERANCE,
+                 startup_timeout_s: float = STARTUP_TIMEOUT_S):
+        self.service = service
+        self.launcher = launcher
+        self.prompts = prompts
+        self.host = host
+        self.port = port
+        self.objective = objective
+        self.n_predict = n_predict
+        self.repetitions = repetitions
+        self.tolerance = tolerance
+        self.startup_timeout_s = startup_timeout_s
+        self.trials: Dict[LaunchConfig, Trial] = {}
+        self.selected: Optional[Trial] = None
+
+    def evaluate(self, config: LaunchConfig) -> Trial:
+        """Relanza el servidor con config y mide la carga (memoizado)."""
+        if config in self.trials:
+            return self.trials[config]
+
+        trial = Trial(config=config)
+        print(f"  [{len(self.trials) + 1:>2}] {config.label:<24}", end=" ", flush=True)
+        try:
+            self.launcher.start(config.apply(self.service.command))
+            trial.startup_s = wait_until_ready(self.launcher, self.host, self.port,
+                                               self.startup_timeout_s)
+            run_workload(self.host, self.port, self.prompts, self.n_predict,
+                         self.repetitions, trial)
+        except Exception as e:
+            trial.error = str(e)
+        finally:
+            self.launcher.stop()
+            # Las conexiones keep-alive apuntaban al servidor detenido
+            get_transport().close()
+
+        if trial.ok:
+            print(f"prompt {trial.median_prompt_tps:>7.1f}  gen {trial.median_generation_tps:>6.1f}  "
+                  f"total {trial.median_total_tps:>6.1f} TPS")
+        else:
+            print(f"✗ {trial.error}")
+        self.trials[config] = trial
+        return trial
+
+    def _better(self, candidate: Trial, best: Trial) -> bool:
+        return candidate.score(self.objective) > best.score(self.objective) * (1 + self.tolerance)
+
+    def grid(self, space: Dict[str, Sequence[int]],
+             baseline: Optional[LaunchConfig] = None) -> Optional[Trial]:
+        """
+        Evalúa todas las combinaciones válidas. La más rápida reemplaza a
+        baseline solo si la supera por más de la tolerancia.
+        """
+        for threads, batch, ctx in product(space["threads"], space["batch"], space["ctx"]):
+            if batch <= ctx:
+                self.evaluate(LaunchConfig(threads, batch, ctx))
+        fastest = self.fastest
+        incumbent = self.trials.get(baseline) if baseline else None
+        if incumbent is None or not incumbent.ok or (fastest and self._better(fastest, incumbent)):
+            incumbent = fastest
+        self.selected = incumbent
+        return self.selected
+
+    def adaptive(self, space: Dict[str, Sequence[int]], start: LaunchConfig,
+                 max_rounds: int = DEFAULT_MAX_ROUNDS) -> Optional[Trial]:
+        """
+        Ascenso por coordenadas: para cada parámetro avanza hacia el
+        candidato vecino (arriba y abajo) mientras la mejora supere la
+        tolerancia; repite las rondas hasta que ningún parámetro se mueva.
+        Retorna la configuración a la que llegó, no la medición más alta.
+        """
+        current = LaunchConfig(**{p: _nearest(space[p], getattr(start, p)) for p in PARAMS})
+        best = self.evaluate(current)
+
+        for _ in range(max_rounds):
+            moved = False
+            for param in PARAMS:
+                values = list(space[param])
+                for step in (1, -1):
+                    index = values.index(getattr(current, param)) + step
+                    while 0 <= index < len(values):
+                        candidate = replace(current, **{param: values[index]})
+                        if candidate.batch > candidate.ctx:
+                            break
+                        trial = self.evaluate(candidate)
+                        if not self._better(trial, best):
+                            break
+                        current, best, moved = candidate, trial, True
+                        index += step
+            if not moved:
+                break
+        self.selected = best if best.ok else self.fastest
+        return self.selected
+
+    @property
+    def fastest(self) -> Optional[Trial]:
+        """Medición más alta, aunque la diferencia sea ruido."""
+        ok = [t for t in self.trials.values() if t.ok]
+        return max(ok, key=lambda t: t.score(self.objective)) if ok else None
+
+
+def _nearest(values: Sequence[int], target: int) -> int:
+    return min(values, key=lambda v: (abs(v - target), v))
+
+
+def build_space(threads: Sequence[int], batch: Sequence[int], ctx: Sequence[int],
+                baseline: LaunchConfig, ctx_min: int = 0) -> Dict[str, List[int]]:
+    """Candidatos por parámetro, incluyendo siempre la configuración actual."""
+    space = {
+        "threads": sorted(set(threads) | {baseline.threads}),
+        "batch": sorted(set(batch) | {baseline.batch}),
+        "ctx": sorted(v for v in set(ctx) | {baseline.ctx} if v >= ctx_min),
+    }
+    if not space["ctx"]:
+        raise ValueError(f"Ningún contexto candidato es >= {ctx_min}")
+    return space
+
+
+# =============================================================================
+# REPORTE
+# =============================================================================
+
+def print_trials(tuner: Autotuner, baseline: Trial, top: int = 10):
+    trials = sorted(tuner.trials.values(), key=lambda t: t.score(tuner.objective), reverse=True)
+    print(f"\n  {'Configuración':<24} {'Prompt':>8} {'Gen':>7} {'Total':>7} {'vs actual':>10}")
+    print("  " + "-" * 60)
+    for trial in trials[:top]:
+        if not trial.ok:
+            continue
+        mark = " (actual)" if trial.config == baseline.config else ""
+        print(f"  {trial.config.label:<24} {trial.median_prompt_tps:>8.1f} "
+              f"{trial.median_generation_tps:>7.1f} {trial.median_total_tps:>7.1f} "
+              f"{_gain(baseline, trial, tuner.objective):>10}{mark}")
+    failed = [t for t in trials if not t.ok]
+    if failed:
+        print(f"  ({len(failed)} configuración(es) fallaron)")
+
+
+def save_trials(tuner: Autotuner, baseline: Trial, search: str,
+                case_ids: Sequence[str], output_dir: Path) -> Path:
+    output_dir.mkdir(parents=True, exist_ok=True)
+    timestamp = datetime.now()
+    path = output_dir / f"autotune_{tuner.service.name}_{timestamp.strftime('%Y%m%d_%H%M%S')}.json"
+    best = tuner.selected
+    fastest = tuner.fastest
+    data = {
+        "experimento": "autotune",
+        "timestamp": timestamp.isoformat(),
+        "service": tuner.service.name,
+        "objective": tuner.objective,
+        "search": search,
+        "workload": {
+            "cases": list(case_ids),
+            "n_predict": tuner.n_predict,
+            "repetitions": tuner.repetitions
+        },
+        "baseline": baseline.to_dict(),
+        "tolerance": tuner.tolerance,
+        "best": best.to_dict() if best else None,
+        "fastest": fastest.to_dict() if fastest else None,
+        "trials": [t.to_dict() for t in tuner.trials.values()]
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+    return path
+
+
+# =============================================================================
+# CLI
+# =============================================================================
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Búsqueda de threads, batch y contexto para los servidores llama.cpp",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Ejemplos:
+  python autotuner.py --servicio qwen-7b
+  python autotuner.py --servicio qwen-7b mistral-7b --busqueda grilla --objetivo generacion
+  python autotuner.py --servicio qwen-7b --comando "python3 stub_server.py --escala-tiempo 0"
+  docker-compose -f config/docker-compose.yml -f benchmarks/results/docker-compose.autotune.yml up -d
+        """
+    )
+    parser.add_argument("--servicio", nargs="+", required=True,
+                        help="Servicio(s) del docker-compose a ajustar")
+    parser.add_argument("--compose", default=str(DEFAULT_COMPOSE),
+                        help="docker-compose con la configuración actual")
+    parser.add_argument("--busqueda", choices=SEARCHES, default="adaptativa",
+                        help="Estrategia de búsqueda (default: adaptativa)")
+    parser.add_argument("--objetivo", choices=OBJECTIVES, default="total",
+                        help="TPS a maximizar: total (prompt + generación), generacion o prompt")
+    parser.add_argument("--threads", type=int, nargs="+", default=list(DEFAULT_THREADS))
+    parser.add_argument("--batch", type=int, nargs="+", default=list(DEFAULT_BATCH))
+    parser.add_argument("--ctx", type=int, nargs="+", default=list(DEFAULT_CTX))
+    parser.add_argument("--ctx-minimo", type=int,
+                        help="Descartar contextos menores (default: el -c actual del servicio)")
+    parser.add_argument("--casos", nargs="+", default=list(DEFAULT_CASES),
+                        choices=sorted(CASOS_CLINICOS), help="Casos de la carga fija")
+    parser.add_argument("--n-predict", type=int, default=DEFAULT_N_PREDICT,
+                        help=f"Tokens a generar por request (default: {DEFAULT_N_PREDICT})")
+    parser.add_argument("--repeticiones", type=int, default=DEFAULT_REPETITIONS,
+                        help=f"Pasadas de la carga por configuración (default: {DEFAULT_REPETITIONS})")
+    parser.add_argument("--tolerancia", type=float, default=DEFAULT_TOLERANCE * 100,
+                        help=f"Mejora mínima en %% para moverse (default: {DEFAULT_TOLERANCE * 100:.0f})")
+    parser.add_argument("--comando",
+                        help="Lanzar un proceso local en vez de docker (p. ej. llama-server o stub_server.py)")
+    parser.add_argument("--modelos", help="Directorio local que reemplaza /models con --comando")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--puerto", type=int,
+                        help="Puerto del servidor (default: el del servicio en el compose)")
+    parser.add_argument("--timeout-arranque", type=float, default=STARTUP_TIMEOUT_S,
+                        help="Segundos máximos de carga del modelo")
+    parser.add_argument("--output", default=str(DEFAULT_OVERRIDE),
+                        help=f"Override de compose a generar (default: {DEFAULT_OVERRIDE})")
+
+    args = parser.parse_args()
+
+    services = read_compose_services(Path(args.compose))
+    unknown = [name for name in args.servicio if name not in services]
+    if unknown:
+        print(f"  Servicio(s) no encontrados en {args.compose}: {', '.join(unknown)}")
+        print(f"  Disponibles: {', '.join(services)}")
+        return 1
+
+    prompts = build_workload(args.casos)
+    best: Dict[str, Tuple[ServiceSpec, Trial, Trial]] = {}
+
+    for name in args.servicio:
+        spec = services[name]
+        port = args.puerto or spec.host_port
+        launcher = (ProcessLauncher(args.comando, port, args.modelos) if args.comando
+                    else DockerLauncher(spec, port))
+        ctx_min = spec.config.ctx if args.ctx_minimo is None else args.ctx_minimo
+        try:
+            space = build_space(args.threads, args.batch, args.ctx, spec.config, ctx_min)
+        except ValueError as e:
+            print(f"  {name}: {e}")
+            return 1
+
+        print(f"\n{'=' * 70}")
+        print(f"AUTOTUNE: {name} ({args.busqueda}, objetivo {args.objetivo})")
+        print(f"  Actual: {spec.config.label}")
+        print(f"  Candidatos: -t {space['threads']}  -b {space['batch']}  -c {space['ctx']}")
+        print(f"{'=' * 70}")
+
+        tuner = Autotuner(spec, launcher, prompts, args.host, port, args.objetivo,
+                          args.n_predict, args.repeticiones, args.tolerancia / 100,
+                          args.timeout_arranque)
+        try:
+            baseline = tuner.evaluate(spec.config) if spec.config.ctx >= ctx_min \
+                else Trial(config=spec.config, error="contexto menor a --ctx-minimo")
+            if args.busqueda == "grilla":
+                tuner.grid(space, spec.config)
+            else:
+                tuner.adaptive(space, spec.config)
+        finally:
+            launcher.stop()
+
+        print_trials(tuner, baseline)
+        path = save_trials(tuner, baseline, args.busqueda, args.casos, RESULTS_DIR)
+        print(f"\n  Mediciones guardadas: {path}")
+
+        if tuner.selected is None:
+            print(f"  ✗ Ninguna configuración de {name} completó la carga")
+            continue
+        best[name] = (spec, baseline, tuner.selected)
+        if tuner.selected.config == spec.config:
+            print(f"  = Se mantiene la actual: ninguna la supera en más de {args.tolerancia:.0f}%")
+        else:
+            print(f"  ✓ Mejor: {tuner.selected.config.label} "
+                  f"({_gain(baseline, tuner.selected, args.objetivo)})")
+
+    if not best:
+        return 1
+    output = write_compose_override(Path(args.output), best, args.objetivo)
+    print(f"\n  Override de compose: {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
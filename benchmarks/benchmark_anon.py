@@ -14,10 +14,9 @@ Uso:
     python benchmark_anon.py --port 8088 --iterations 3   # Configuración personalizada
 
 Requisitos:
-    pip install requests
+    Solo biblioteca estándar (conexiones keep-alive vía http_transport)
 """
 
-import requests
 import time
 import json
 import statistics
@@ -27,6 +26,9 @@ from datetime import datetime
 # Importar casos y prompts desde módulos locales
 from casos_sinteticos import CASOS, obtener_caso, obtener_todos_los_casos
 from prompts_anonimizacion import PROMPTS, obtener_prompt, formatear_prompt, obtener_todos_los_prompts
+from http_transport import get_transport
+from metrics.leak_scanner import find_leaks
+from results_store import configure_results_store, record_result, DEFAULT_STORE_PATH
 
 
 # =============================================================================
@@ -43,13 +45,14 @@ DEFAULT_PROMPT = "detailed"
 # FUNCIONES DE EVALUACIÓN
 # =============================================================================
 
-def evaluar_anonimizacion(texto_anonimizado: str, entidades: list) -> dict:
+def evaluar_anonimizacion(texto_anonimizado: str, entidades: list, caso_id: str = None) -> dict:
     """
     Evalúa la calidad de la anonimización comparando con ground truth.
 
     Args:
         texto_anonimizado: Texto devuelto por el modelo
         entidades: Lista de entidades PHI esperadas
+        caso_id: Id del caso (cache del autómata de fugas)
 
     Returns:
         dict con métricas: tp, fn, precision, recall, entidades_escapadas
@@ -58,10 +61,12 @@ def evaluar_anonimizacion(texto_anonimizado: str, entidades: list) -> dict:
     fn = 0  # False Negatives: entidades que se escaparon
     entidades_escapadas = []
 
+    fugas = find_leaks(texto_anonimizado, entidades, caso_id, value_key="valor")
+
     for entidad in entidades:
         valor = entidad["valor"]
         # Verificar si el valor original sigue presente en el texto
-        if valor in texto_anonimizado:
+        if valor in fugas:
             fn += 1
             entidades_escapadas.append({
                 "tipo": entidad["tipo"],
@@ -122,8 +127,6 @@ def run_anonymization(port: int, texto: str, prompt_template: str) -> dict:
     Returns:
         dict con 'content', 'tokens', 'time_ms', 'tps'
     """
-    url = f"http://localhost:{port}/completion"
-
     # Formatear el prompt con el texto
     prompt = prompt_template.format(text=texto)
 
@@ -137,7 +140,7 @@ def run_anonymization(port: int, texto: str, prompt_template: str) -> dict:
     }
 
     start_time = time.time()
-    response = requests.post(url, json=payload, timeout=300)
+    response = get_transport().post_json("localhost", port, "/completion", payload, timeout=300)
     elapsed_ms = (time.time() - start_time) * 1000
 
     response.raise_for_status()
@@ -161,11 +164,12 @@ def run_anonymization(port: int, texto: str, prompt_template: str) -> dict:
         "tokens": tokens,
         "time_ms": elapsed_ms,
         "tps": tps,
-        "timings": timings
+        "timings": timings,
+        "http_timings": response.timings.to_dict()
     }
 
 
-def run_benchmark(port: int, caso: dict, prompt: dict, iterations: int) -> dict:
+def run_benchmark(port: int, caso: dict, prompt: dict, iterations: int, modelo: str = None) -> dict:
     """
     Ejecuta el benchmark para un caso y prompt específico.
 
@@ -174,6 +178,7 @@ def run_benchmark(port: int, caso: dict, prompt: dict, iterations: int) -> dict:
         caso: Diccionario con datos del caso de prueba
         prompt: Diccionario con datos del prompt
         iterations: Número de iteraciones
+        modelo: Nombre del modelo servido (opcional)
 
     Returns:
         dict con estadísticas del benchmark
@@ -203,7 +208,7 @@ def run_benchmark(port: int, caso: dict, prompt: dict, iterations: int) -> dict:
             print(f"OK - {result['tokens']} tokens en {result['time_ms']:.0f}ms "
                   f"({result['tps']:.2f} TPS)")
 
-        except requests.exceptions.ConnectionError:
+        except ConnectionError:
             print(f"ERROR - No se puede conectar al servidor en puerto {port}")
             return None
         except Exception as e:
@@ -220,10 +225,11 @@ def run_benchmark(port: int, caso: dict, prompt: dict, iterations: int) -> dict:
     token_values = [r["tokens"] for r in results]
 
     # Evaluar calidad de anonimización
-    evaluacion = evaluar_anonimizacion(first_response, caso['entidades'])
+    evaluacion = evaluar_anonimizacion(first_response, caso['entidades'], caso['id'])
 
     stats = {
         "port": port,
+        "modelo": modelo,
         "caso_id": caso['id'],
         "caso_nombre": caso['nombre'],
         "prompt_id": prompt['id'],
@@ -304,10 +310,12 @@ def save_results(stats: dict, filename: str = None):
         json.dump(save_stats, f, indent=2, ensure_ascii=False)
 
     print(f"Resultados guardados en: {filename}")
+    record_result(save_stats, filename)
     return filename
 
 
-def run_benchmark_matrix(port: int, casos: list, prompts: list, iterations: int, save: bool) -> list:
+def run_benchmark_matrix(port: int, casos: list, prompts: list, iterations: int, save: bool,
+                         modelo: str = None) -> list:
     """
     Ejecuta benchmarks para todas las combinaciones de casos y prompts.
 
@@ -317,6 +325,7 @@ def run_benchmark_matrix(port: int, casos: list, prompts: list, iterations: int,
         prompts: Lista de IDs de prompts a probar
         iterations: Número de iteraciones por combinación
         save: Si guardar resultados en archivos
+        modelo: Nombre del modelo servido (opcional)
 
     Returns:
         Lista de resultados de todos los benchmarks
@@ -334,7 +343,7 @@ def run_benchmark_matrix(port: int, casos: list, prompts: list, iterations: int,
         for prompt_id in prompts:
             prompt = obtener_prompt(prompt_id)
 
-            stats = run_benchmark(port, caso, prompt, iterations)
+            stats = run_benchmark(port, caso, prompt, iterations, modelo)
 
             if stats:
                 all_results.append(stats)
@@ -421,6 +430,19 @@ Ejemplos:
         default=None,
         help="Nombre del archivo de salida (default: auto-generado)"
     )
+    parser.add_argument(
+        "--modelo", "-m",
+        type=str,
+        default=None,
+        help="Nombre del modelo servido (clave en el almacén de resultados)"
+    )
+    parser.add_argument(
+        "--results-db",
+        nargs="?",
+        const=DEFAULT_STORE_PATH,
+        default=None,
+        help=f"Guardar cada request en el almacén SQLite; implica --save (default: {DEFAULT_STORE_PATH})"
+    )
     parser.add_argument(
         "--list-casos",
         action="store_true",
@@ -446,6 +468,10 @@ Ejemplos:
         listar_prompts()
         exit(0)
 
+    if args.results_db:
+        configure_results_store(args.results_db)
+        args.save = True
+
     print("\n" + "="*60)
     print("  BENCHMARK DE ANONIMIZACIÓN CLÍNICA - IBM POWER10")
     print("  Universidad de Montevideo - Tesis 2025")
@@ -474,7 +500,8 @@ Ejemplos:
     # Ejecutar benchmarks
     if len(casos_ids) > 1 or len(prompts_ids) > 1:
         # Ejecutar matriz de benchmarks
-        results = run_benchmark_matrix(args.port, casos_ids, prompts_ids, args.iterations, args.save)
+        results = run_benchmark_matrix(args.port, casos_ids, prompts_ids, args.iterations, args.save,
+                                       args.modelo)
     else:
         # Ejecutar benchmark único
         caso = obtener_caso(casos_ids[0])
@@ -483,7 +510,7 @@ Ejemplos:
         print(f"\nTexto clínico: {len(caso['texto'])} caracteres")
         print(f"Entidades PHI a detectar: {caso['num_entidades']}")
 
-        stats = run_benchmark(args.port, caso, prompt, args.iterations)
+        stats = run_benchmark(args.port, caso, prompt, args.iterations, args.modelo)
         print_results(stats)
 
         if args.save and stats:
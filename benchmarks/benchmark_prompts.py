@@ -11,12 +11,12 @@ Uso:
     python benchmark_prompts.py --caso caso_olaf  # Usa caso completo CTI
     python benchmark_prompts.py --port 8088       # Usar otro modelo
     python benchmark_prompts.py --export csv      # Exportar a CSV
+    python benchmark_prompts.py --prefix-cache    # Prefijo fijado a un slot (cache_prompt)
 
 Requisitos:
-    pip install requests tabulate
+    pip install tabulate
 """
 
-import requests
 import time
 import json
 import statistics
@@ -27,6 +27,10 @@ from typing import List, Dict
 
 from casos_sinteticos import CASOS, obtener_caso
 from prompts_anonimizacion import PROMPTS, obtener_prompt, obtener_todos_los_prompts
+from http_transport import get_transport
+from metrics.leak_scanner import find_leaks
+from prefix_cache import assign_prefix_slots, split_template, warm_prefix, summarize_prefix_cache
+from concurrent_engine import detect_parallel_slots
 
 
 # =============================================================================
@@ -42,9 +46,14 @@ DEFAULT_ITERATIONS = 3
 # FUNCIONES DE BENCHMARK
 # =============================================================================
 
-def run_single_test(port: int, texto: str, prompt_template: str, timeout: int = 300) -> dict:
-    """Ejecuta una única prueba de anonimización."""
-    url = f"http://localhost:{port}/completion"
+def run_single_test(port: int, texto: str, prompt_template: str, timeout: int = 300,
+                    id_slot: int = None) -> dict:
+    """
+    Ejecuta una única prueba de anonimización.
+
+    Con id_slot se envía cache_prompt fijado a ese slot, de modo que el
+    prefijo del template no se reevalúa (ver prefix_cache.py).
+    """
     prompt = prompt_template.format(text=texto)
 
     payload = {
@@ -55,9 +64,12 @@ def run_single_test(port: int, texto: str, prompt_template: str, timeout: int =
         "top_p": 0.9,
         "stop": ["```", "---END---"]
     }
+    if id_slot is not None:
+        payload["cache_prompt"] = True
+        payload["id_slot"] = id_slot
 
     start_time = time.time()
-    response = requests.post(url, json=payload, timeout=timeout)
+    response = get_transport().post_json("localhost", port, "/completion", payload, timeout=timeout)
     elapsed_ms = (time.time() - start_time) * 1000
 
     response.raise_for_status()
@@ -71,24 +83,30 @@ def run_single_test(port: int, texto: str, prompt_template: str, timeout: int =
         tokens = len(content) // 4
 
     tps = (tokens / elapsed_ms) * 1000 if elapsed_ms > 0 else 0
+    tokens_prompt = result.get("tokens_evaluated", 0)
 
     return {
         "content": content,
         "tokens": tokens,
         "time_ms": elapsed_ms,
-        "tps": tps
+        "tps": tps,
+        "tokens_prompt": tokens_prompt,
+        "tokens_cached": max(tokens_prompt - timings.get("prompt_n", tokens_prompt), 0),
+        "time_prompt_ms": timings.get("prompt_ms", 0)
     }
 
 
-def evaluar_resultado(texto_anonimizado: str, entidades: list) -> dict:
+def evaluar_resultado(texto_anonimizado: str, entidades: list, caso_id: str = None) -> dict:
     """Evalúa la calidad de la anonimización."""
     tp = 0
     fn = 0
     escapadas = []
 
+    fugas = find_leaks(texto_anonimizado, entidades, caso_id, value_key="valor")
+
     for entidad in entidades:
         valor = entidad["valor"]
-        if valor in texto_anonimizado:
+        if valor in fugas:
             fn += 1
             escapadas.append(valor)
         else:
@@ -106,14 +124,24 @@ def evaluar_resultado(texto_anonimizado: str, entidades: list) -> dict:
     }
 
 
-def benchmark_prompt(port: int, caso: dict, prompt: dict, iterations: int) -> dict:
-    """Ejecuta benchmark para un prompt específico."""
+def benchmark_prompt(port: int, caso: dict, prompt: dict, iterations: int,
+                     id_slot: int = None) -> dict:
+    """
+    Ejecuta benchmark para un prompt específico.
+
+    Con id_slot el prefijo del prompt se precalienta en ese slot y el
+    resultado incluye el tiempo de evaluación de prompt ahorrado.
+    """
     results = []
     contenidos = []
 
+    if id_slot is not None:
+        prefix, _ = split_template(prompt['template'])
+        warm = warm_prefix("localhost", port, prefix, id_slot)
+
     for i in range(iterations):
         try:
-            result = run_single_test(port, caso['texto'], prompt['template'])
+            result = run_single_test(port, caso['texto'], prompt['template'], id_slot=id_slot)
             results.append(result)
             contenidos.append(result['content'])
         except Exception as e:
@@ -125,9 +153,9 @@ def benchmark_prompt(port: int, caso: dict, prompt: dict, iterations: int) -> di
     time_values = [r['time_ms'] for r in results]
 
     # Evaluar calidad usando la primera respuesta
-    eval_result = evaluar_resultado(contenidos[0], caso['entidades'])
+    eval_result = evaluar_resultado(contenidos[0], caso['entidades'], caso['id'])
 
-    return {
+    resultado = {
         "prompt_id": prompt['id'],
         "prompt_nombre": prompt['nombre'],
         "tps_avg": statistics.mean(tps_values),
@@ -141,11 +169,25 @@ def benchmark_prompt(port: int, caso: dict, prompt: dict, iterations: int) -> di
         "respuesta_ejemplo": contenidos[0][:500]
     }
 
+    if id_slot is not None:
+        resultado["prefix_cache"] = summarize_prefix_cache(results, warm)
 
-def run_prompt_comparison(port: int, caso: dict, iterations: int) -> List[dict]:
-    """Ejecuta benchmark comparativo de todos los prompts."""
+    return resultado
+
+
+def run_prompt_comparison(port: int, caso: dict, iterations: int,
+                          prefix_cache: bool = False) -> List[dict]:
+    """
+    Ejecuta benchmark comparativo de todos los prompts.
+
+    Con prefix_cache cada prompt se fija a un slot del servidor con
+    cache_prompt (ver prefix_cache.py).
+    """
     resultados = []
     prompts = obtener_todos_los_prompts()
+    slots = {}
+    if prefix_cache:
+        slots = assign_prefix_slots(prompts.keys(), detect_parallel_slots("localhost", port))
 
     print(f"\n{'='*70}")
     print(f"  COMPARATIVA DE ESTRATEGIAS DE PROMPTING")
@@ -160,11 +202,14 @@ def run_prompt_comparison(port: int, caso: dict, iterations: int) -> List[dict]:
     for prompt_id, prompt in prompts.items():
         print(f"  Probando [{prompt_id}] {prompt['nombre']}...", end=" ", flush=True)
 
-        resultado = benchmark_prompt(port, caso, prompt, iterations)
+        resultado = benchmark_prompt(port, caso, prompt, iterations, slots.get(prompt_id))
 
         if resultado:
             resultados.append(resultado)
-            print(f"OK - {resultado['tps_avg']:.1f} TPS, {resultado['precision']:.0f}% precision")
+            print(f"OK - {resultado['tps_avg']:.1f} TPS, {resultado['precision']:.0f}% precision", end="")
+            if "prefix_cache" in resultado:
+                print(f", {resultado['prefix_cache']['prompt_eval_saved_ms']:.0f} ms de prompt ahorrados", end="")
+            print()
         else:
             print("FALLO")
 
@@ -270,6 +315,7 @@ Ejemplos:
   python benchmark_prompts.py --caso caso_olaf  # Usar caso completo
   python benchmark_prompts.py --export csv      # Exportar a CSV
   python benchmark_prompts.py --export json     # Exportar a JSON
+  python benchmark_prompts.py --prefix-cache    # Reutilizar KV cache del prefijo
         """
     )
     parser.add_argument(
@@ -297,6 +343,11 @@ Ejemplos:
         choices=['csv', 'json', 'both'],
         help="Formato de exportación de resultados"
     )
+    parser.add_argument(
+        "--prefix-cache",
+        action="store_true",
+        help="Fijar el prefijo de cada prompt a un slot del servidor (cache_prompt)"
+    )
     parser.add_argument(
         "--output-dir", "-o",
         type=str,
@@ -318,7 +369,7 @@ Ejemplos:
     print(f"  Entidades PHI: {caso['num_entidades']}")
 
     # Ejecutar comparación
-    resultados = run_prompt_comparison(args.port, caso, args.iterations)
+    resultados = run_prompt_comparison(args.port, caso, args.iterations, args.prefix_cache)
 
     # Mostrar tabla
     print_comparison_table(resultados)
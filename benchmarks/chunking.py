@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""
+chunking.py - Fragmentación por secciones y anonimización paralela
+Universidad de Montevideo - Tesis 2025
+
+experiment_runner_v3 limita la generación a N_PREDICT tokens, lo que trunca
+notas largas como la evolución de CTI, y experiment_runner envía notas
+completas contra contextos de 4096 tokens. Este módulo:
+
+1. Divide la nota en los encabezados de sección ("DATOS DEL PACIENTE:",
+   "--- EVOLUCIÓN 27/11/2024 ---", "EXAMEN FÍSICO:", ...)
+2. Agrupa secciones consecutivas en fragmentos que entran en el presupuesto
+   de tokens (las secciones demasiado largas se cortan por párrafo o línea)
+3. Anonimiza los fragmentos concurrentemente con el motor concurrente
+4. Une las salidas en orden, conservando los offsets de cada fragmento en el
+   texto original y en el anonimizado
+
+Así la latencia de una nota larga depende de los fragmentos en vuelo y no
+de la longitud total.
+
+Uso:
+    from chunking import chunk_note, anonymize_document
+
+    chunks = chunk_note(texto, max_tokens=400)
+    result = anonymize_document(texto, template, "localhost", 8080, parallel=4)
+"""
+
+import re
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+
+# =============================================================================
+# CONFIGURACIÓN
+# =============================================================================
+
+CHARS_PER_TOKEN = 4             # Misma estimación que benchmark_anon
+DEFAULT_MAX_CHUNK_TOKENS = 400  # La salida de un fragmento entra en N_PREDICT=500
+
+# "--- Sección 2 ---", "--- EVOLUCIÓN 27/11/2024 ---"
+_SEPARATOR_HEADER = re.compile(r"^\s*-{2,}.*-{2,}\s*$")
+# Línea completa en mayúsculas, opcionalmente terminada en ':'
+# ("DATOS DEL PACIENTE:", "EVOLUCIÓN", "EXAMEN FÍSICO:")
+_UPPER_HEADER = re.compile(r"^\s*[A-ZÁÉÍÓÚÑÜ][A-ZÁÉÍÓÚÑÜ0-9 .,/()-]{2,}:?\s*$")
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimación de tokens a partir de la cantidad de caracteres."""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def is_section_header(line: str) -> bool:
+    """True si la línea abre una sección de la nota clínica."""
+    return bool(_SEPARATOR_HEADER.match(line) or _UPPER_HEADER.match(line))
+
+
+def chunk_budget_tokens(n_ctx: int, prompt_prefix_tokens: int,
+                        output_ratio: float = 1.2) -> int:
+    """
+    Tokens de texto por fragmento para un contexto n_ctx.
+
+    El contexto debe contener prefijo + fragmento + salida, y la salida de
+    una anonimización es aproximadamente output_ratio veces el fragmento.
+    """
+    return max(1, int((n_ctx - prompt_prefix_tokens) / (1 + output_ratio)))
+
+
+# =============================================================================
+# DATACLASSES
+# =============================================================================
+
+@dataclass
+class Chunk:
+    """Fragmento de la nota; text == nota[start:end]."""
+    index: int
+    start: int
+    end: int
+    text: str
+    header: str = ""                # Primer encabezado del fragmento
+
+    @property
+    def tokens(self) -> int:
+        return estimate_tokens(self.text)
+
+
+@dataclass
+class ChunkOutput:
+    """Salida anonimizada de un fragmento y su ubicación en el resultado."""
+    chunk: Chunk
+    text: str
+    out_start: int = 0              # Offset en el texto anonimizado unido
+    out_end: int = 0
+    result: Dict = field(default_factory=dict)
+
+    def to_dict(self) -> Dict:
+        return {
+            "index": self.chunk.index,
+            "header": self.chunk.header,
+            "source_span": [self.chunk.start, self.chunk.end],
+            "output_span": [self.out_start, self.out_end],
+            "tokens_estimated": self.chunk.tokens,
+            "success": bool(self.result.get("success", False)),
+            "tokens_generated": self.result.get("tokens_generated", 0),
+            "latency_ms": self.result.get("latency_ms", 0.0)
+        }
+
+
+# =============================================================================
+# FRAGMENTACIÓN
+# =============================================================================
+
+def split_sections(text: str) -> List[Tuple[int, int, str]]:
+    """
+    Divide el texto en secciones que comienzan en un encabezado.
+
+    Returns:
+        Lista de (start, end, header) que cubre todo el texto sin huecos.
+    """
+    boundaries = [(0, "")]
+    offset = 0
+    for line in text.splitlines(keepends=True):
+        if offset > 0 and is_section_header(line):
+            boundaries.append((offset, line.strip()))
+        elif offset == 0 and is_section_header(line):
+            boundaries[0] = (0, line.strip())
+        offset += len(line)
+
+    sections = []
+    for i, (start, header) in enumerate(boundaries):
+        end = boundaries[i + 1][0] if i + 1 < len(boundaries) else len(text)
+        if end > start:
+            sections.append((start, end, header))
+    return sections
+
+
+def _split_oversized(text: str, start: int, end: int, max_chars: int) -> List[Tuple[int, int]]:
+    """Corta [start, end) en piezas <= max_chars por párrafo, línea o carácter."""
+    pieces = []
+    while end - start > max_chars:
+        window = text[start:start + max_chars]
+        cut = window.rfind("\n\n")
+        if cut <= 0:
+            cut = window.rfind("\n")
+        if cut <= 0:
+            cut = window.rfind(" ")
+        cut = cut + 1 if cut > 0 else max_chars
+        pieces.append((start, start + cut))
+        start += cut
+    pieces.append((start, end))
+    return pieces
+
+
+def chunk_note(text: str, max_tokens: int = DEFAULT_MAX_CHUNK_TOKENS) -> List[Chunk]:
+    """
+    Fragmenta la nota en piezas de hasta max_tokens (estimados).
+
+    Agrupa secciones consecutivas mientras entren en el presupuesto; nunca
+    corta dentro de una sección salvo que ella sola lo exceda. La
+    concatenación de los fragmentos reproduce exactamente el texto.
+    """
+    max_chars = max(1, max_tokens * CHARS_PER_TOKEN)
+    spans: List[Tuple[int, int, str]] = []
+    for start, end, header in split_sections(text):
+        for i, (s, e) in enumerate(_split_oversized(text, start, end, max_chars)):
+            spans.append((s, e, header if i == 0 else ""))
+
+    chunks: List[Chunk] = []
+    current_start, current_end, current_header = None, None, ""
+    for start, end, header in spans:
+        if current_start is not None and end - current_start <= max_chars:
+            current_end = end
+            continue
+        if current_start is not None:
+            chunks.append(Chunk(len(chunks), current_start, current_end,
+                                text[current_start:current_end], current_header))
+        current_start, current_end, current_header = start, end, header
+    if current_start is not None:
+        chunks.append(Chunk(len(chunks), current_start, current_end,
+                            text[current_start:current_end], current_header))
+    return chunks
+
+
+# =============================================================================
+# UNIÓN
+# =============================================================================
+
+def _edge_whitespace(text: str) -> Tuple[str, str, str]:
+    """(espacios iniciales, contenido, espacios finales)."""
+    core = text.strip()
+    if not core:
+        return text, "", ""
+    lead = text[:len(text) - len(text.lstrip())]
+    trail = text[len(text.rstrip()):]
+    return lead, core, trail
+
+
+def stitch(chunks: List[Chunk], outputs: List[str],
+           results: Optional[List[Dict]] = None) -> Tuple[str, List[ChunkOutput]]:
+    """
+    Une las salidas de los fragmentos en orden.
+
+    El modelo descarta los espacios y saltos de línea de los bordes; se
+    restauran los del fragmento original para conservar la estructura.
+    """
+    results = results or [{} for _ in chunks]
+    parts = []
+    chunk_outputs = []
+    offset = 0
+    for chunk, output, result in zip(chunks, outputs, results):
+        lead, _, trail = _edge_whitespace(chunk.text)
+        piece = lead + output.strip() + trail
+        chunk_outputs.append(ChunkOutput(chunk, piece, offset, offset + len(piece), result))
+        parts.append(piece)
+        offset += len(piece)
+    return "".join(parts), chunk_outputs
+
+
+# =============================================================================
+# ANONIMIZACIÓN PARALELA
+# =============================================================================
+
+def anonymize_document(
+    text: str,
+    prompt_template: str,
+    host: str,
+    port: int,
+    parallel: int = 1,
+    max_tokens: int = DEFAULT_MAX_CHUNK_TOKENS,
+    call_fn: Optional[Callable[..., Dict]] = None,
+    call_options: Optional[Dict] = None
+) -> Dict:
+    """
+    Anonimiza una nota fragmentada, con `parallel` fragmentos en vuelo.
+
+    Retorna un dict con la forma de experiment_runner_v3.call_model (success,
+    text, tokens_generated, tps_generation, total_time_s) más 'chunks' con
+    los offsets de cada fragmento. Si un fragmento falla se conserva su
+    texto original en el resultado unido y success es False.
+    """
+    from concurrent_engine import run_prompts
+
+    call_options = call_options or {}
+    if not text.strip():
+        return {"success": True, "error": "", "text": text, "tokens_generated": 0,
+                "tps_generation": 0, "aggregate_tps": 0, "total_time_s": 0.0, "chunks": []}
+
+    chunks = chunk_note(text, max_tokens)
+    prompts = [prompt_template.format(text=_edge_whitespace(c.text)[1]) for c in chunks]
+
+    start = time.perf_counter()
+    report = run_prompts(prompts, host, port, max(1, parallel), call_fn, **call_options)
+    wall_s = time.perf_counter() - start
+
+    results = []
+    outputs = []
+    for chunk, record in zip(chunks, report.records):
+        result = {**record.result, "latency_ms": round(record.latency_ms, 1)}
+        results.append(result)
+        outputs.append(result.get("text", "") if record.success else chunk.text)
+
+    stitched, chunk_outputs = stitch(chunks, outputs, results)
+    errors = [r.get("error", "") for r in results if not r.get("success", False)]
+    tokens = sum(r.get("tokens_generated", 0) for r in results)
+    gen_ms = sum(r.get("time_generation_ms", 0) for r in results)
+
+    return {
+        "success": not errors,
+        "error": "; ".join(errors),
+        "text": stitched,
+        "tokens_generated": tokens,
+        "tps_generation": round(tokens / (gen_ms / 1000), 2) if gen_ms > 0 else 0,
+        "aggregate_tps": round(tokens / wall_s, 2) if wall_s > 0 else 0,
+        "total_time_s": round(wall_s, 2),
+        "chunks": [c.to_dict() for c in chunk_outputs]
+    }
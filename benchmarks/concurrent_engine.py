@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""
+concurrent_engine.py - Motor de requests concurrentes para llama.cpp
+Universidad de Montevideo - Tesis 2025
+
+El servidor llama.cpp puede decodificar varios slots en paralelo
+(flag --parallel / -np). Enviar un request a la vez deja cores Power10
+ociosos entre llamadas. Este motor mantiene N requests en vuelo por
+endpoint, con N igual a la cantidad de slots del servidor.
+
+Métricas reportadas:
+- TPS agregado (tokens generados totales / tiempo de pared)
+- Latencia por request (desde que el request toma un slot hasta que termina)
+- Demora de encolado (desde que el request se encola hasta que toma un slot)
+
+Uso:
+    from concurrent_engine import ConcurrentEngine
+
+    engine = ConcurrentEngine([("localhost", 8080)], slots_per_endpoint=4)
+    report = engine.run([{"prompt": "..."}, {"prompt": "..."}])
+    print(report.summary())
+"""
+
+import asyncio
+import json
+import statistics
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from metrics.quantile_sketch import percentile
+
+# =============================================================================
+# CONFIGURACIÓN
+# =============================================================================
+
+DEFAULT_SLOTS = 1
+
+# (host, port)
+Endpoint = Tuple[str, int]
+
+# call_fn(prompt, host, port, **kwargs) -> Dict con al menos "success" y
+# "tokens_generated" (misma forma que experiment_runner_v3.call_model)
+CallFn = Callable[..., Dict]
+
+
+# =============================================================================
+# DATACLASSES
+# =============================================================================
+
+@dataclass
+class RequestRecord:
+    """Registro de un request ejecutado por el motor."""
+    index: int                      # Posición del job en la lista original
+    endpoint: str = ""              # "host:port" que atendió el request
+    enqueued_at: float = 0.0        # time.perf_counter() al encolar
+    started_at: float = 0.0         # time.perf_counter() al tomar un slot
+    finished_at: float = 0.0        # time.perf_counter() al terminar
+    result: Dict = field(default_factory=dict)
+    meta: Dict = field(default_factory=dict)
+
+    @property
+    def queue_delay_ms(self) -> float:
+        """Tiempo esperando un slot libre (ms)."""
+        return (self.started_at - self.enqueued_at) * 1000
+
+    @property
+    def latency_ms(self) -> float:
+        """Tiempo de servicio del request, sin contar la espera (ms)."""
+        return (self.finished_at - self.started_at) * 1000
+
+    @property
+    def success(self) -> bool:
+        return bool(self.result.get("success", False))
+
+
+@dataclass
+class EngineReport:
+    """Resultado agregado de una corrida del motor."""
+    records: List[RequestRecord] = field(default_factory=list)
+    wall_time_s: float = 0.0
+    slots_per_endpoint: int = DEFAULT_SLOTS
+    endpoints: List[str] = field(default_factory=list)
+
+    @property
+    def results(self) -> List[Dict]:
+        """Resultados de call_fn en el mismo orden que los jobs."""
+        return [r.result for r in self.records]
+
+    def summary(self) -> Dict:
+        """Estadísticas de throughput, latencia y encolado."""
+        ok = [r for r in self.records if r.success]
+        tokens = sum(r.result.get("tokens_generated", 0) for r in ok)
+        latencies = sorted(r.latency_ms for r in ok)
+        delays = sorted(r.queue_delay_ms for r in ok)
+
+        summary = {
+            "requests": len(self.records),
+            "successful": len(ok),
+            "errors": len(self.records) - len(ok),
+            "endpoints": self.endpoints,
+            "slots_per_endpoint": self.slots_per_endpoint,
+            "wall_time_s": round(self.wall_time_s, 2),
+            "tokens_generated": tokens,
+            "aggregate_tps": round(tokens / self.wall_time_s, 2) if self.wall_time_s > 0 else 0.0,
+            "throughput_qps": round(len(ok) / self.wall_time_s, 3) if self.wall_time_s > 0 else 0.0,
+        }
+        summary["latency_ms"] = latency_distribution(latencies)
+        summary["queue_delay_ms"] = latency_distribution(delays)
+        return summary
+
+
+def latency_distribution(sorted_values: List[float]) -> Dict:
+    """Resumen (mean, p50, p95, p99, max) de una lista ordenada."""
+    if not sorted_values:
+        return {"mean": 0.0, "p50": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0}
+    return {
+        "mean": round(statistics.mean(sorted_values), 1),
+        "p50": round(percentile(sorted_values, 0.50), 1),
+        "p95": round(percentile(sorted_values, 0.95), 1),
+        "p99": round(percentile(sorted_values, 0.99), 1),
+        "max": round(sorted_values[-1], 1),
+    }
+
+
+# =============================================================================
+# DETECCIÓN DE SLOTS
+# =============================================================================
+
+def detect_parallel_slots(host: str, port: int, timeout: int = 5) -> int:
+    """
+    Consulta /props del servidor llama.cpp para obtener total_slots.
+
+    Retorna DEFAULT_SLOTS si el servidor no expone el dato.
+    """
+    try:
+        url = f"http://{host}:{port}/props"
+        with urllib.request.urlopen(url, timeout=timeout) as response:
+            props = json.loads(response.read().decode("utf-8"))
+        return max(1, int(props.get("total_slots", DEFAULT_SLOTS)))
+    except Exception:
+        return DEFAULT_SLOTS
+
+
+# =============================================================================
+# MOTOR
+# =============================================================================
+
+class ConcurrentEngine:
+    """
+    Ejecuta jobs contra uno o más endpoints manteniendo N requests en vuelo
+    por endpoint.
+
+    Cada endpoint tiene `slots_per_endpoint` workers que consumen de una cola
+    compartida, de modo que un endpoint libre toma el siguiente job apenas
+    termina el anterior. call_fn es bloqueante y se ejecuta en un pool
+    propio con un thread por slot: el executor por defecto de asyncio tiene
+    un tope (min(32, cpu + 4)) y la espera por un thread libre se contaría
+    como latencia en lugar de encolado.
+    """
+
+    def __init__(
+        self,
+        endpoints: List[Endpoint],
+        slots_per_endpoint: int = DEFAULT_SLOTS,
+        call_fn: Optional[CallFn] = None
+    ):
+        """
+        Args:
+            endpoints: Lista de (host, port) que sirven el mismo modelo
+            slots_per_endpoint: Requests simultáneos por endpoint (--parallel)
+            call_fn: Función de llamada; default experiment_runner_v3.call_model
+        """
+        if not endpoints:
+            raise ValueError("Se requiere al menos un endpoint")
+        if call_fn is None:
+            from experiment_runner_v3 import call_model
+            call_fn = call_model
+
+        self.endpoints = list(endpoints)
+        self.slots_per_endpoint = max(1, slots_per_endpoint)
+        self.call_fn = call_fn
+
+    def _call(self, endpoint: Endpoint, record: RequestRecord, job: Dict):
+        """Ejecuta call_fn en el thread del slot; los tiempos se toman ahí."""
+        host, port = endpoint
+        record.started_at = time.perf_counter()
+        try:
+            record.result = self.call_fn(job["prompt"], host, port, **job.get("kwargs", {}))
+        except Exception as e:
+            record.result = {"success": False, "error": str(e),
+                             "text": "", "tokens_generated": 0}
+        record.finished_at = time.perf_counter()
+
+    async def _worker(self, endpoint: Endpoint, queue: asyncio.Queue,
+                      records: List[RequestRecord], executor: ThreadPoolExecutor):
+        loop = asyncio.get_running_loop()
+        host, port = endpoint
+        while True:
+            try:
+                record, job = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+
+            record.endpoint = f"{host}:{port}"
+            await loop.run_in_executor(executor, self._call, endpoint, record, job)
+            records[record.index] = record
+            queue.task_done()
+
+    async def run_async(self, jobs: List[Dict]) -> EngineReport:
+        """
+        Ejecuta los jobs y retorna un EngineReport con registros en orden.
+
+        Cada job es un dict con 'prompt' y opcionalmente 'kwargs' (argumentos
+        extra para call_fn) y 'meta' (datos que se copian al registro).
+        """
+        queue: asyncio.Queue = asyncio.Queue()
+        records: List[Optional[RequestRecord]] = [None] * len(jobs)
+
+        start = time.perf_counter()
+        for index, job in enumerate(jobs):
+            record = RequestRecord(index=index, enqueued_at=start,
+                                   meta=job.get("meta", {}))
+            queue.put_nowait((record, job))
+
+        total_slots = len(self.endpoints) * self.slots_per_endpoint
+        with ThreadPoolExecutor(max_workers=total_slots) as executor:
+            workers = [
+                self._worker(endpoint, queue, records, executor)
+                for endpoint in self.endpoints
+                for _ in range(self.slots_per_endpoint)
+            ]
+            await asyncio.gather(*workers)
+
+        return EngineReport(
+            records=records,
+            wall_time_s=time.perf_counter() - start,
+            slots_per_endpoint=self.slots_per_endpoint,
+            endpoints=[f"{h}:{p}" for h, p in self.endpoints]
+        )
+
+    def run(self, jobs: List[Dict]) -> EngineReport:
+        """Versión sincrónica de run_async."""
+        return asyncio.run(self.run_async(jobs))
+
+
+def run_prompts(
+    prompts: List[str],
+    host: str,
+    port: int,
+    parallel: int = DEFAULT_SLOTS,
+    call_fn: Optional[CallFn] = None,
+    **kwargs: Any
+) -> EngineReport:
+    """
+    Atajo para un único endpoint: ejecuta los prompts con `parallel` slots.
+
+    Los kwargs extra se pasan a call_fn en cada request.
+    """
+    engine = ConcurrentEngine([(host, port)], parallel, call_fn)
+    jobs = [{"prompt": p, "kwargs": kwargs} for p in prompts]
+    return engine.run(jobs)
+
+
+def print_engine_summary(report: EngineReport):
+    """Imprime el resumen del motor en consola."""
+    s = report.summary()
+    print(f"\n  MOTOR CONCURRENTE ({s['slots_per_endpoint']} slots x {len(s['endpoints'])} endpoint(s)):")
+    print(f"    Requests:        {s['successful']}/{s['requests']} OK")
+    print(f"    Tiempo de pared: {s['wall_time_s']:.2f} s")
+    print(f"    TPS agregado:    {s['aggregate_tps']:.2f}")
+    print(f"    Latencia p50/p95: {s['latency_ms']['p50']:.0f} / {s['latency_ms']['p95']:.0f} ms")
+    print(f"    Encolado p50/p95: {s['queue_delay_ms']['p50']:.0f} / {s['queue_delay_ms']['p95']:.0f} ms")
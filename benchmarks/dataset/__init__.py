@@ -6,7 +6,7 @@ from .casos_clinicos_spanish import (
     CASOS_CLINICOS,
     obtener_caso,
     listar_casos,
-    obtener_todos_casos
+    obtener_todos_los_casos
 )
 
 from .phi_categories import (
@@ -27,7 +27,7 @@ __all__ = [
     "CASOS_CLINICOS",
     "obtener_caso",
     "listar_casos",
-    "obtener_todos_casos",
+    "obtener_todos_los_casos",
     # PHI categories
     "PHIType",
     "PHICategoryUruguay",
@@ -23,7 +23,7 @@ import sys
 import json
 import time
 import argparse
-import requests
+import socket
 from datetime import datetime
 from dataclasses import dataclass, asdict
 from typing import List, Dict, Optional, Tuple
@@ -39,13 +39,18 @@ from dataset.casos_clinicos_spanish import CASOS_CLINICOS, obtener_caso, listar_
 from dataset.phi_categories import DIRECT_IDENTIFIERS, QUASI_IDENTIFIERS
 from metrics.performance_metrics import (
     InferenceMetrics, BenchmarkResult,
-    calculate_tps, measure_latency_stats,
-    get_system_resources, GPU_REFERENCE_BENCHMARKS
+    get_system_resources, GPU_REFERENCE_DATA
 )
 from metrics.quality_metrics import (
     QualityMetrics, AnonymizationEvaluator,
     calculate_standard_metrics, print_metrics_summary
 )
+from metrics.numa import NumaCollector, attach_numa, combine_reports
+from metrics.resource_sampler import find_server_pid
+from http_transport import get_transport
+from response_cache import (get_response_cache, configure_response_cache, resolve_model_id,
+                            DEFAULT_CACHE_PATH, DEFAULT_MAX_MB, DEFAULT_MODELS_DIR)
+from results_store import configure_results_store, record_result, DEFAULT_STORE_PATH
 
 
 # =============================================================================
@@ -128,7 +133,9 @@ def llamar_modelo(
     host: str = "localhost",
     temperatura: float = 0.1,
     max_tokens: int = 2048,
-    timeout: int = 120
+    timeout: int = 120,
+    cache_model: Optional[str] = None,
+    cache_variant: str = ""
 ) -> LlamaResponse:
     """
     Llama al servidor llama.cpp con un prompt.
@@ -140,12 +147,12 @@ def llamar_modelo(
         temperatura: Temperatura de generación
         max_tokens: Máximo de tokens a generar
         timeout: Timeout en segundos
+        cache_model: Id del modelo para el cache de respuestas (None = sin cache)
+        cache_variant: Distingue repeticiones del mismo prompt en el cache
 
     Returns:
         LlamaResponse con resultados de la inferencia
     """
-    url = f"http://{host}:{puerto}/completion"
-
     payload = {
         "prompt": prompt,
         "n_predict": max_tokens,
@@ -156,12 +163,31 @@ def llamar_modelo(
         "stream": False
     }
 
+    cache = get_response_cache() if cache_model else None
+    if cache is not None:
+        cache_key = cache.make_key(cache_model, payload, cache_variant)
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return LlamaResponse(**cached)
+        if cache.cache_only:
+            return LlamaResponse(
+                texto="",
+                tokens_generados=0,
+                tokens_prompt=0,
+                tiempo_generacion_ms=0,
+                tiempo_prompt_ms=0,
+                tps_generacion=0,
+                tps_prompt=0,
+                exito=False,
+                error="Respuesta no encontrada en cache (modo solo-cache)"
+            )
+
     try:
         inicio = time.time()
-        response = requests.post(url, json=payload, timeout=timeout)
+        response = get_transport().post_json(host, puerto, "/completion", payload, timeout=timeout)
         tiempo_total = (time.time() - inicio) * 1000  # ms
 
-        if response.status_code == 200:
+        if response.status == 200:
             data = response.json()
 
             # Extraer métricas de la respuesta
@@ -173,7 +199,7 @@ def llamar_modelo(
             tps_gen = tokens_gen / (tiempo_gen / 1000) if tiempo_gen > 0 else 0
             tps_prompt = tokens_prompt / (tiempo_prompt / 1000) if tiempo_prompt > 0 else 0
 
-            return LlamaResponse(
+            respuesta = LlamaResponse(
                 texto=data.get("content", ""),
                 tokens_generados=tokens_gen,
                 tokens_prompt=tokens_prompt,
@@ -183,6 +209,9 @@ def llamar_modelo(
                 tps_prompt=tps_prompt,
                 exito=True
             )
+            if cache is not None:
+                cache.put(cache_key, cache_model, asdict(respuesta))
+            return respuesta
         else:
             return LlamaResponse(
                 texto="",
@@ -193,10 +222,10 @@ def llamar_modelo(
                 tps_generacion=0,
                 tps_prompt=0,
                 exito=False,
-                error=f"HTTP {response.status_code}: {response.text[:200]}"
+                error=f"HTTP {response.status}: {response.text[:200]}"
             )
 
-    except requests.exceptions.Timeout:
+    except (TimeoutError, socket.timeout):
         return LlamaResponse(
             texto="",
             tokens_generados=0,
@@ -225,8 +254,8 @@ def llamar_modelo(
 def verificar_modelo_disponible(puerto: int, host: str = "localhost") -> bool:
     """Verifica si el modelo está disponible en el puerto especificado."""
     try:
-        response = requests.get(f"http://{host}:{puerto}/health", timeout=5)
-        return response.status_code == 200
+        response = get_transport().get(host, puerto, "/health", timeout=5)
+        return response.status == 200
     except:
         return False
 
@@ -241,7 +270,8 @@ def ejecutar_benchmark_rendimiento(
     prompt_id: str = "detailed",
     iteraciones: int = 3,
     host: str = "localhost",
-    output_dir: str = "results"
+    output_dir: str = "results",
+    numa: bool = False
 ) -> Dict:
     """
     Ejecuta benchmark de rendimiento para medir TPS, latencia y throughput.
@@ -255,6 +285,8 @@ def ejecutar_benchmark_rendimiento(
         iteraciones: Número de repeticiones por caso
         host: Host del servidor
         output_dir: Directorio para resultados
+        numa: Medir la localidad NUMA del servidor (metrics/numa.py) en
+            cada caso y en total por modelo
 
     Returns:
         Diccionario con resultados del benchmark
@@ -275,7 +307,8 @@ def ejecutar_benchmark_rendimiento(
             "prompt_id": prompt_id,
             "iteraciones": iteraciones
         },
-        "resultados_por_modelo": {}
+        "resultados_por_modelo": {},
+        "fallos": []
     }
 
     for modelo_id in modelos:
@@ -299,6 +332,10 @@ def ejecutar_benchmark_rendimiento(
             continue
 
         metricas_modelo = []
+        reportes_numa = []
+        pid_servidor = find_server_pid(puerto) if numa else None
+        if numa:
+            print(f"    NUMA: {f'servidor pid {pid_servidor}' if pid_servidor else 'pid del servidor no encontrado'}")
 
         for caso_id in casos:
             caso = obtener_caso(caso_id)
@@ -312,6 +349,7 @@ def ejecutar_benchmark_rendimiento(
 
             tps_valores = []
             latencias = []
+            colector = NumaCollector(pid_servidor).start() if numa else None
 
             for i in range(iteraciones):
                 response = llamar_modelo(prompt_completo, puerto, host)
@@ -321,8 +359,14 @@ def ejecutar_benchmark_rendimiento(
                     latencias.append(response.tiempo_generacion_ms)
                     print(".", end="", flush=True)
                 else:
+                    resultados["fallos"].append({"modelo": modelo_id, "caso": caso_id,
+                                                 "iteracion": i + 1, "error": response.error})
                     print("x", end="", flush=True)
 
+            reporte_numa = colector.stop() if colector else None
+            if reporte_numa:
+                reportes_numa.append(reporte_numa)
+
             if tps_valores:
                 metricas_modelo.append({
                     "caso_id": caso_id,
@@ -330,9 +374,16 @@ def ejecutar_benchmark_rendimiento(
                     "tps_std": statistics.stdev(tps_valores) if len(tps_valores) > 1 else 0,
                     "latencia_promedio_ms": statistics.mean(latencias),
                     "latencia_p95_ms": sorted(latencias)[int(len(latencias) * 0.95)] if latencias else 0,
-                    "iteraciones_exitosas": len(tps_valores)
+                    "iteraciones_exitosas": len(tps_valores),
+                    "tps_valores": tps_valores,
+                    "latencias_ms": latencias
                 })
-                print(f" TPS: {statistics.mean(tps_valores):.2f}")
+                if reporte_numa:
+                    attach_numa(metricas_modelo[-1], reporte_numa)
+                print(f" TPS: {statistics.mean(tps_valores):.2f}", end="")
+                if reporte_numa and reporte_numa.nodes:
+                    print(f" | Acceso remoto NUMA: {reporte_numa.remote_access_estimate:.0%}", end="")
+                print()
             else:
                 print(" [FAILED]")
 
@@ -352,6 +403,8 @@ def ejecutar_benchmark_rendimiento(
                 },
                 "metricas_por_caso": metricas_modelo
             }
+            if reportes_numa:
+                attach_numa(resultados["resultados_por_modelo"][modelo_id], combine_reports(reportes_numa))
 
     # Guardar resultados
     os.makedirs(output_dir, exist_ok=True)
@@ -362,6 +415,7 @@ def ejecutar_benchmark_rendimiento(
         json.dump(resultados, f, indent=2, ensure_ascii=False)
 
     print(f"\n  Resultados guardados en: {output_file}")
+    record_result(resultados, output_file)
     return resultados
 
 
@@ -410,7 +464,8 @@ def ejecutar_comparativa_prompts(
         "experimento": "comparativa_prompts",
         "timestamp": datetime.now().isoformat(),
         "modelo": modelo_id,
-        "resultados_por_prompt": {}
+        "resultados_por_prompt": {},
+        "fallos": []
     }
 
     evaluator = AnonymizationEvaluator()
@@ -461,6 +516,8 @@ def ejecutar_comparativa_prompts(
                 })
                 print(f"F1: {quality.f1_micro:.3f} | LRDI: {quality.lrdi:.0f}%")
             else:
+                resultados["fallos"].append({"modelo": modelo_id, "prompt": prompt_id, "caso": caso_id,
+                                             "iteracion": 1, "error": response.error})
                 print(f"[ERROR] {response.error[:50]}")
 
         # Agregar métricas del prompt
@@ -486,6 +543,7 @@ def ejecutar_comparativa_prompts(
         json.dump(resultados, f, indent=2, ensure_ascii=False)
 
     print(f"\n  Resultados guardados en: {output_file}")
+    record_result(resultados, output_file)
     return resultados
 
 
@@ -499,7 +557,8 @@ def ejecutar_evaluacion_calidad(
     casos: List[str],
     iteraciones: int = 3,
     host: str = "localhost",
-    output_dir: str = "results"
+    output_dir: str = "results",
+    models_dir: str = DEFAULT_MODELS_DIR
 ) -> Dict:
     """
     Evaluación completa de calidad con métricas de papers académicos.
@@ -508,6 +567,11 @@ def ejecutar_evaluacion_calidad(
     - Precision, Recall, F1-micro, F1-macro (paper arXiv:2412.10918)
     - ALID, LR, LRDI, LRQI (paper arXiv:2406.00062)
 
+    Si hay un cache de respuestas configurado (--response-cache), cada
+    respuesta se guarda por (modelo, prompt, iteración) y las corridas
+    siguientes re-puntúan sin regenerar; con --cache-only no se contacta
+    al servidor.
+
     Args:
         modelos: Lista de IDs de modelos
         prompts: Lista de IDs de prompts
@@ -515,6 +579,7 @@ def ejecutar_evaluacion_calidad(
         iteraciones: Repeticiones por combinación
         host: Host del servidor
         output_dir: Directorio para resultados
+        models_dir: Directorio de los GGUF (hash del modelo para el cache)
 
     Returns:
         Diccionario con resultados completos
@@ -533,7 +598,8 @@ def ejecutar_evaluacion_calidad(
             "arXiv:2412.10918 - LLMs-in-the-Loop Part 2",
             "arXiv:2406.00062 - Unlocking LLMs for Clinical Text Anonymization"
         ],
-        "resultados": []
+        "resultados": [],
+        "fallos": []
     }
 
     total_combinaciones = len(modelos) * len(prompts) * len(casos) * iteraciones
@@ -546,7 +612,10 @@ def ejecutar_evaluacion_calidad(
         config = MODELOS_CONFIG[modelo_id]
         puerto = config["puerto"]
 
-        if not verificar_modelo_disponible(puerto, host):
+        cache = get_response_cache()
+        cache_model = resolve_model_id(config["archivo"], models_dir, cache) if cache else None
+
+        if not (cache and cache.cache_only) and not verificar_modelo_disponible(puerto, host):
             print(f"  [SKIP] {modelo_id} no disponible")
             continue
 
@@ -573,7 +642,9 @@ def ejecutar_evaluacion_calidad(
                     print(f"\r    [{progreso:5.1f}%] {modelo_id} + {prompt_id} + {caso_id} (iter {iteracion+1})", end="")
 
                     prompt_completo = formatear_prompt(prompt_id, texto)
-                    response = llamar_modelo(prompt_completo, puerto, host)
+                    response = llamar_modelo(prompt_completo, puerto, host,
+                                             cache_model=cache_model,
+                                             cache_variant=f"iter{iteracion + 1}")
 
                     if response.exito:
                         quality = evaluator.evaluate(
@@ -611,6 +682,10 @@ def ejecutar_evaluacion_calidad(
                                 "directos_escapados": len(quality.direct_identifiers_escaped)
                             }
                         })
+                    else:
+                        resultados["fallos"].append({"modelo": modelo_id, "prompt": prompt_id,
+                                                     "caso": caso_id, "iteracion": iteracion + 1,
+                                                     "error": response.error})
 
     print("\n")
 
@@ -653,6 +728,9 @@ def ejecutar_evaluacion_calidad(
                 "muestras": len(datos)
             }
 
+    if get_response_cache():
+        resultados["cache_respuestas"] = get_response_cache().stats()
+
     # Guardar resultados
     os.makedirs(output_dir, exist_ok=True)
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -662,6 +740,7 @@ def ejecutar_evaluacion_calidad(
         json.dump(resultados, f, indent=2, ensure_ascii=False)
 
     print(f"  Resultados guardados en: {output_file}")
+    record_result(resultados, output_file)
     return resultados
 
 
@@ -802,6 +881,20 @@ Ejemplos:
     parser.add_argument("--output", type=str, default="results",
                         help="Directorio de salida")
 
+    parser.add_argument("--response-cache", nargs="?", const=DEFAULT_CACHE_PATH,
+                        help=f"Cache de respuestas en disco para --calidad (default: {DEFAULT_CACHE_PATH})")
+    parser.add_argument("--cache-max-mb", type=float, default=DEFAULT_MAX_MB,
+                        help="Tamaño máximo del cache de respuestas (LRU)")
+    parser.add_argument("--cache-only", action="store_true",
+                        help="Re-puntuar respuestas del cache sin contactar al servidor")
+    parser.add_argument("--models-dir", type=str, default=DEFAULT_MODELS_DIR,
+                        help="Directorio de los GGUF (para el hash del modelo)")
+
+    parser.add_argument("--results-db", nargs="?", const=DEFAULT_STORE_PATH,
+                        help=f"Guardar cada request en el almacén SQLite (default: {DEFAULT_STORE_PATH})")
+    parser.add_argument("--numa", action="store_true",
+                        help="Medir localidad NUMA del servidor en --rendimiento (hilos y páginas por nodo)")
+
     parser.add_argument("--listar-modelos", action="store_true",
                         help="Listar modelos disponibles")
     parser.add_argument("--listar-prompts", action="store_true",
@@ -827,6 +920,13 @@ Ejemplos:
         listar_casos()
         return
 
+    if args.response_cache or args.cache_only:
+        configure_response_cache(args.response_cache or DEFAULT_CACHE_PATH,
+                                 args.cache_max_mb, args.cache_only)
+
+    if args.results_db:
+        configure_results_store(args.results_db)
+
     # Configurar modelos y casos
     modelos = args.modelos or list(MODELOS_CONFIG.keys())
     casos = args.casos or list(CASOS_CLINICOS.keys())
@@ -841,7 +941,8 @@ Ejemplos:
             casos=casos,
             iteraciones=args.iteraciones,
             host=args.host,
-            output_dir=args.output
+            output_dir=args.output,
+            numa=args.numa
         )
 
     elif args.prompts:
@@ -860,7 +961,8 @@ Ejemplos:
             casos=casos,
             iteraciones=args.iteraciones,
             host=args.host,
-            output_dir=args.output
+            output_dir=args.output,
+            models_dir=args.models_dir
         )
 
     else:
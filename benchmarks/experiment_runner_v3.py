@@ -13,7 +13,6 @@ Ejecuta 3 experimentos:
 3. Evaluación de Calidad con métricas académicas
 """
 
-import urllib.request
 import json
 import time
 import statistics
@@ -24,6 +23,24 @@ from pathlib import Path
 from typing import Dict, List, Any, Optional
 from dataclasses import dataclass, field, asdict
 
+sys.path.insert(0, str(Path(__file__).parent))
+
+from metrics.performance_metrics import parse_llama_cpp_timings, apply_stream_arrivals
+from metrics.levenshtein import levenshtein_distance, levenshtein_similarity
+from metrics.leak_scanner import find_leaks
+from metrics.bootstrap import bootstrap_metrics, compare_groups
+from metrics.resource_sampler import (configure_resource_sampler, get_resource_sampler,
+                                      resource_phase, find_server_pid, timeline_now,
+                                      format_phase_table, DEFAULT_INTERVAL_S)
+from metrics.numa import NumaCollector, attach_numa
+from metrics.server_metrics import ServerMetricsCollector, format_server_summary
+from http_transport import get_transport, configure_transport, DEFAULT_POOL_SIZE
+from response_cache import (get_response_cache, configure_response_cache, resolve_model_id,
+                            server_model_file, DEFAULT_CACHE_PATH, DEFAULT_MAX_MB)
+from results_store import configure_results_store, record_result, DEFAULT_STORE_PATH
+from load_balancer import (get_balancer, configure_balancer, print_balancer_stats,
+                           parse_endpoints, POLICIES, DEFAULT_POLICY)
+
 # =============================================================================
 # CONFIGURACIÓN
 # =============================================================================
@@ -677,42 +694,19 @@ CI médico: 2.567.890-1""",
 # FUNCIONES DE MÉTRICAS
 # =============================================================================
 
-def levenshtein_distance(s1: str, s2: str) -> int:
-    """Distancia de Levenshtein entre dos strings."""
-    if len(s1) < len(s2):
-        return levenshtein_distance(s2, s1)
-    if len(s2) == 0:
-        return len(s1)
-    previous_row = range(len(s2) + 1)
-    for i, c1 in enumerate(s1):
-        current_row = [i + 1]
-        for j, c2 in enumerate(s2):
-            insertions = previous_row[j + 1] + 1
-            deletions = current_row[j] + 1
-            substitutions = previous_row[j] + (c1 != c2)
-            current_row.append(min(insertions, deletions, substitutions))
-        previous_row = current_row
-    return previous_row[-1]
-
-
-def levenshtein_similarity(s1: str, s2: str) -> float:
-    """Similitud de Levenshtein normalizada (0-1)."""
-    if len(s1) == 0 and len(s2) == 0:
-        return 1.0
-    distance = levenshtein_distance(s1, s2)
-    max_len = max(len(s1), len(s2))
-    return 1 - (distance / max_len)
-
-
 def calculate_alid(original: str, anonymized: str) -> float:
     """ALID - Average Levenshtein Index of Dissimilarity."""
     return 1 - levenshtein_similarity(original, anonymized)
 
 
-def calculate_quality_metrics(anonymized_text: str, entities: List[Dict]) -> Dict:
+def calculate_quality_metrics(anonymized_text: str, entities: List[Dict],
+                              case_id: Optional[str] = None) -> Dict:
     """
     Calcula métricas de calidad según papers académicos.
 
+    Las entidades escapadas se buscan en una sola pasada con el autómata
+    del caso (cacheado por case_id, ver metrics/leak_scanner.py).
+
     Returns:
         Dict con precision, recall, f1, lrdi, lrqi, etc.
     """
@@ -720,13 +714,14 @@ def calculate_quality_metrics(anonymized_text: str, entities: List[Dict]) -> Dic
     fn = 0  # False negatives (entidad escapada)
     direct_escaped = []
     quasi_escaped = []
+    leaks = find_leaks(anonymized_text, entities, case_id)
 
     for entity in entities:
         value = entity.get("value", "")
         is_direct = entity.get("is_direct", False)
         category = entity.get("category", "")
 
-        if value and value in anonymized_text:
+        if value and value in leaks:
             # Entidad NO fue anonimizada (escapó)
             fn += 1
             if is_direct:
@@ -775,47 +770,148 @@ def calculate_quality_metrics(anonymized_text: str, entities: List[Dict]) -> Dic
 # LLAMADA AL MODELO
 # =============================================================================
 
+def read_sse_completion(lines, start: float) -> tuple:
+    """
+    Consume los server-sent events de /completion con stream=True.
+
+    Args:
+        lines: Iterable de líneas (bytes) de la respuesta HTTP
+        start: time.perf_counter() al enviar el request
+
+    Returns:
+        (result, arrival_ms): result tiene la forma de la respuesta no
+        streaming (content completo + timings del evento final) y
+        arrival_ms la llegada de cada token en ms desde el envío.
+    """
+    chunks = []
+    arrival_ms = []
+    result = {}
+
+    for raw in lines:
+        line = raw.decode("utf-8").strip()
+        if not line.startswith("data:"):
+            continue
+        event = json.loads(line[len("data:"):].strip())
+
+        if event.get("content"):
+            arrival_ms.append((time.perf_counter() - start) * 1000)
+            chunks.append(event["content"])
+
+        if event.get("stop"):
+            result = event
+            break
+
+    result["content"] = "".join(chunks)
+    return result, arrival_ms
+
+
 def call_model(prompt: str, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT,
-               timeout: int = DEFAULT_TIMEOUT) -> Dict:
-    """Llama al servidor llama.cpp y retorna métricas."""
+               timeout: int = DEFAULT_TIMEOUT, stream: bool = False,
+               cache_prompt: bool = False, id_slot: Optional[int] = None,
+               cache_model: Optional[str] = None, cache_variant: str = "") -> Dict:
+    """
+    Llama al servidor llama.cpp y retorna métricas.
+
+    Con stream=True consume los eventos SSE y agrega TTFT y latencia entre
+    tokens (p50/p95/p99) medidos en el cliente.
+
+    Con cache_prompt=True el servidor reutiliza el KV cache del prompt
+    anterior del slot (id_slot lo fija) y tokens_cached indica cuántos
+    tokens del prompt no se reevaluaron.
+
+    Con cache_model (id del modelo, ver response_cache.resolve_model_id) y
+    un cache de respuestas configurado, la respuesta se busca primero en el
+    cache en disco; los hits se marcan con cache_hit=True.
+
+    started_at y finished_at son segundos en la línea de tiempo de la
+    corrida (timeline_now), la misma del muestreo de recursos.
+    """
     payload = {
         "prompt": prompt,
         "n_predict": N_PREDICT,
         "temperature": 0.1,
         "top_k": 40,
         "top_p": 0.95,
-        "stream": False
+        "stream": stream
     }
-
-    url = f"http://{host}:{port}/completion"
-    data = json.dumps(payload).encode("utf-8")
-    req = urllib.request.Request(url, data=data, headers={"Content-Type": "application/json"})
+    if cache_prompt:
+        payload["cache_prompt"] = True
+    if id_slot is not None:
+        payload["id_slot"] = id_slot
+
+    response_cache = get_response_cache() if cache_model else None
+    if response_cache is not None:
+        cache_key = response_cache.make_key(cache_model, payload, cache_variant)
+        cached = response_cache.get(cache_key)
+        if cached is not None:
+            return {**cached, "cache_hit": True}
+        if response_cache.cache_only:
+            return {
+                "success": False,
+                "error": "Respuesta no encontrada en cache (modo solo-cache)",
+                "text": "",
+                "tokens_generated": 0,
+                "tps_generation": 0
+            }
+
+    transport = get_transport()
 
     start_time = time.time()
+    started_at = timeline_now()
+    stream_start = time.perf_counter()
     try:
-        with urllib.request.urlopen(req, timeout=timeout) as response:
-            result = json.loads(response.read().decode("utf-8"))
+        if stream:
+            with transport.stream_post(host, port, "/completion", payload, timeout) as response:
+                response.raise_for_status()
+                result, arrival_ms = read_sse_completion(response.lines(), stream_start)
+        else:
+            response = transport.post_json(host, port, "/completion", payload, timeout)
+            response.raise_for_status()
+            result = response.json()
         total_time = time.time() - start_time
 
         tokens_gen = result.get("tokens_predicted", 0)
         tokens_prompt = result.get("tokens_evaluated", 0)
         time_gen_ms = result.get("timings", {}).get("predicted_ms", total_time * 1000)
         time_prompt_ms = result.get("timings", {}).get("prompt_ms", 0)
+        # prompt_n = tokens realmente evaluados; el resto vino del KV cache
+        tokens_cached = max(tokens_prompt - result.get("timings", {}).get("prompt_n", tokens_prompt), 0)
 
         tps_gen = tokens_gen / (time_gen_ms / 1000) if time_gen_ms > 0 else 0
         tps_prompt = tokens_prompt / (time_prompt_ms / 1000) if time_prompt_ms > 0 else 0
 
-        return {
+        output = {
             "success": True,
             "text": result.get("content", ""),
             "tokens_generated": tokens_gen,
             "tokens_prompt": tokens_prompt,
+            "tokens_cached": tokens_cached,
             "time_generation_ms": time_gen_ms,
             "time_prompt_ms": time_prompt_ms,
             "tps_generation": round(tps_gen, 2),
             "tps_prompt": round(tps_prompt, 2),
-            "total_time_s": round(total_time, 2)
+            "total_time_s": round(total_time, 2),
+            "http_timings": response.timings.to_dict()
         }
+
+        if stream:
+            metrics = apply_stream_arrivals(
+                parse_llama_cpp_timings(result.get("timings", {})),
+                arrival_ms,
+                total_time * 1000
+            )
+            output.update({
+                "ttft_ms": round(metrics.time_to_first_token_ms, 1),
+                "inter_token_p50_ms": round(metrics.inter_token_p50_ms, 1),
+                "inter_token_p95_ms": round(metrics.inter_token_p95_ms, 1),
+                "inter_token_p99_ms": round(metrics.inter_token_p99_ms, 1),
+                "token_arrival_ms": [round(t, 1) for t in metrics.token_arrival_ms]
+            })
+
+        if response_cache is not None:
+            response_cache.put(cache_key, cache_model, output)
+
+        return {**output, "started_at": round(started_at, 3), "finished_at": round(timeline_now(), 3)}
     except Exception as e:
         return {
             "success": False,
@@ -826,16 +922,84 @@ def call_model(prompt: str, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT,
         }
 
 
+def iter_call_model(prompts: List[str], host: str = DEFAULT_HOST, port: int = DEFAULT_PORT,
+                    parallel: int = 1, engine_summary: Optional[Dict] = None,
+                    call_options: Optional[Dict] = None):
+    """
+    Itera los resultados de call_model para cada prompt, en orden.
+
+    Con parallel <= 1 llama secuencialmente (un request a la vez). Con
+    parallel > 1 usa el motor concurrente, manteniendo `parallel` requests
+    en vuelo (igual al --parallel del servidor). Cada resultado incluye
+    entonces latency_ms y queue_delay_ms, y engine_summary (si se pasa)
+    recibe el resumen agregado del motor.
+
+    call_options son argumentos extra para call_model (p. ej. stream=True).
+
+    Si hay un balanceador configurado (--endpoints), los requests se reparten
+    entre sus réplicas y `parallel` se aplica por réplica.
+    """
+    call_options = call_options or {}
+    balancer = get_balancer()
+    call_fn = balancer.call if balancer else call_model
+
+    if parallel <= 1 and balancer is None:
+        for prompt in prompts:
+            yield call_fn(prompt, host, port, **call_options)
+        return
+
+    from concurrent_engine import run_prompts, print_engine_summary
+
+    in_flight = parallel * len(balancer.backends) if balancer else parallel
+    report = run_prompts(prompts, host, port, in_flight, call_fn, **call_options)
+    print_engine_summary(report)
+    if balancer:
+        print_balancer_stats(balancer)
+    if engine_summary is not None:
+        engine_summary.update(report.summary())
+
+    for record in report.records:
+        yield {
+            **record.result,
+            "latency_ms": round(record.latency_ms, 1),
+            "queue_delay_ms": round(record.queue_delay_ms, 1)
+        }
+
+
+def iter_anonymize_chunked(texts: List[str], prompt_template: str,
+                           host: str = DEFAULT_HOST, port: int = DEFAULT_PORT,
+                           parallel: int = 1, chunk_tokens: int = 400,
+                           call_options: Optional[Dict] = None):
+    """
+    Itera la anonimización fragmentada de cada texto, en orden.
+
+    Los fragmentos de cada nota se envían con `parallel` en vuelo (por
+    réplica si hay balanceador); el resultado tiene la forma de call_model
+    más 'chunks' con los offsets de cada fragmento.
+    """
+    from chunking import anonymize_document
+
+    balancer = get_balancer()
+    call_fn = balancer.call if balancer else call_model
+    in_flight = parallel * len(balancer.backends) if balancer else parallel
+
+    for text in texts:
+        yield anonymize_document(text, prompt_template, host, port, in_flight,
+                                 chunk_tokens, call_fn, call_options)
+
+
 # =============================================================================
 # EXPERIMENTO 1: BENCHMARK DE RENDIMIENTO
 # =============================================================================
 
 def run_performance_benchmark(host: str = DEFAULT_HOST, port: int = DEFAULT_PORT,
-                              iterations: int = 1, cases: List[str] = None) -> Dict:
+                              iterations: int = 1, cases: List[str] = None,
+                              parallel: int = 1, call_options: Optional[Dict] = None) -> Dict:
     """
     Experimento 1: Benchmark de rendimiento MMA.
 
-    Mide TPS, latencia y throughput para cada caso.
+    Mide TPS, latencia y throughput para cada caso. Con parallel > 1 las
+    iteraciones de cada ronda se envían concurrentemente.
     """
     print("\n" + "=" * 70)
     print("  EXPERIMENTO 1: Benchmark de Rendimiento MMA")
@@ -845,24 +1009,28 @@ def run_performance_benchmark(host: str = DEFAULT_HOST, port: int = DEFAULT_PORT
         cases = list(CASOS_CLINICOS.keys())
 
     results = []
+    failures = []
     all_tps = []
+    all_ttft = []
 
     # Usar prompt baseline para rendimiento puro
     prompt_template = PROMPT_STRATEGIES["baseline"]["template"]
 
+    engine_summary = {}
+
     for iteration in range(1, iterations + 1):
         print(f"\n  --- Iteración {iteration}/{iterations} ---")
 
-        for caso_id in cases:
+        prompts = [prompt_template.format(text=CASOS_CLINICOS[c]["texto"]) for c in cases]
+        calls = iter_call_model(prompts, host, port, parallel, engine_summary, call_options)
+
+        for caso_id, result in zip(cases, calls):
             caso = CASOS_CLINICOS[caso_id]
-            prompt = prompt_template.format(text=caso["texto"])
 
             print(f"    {caso_id} ({caso['nombre']}): ", end="", flush=True)
 
-            result = call_model(prompt, host, port)
-
             if result["success"]:
-                results.append({
+                row = {
                     "iteration": iteration,
                     "case_id": caso_id,
                     "case_name": caso["nombre"],
@@ -870,10 +1038,28 @@ def run_performance_benchmark(host: str = DEFAULT_HOST, port: int = DEFAULT_PORT
                     "tps_prompt": result["tps_prompt"],
                     "tokens_generated": result["tokens_generated"],
                     "total_time_s": result["total_time_s"]
-                })
+                }
+                if "queue_delay_ms" in result:
+                    row["latency_ms"] = result["latency_ms"]
+                    row["queue_delay_ms"] = result["queue_delay_ms"]
+                if "started_at" in result:
+                    row["started_at"] = result["started_at"]
+                    row["finished_at"] = result["finished_at"]
+                if "ttft_ms" in result:
+                    row["ttft_ms"] = result["ttft_ms"]
+                    row["inter_token_p50_ms"] = result["inter_token_p50_ms"]
+                    row["inter_token_p95_ms"] = result["inter_token_p95_ms"]
+                    row["inter_token_p99_ms"] = result["inter_token_p99_ms"]
+                    all_ttft.append(result["ttft_ms"])
+                results.append(row)
                 all_tps.append(result["tps_generation"])
-                print(f"TPS: {result['tps_generation']:.2f}")
+                if "ttft_ms" in result:
+                    print(f"TPS: {result['tps_generation']:.2f} | TTFT: {result['ttft_ms']:.0f} ms | "
+                          f"ITL p95: {result['inter_token_p95_ms']:.0f} ms")
+                else:
+                    print(f"TPS: {result['tps_generation']:.2f}")
             else:
+                failures.append({"iteration": iteration, "case_id": caso_id, "error": result["error"]})
                 print(f"ERROR: {result['error']}")
 
     # Calcular estadísticas
@@ -886,17 +1072,26 @@ def run_performance_benchmark(host: str = DEFAULT_HOST, port: int = DEFAULT_PORT
             "tps_max": round(max(all_tps), 2),
             "total_tests": len(results)
         }
+        if all_ttft:
+            summary["ttft_mean_ms"] = round(statistics.mean(all_ttft), 1)
+            summary["ttft_max_ms"] = round(max(all_ttft), 1)
 
         print("\n  RESUMEN:")
         print(f"    TPS promedio: {summary['tps_mean']}")
         print(f"    TPS std: {summary['tps_std']}")
         print(f"    TPS min/max: {summary['tps_min']} / {summary['tps_max']}")
+        if all_ttft:
+            print(f"    TTFT promedio/max: {summary['ttft_mean_ms']} / {summary['ttft_max_ms']} ms")
 
-    return {
+    output = {
         "experiment": "performance_benchmark",
         "results": results,
+        "failures": failures,
         "summary": summary
     }
+    if engine_summary:
+        output["engine"] = engine_summary
+    return output
 
 
 # =============================================================================
@@ -904,11 +1099,21 @@ def run_performance_benchmark(host: str = DEFAULT_HOST, port: int = DEFAULT_PORT
 # =============================================================================
 
 def run_prompt_comparison(host: str = DEFAULT_HOST, port: int = DEFAULT_PORT,
-                          cases: List[str] = None) -> Dict:
+                          cases: List[str] = None, parallel: int = 1,
+                          call_options: Optional[Dict] = None,
+                          prefix_cache: bool = False, total_slots: int = 1,
+                          premask_phi: bool = False) -> Dict:
     """
     Experimento 2: Comparativa de 8 estrategias de prompting.
 
     Evalúa calidad y velocidad de cada estrategia.
+
+    Con prefix_cache=True cada estrategia queda fijada a un slot del servidor
+    (de total_slots), su prefijo de instrucciones se precalienta con
+    cache_prompt y solo se evalúa el texto clínico. Cada resultado incluye
+    entonces el tiempo de evaluación de prompt ahorrado.
+
+    Con premask_phi los textos se pre-enmascaran con PATTERNS_URUGUAY.
     """
     print("\n" + "=" * 70)
     print("  EXPERIMENTO 2: Comparativa de Prompts")
@@ -918,41 +1123,77 @@ def run_prompt_comparison(host: str = DEFAULT_HOST, port: int = DEFAULT_PORT,
         cases = ["A1", "A2", "A3"]  # Casos representativos
 
     results = []
+    failures = []
+
+    texts = {c: CASOS_CLINICOS[c]["texto"] for c in cases}
+    if premask_phi:
+        from premask import premask
+        texts = {c: premask(t).text for c, t in texts.items()}
+
+    if prefix_cache:
+        from prefix_cache import (assign_prefix_slots, cache_call_options,
+                                  split_template, warm_prefix, summarize_prefix_cache)
+        prefix_slots = assign_prefix_slots(PROMPT_STRATEGIES.keys(), total_slots)
 
     for prompt_id, prompt_info in PROMPT_STRATEGIES.items():
         print(f"\n  === Prompt: {prompt_id} ({prompt_info['nombre']}) ===")
 
         prompt_results = []
+        strategy_options = call_options
+        cached_calls = []
 
-        for caso_id in cases:
-            caso = CASOS_CLINICOS[caso_id]
-            prompt = prompt_info["template"].format(text=caso["texto"])
+        if prefix_cache:
+            slot = prefix_slots[prompt_id]
+            prefix, _ = split_template(prompt_info["template"])
+            warm = warm_prefix(host, port, prefix, slot)
+            strategy_options = cache_call_options(call_options, slot)
+            print(f"    Prefijo: {warm['prefix_tokens']} tokens en slot {slot} "
+                  f"({warm['prefix_prompt_ms']:.0f} ms en frío)")
 
-            print(f"    {caso_id}: ", end="", flush=True)
+        prompts = [prompt_info["template"].format(text=texts[c]) for c in cases]
+        calls = iter_call_model(prompts, host, port, parallel, call_options=strategy_options)
 
-            result = call_model(prompt, host, port)
+        with resource_phase(f"prompts/{prompt_id}"):
+            for caso_id, result in zip(cases, calls):
+                caso = CASOS_CLINICOS[caso_id]
 
-            if result["success"]:
-                # Evaluar calidad
-                quality = calculate_quality_metrics(result["text"], caso["entidades"])
+                print(f"    {caso_id}: ", end="", flush=True)
 
-                prompt_results.append({
-                    "case_id": caso_id,
-                    "tps": result["tps_generation"],
-                    "quality": quality,
-                    "anonymized_text": result["text"][:200] + "..."
-                })
+                if result["success"]:
+                    cached_calls.append(result)
 
-                print(f"TPS: {result['tps_generation']:.2f} | "
-                      f"Recall: {quality['recall']:.2f} | "
-                      f"LRDI: {quality['lrdi']:.0f}%")
-            else:
-                print(f"ERROR: {result['error']}")
+                    # Evaluar calidad
+                    quality = calculate_quality_metrics(result["text"], caso["entidades"], caso_id)
+
+                    prompt_results.append({
+                        "case_id": caso_id,
+                        "tps": result["tps_generation"],
+                        "quality": quality,
+                        "anonymized_text": result["text"][:200] + "..."
+                    })
+                    if "started_at" in result:
+                        prompt_results[-1]["started_at"] = result["started_at"]
+                        prompt_results[-1]["finished_at"] = result["finished_at"]
+
+                    print(f"TPS: {result['tps_generation']:.2f} | "
+                          f"Recall: {quality['recall']:.2f} | "
+                          f"LRDI: {quality['lrdi']:.0f}%")
+                else:
+                    failures.append({"prompt_id": prompt_id, "case_id": caso_id, "error": result["error"]})
+                    print(f"ERROR: {result['error']}")
 
         if prompt_results:
             avg_tps = statistics.mean([r["tps"] for r in prompt_results])
             avg_recall = statistics.mean([r["quality"]["recall"] for r in prompt_results])
             avg_lrdi = statistics.mean([r["quality"]["lrdi"] for r in prompt_results])
+            intervals = bootstrap_metrics(
+                {
+                    "tps": [r["tps"] for r in prompt_results],
+                    "recall": [r["quality"]["recall"] for r in prompt_results],
+                    "lrdi": [r["quality"]["lrdi"] for r in prompt_results]
+                },
+                clusters=[r["case_id"] for r in prompt_results]
+            )
 
             results.append({
                 "prompt_id": prompt_id,
@@ -960,19 +1201,40 @@ def run_prompt_comparison(host: str = DEFAULT_HOST, port: int = DEFAULT_PORT,
                 "avg_tps": round(avg_tps, 2),
                 "avg_recall": round(avg_recall, 4),
                 "avg_lrdi": round(avg_lrdi, 2),
+                "ci95": {name: ci.to_dict() for name, ci in intervals.items()},
                 "details": prompt_results
             })
 
-    # Ranking
-    print("\n  RANKING DE PROMPTS (por Recall):")
-    sorted_results = sorted(results, key=lambda x: x["avg_recall"], reverse=True)
-    for i, r in enumerate(sorted_results, 1):
-        print(f"    {i}. {r['prompt_id']}: Recall={r['avg_recall']:.4f}, LRDI={r['avg_lrdi']:.0f}%, TPS={r['avg_tps']:.2f}")
+            if prefix_cache:
+                cache_summary = summarize_prefix_cache(cached_calls, warm)
+                results[-1]["prefix_cache"] = cache_summary
+                print(f"    Prompt eval ahorrado: {cache_summary['prompt_eval_saved_ms']:.0f} ms "
+                      f"({cache_summary['cached_ratio']:.0%} de tokens desde cache)")
+
+    # Ranking (bootstrap pareado por caso contra el mejor)
+    print("\n  RANKING DE PROMPTS (por Recall, IC 95%):")
+    by_id = {r["prompt_id"]: r for r in results}
+    ranking = compare_groups(
+        {r["prompt_id"]: [d["quality"]["recall"] for d in r["details"]] for r in results},
+        clusters={r["prompt_id"]: [d["case_id"] for d in r["details"]] for r in results}
+    )
+    for i, entry in enumerate(ranking, 1):
+        r = by_id[entry["name"]]
+        r["tied_with_best"] = entry["tied_with_best"]
+        tie = " (≈ mejor)" if i > 1 and entry["tied_with_best"] else ""
+        print(f"    {i}. {r['prompt_id']}: Recall={entry['ci'].format(4)}{tie}, "
+              f"LRDI={r['avg_lrdi']:.0f}%, TPS={r['avg_tps']:.2f}")
+
+    tied = [entry["name"] for entry in ranking[1:] if entry["tied_with_best"]]
+    if tied:
+        print(f"    Sin diferencia significativa con {ranking[0]['name']}: {', '.join(tied)}")
 
     return {
         "experiment": "prompt_comparison",
         "results": results,
-        "ranking": [r["prompt_id"] for r in sorted_results]
+        "failures": failures,
+        "ranking": [entry["name"] for entry in ranking],
+        "tied_with_best": tied
     }
 
 
@@ -981,11 +1243,25 @@ def run_prompt_comparison(host: str = DEFAULT_HOST, port: int = DEFAULT_PORT,
 # =============================================================================
 
 def run_quality_evaluation(host: str = DEFAULT_HOST, port: int = DEFAULT_PORT,
-                           prompt_id: str = "detailed", iterations: int = 1) -> Dict:
+                           prompt_id: str = "detailed", iterations: int = 1,
+                           parallel: int = 1, call_options: Optional[Dict] = None,
+                           cache_model: Optional[str] = None,
+                           chunk_tokens: int = 0, premask_phi: bool = False) -> Dict:
     """
     Experimento 3: Evaluación completa de calidad con métricas académicas.
 
     Métricas: Precision, Recall, F1, ALID, LR, LRDI, LRQI
+
+    Con cache_model las respuestas se guardan/leen del cache en disco, una
+    entrada por (caso, iteración), para re-puntuar sin regenerarlas.
+
+    Con chunk_tokens > 0 cada nota se divide por secciones en fragmentos de
+    hasta chunk_tokens tokens, que se anonimizan con `parallel` fragmentos en
+    vuelo y se unen en orden (ver chunking.py); los casos van en secuencia.
+
+    Con premask_phi los identificadores que cubren PATTERNS_URUGUAY se
+    enmascaran antes del prompt (ver premask.py) y cada resultado incluye
+    el mapa de spans y los tokens eliminados.
     """
     print("\n" + "=" * 70)
     print("  EXPERIMENTO 3: Evaluación de Calidad (Métricas Académicas)")
@@ -996,6 +1272,7 @@ def run_quality_evaluation(host: str = DEFAULT_HOST, port: int = DEFAULT_PORT,
 
     prompt_template = PROMPT_STRATEGIES[prompt_id]["template"]
     results = []
+    failures = []
 
     all_precision = []
     all_recall = []
@@ -1004,18 +1281,33 @@ def run_quality_evaluation(host: str = DEFAULT_HOST, port: int = DEFAULT_PORT,
     all_lrqi = []
     total_direct_escaped = 0
 
+    texts = {caso_id: caso["texto"] for caso_id, caso in CASOS_CLINICOS.items()}
+    masks = {}
+    if premask_phi:
+        from premask import premask
+        masks = {caso_id: premask(texto) for caso_id, texto in texts.items()}
+        texts = {caso_id: m.text for caso_id, m in masks.items()}
+
     for iteration in range(1, iterations + 1):
         print(f"\n  --- Iteración {iteration}/{iterations} ---")
 
-        for caso_id, caso in CASOS_CLINICOS.items():
-            prompt = prompt_template.format(text=caso["texto"])
+        iteration_options = call_options
+        if cache_model:
+            iteration_options = {**(call_options or {}), "cache_model": cache_model,
+                                 "cache_variant": f"iter{iteration}"}
 
-            print(f"    {caso_id}: ", end="", flush=True)
+        if chunk_tokens > 0:
+            calls = iter_anonymize_chunked(list(texts.values()), prompt_template, host, port,
+                                           parallel, chunk_tokens, iteration_options)
+        else:
+            prompts = [prompt_template.format(text=texto) for texto in texts.values()]
+            calls = iter_call_model(prompts, host, port, parallel, call_options=iteration_options)
 
-            result = call_model(prompt, host, port)
+        for (caso_id, caso), result in zip(CASOS_CLINICOS.items(), calls):
+            print(f"    {caso_id}: ", end="", flush=True)
 
             if result["success"]:
-                quality = calculate_quality_metrics(result["text"], caso["entidades"])
+                quality = calculate_quality_metrics(result["text"], caso["entidades"], caso_id)
 
                 results.append({
                     "iteration": iteration,
@@ -1024,8 +1316,18 @@ def run_quality_evaluation(host: str = DEFAULT_HOST, port: int = DEFAULT_PORT,
                         "tps": result["tps_generation"],
                         "time_s": result["total_time_s"]
                     },
-                    "quality": quality
+                    "quality": quality,
+                    "cache_hit": result.get("cache_hit", False)
                 })
+                if "started_at" in result:
+                    results[-1]["performance"]["started_at"] = result["started_at"]
+                    results[-1]["performance"]["finished_at"] = result["finished_at"]
+                if "chunks" in result:
+                    results[-1]["chunks"] = result["chunks"]
+                if caso_id in masks:
+                    results[-1]["premask"] = masks[caso_id].summary()
+                    results[-1]["performance"]["tokens_generated"] = result["tokens_generated"]
+                    results[-1]["performance"]["tokens_prompt"] = result.get("tokens_prompt", 0)
 
                 all_precision.append(quality["precision"])
                 all_recall.append(quality["recall"])
@@ -1038,6 +1340,7 @@ def run_quality_evaluation(host: str = DEFAULT_HOST, port: int = DEFAULT_PORT,
                 print(f"P:{quality['precision']:.2f} R:{quality['recall']:.2f} "
                       f"F1:{quality['f1_micro']:.2f} LRDI:{quality['lrdi']:.0f}% [{lrdi_status}]")
             else:
+                failures.append({"iteration": iteration, "case_id": caso_id, "error": result["error"]})
                 print(f"ERROR: {result['error']}")
 
     # Resumen
@@ -1053,6 +1356,9 @@ def run_quality_evaluation(host: str = DEFAULT_HOST, port: int = DEFAULT_PORT,
             "privacy_risk": "ALTO" if total_direct_escaped > 0 else "BAJO",
             "total_evaluations": len(results)
         }
+        if masks:
+            summary["premask_spans"] = sum(len(m.spans) for m in masks.values())
+            summary["premask_tokens_removed_est"] = sum(m.tokens_removed for m in masks.values())
 
         print("\n" + "=" * 70)
         print("  MÉTRICAS AGREGADAS (estilo paper académico)")
@@ -1074,6 +1380,7 @@ def run_quality_evaluation(host: str = DEFAULT_HOST, port: int = DEFAULT_PORT,
         "experiment": "quality_evaluation",
         "prompt_used": prompt_id,
         "results": results,
+        "failures": failures,
         "summary": summary
     }
 
@@ -1094,15 +1401,84 @@ def main():
     parser.add_argument("--all", action="store_true", help="Ejecutar todos los experimentos")
     parser.add_argument("--iterations", type=int, default=1, help="Número de iteraciones")
     parser.add_argument("--output", default="results", help="Directorio de salida")
+    parser.add_argument("--parallel", type=int, default=1,
+                        help="Requests en vuelo (igual al --parallel del servidor; 0 = detectar vía /props)")
+
+    parser.add_argument("--stream", action="store_true",
+                        help="Usar streaming SSE (TTFT y latencia entre tokens medidos en el cliente)")
+    parser.add_argument("--prefix-cache", action="store_true",
+                        help="Exp 2: fijar el prefijo de cada estrategia a un slot (cache_prompt)")
+    parser.add_argument("--endpoints",
+                        help="Réplicas del mismo modelo, host:port separados por comas (balanceo)")
+    parser.add_argument("--lb-policy", choices=POLICIES, default=DEFAULT_POLICY,
+                        help="Política del balanceador")
+    parser.add_argument("--response-cache", nargs="?", const=DEFAULT_CACHE_PATH,
+                        help=f"Exp 3: cache de respuestas en disco (default: {DEFAULT_CACHE_PATH})")
+    parser.add_argument("--cache-max-mb", type=float, default=DEFAULT_MAX_MB,
+                        help="Tamaño máximo del cache de respuestas (LRU)")
+    parser.add_argument("--cache-only", action="store_true",
+                        help="Exp 3: solo re-puntuar respuestas del cache, sin contactar al servidor")
+    parser.add_argument("--model-file",
+                        help="GGUF servido (ruta o nombre en ~/models) para la clave del cache")
+    parser.add_argument("--chunk-tokens", type=int, default=0,
+                        help="Exp 3: fragmentar notas por sección en piezas de N tokens (0 = nota completa)")
+    parser.add_argument("--premask", action="store_true",
+                        help="Exp 2/3: enmascarar CI, teléfonos, emails, fechas y HC con regex antes del LLM")
+    parser.add_argument("--pool-size", type=int, default=DEFAULT_POOL_SIZE,
+                        help="Conexiones keep-alive por endpoint")
+    parser.add_argument("--results-db", nargs="?", const=DEFAULT_STORE_PATH,
+                        help=f"Guardar cada request en el almacén SQLite (default: {DEFAULT_STORE_PATH})")
+    parser.add_argument("--recursos", type=float, nargs="?", const=DEFAULT_INTERVAL_S, default=None,
+                        metavar="SEGUNDOS",
+                        help=f"Muestrear CPU/memoria en segundo plano (default: cada {DEFAULT_INTERVAL_S} s)")
+    parser.add_argument("--server-pid", type=int, default=None,
+                        help="Pid del servidor llama.cpp para --recursos/--numa (default: se busca por puerto)")
+    parser.add_argument("--numa", action="store_true",
+                        help="Medir localidad NUMA del servidor en cada experimento (hilos y páginas por nodo)")
+    parser.add_argument("--server-metrics", type=float, nargs="?", const=DEFAULT_INTERVAL_S, default=None,
+                        metavar="SEGUNDOS",
+                        help="Consultar /metrics y /slots del servidor (llama-server --metrics) "
+                             f"durante la corrida (default: cada {DEFAULT_INTERVAL_S} s)")
 
     args = parser.parse_args()
 
+    call_options = {"stream": True} if args.stream else {}
+
+    if args.endpoints:
+        # Las réplicas sirven el mismo modelo: la primera define host/port de referencia
+        args.host, args.port = parse_endpoints(args.endpoints)[0]
+
+    from concurrent_engine import detect_parallel_slots
+    if args.parallel == 0:
+        args.parallel = detect_parallel_slots(args.host, args.port)
+    total_slots = detect_parallel_slots(args.host, args.port) if args.prefix_cache else 1
+
+    # El pool debe cubrir todos los requests en vuelo
+    configure_transport(pool_size=max(args.pool_size, args.parallel))
+
+    if args.endpoints:
+        balancer = configure_balancer(args.endpoints, args.lb_policy)
+        balancer.check_health()
+
+    cache_model = None
+    if args.response_cache or args.cache_only:
+        response_cache = configure_response_cache(args.response_cache or DEFAULT_CACHE_PATH,
+                                                  args.cache_max_mb, args.cache_only)
+        model_file = args.model_file or server_model_file(args.host, args.port)
+        if model_file is None:
+            parser.error("No se pudo determinar el modelo servido: usar --model-file")
+        cache_model = resolve_model_id(model_file, cache=response_cache)
+
     print("=" * 70)
     print("  PROTOCOLO DE EXPERIMENTACIÓN v3.0")
     print("  Universidad de Montevideo - Tesis 2025")
     print("=" * 70)
     print(f"  Fecha: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-    print(f"  Host: {args.host}:{args.port}")
+    if args.endpoints:
+        print(f"  Réplicas: {args.endpoints} ({args.lb_policy})")
+    else:
+        print(f"  Host: {args.host}:{args.port}")
+    print(f"  Requests en vuelo: {args.parallel}")
     print(f"  Papers: arXiv:2412.10918, arXiv:2406.00062")
     print("=" * 70)
 
@@ -1111,24 +1487,110 @@ def main():
             "timestamp": datetime.now().isoformat(),
             "host": args.host,
             "port": args.port,
-            "iterations": args.iterations
+            "iterations": args.iterations,
+            "parallel": args.parallel,
+            "stream": args.stream,
+            "prefix_cache": args.prefix_cache,
+            "endpoints": args.endpoints.split(",") if args.endpoints else [f"{args.host}:{args.port}"],
+            "lb_policy": args.lb_policy if args.endpoints else None,
+            "response_cache_model": cache_model,
+            "chunk_tokens": args.chunk_tokens,
+            "premask": args.premask,
+            "pool_size": get_transport().pool_size,
+            "model": args.model_file or (server_model_file(args.host, args.port) if args.results_db else None)
         },
         "experiments": {}
     }
 
+    server_pid = None
+    if args.recursos or args.numa:
+        server_pid = args.server_pid or find_server_pid(args.port)
+        print(f"  Servidor: {f'pid {server_pid}' if server_pid else 'pid no encontrado'}")
+    if args.recursos:
+        configure_resource_sampler(args.recursos, server_pid)
+        print(f"  Recursos: muestreo cada {args.recursos} s")
+
+    server_collectors = []
+    if args.server_metrics:
+        server_collectors = [
+            ServerMetricsCollector(host, port, args.server_metrics).start()
+            for host, port in parse_endpoints(all_results["metadata"]["endpoints"])
+        ]
+        print(f"  Métricas del servidor: /metrics y /slots cada {args.server_metrics} s")
+    experiment_windows = {}
+
+    def run_experiment(name: str, run, *run_args, **run_kwargs) -> Dict:
+        """Corre un experimento como fase de recursos y, con --numa, mide su localidad."""
+        collector = NumaCollector(server_pid).start() if args.numa else None
+        start = timeline_now()
+        with resource_phase(name):
+            result = run(*run_args, **run_kwargs)
+        experiment_windows[name] = (start, timeline_now())
+        if collector:
+            report = collector.stop()
+            attach_numa(result, report)
+            print(f"\n  NUMA ({name}): nodos {report.nodes}, hilos en nodo {report.home_node}, "
+                  f"acceso remoto estimado {report.remote_access_estimate:.1%}")
+        return result
+
     # Ejecutar experimentos
     if args.all or args.rendimiento:
-        result = run_performance_benchmark(args.host, args.port, args.iterations)
+        result = run_experiment("performance", run_performance_benchmark,
+                                args.host, args.port, args.iterations,
+                                parallel=args.parallel, call_options=call_options)
         all_results["experiments"]["performance"] = result
 
     if args.all or args.prompts:
-        result = run_prompt_comparison(args.host, args.port)
+        result = run_experiment("prompts", run_prompt_comparison,
+                                args.host, args.port, parallel=args.parallel,
+                                call_options=call_options,
+                                prefix_cache=args.prefix_cache,
+                                total_slots=total_slots,
+                                premask_phi=args.premask)
         all_results["experiments"]["prompts"] = result
 
     if args.all or args.calidad:
-        result = run_quality_evaluation(args.host, args.port, "detailed", args.iterations)
+        result = run_experiment("quality", run_quality_evaluation,
+                                args.host, args.port, "detailed", args.iterations,
+                                parallel=args.parallel, call_options=call_options,
+                                cache_model=cache_model,
+                                chunk_tokens=args.chunk_tokens,
+                                premask_phi=args.premask)
         all_results["experiments"]["quality"] = result
 
+    if server_collectors:
+        # Se detienen antes de unir: la última lectura cierra la ventana del último request
+        for server_collector in server_collectors:
+            server_collector.stop()
+        print("\n  MÉTRICAS DEL SERVIDOR:")
+        for name, result in all_results["experiments"].items():
+            start, end = experiment_windows[name]
+            result["server_metrics"] = {c.endpoint: c.summarize(start, end) for c in server_collectors}
+            # Con réplicas, las filas no registran qué servidor atendió cada request
+            if len(server_collectors) == 1:
+                rows = result.get("results", [])
+                if name == "prompts":
+                    # results son agregados por estrategia; los requests están en details
+                    rows = [d for r in rows for d in r.get("details", [])]
+                server_collectors[0].join(rows)
+            for endpoint, summary in result["server_metrics"].items():
+                print(format_server_summary(f"{name} {endpoint}", summary))
+        all_results["server_metrics"] = {c.endpoint: c.to_dict() for c in server_collectors}
+
+    sampler = get_resource_sampler()
+    if sampler:
+        sampler.stop()
+        all_results["resources"] = sampler.to_dict()
+        print("\n  RECURSOS POR FASE:")
+        print(format_phase_table(all_results["resources"]["by_phase"]))
+
+    if get_balancer():
+        all_results["metadata"]["balancer"] = get_balancer().stats()
+    if get_response_cache():
+        all_results["metadata"]["response_cache"] = get_response_cache().stats()
+        print(f"\n  Cache de respuestas: {get_response_cache().hits} hits, "
+              f"{get_response_cache().misses} misses")
+
     # Guardar resultados
     output_dir = Path(args.output)
     output_dir.mkdir(parents=True, exist_ok=True)
@@ -1140,6 +1602,9 @@ def main():
         json.dump(all_results, f, indent=2, ensure_ascii=False)
 
     print(f"\n  Resultados guardados en: {output_file}")
+    if args.results_db:
+        configure_results_store(args.results_db)
+        record_result(all_results, output_file)
     print("=" * 70)
 
     return all_results
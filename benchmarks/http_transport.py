@@ -0,0 +1,368 @@
+#!/usr/bin/env python3
+"""
+http_transport.py - Transporte HTTP con pool de conexiones keep-alive
+Universidad de Montevideo - Tesis 2025
+
+Todos los runners de benchmark (experiment_runner, experiment_runner_v3,
+benchmark_anon, benchmark_prompts, run_benchmark_power10) envían sus
+requests a llama.cpp a través de este transporte. Abrir una conexión TCP
+nueva por request agrega el handshake a la latencia medida; con un pool
+keep-alive ese costo se paga una sola vez por conexión.
+
+Características:
+- Pool de conexiones por (host, port) con tamaño configurable
+- Reintentos con backoff exponencial ante conexiones reseteadas/rechazadas.
+  Un POST (no idempotente) solo se reintenta si falló antes de enviarse:
+  al conectar, o al escribir en una conexión keep-alive reutilizada que el
+  servidor ya había cerrado. Si falla esperando la respuesta, el servidor
+  puede estar generando y reenviarlo duplicaría el trabajo
+- Fases de tiempo HTTP por request: connect, first byte, body
+- Respuestas streaming (SSE) sobre la misma conexión del pool
+
+Solo usa la biblioteca estándar (http.client).
+
+Uso:
+    from http_transport import get_transport
+
+    response = get_transport().post_json("localhost", 8080, "/completion", payload)
+    response.raise_for_status()
+    data = response.json()
+    print(response.timings.first_byte_ms)
+"""
+
+import http.client
+import json
+import queue
+import select
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field, asdict
+from typing import Dict, Iterator, Optional, Tuple
+
+# =============================================================================
+# CONFIGURACIÓN
+# =============================================================================
+
+DEFAULT_POOL_SIZE = 8
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_BACKOFF_S = 0.25
+DEFAULT_TIMEOUT = 180
+
+# Errores de conexión que justifican reintentar con una conexión nueva
+# (incluye http.client.RemoteDisconnected, subclase de ConnectionResetError)
+RETRYABLE_ERRORS = (
+    ConnectionResetError,
+    ConnectionRefusedError,
+    ConnectionAbortedError,
+    BrokenPipeError,
+    http.client.BadStatusLine,
+)
+
+# Métodos que se pueden reintentar aunque el request ya se haya enviado
+IDEMPOTENT_METHODS = ("GET", "HEAD", "OPTIONS")
+
+
+# =============================================================================
+# DATACLASSES
+# =============================================================================
+
+@dataclass
+class HTTPTimings:
+    """Fases de tiempo de un request HTTP (ms)."""
+    connect_ms: float = 0.0       # Establecer TCP (0 si se reutilizó la conexión)
+    first_byte_ms: float = 0.0    # Desde el envío hasta recibir los headers
+    body_ms: float = 0.0          # Lectura del cuerpo de la respuesta
+    total_ms: float = 0.0
+    reused_connection: bool = False
+    retries: int = 0
+
+    def to_dict(self) -> Dict:
+        return {k: round(v, 2) if isinstance(v, float) else v
+                for k, v in asdict(self).items()}
+
+
+class HTTPStatusError(Exception):
+    """Respuesta HTTP con código de error (>= 400)."""
+
+    def __init__(self, status: int, body: str):
+        super().__init__(f"HTTP {status}: {body[:200]}")
+        self.status = status
+        self.body = body
+
+
+@dataclass
+class TransportResponse:
+    """Respuesta HTTP completa leída del pool."""
+    status: int
+    body: bytes
+    timings: HTTPTimings = field(default_factory=HTTPTimings)
+
+    @property
+    def text(self) -> str:
+        return self.body.decode("utf-8", errors="replace")
+
+    def json(self) -> Dict:
+        return json.loads(self.body.decode("utf-8"))
+
+    def raise_for_status(self):
+        if self.status >= 400:
+            raise HTTPStatusError(self.status, self.text)
+
+
+class StreamingResponse:
+    """Respuesta HTTP cuyo cuerpo se consume línea a línea (SSE)."""
+
+    def __init__(self, response: http.client.HTTPResponse, timings: HTTPTimings):
+        self._response = response
+        self.status = response.status
+        self.timings = timings
+
+    def raise_for_status(self):
+        if self.status >= 400:
+            raise HTTPStatusError(self.status, self._response.read().decode("utf-8", "replace"))
+
+    def lines(self) -> Iterator[bytes]:
+        """Itera las líneas del cuerpo a medida que llegan."""
+        while True:
+            line = self._response.readline()
+            if not line:
+                return
+            yield line
+
+
+# =============================================================================
+# POOL DE CONEXIONES
+# =============================================================================
+
+def _is_dropped(sock) -> bool:
+    """Una conexión inactiva legible fue cerrada por el servidor (EOF pendiente)."""
+    try:
+        readable, _, _ = select.select([sock], [], [], 0)
+    except (OSError, ValueError):
+        return True
+    return bool(readable)
+
+
+class _HostPool:
+    """Conexiones keep-alive hacia un único (host, port)."""
+
+    def __init__(self, host: str, port: int, size: int):
+        self.host = host
+        self.port = port
+        self._idle: "queue.LifoQueue[http.client.HTTPConnection]" = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+
+    def acquire(self, timeout: float) -> Tuple[http.client.HTTPConnection, bool]:
+        """
+        Toma una conexión del pool; si hay `size` en uso espera hasta timeout
+        segundos (TimeoutError si ninguna se libera, p. ej. por una fuga).
+        """
+        if not self._slots.acquire(timeout=timeout):
+            raise TimeoutError(f"Pool de conexiones a {self.host}:{self.port} agotado "
+                               f"durante {timeout}s")
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                return http.client.HTTPConnection(self.host, self.port, timeout=timeout), False
+            if conn.sock is None or _is_dropped(conn.sock):
+                conn.close()
+                continue
+            conn.timeout = timeout
+            conn.sock.settimeout(timeout)
+            return conn, True
+
+    def release(self, conn: http.client.HTTPConnection, reusable: bool):
+        """Devuelve la conexión al pool, o la cierra si no es reutilizable."""
+        if reusable:
+            self._idle.put(conn)
+        else:
+            conn.close()
+        self._slots.release()
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+class PooledTransport:
+    """
+    Cliente HTTP/1.1 con pool keep-alive por endpoint y reintentos.
+
+    Es thread-safe: el motor concurrente y el balanceador lo comparten
+    entre threads. pool_size debería ser >= requests en vuelo por endpoint.
+    """
+
+    def __init__(
+        self,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        backoff_s: float = DEFAULT_BACKOFF_S,
+        timeout: float = DEFAULT_TIMEOUT
+    ):
+        """
+        Args:
+            pool_size: Conexiones máximas por (host, port)
+            max_retries: Reintentos ante errores de conexión
+            backoff_s: Espera base entre reintentos (se duplica en cada uno)
+            timeout: Timeout por defecto en segundos
+        """
+        self.pool_size = max(1, pool_size)
+        self.max_retries = max(0, max_retries)
+        self.backoff_s = backoff_s
+        self.timeout = timeout
+        self._pools: Dict[Tuple[str, int], _HostPool] = {}
+        self._lock = threading.Lock()
+
+    def _pool(self, host: str, port: int) -> _HostPool:
+        key = (host, int(port))
+        with self._lock:
+            if key not in self._pools:
+                self._pools[key] = _HostPool(host, int(port), self.pool_size)
+            return self._pools[key]
+
+    def _send(self, method: str, host: str, port: int, path: str,
+              payload: Optional[Dict], timeout: Optional[float]):
+        """
+        Envía el request y espera los headers, reintentando con backoff
+        (solo si es seguro: ver IDEMPOTENT_METHODS).
+
+        Returns:
+            (pool, conn, response, timings, start) con la conexión aún tomada
+        """
+        timeout = timeout or self.timeout
+        pool = self._pool(host, port)
+        body = json.dumps(payload).encode("utf-8") if payload is not None else None
+        headers = {"Connection": "keep-alive"}
+        if body is not None:
+            headers["Content-Type"] = "application/json"
+
+        attempt = 0
+        while True:
+            conn, reused = pool.acquire(timeout)
+            timings = HTTPTimings(reused_connection=reused, retries=attempt)
+            start = time.perf_counter()
+            stage = "connect"
+            try:
+                if conn.sock is None:
+                    conn.connect()
+                connected = time.perf_counter()
+                timings.connect_ms = (connected - start) * 1000
+
+                stage = "send"
+                conn.request(method, path, body=body, headers=headers)
+                stage = "response"
+                response = conn.getresponse()
+                timings.first_byte_ms = (time.perf_counter() - connected) * 1000
+                return pool, conn, response, timings, start
+
+            except RETRYABLE_ERRORS:
+                pool.release(conn, reusable=False)
+                # Sin enviar (o con el socket keep-alive ya cerrado al escribir)
+                # el servidor no recibió el request
+                not_received = stage == "connect" or (stage == "send" and reused)
+                if attempt >= self.max_retries or not (method in IDEMPOTENT_METHODS or not_received):
+                    raise
+                # Una conexión keep-alive cerrada por el servidor se reintenta
+                # de inmediato; el resto espera con backoff exponencial.
+                if not reused:
+                    time.sleep(self.backoff_s * (2 ** attempt))
+                attempt += 1
+            except Exception:
+                pool.release(conn, reusable=False)
+                raise
+
+    def request(self, method: str, host: str, port: int, path: str,
+                payload: Optional[Dict] = None,
+                timeout: Optional[float] = None) -> TransportResponse:
+        """Ejecuta un request y lee la respuesta completa."""
+        pool, conn, response, timings, start = self._send(
+            method, host, port, path, payload, timeout
+        )
+        try:
+            body_start = time.perf_counter()
+            body = response.read()
+            timings.body_ms = (time.perf_counter() - body_start) * 1000
+        except Exception:
+            pool.release(conn, reusable=False)
+            raise
+
+        timings.total_ms = (time.perf_counter() - start) * 1000
+        pool.release(conn, reusable=not response.will_close)
+        return TransportResponse(status=response.status, body=body, timings=timings)
+
+    def post_json(self, host: str, port: int, path: str, payload: Dict,
+                  timeout: Optional[float] = None) -> TransportResponse:
+        """POST con cuerpo JSON."""
+        return self.request("POST", host, port, path, payload, timeout)
+
+    def get(self, host: str, port: int, path: str,
+            timeout: Optional[float] = None) -> TransportResponse:
+        """GET sin cuerpo."""
+        return self.request("GET", host, port, path, None, timeout)
+
+    @contextmanager
+    def stream_post(self, host: str, port: int, path: str, payload: Dict,
+                    timeout: Optional[float] = None) -> Iterator[StreamingResponse]:
+        """
+        POST cuya respuesta se consume de forma incremental (SSE).
+
+        Al salir del bloque se descarta lo que quede del cuerpo (p. ej. el
+        cierre del chunked encoding tras el evento final) para que la
+        conexión pueda volver al pool.
+        """
+        pool, conn, response, timings, start = self._send(
+            "POST", host, port, path, payload, timeout
+        )
+        body_start = time.perf_counter()
+        try:
+            yield StreamingResponse(response, timings)
+            timings.body_ms = (time.perf_counter() - body_start) * 1000
+            response.read()
+        except BaseException:
+            pool.release(conn, reusable=False)
+            raise
+        timings.total_ms = (time.perf_counter() - start) * 1000
+        pool.release(conn, reusable=not response.will_close)
+
+    def close(self):
+        """Cierra todas las conexiones inactivas."""
+        with self._lock:
+            for pool in self._pools.values():
+                pool.close()
+
+
+# =============================================================================
+# TRANSPORTE COMPARTIDO
+# =============================================================================
+
+_default_transport: Optional[PooledTransport] = None
+_default_lock = threading.Lock()
+
+
+def get_transport() -> PooledTransport:
+    """Retorna el transporte compartido por todos los runners."""
+    global _default_transport
+    with _default_lock:
+        if _default_transport is None:
+            _default_transport = PooledTransport()
+        return _default_transport
+
+
+def configure_transport(
+    pool_size: int = DEFAULT_POOL_SIZE,
+    max_retries: int = DEFAULT_MAX_RETRIES,
+    backoff_s: float = DEFAULT_BACKOFF_S,
+    timeout: float = DEFAULT_TIMEOUT
+) -> PooledTransport:
+    """Reemplaza el transporte compartido con una nueva configuración."""
+    global _default_transport
+    with _default_lock:
+        if _default_transport is not None:
+            _default_transport.close()
+        _default_transport = PooledTransport(pool_size, max_retries, backoff_s, timeout)
+        return _default_transport
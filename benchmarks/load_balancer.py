@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+"""
+load_balancer.py - Balanceador de carga entre réplicas llama.cpp
+Universidad de Montevideo - Tesis 2025
+
+config/docker-compose.yml levanta varios contenedores llama.cpp (puertos
+8088-8091). Cuando varias réplicas sirven el mismo GGUF (por ejemplo cada
+una fijada a un nodo NUMA distinto), este router del lado del cliente
+reparte los requests entre ellas.
+
+Políticas:
+- least_outstanding: el backend con menos requests en vuelo
+- p2c: power-of-two-choices (dos backends al azar, el menos cargado)
+
+Cada health_interval_s se sondea /health de todos los backends: uno que
+no responde 200 (cargando el modelo, reiniciado tras un OOM) se expulsa
+aunque todavía no haya fallado ningún request, y uno expulsado vuelve
+cuando responde 200. También se expulsa tras varios errores consecutivos.
+
+Uso:
+    python load_balancer.py --endpoints localhost:8088,localhost:8089
+
+    from load_balancer import configure_balancer
+    balancer = configure_balancer(["localhost:8088", "localhost:8089"], policy="p2c")
+    result = balancer.call(prompt)
+"""
+
+import random
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+from http_transport import PooledTransport
+
+# =============================================================================
+# CONFIGURACIÓN
+# =============================================================================
+
+POLICIES = ("least_outstanding", "p2c")
+DEFAULT_POLICY = "least_outstanding"
+DEFAULT_HEALTH_INTERVAL_S = 5.0
+DEFAULT_MAX_FAILURES = 3
+HEALTH_TIMEOUT_S = 2
+
+Endpoint = Tuple[str, int]
+
+
+def parse_endpoints(spec: Union[str, Sequence]) -> List[Endpoint]:
+    """
+    Convierte 'host:port,host:port' (o una lista de strings/tuplas) en
+    una lista de (host, port).
+    """
+    items = spec.split(",") if isinstance(spec, str) else list(spec)
+    endpoints = []
+    for item in items:
+        if isinstance(item, (tuple, list)):
+            endpoints.append((item[0], int(item[1])))
+            continue
+        item = item.strip()
+        if not item:
+            continue
+        host, _, port = item.rpartition(":")
+        endpoints.append((host or "localhost", int(port)))
+    return endpoints
+
+
+# =============================================================================
+# DATACLASSES
+# =============================================================================
+
+@dataclass
+class Backend:
+    """Estado de una réplica del modelo."""
+    host: str
+    port: int
+    healthy: bool = True
+    outstanding: int = 0            # Requests en vuelo
+    requests: int = 0
+    errors: int = 0
+    consecutive_failures: int = 0
+    ejections: int = 0
+    last_health_check: float = 0.0  # time.monotonic() del último sondeo
+
+    @property
+    def name(self) -> str:
+        return f"{self.host}:{self.port}"
+
+    def to_dict(self) -> Dict:
+        return {
+            "endpoint": self.name,
+            "healthy": self.healthy,
+            "outstanding": self.outstanding,
+            "requests": self.requests,
+            "errors": self.errors,
+            "ejections": self.ejections
+        }
+
+
+class NoHealthyBackendError(Exception):
+    """Todas las réplicas están expulsadas."""
+
+
+# =============================================================================
+# BALANCEADOR
+# =============================================================================
+
+class LoadBalancer:
+    """
+    Router del lado del cliente para réplicas que sirven el mismo modelo.
+
+    Es thread-safe: el motor concurrente llama a call() desde varios threads.
+    """
+
+    def __init__(
+        self,
+        endpoints: Sequence,
+        policy: str = DEFAULT_POLICY,
+        health_interval_s: float = DEFAULT_HEALTH_INTERVAL_S,
+        max_failures: int = DEFAULT_MAX_FAILURES,
+        call_fn: Optional[Callable[..., Dict]] = None
+    ):
+        """
+        Args:
+            endpoints: 'host:port,...' o lista de (host, port)
+            policy: 'least_outstanding' o 'p2c'
+            health_interval_s: Cada cuánto se sondea /health de cada backend
+            max_failures: Errores consecutivos antes de expulsar un backend
+            call_fn: Función de llamada; default experiment_runner_v3.call_model
+        """
+        if policy not in POLICIES:
+            raise ValueError(f"Política desconocida: {policy}. Opciones: {POLICIES}")
+        parsed = parse_endpoints(endpoints)
+        if not parsed:
+            raise ValueError("Se requiere al menos un endpoint")
+        if call_fn is None:
+            from experiment_runner_v3 import call_model
+            call_fn = call_model
+
+        self.backends = [Backend(host, port) for host, port in parsed]
+        self.policy = policy
+        self.health_interval_s = health_interval_s
+        self.max_failures = max(1, max_failures)
+        self.call_fn = call_fn
+        self._lock = threading.Lock()
+        self._rng = random.Random()
+        # Sondeos sin reintentos: un backend caído debe detectarse rápido
+        self._health_transport = PooledTransport(pool_size=2, max_retries=0,
+                                                 timeout=HEALTH_TIMEOUT_S)
+
+    # -------------------------------------------------------------------------
+    # Salud
+    # -------------------------------------------------------------------------
+
+    def _probe(self, backend: Backend) -> bool:
+        """GET /health; True si responde 200."""
+        try:
+            response = self._health_transport.get(backend.host, backend.port, "/health")
+            return response.status == 200
+        except Exception:
+            return False
+
+    def _set_health(self, backend: Backend, healthy: bool):
+        if backend.healthy and not healthy:
+            backend.ejections += 1
+        backend.healthy = healthy
+        backend.last_health_check = time.monotonic()
+        if healthy:
+            backend.consecutive_failures = 0
+
+    def check_health(self) -> Dict[str, bool]:
+        """Sondea /health de todos los backends y actualiza su estado."""
+        status = {}
+        for backend in self.backends:
+            healthy = self._probe(backend)
+            with self._lock:
+                self._set_health(backend, healthy)
+            status[backend.name] = healthy
+        return status
+
+    def _recheck_health(self):
+        """Sondea los backends (saludables o expulsados) cuyo intervalo ya venció."""
+        now = time.monotonic()
+        with self._lock:
+            due = [b for b in self.backends
+                   if now - b.last_health_check >= self.health_interval_s]
+            for backend in due:
+                # Evita que otro thread sondee el mismo backend en paralelo
+                backend.last_health_check = now
+        for backend in due:
+            healthy = self._probe(backend)
+            with self._lock:
+                self._set_health(backend, healthy)
+
+    # -------------------------------------------------------------------------
+    # Selección
+    # -------------------------------------------------------------------------
+
+    def _choose(self, candidates: List[Backend]) -> Backend:
+        if self.policy == "p2c" and len(candidates) > 1:
+            a, b = self._rng.sample(candidates, 2)
+            return a if a.outstanding <= b.outstanding else b
+        return min(candidates, key=lambda b: (b.outstanding, b.requests))
+
+    def acquire(self) -> Backend:
+        """Elige un backend saludable y registra el request en vuelo."""
+        self._recheck_health()
+        with self._lock:
+            candidates = [b for b in self.backends if b.healthy]
+            if not candidates:
+                raise NoHealthyBackendError(
+                    "Sin backends saludables: " + ", ".join(b.name for b in self.backends)
+                )
+            backend = self._choose(candidates)
+            backend.outstanding += 1
+            backend.requests += 1
+            return backend
+
+    def release(self, backend: Backend, success: bool):
+        """Libera el request en vuelo; expulsa el backend tras max_failures."""
+        with self._lock:
+            backend.outstanding -= 1
+            if success:
+                backend.consecutive_failures = 0
+                return
+            backend.errors += 1
+            backend.consecutive_failures += 1
+            if backend.consecutive_failures >= self.max_failures:
+                self._set_health(backend, False)
+
+    # -------------------------------------------------------------------------
+    # Llamadas
+    # -------------------------------------------------------------------------
+
+    def call(self, prompt: str, host: str = None, port: int = None, **kwargs) -> Dict:
+        """
+        Envía el prompt al backend elegido con call_fn.
+
+        host y port se ignoran: la firma coincide con call_model para poder
+        usar el balanceador como call_fn del motor concurrente. El resultado
+        incluye 'endpoint' con el backend que lo atendió.
+        """
+        try:
+            backend = self.acquire()
+        except NoHealthyBackendError as e:
+            return {"success": False, "error": str(e), "text": "",
+                    "tokens_generated": 0, "tps_generation": 0}
+
+        success = False
+        try:
+            result = self.call_fn(prompt, backend.host, backend.port, **kwargs)
+            success = bool(result.get("success", False))
+        finally:
+            self.release(backend, success)
+
+        result["endpoint"] = backend.name
+        return result
+
+    def stats(self) -> Dict:
+        """Estado y contadores de cada backend."""
+        with self._lock:
+            return {
+                "policy": self.policy,
+                "backends": [b.to_dict() for b in self.backends]
+            }
+
+
+# =============================================================================
+# BALANCEADOR COMPARTIDO
+# =============================================================================
+
+_default_balancer: Optional[LoadBalancer] = None
+
+
+def get_balancer() -> Optional[LoadBalancer]:
+    """Retorna el balanceador configurado, o None si se usa un solo endpoint."""
+    return _default_balancer
+
+
+def configure_balancer(endpoints: Sequence, policy: str = DEFAULT_POLICY,
+                       **kwargs) -> LoadBalancer:
+    """Configura el balanceador compartido por los runners."""
+    global _default_balancer
+    _default_balancer = LoadBalancer(endpoints, policy, **kwargs)
+    return _default_balancer
+
+
+def print_balancer_stats(balancer: LoadBalancer):
+    """Imprime el reparto de requests por backend."""
+    stats = balancer.stats()
+    print(f"\n  BALANCEADOR ({stats['policy']}):")
+    for b in stats["backends"]:
+        estado = "OK" if b["healthy"] else "EXPULSADO"
+        print(f"    {b['endpoint']:<22} {estado:<10} requests={b['requests']:<5} "
+              f"errores={b['errors']:<4} expulsiones={b['ejections']}")
+
+
+# =============================================================================
+# MAIN
+# =============================================================================
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Estado de salud de réplicas llama.cpp")
+    parser.add_argument("--endpoints", required=True,
+                        help="Lista host:port separada por comas (ej. localhost:8088,localhost:8089)")
+    args = parser.parse_args()
+
+    balancer = LoadBalancer(args.endpoints, call_fn=lambda *a, **k: {})
+    for endpoint, healthy in balancer.check_health().items():
+        print(f"  {endpoint:<22} {'OK' if healthy else 'NO DISPONIBLE'}")
+
+
+if __name__ == "__main__":
+    main()
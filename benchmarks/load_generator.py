@@ -0,0 +1,363 @@
+#!/usr/bin/env python3
+"""
+load_generator.py - Generador de carga de lazo abierto (curvas QPS-latencia)
+Universidad de Montevideo - Tesis 2025
+
+Los experimentos envían un request a la vez (lazo cerrado): miden el TPS de
+un único stream, no la capacidad del servidor. Este generador reproduce los
+prompts de CASOS_CLINICOS a una tasa de llegada objetivo, sin esperar a que
+terminen los requests anteriores (lazo abierto), y barre la tasa hacia
+arriba.
+
+Por cada tasa reporta QPS ofrecido vs. logrado y percentiles de latencia.
+El QPS logrado son las respuestas exitosas de los requests llegados en la
+ventana de carga, divididas por el largo de la ventana; se espera a que
+terminen (vaciado) antes de medir. La latencia se mide desde el instante
+de llegada programado, de modo que la espera en el cliente también cuenta
+(sin coordinated omission).
+
+Punto de saturación: la primera tasa en la que el throughput deja de seguir
+a la carga ofrecida (logrado < 90% del ofrecido: requests fallidos o
+vencidos) o la latencia p95 supera knee_factor veces la p95 a la tasa más
+baja (la cola crece). La rodilla de la curva (máxima
+tasa sostenible) es la tasa anterior.
+
+Uso:
+    python load_generator.py --port 8089 --rates 0.05,0.1,0.2,0.4 --duration 120
+    python load_generator.py --port 8089 --rates 0.1,0.2 --arrival constant
+"""
+
+import asyncio
+import json
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from concurrent_engine import latency_distribution
+from metrics.performance_metrics import calculate_throughput_qps
+from http_transport import configure_transport
+
+# =============================================================================
+# CONFIGURACIÓN
+# =============================================================================
+
+ARRIVALS = ("poisson", "constant")
+DEFAULT_DURATION_S = 60.0
+DEFAULT_MAX_IN_FLIGHT = 256     # Tope de threads; por encima la carga deja de ser abierta
+THROUGHPUT_RATIO = 0.9          # Logrado / ofrecido mínimo para considerar la tasa sostenida
+DEFAULT_KNEE_FACTOR = 2.0       # p95 / p95 a baja carga que marca saturación
+
+
+# =============================================================================
+# DATACLASSES
+# =============================================================================
+
+@dataclass
+class LoadRecord:
+    """Un request del generador (tiempos en time.perf_counter())."""
+    scheduled_at: float
+    sent_at: float = 0.0
+    finished_at: float = 0.0
+    success: bool = False
+    tokens_generated: int = 0
+
+    @property
+    def latency_ms(self) -> float:
+        """Desde la llegada programada hasta la respuesta."""
+        return (self.finished_at - self.scheduled_at) * 1000
+
+    @property
+    def send_lag_ms(self) -> float:
+        """Atraso del cliente en despachar el request."""
+        return (self.sent_at - self.scheduled_at) * 1000
+
+
+@dataclass
+class RatePoint:
+    """Resultado de una tasa del barrido."""
+    offered_qps: float
+    arrival: str
+    duration_s: float
+    records: List[LoadRecord] = field(default_factory=list)
+    started_at: float = 0.0         # Inicio de la ventana de llegadas (perf_counter)
+    span_s: float = 0.0             # Desde la primera llegada hasta la última respuesta
+
+    def achieved_qps(self) -> float:
+        """
+        Respuestas exitosas de los requests llegados en la ventana de carga
+        [started_at, started_at + duration_s], divididas por duration_s.
+
+        run_rate espera todas las respuestas, así que una latencia larga
+        al final de la ventana no se cuenta como falta de capacidad (una
+        ventana por instante de respuesta la dejaría afuera). La cola de un
+        servidor saturado se ve en la latencia; el throughput cae con los
+        requests fallidos o vencidos.
+        """
+        if self.duration_s <= 0:
+            return 0.0
+        window_end = self.started_at + self.duration_s
+        completed = sum(r.success and self.started_at <= r.scheduled_at <= window_end
+                        for r in self.records)
+        return calculate_throughput_qps(completed, self.duration_s)
+
+    def summary(self) -> Dict:
+        ok = [r for r in self.records if r.success]
+        latencies = sorted(r.latency_ms for r in ok)
+        lags = sorted(r.send_lag_ms for r in self.records)
+        achieved = self.achieved_qps()
+        tokens = sum(r.tokens_generated for r in ok)
+        return {
+            "offered_qps": self.offered_qps,
+            "arrival": self.arrival,
+            "requests": len(self.records),
+            "arrival_qps": round(calculate_throughput_qps(len(self.records), self.duration_s), 4),
+            "successful": len(ok),
+            "error_rate": round(1 - len(ok) / len(self.records), 4) if self.records else 0.0,
+            "achieved_qps": round(achieved, 4),
+            "aggregate_tps": round(tokens / self.span_s, 2) if self.span_s > 0 else 0.0,
+            "latency_ms": latency_distribution(latencies),
+            "send_lag_ms": latency_distribution(lags)
+        }
+
+
+# =============================================================================
+# LLEGADAS
+# =============================================================================
+
+def arrival_schedule(rate_qps: float, duration_s: float, arrival: str = "poisson",
+                     rng: Optional[random.Random] = None) -> List[float]:
+    """
+    Instantes de llegada (s desde el inicio) para una tasa y duración.
+
+    poisson: intervalos exponenciales de media 1/rate; constant: cada 1/rate.
+    """
+    if arrival not in ARRIVALS:
+        raise ValueError(f"Llegada desconocida: {arrival}. Opciones: {ARRIVALS}")
+    if rate_qps <= 0:
+        return []
+    rng = rng or random.Random()
+
+    times = []
+    t = 0.0
+    while True:
+        t += rng.expovariate(rate_qps) if arrival == "poisson" else 1.0 / rate_qps
+        if t > duration_s:
+            return times
+        times.append(t)
+
+
+# =============================================================================
+# GENERADOR
+# =============================================================================
+
+class LoadGenerator:
+    """
+    Reproduce prompts a una tasa objetivo sin esperar respuestas.
+
+    call_fn es bloqueante (misma firma que experiment_runner_v3.call_model) y
+    se ejecuta en un pool de hasta max_in_flight threads.
+    """
+
+    def __init__(self, prompts: List[str], host: str, port: int,
+                 call_fn: Optional[Callable[..., Dict]] = None,
+                 max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+                 call_options: Optional[Dict] = None, seed: Optional[int] = None):
+        if not prompts:
+            raise ValueError("Se requiere al menos un prompt")
+        if call_fn is None:
+            from experiment_runner_v3 import call_model
+            call_fn = call_model
+        self.prompts = prompts
+        self.host = host
+        self.port = port
+        self.call_fn = call_fn
+        self.max_in_flight = max(1, max_in_flight)
+        self.call_options = call_options or {}
+        self.rng = random.Random(seed)
+
+    def _call(self, prompt: str, record: LoadRecord):
+        record.sent_at = time.perf_counter()
+        try:
+            result = self.call_fn(prompt, self.host, self.port, **self.call_options)
+            record.success = bool(result.get("success", False))
+            record.tokens_generated = result.get("tokens_generated", 0)
+        except Exception:
+            record.success = False
+        record.finished_at = time.perf_counter()
+
+    async def _run_rate(self, schedule: List[float], executor: ThreadPoolExecutor,
+                        point: RatePoint) -> List[LoadRecord]:
+        loop = asyncio.get_running_loop()
+        start = point.started_at = time.perf_counter()
+        records = []
+        tasks = []
+        for i, offset in enumerate(schedule):
+            delay = start + offset - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            record = LoadRecord(scheduled_at=start + offset)
+            records.append(record)
+            prompt = self.prompts[i % len(self.prompts)]
+            tasks.append(loop.run_in_executor(executor, self._call, prompt, record))
+        await asyncio.gather(*tasks)
+        return records
+
+    def run_rate(self, rate_qps: float, duration_s: float = DEFAULT_DURATION_S,
+                 arrival: str = "poisson") -> RatePoint:
+        """Ejecuta una tasa durante duration_s y espera las respuestas pendientes."""
+        schedule = arrival_schedule(rate_qps, duration_s, arrival, self.rng)
+        point = RatePoint(offered_qps=rate_qps, arrival=arrival, duration_s=duration_s)
+        if not schedule:
+            return point
+
+        with ThreadPoolExecutor(max_workers=self.max_in_flight) as executor:
+            point.records = asyncio.run(self._run_rate(schedule, executor, point))
+        point.span_s = (max(r.finished_at for r in point.records)
+                        - min(r.scheduled_at for r in point.records))
+        return point
+
+    def sweep(self, rates: List[float], duration_s: float = DEFAULT_DURATION_S,
+              arrival: str = "poisson", knee_factor: float = DEFAULT_KNEE_FACTOR,
+              stop_after_saturation: bool = True) -> Dict:
+        """
+        Barre las tasas en orden creciente y detecta la saturación.
+
+        Con stop_after_saturation el barrido termina en la primera tasa
+        saturada (las siguientes solo agregarían cola).
+        """
+        points = []
+        for rate in sorted(rates):
+            print(f"  Tasa {rate:.3f} QPS ({arrival}, {duration_s:.0f}s)...", end=" ", flush=True)
+            summary = self.run_rate(rate, duration_s, arrival).summary()
+            points.append(summary)
+            lat = summary["latency_ms"]
+            print(f"logrado {summary['achieved_qps']:.3f} QPS | "
+                  f"p50 {lat['p50']:.0f} ms | p95 {lat['p95']:.0f} ms | p99 {lat['p99']:.0f} ms")
+            if stop_after_saturation and find_saturation(points, knee_factor)["saturation_qps"] is not None:
+                break
+
+        return {
+            "arrival": arrival,
+            "duration_s": duration_s,
+            "knee_factor": knee_factor,
+            "points": points,
+            **find_saturation(points, knee_factor)
+        }
+
+
+# =============================================================================
+# SATURACIÓN
+# =============================================================================
+
+def find_saturation(points: List[Dict], knee_factor: float = DEFAULT_KNEE_FACTOR) -> Dict:
+    """
+    Detecta el punto de saturación de una curva QPS-latencia.
+
+    Returns:
+        {'saturation_qps', 'knee_qps', 'reason'}: saturation_qps es la primera
+        tasa saturada y knee_qps la última sostenida (None si no aplica).
+    """
+    points = sorted(points, key=lambda p: p["offered_qps"])
+    base_p95 = next((p["latency_ms"]["p95"] for p in points if p["successful"] > 0), 0.0)
+
+    knee = None
+    for p in points:
+        reason = None
+        # Con llegadas Poisson se compara con la tasa efectivamente generada
+        offered = p.get("arrival_qps", p["offered_qps"])
+        if p["achieved_qps"] < THROUGHPUT_RATIO * offered:
+            reason = "throughput"
+        elif base_p95 > 0 and p["latency_ms"]["p95"] > knee_factor * base_p95:
+            reason = "latency"
+        if reason:
+            return {"saturation_qps": p["offered_qps"], "knee_qps": knee, "reason": reason}
+        knee = p["offered_qps"]
+
+    return {"saturation_qps": None, "knee_qps": knee, "reason": None}
+
+
+def clinical_prompts(strategy: str = "baseline") -> List[str]:
+    """Prompts de CASOS_CLINICOS con una estrategia de experiment_runner_v3."""
+    from experiment_runner_v3 import CASOS_CLINICOS, PROMPT_STRATEGIES
+    template = PROMPT_STRATEGIES[strategy]["template"]
+    return [template.format(text=caso["texto"]) for caso in CASOS_CLINICOS.values()]
+
+
+# =============================================================================
+# MAIN
+# =============================================================================
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Generador de carga de lazo abierto")
+    parser.add_argument("--host", default="localhost", help="Host del servidor llama.cpp")
+    parser.add_argument("--port", type=int, default=8080, help="Puerto del servidor")
+    parser.add_argument("--rates", default="0.05,0.1,0.2,0.4,0.8",
+                        help="Tasas de llegada a barrer (QPS, separadas por comas)")
+    parser.add_argument("--duration", type=float, default=DEFAULT_DURATION_S,
+                        help="Segundos de carga por tasa")
+    parser.add_argument("--arrival", choices=ARRIVALS, default="poisson",
+                        help="Proceso de llegadas")
+    parser.add_argument("--prompt", default="baseline", help="Estrategia de prompting")
+    parser.add_argument("--knee-factor", type=float, default=DEFAULT_KNEE_FACTOR,
+                        help="p95 / p95 a baja carga que marca saturación")
+    parser.add_argument("--full-sweep", action="store_true",
+                        help="No detener el barrido en la primera tasa saturada")
+    parser.add_argument("--max-in-flight", type=int, default=DEFAULT_MAX_IN_FLIGHT,
+                        help="Máximo de requests simultáneos del cliente")
+    parser.add_argument("--seed", type=int, default=None, help="Semilla de las llegadas")
+    parser.add_argument("--output", default="results", help="Directorio de salida")
+    args = parser.parse_args()
+
+    rates = [float(r) for r in args.rates.split(",") if r.strip()]
+
+    # El pool de conexiones no debe limitar los requests en vuelo
+    configure_transport(pool_size=args.max_in_flight)
+
+    print("=" * 70)
+    print("  GENERADOR DE CARGA - Curva QPS / Latencia")
+    print("  Universidad de Montevideo - Tesis 2025")
+    print("=" * 70)
+    print(f"  Host: {args.host}:{args.port}")
+    print(f"  Tasas: {rates} QPS ({args.arrival})")
+    print("=" * 70)
+
+    generator = LoadGenerator(clinical_prompts(args.prompt), args.host, args.port,
+                              max_in_flight=args.max_in_flight, seed=args.seed)
+    result = generator.sweep(rates, args.duration, args.arrival, args.knee_factor,
+                             stop_after_saturation=not args.full_sweep)
+
+    print(f"\n  Rodilla (máxima tasa sostenida): {result['knee_qps']} QPS")
+    if result["saturation_qps"] is not None:
+        print(f"  Saturación: {result['saturation_qps']} QPS ({result['reason']})")
+    else:
+        print("  Sin saturación en las tasas barridas")
+
+    output = {
+        "metadata": {
+            "timestamp": datetime.now().isoformat(),
+            "host": args.host,
+            "port": args.port,
+            "prompt": args.prompt,
+            "seed": args.seed
+        },
+        "load_sweep": result
+    }
+    output_dir = Path(args.output)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    output_file = output_dir / f"load_sweep_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    with open(output_file, "w", encoding="utf-8") as f:
+        json.dump(output, f, indent=2, ensure_ascii=False)
+    print(f"\n  Resultados guardados en: {output_file}")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,11 +5,17 @@ Metrics module - Métricas de rendimiento y calidad para benchmark.
 from .performance_metrics import (
     InferenceMetrics,
     BenchmarkResult,
-    calculate_tps,
-    measure_latency_stats,
+    parse_llama_cpp_timings,
+    calculate_benchmark_stats,
+    add_confidence_intervals,
+    StreamingBenchmarkStats,
+    calculate_speedup,
+    calculate_throughput_qps,
+    summarize_token_arrivals,
+    apply_stream_arrivals,
     get_system_resources,
-    GPU_REFERENCE_BENCHMARKS,
-    print_benchmark_summary
+    GPU_REFERENCE_DATA,
+    format_benchmark_report
 )
 
 from .quality_metrics import (
@@ -25,15 +31,36 @@ from .quality_metrics import (
     print_metrics_summary
 )
 
+from .levenshtein import (
+    dissimilarity_at_least,
+    levenshtein_batch
+)
+
+from .quantile_sketch import QuantileSketch, percentile
+from .leak_scanner import find_leaks
+from .partial_leaks import find_partial_leaks
+from .span_alignment import evaluate_spans, align_placeholders
+from .bootstrap import bootstrap_ci, bootstrap_metrics, bootstrap_difference, bootstrap_ratio, compare_groups
+from .regression import mann_whitney, check_regression, compare_benchmark_results
+from .resource_sampler import ResourceSampler, configure_resource_sampler, resource_phase
+from .numa import NumaCollector, attach_numa
+from .server_metrics import ServerMetricsCollector, parse_prometheus
+
 __all__ = [
     # Performance
     "InferenceMetrics",
     "BenchmarkResult",
-    "calculate_tps",
-    "measure_latency_stats",
+    "parse_llama_cpp_timings",
+    "calculate_benchmark_stats",
+    "add_confidence_intervals",
+    "StreamingBenchmarkStats",
+    "calculate_speedup",
+    "calculate_throughput_qps",
+    "summarize_token_arrivals",
+    "apply_stream_arrivals",
     "get_system_resources",
-    "GPU_REFERENCE_BENCHMARKS",
-    "print_benchmark_summary",
+    "GPU_REFERENCE_DATA",
+    "format_benchmark_report",
     # Quality
     "QualityMetrics",
     "AnonymizationEvaluator",
@@ -44,5 +71,34 @@ __all__ = [
     "calculate_lrqi",
     "levenshtein_distance",
     "levenshtein_similarity",
-    "print_metrics_summary"
+    "print_metrics_summary",
+    # Levenshtein
+    "dissimilarity_at_least",
+    "levenshtein_batch",
+    "QuantileSketch",
+    "percentile",
+    # Fugas
+    "find_leaks",
+    "find_partial_leaks",
+    # Alineamiento
+    "evaluate_spans",
+    "align_placeholders",
+    # Intervalos de confianza
+    "bootstrap_ci",
+    "bootstrap_metrics",
+    "bootstrap_difference",
+    "bootstrap_ratio",
+    "compare_groups",
+    # Regresiones
+    "mann_whitney",
+    "check_regression",
+    "compare_benchmark_results",
+    # Recursos
+    "ResourceSampler",
+    "configure_resource_sampler",
+    "resource_phase",
+    "NumaCollector",
+    "attach_numa",
+    "ServerMetricsCollector",
+    "parse_prometheus"
 ]
@@ -0,0 +1,379 @@
+#!/usr/bin/env python3
+"""
+bootstrap.py - Intervalos de confianza bootstrap para métricas de benchmark
+Universidad de Montevideo - Tesis 2025
+
+run_prompt_comparison ordena estrategias por la media de recall sobre tres
+casos y calculate_benchmark_stats reporta TPS medios sin incertidumbre:
+con tan pocas muestras, dos prompts o modelos con medias distintas pueden
+no ser realmente distintos.
+
+Este módulo estima intervalos de confianza percentil por bootstrap para
+la media de cualquier métrica (TPS, latencia, precision, recall, F1, LRDI,
+LRQI):
+
+- Vectorizado: con NumPy, los B remuestreos son una matriz de pesos
+  multinomiales (B x k) y todas las medias salen de un producto matricial;
+  2000 remuestreos de decenas de casos toman milisegundos. Sin NumPy se
+  usa una implementación en Python puro con el mismo resultado esperado
+- Por caso: con varias iteraciones por caso, las iteraciones de un mismo
+  caso están correlacionadas; con `clusters` se remuestrean casos enteros
+  (bootstrap por conglomerados) en lugar de filas sueltas
+- Varias métricas a la vez: bootstrap_metrics usa los mismos remuestreos
+  para todas, como filas de la misma tabla
+- Comparaciones: bootstrap_difference da el IC de la diferencia de medias
+  (pareada por caso cuando ambos grupos evaluaron los mismos casos),
+  bootstrap_ratio el del cociente (speedup MMA vs baseline) y
+  compare_groups marca los grupos que no se distinguen del mejor
+
+Uso:
+    from metrics.bootstrap import bootstrap_ci, compare_groups
+
+    ci = bootstrap_ci([0.91, 0.88, 0.95])
+    print(ci.format(3))             # 0.913 [0.880, 0.950]
+    ranking = compare_groups({"detailed": recall_a, "few_shot": recall_b},
+                             clusters={"detailed": casos_a, "few_shot": casos_b})
+"""
+
+import random
+from dataclasses import dataclass
+from typing import Dict, Hashable, List, Optional, Sequence, Tuple
+
+from metrics.quantile_sketch import percentile
+
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
+
+# =============================================================================
+# CONFIGURACIÓN
+# =============================================================================
+
+DEFAULT_RESAMPLES = 2000
+DEFAULT_CONFIDENCE = 0.95
+DEFAULT_SEED = 2025             # Reportes reproducibles entre corridas
+
+
+# =============================================================================
+# DATACLASSES
+# =============================================================================
+
+@dataclass
+class ConfidenceInterval:
+    """Media de una métrica con su intervalo de confianza bootstrap."""
+    estimate: float
+    low: float
+    high: float
+    n: int                          # Muestras (filas)
+    clusters: int = 0               # Unidades remuestreadas (casos o filas)
+    confidence: float = DEFAULT_CONFIDENCE
+
+    @property
+    def width(self) -> float:
+        return self.high - self.low
+
+    def contains(self, value: float) -> bool:
+        return self.low <= value <= self.high
+
+    def format(self, digits: int = 2) -> str:
+        """'media [low, high]' para tablas."""
+        return f"{self.estimate:.{digits}f} [{self.low:.{digits}f}, {self.high:.{digits}f}]"
+
+    def to_dict(self, digits: int = 4) -> Dict:
+        return {
+            "estimate": round(self.estimate, digits),
+            "low": round(self.low, digits),
+            "high": round(self.high, digits),
+            "n": self.n,
+            "clusters": self.clusters,
+            "confidence": self.confidence
+        }
+
+
+@dataclass
+class MeanDifference:
+    """IC de la diferencia de medias a - b."""
+    ci: ConfidenceInterval
+    paired: bool
+
+    @property
+    def significant(self) -> bool:
+        """True si el intervalo excluye el 0 (las medias son distintas)."""
+        return not self.ci.contains(0.0)
+
+    def to_dict(self, digits: int = 4) -> Dict:
+        return {**self.ci.to_dict(digits), "paired": self.paired, "significant": self.significant}
+
+
+# =============================================================================
+# REMUESTREO
+# =============================================================================
+
+def _cluster_totals(values: Sequence[float], clusters: Optional[Sequence[Hashable]]
+                    ) -> Tuple[List[Hashable], Dict[Hashable, float], Dict[Hashable, int]]:
+    """Suma y cantidad de filas por conglomerado (cada fila es uno sin clusters)."""
+    labels = list(clusters) if clusters is not None else list(range(len(values)))
+    if len(labels) != len(values):
+        raise ValueError("clusters debe tener un elemento por valor")
+    sums: Dict[Hashable, float] = {}
+    counts: Dict[Hashable, int] = {}
+    for label, value in zip(labels, values):
+        sums[label] = sums.get(label, 0.0) + float(value)
+        counts[label] = counts.get(label, 0) + 1
+    return list(sums), sums, counts
+
+
+def _resampled_means(sums: List[List[float]], counts: List[List[int]],
+                     n_resamples: int, seed: Optional[int]):
+    """
+    Medias de cada columna en n_resamples remuestreos de las k filas.
+
+    sums[i][j] y counts[i][j] son la suma y cantidad de valores de la
+    métrica j en el conglomerado i; la media remuestreada es
+    sum(w_i * sums_ij) / sum(w_i * counts_ij) con w ~ Multinomial(k, 1/k).
+
+    Returns:
+        Lista por columna de las n_resamples medias
+    """
+    k = len(sums)
+    if HAS_NUMPY:
+        rng = np.random.default_rng(seed)
+        weights = rng.multinomial(k, np.full(k, 1.0 / k), size=n_resamples)
+        means = (weights @ np.asarray(sums, dtype=float)) / (weights @ np.asarray(counts, dtype=float))
+        return [means[:, j] for j in range(means.shape[1])]
+
+    rng = random.Random(seed)
+    columns = len(sums[0])
+    result: List[List[float]] = [[] for _ in range(columns)]
+    population = range(k)
+    for _ in range(n_resamples):
+        picks = rng.choices(population, k=k)
+        for j in range(columns):
+            total = sum(sums[i][j] for i in picks)
+            size = sum(counts[i][j] for i in picks)
+            result[j].append(total / size)
+    return result
+
+
+def _interval(resampled, estimate: float, n: int, clusters: int,
+              confidence: float) -> ConfidenceInterval:
+    alpha = (1 - confidence) / 2
+    if HAS_NUMPY:
+        low, high = np.quantile(resampled, [alpha, 1 - alpha])
+    else:
+        ordered = sorted(resampled)
+        low, high = percentile(ordered, alpha), percentile(ordered, 1 - alpha)
+    return ConfidenceInterval(estimate, float(low), float(high), n, clusters, confidence)
+
+
+def _degenerate(values: Sequence[float], clusters: int, confidence: float) -> ConfidenceInterval:
+    """Sin variabilidad que remuestrear (0 o 1 conglomerado)."""
+    estimate = sum(values) / len(values) if values else 0.0
+    return ConfidenceInterval(estimate, estimate, estimate, len(values), clusters, confidence)
+
+
+# =============================================================================
+# API
+# =============================================================================
+
+def bootstrap_metrics(
+    samples: Dict[str, Sequence[float]],
+    clusters: Optional[Sequence[Hashable]] = None,
+    n_resamples: int = DEFAULT_RESAMPLES,
+    confidence: float = DEFAULT_CONFIDENCE,
+    seed: Optional[int] = DEFAULT_SEED
+) -> Dict[str, ConfidenceInterval]:
+    """
+    IC de la media de varias métricas medidas sobre las mismas filas.
+
+    Args:
+        samples: {métrica: valores}, todas con una fila por resultado
+        clusters: Caso de cada fila; si se da, se remuestrean casos
+        n_resamples: Remuestreos bootstrap
+        confidence: Nivel de confianza (0.95 -> percentiles 2.5 y 97.5)
+        seed: Semilla (None para no fijarla)
+
+    Returns:
+        {métrica: ConfidenceInterval}
+    """
+    names = list(samples)
+    if not names:
+        return {}
+    n = len(samples[names[0]])
+    if any(len(samples[name]) != n for name in names):
+        raise ValueError("Todas las métricas deben tener la misma cantidad de filas")
+
+    labels = list(clusters) if clusters is not None else list(range(n))
+    per_metric = [_cluster_totals(samples[name], labels) for name in names]
+    order = per_metric[0][0]
+    if len(order) < 2:
+        return {name: _degenerate(list(samples[name]), len(order), confidence) for name in names}
+
+    sums = [[totals[1][label] for totals in per_metric] for label in order]
+    counts = [[totals[2][label] for totals in per_metric] for label in order]
+    resampled = _resampled_means(sums, counts, n_resamples, seed)
+    return {
+        name: _interval(resampled[j], sum(samples[name]) / n, n, len(order), confidence)
+        for j, name in enumerate(names)
+    }
+
+
+def bootstrap_ci(
+    values: Sequence[float],
+    clusters: Optional[Sequence[Hashable]] = None,
+    n_resamples: int = DEFAULT_RESAMPLES,
+    confidence: float = DEFAULT_CONFIDENCE,
+    seed: Optional[int] = DEFAULT_SEED
+) -> ConfidenceInterval:
+    """IC bootstrap de la media de una métrica."""
+    return bootstrap_metrics({"value": values}, clusters, n_resamples, confidence, seed)["value"]
+
+
+def _resampled_pair(
+    a: Sequence[float],
+    b: Sequence[float],
+    clusters_a: Optional[Sequence[Hashable]],
+    clusters_b: Optional[Sequence[Hashable]],
+    n_resamples: int,
+    seed: Optional[int]
+):
+    """
+    Medias remuestreadas de a y b, pareadas por caso si ambos traen los
+    mismos clusters.
+
+    Returns:
+        (means_a, means_b, paired, clusters); means_a es None si no hay
+        variabilidad que remuestrear
+    """
+    labels_a, sums_a, counts_a = _cluster_totals(a, clusters_a)
+    labels_b, sums_b, counts_b = _cluster_totals(b, clusters_b)
+    paired = (clusters_a is not None and clusters_b is not None
+              and set(labels_a) == set(labels_b))
+
+    if paired:
+        if len(labels_a) < 2:
+            return None, None, True, len(labels_a)
+        sums = [[sums_a[label], sums_b[label]] for label in labels_a]
+        counts = [[counts_a[label], counts_b[label]] for label in labels_a]
+        means_a, means_b = _resampled_means(sums, counts, n_resamples, seed)
+        return means_a, means_b, True, len(labels_a)
+
+    if len(labels_a) < 2 and len(labels_b) < 2:
+        return None, None, False, 0
+    means_a = _resampled_means([[sums_a[label]] for label in labels_a],
+                               [[counts_a[label]] for label in labels_a], n_resamples, seed)[0]
+    means_b = _resampled_means([[sums_b[label]] for label in labels_b],
+                               [[counts_b[label]] for label in labels_b], n_resamples,
+                               None if seed is None else seed + 1)[0]
+    return means_a, means_b, False, len(labels_a) + len(labels_b)
+
+
+def bootstrap_difference(
+    a: Sequence[float],
+    b: Sequence[float],
+    clusters_a: Optional[Sequence[Hashable]] = None,
+    clusters_b: Optional[Sequence[Hashable]] = None,
+    n_resamples: int = DEFAULT_RESAMPLES,
+    confidence: float = DEFAULT_CONFIDENCE,
+    seed: Optional[int] = DEFAULT_SEED
+) -> MeanDifference:
+    """
+    IC de la diferencia de medias a - b.
+
+    Si ambos grupos traen clusters con los mismos casos, el bootstrap es
+    pareado: cada remuestreo elige casos y compara a y b sobre esos mismos
+    casos, lo que descuenta la dificultad propia de cada caso. Si no, los
+    grupos se remuestrean de forma independiente.
+    """
+    estimate = (sum(a) / len(a) if a else 0.0) - (sum(b) / len(b) if b else 0.0)
+    if not a or not b:
+        return MeanDifference(ConfidenceInterval(estimate, estimate, estimate, 0), False)
+
+    means_a, means_b, paired, clusters = _resampled_pair(a, b, clusters_a, clusters_b,
+                                                         n_resamples, seed)
+    if means_a is None:
+        return MeanDifference(ConfidenceInterval(estimate, estimate, estimate,
+                                                 len(a) + len(b), clusters), paired)
+
+    if HAS_NUMPY:
+        differences = means_a - means_b
+    else:
+        differences = [x - y for x, y in zip(means_a, means_b)]
+    ci = _interval(differences, estimate, len(a) + len(b), clusters, confidence)
+    return MeanDifference(ci, paired)
+
+
+def bootstrap_ratio(
+    a: Sequence[float],
+    b: Sequence[float],
+    clusters_a: Optional[Sequence[Hashable]] = None,
+    clusters_b: Optional[Sequence[Hashable]] = None,
+    n_resamples: int = DEFAULT_RESAMPLES,
+    confidence: float = DEFAULT_CONFIDENCE,
+    seed: Optional[int] = DEFAULT_SEED
+) -> ConfidenceInterval:
+    """
+    IC del cociente de medias a / b, p. ej. el speedup TPS_MMA / TPS_baseline.
+
+    Con los mismos clusters en ambos grupos (un id por par de requests
+    intercalados, o por caso) el remuestreo es pareado, como en
+    bootstrap_difference. Los remuestreos con media de b nula se descartan.
+    """
+    mean_b = sum(b) / len(b) if b else 0.0
+    estimate = (sum(a) / len(a)) / mean_b if a and mean_b > 0 else 0.0
+    if not a or not b:
+        return ConfidenceInterval(estimate, estimate, estimate, 0)
+
+    means_a, means_b, _, clusters = _resampled_pair(a, b, clusters_a, clusters_b,
+                                                    n_resamples, seed)
+    if means_a is None:
+        return ConfidenceInterval(estimate, estimate, estimate, len(a) + len(b), clusters, confidence)
+
+    ratios = [x / y for x, y in zip(means_a, means_b) if y > 0]
+    if not ratios:
+        return ConfidenceInterval(estimate, estimate, estimate, len(a) + len(b), clusters, confidence)
+    return _interval(ratios, estimate, len(a) + len(b), clusters, confidence)
+
+
+def compare_groups(
+    groups: Dict[str, Sequence[float]],
+    clusters: Optional[Dict[str, Sequence[Hashable]]] = None,
+    higher_is_better: bool = True,
+    n_resamples: int = DEFAULT_RESAMPLES,
+    confidence: float = DEFAULT_CONFIDENCE,
+    seed: Optional[int] = DEFAULT_SEED
+) -> List[Dict]:
+    """
+    Ordena grupos (modelos, prompts) por la media de una métrica y marca
+    cuáles no se distinguen del mejor.
+
+    Returns:
+        Lista ordenada de {"name", "ci", "difference", "tied_with_best"};
+        "difference" es el IC de la ventaja del mejor sobre el grupo
+        (None para el mejor)
+    """
+    clusters = clusters or {}
+    intervals = {
+        name: bootstrap_ci(values, clusters.get(name), n_resamples, confidence, seed)
+        for name, values in groups.items() if values
+    }
+    ordered = sorted(intervals, key=lambda name: intervals[name].estimate, reverse=higher_is_better)
+    if not ordered:
+        return []
+
+    best = ordered[0]
+    ranking = [{"name": best, "ci": intervals[best], "difference": None, "tied_with_best": True}]
+    for name in ordered[1:]:
+        first, second = (best, name) if higher_is_better else (name, best)
+        difference = bootstrap_difference(groups[first], groups[second],
+                                          clusters.get(first), clusters.get(second),
+                                          n_resamples, confidence, seed)
+        ranking.append({
+            "name": name,
+            "ci": intervals[name],
+            "difference": difference,
+            "tied_with_best": not difference.significant
+        })
+    return ranking
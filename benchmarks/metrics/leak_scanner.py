@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+leak_scanner.py - Detección de fugas de PHI por caso
+Universidad de Montevideo - Tesis 2025
+
+Las métricas de calidad (calculate_standard_metrics, calculate_lrdi,
+calculate_lrqi, experiment_runner_v3.calculate_quality_metrics,
+evaluar_anonimizacion, evaluar_resultado) verificaban cada entidad con
+`valor in texto_anonimizado`: una pasada sobre la salida por entidad y por
+función.
+
+Este módulo arma un scanner con los valores ground truth de cada caso
+(cache por id de caso) que encuentra todos los valores escapados con sus
+posiciones, y memoiza la última salida escaneada para que varias métricas
+sobre el mismo texto no la recorran de nuevo.
+
+Con pocas entidades (todos los casos del repo) cada valor se busca con
+str.find, que recorre el texto en C: ~0.03 ms con 10 valores sobre 5K
+caracteres. Un autómata Aho-Corasick hace una sola pasada pero carácter a
+carácter en Python (~0.9 ms); recién compensa desde AUTOMATON_MIN_VALUES
+valores, y solo entonces se compila.
+
+Uso:
+    from metrics.leak_scanner import find_leaks
+
+    leaks = find_leaks(texto_anonimizado, caso["entidades"], case_id="A1")
+    # {"3.847.291-6": [112], "Montevideo": [160, 402]}
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# =============================================================================
+# CONFIGURACIÓN
+# =============================================================================
+
+MAX_CACHED_SCANNERS = 1024
+AUTOMATON_MIN_VALUES = 500      # Cruce medido: str.find por valor vs. autómata en Python
+
+
+# =============================================================================
+# AUTÓMATA
+# =============================================================================
+
+class LeakAutomaton:
+    """Autómata Aho-Corasick sobre un conjunto fijo de valores PHI."""
+
+    def __init__(self, values: Iterable[str]):
+        # Valores únicos no vacíos, en orden de aparición
+        self.values: List[str] = list(dict.fromkeys(v for v in values if v))
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[Tuple[int, ...]] = [()]
+
+        for index, value in enumerate(self.values):
+            self._insert(value, index)
+        self._build_failure_links()
+
+    def _insert(self, value: str, index: int):
+        state = 0
+        for c in value:
+            nxt = self._goto[state].get(c)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][c] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(())
+            state = nxt
+        self._out[state] = self._out[state] + (index,)
+
+    def _build_failure_links(self):
+        """BFS: cada estado hereda las salidas de su enlace de falla."""
+        queue = list(self._goto[0].values())
+        head = 0
+        while head < len(queue):
+            state = queue[head]
+            head += 1
+            for c, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fail = self._fail[state]
+                while fail and c not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(c, 0)
+                self._fail[nxt] = target if target != nxt else 0
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def scan(self, text: str) -> Dict[str, List[int]]:
+        """
+        Busca todos los valores en una pasada.
+
+        Returns:
+            {valor: [offsets de inicio]} solo para los valores presentes
+        """
+        goto, fail, out, values = self._goto, self._fail, self._out, self.values
+        root = goto[0]
+        found: Dict[str, List[int]] = {}
+        state = 0
+        for pos, c in enumerate(text):
+            if state == 0:
+                state = root.get(c, 0)
+                if state == 0:
+                    continue
+            else:
+                while state and c not in goto[state]:
+                    state = fail[state]
+                state = goto[state].get(c, 0)
+            for index in out[state]:
+                value = values[index]
+                found.setdefault(value, []).append(pos - len(value) + 1)
+
+        for positions in found.values():
+            positions.sort()
+        return found
+
+
+class LeakScanner:
+    """
+    Valores PHI de un caso: str.find por valor o, desde
+    AUTOMATON_MIN_VALUES valores, LeakAutomaton.
+    """
+
+    def __init__(self, values: Iterable[str]):
+        # Valores únicos no vacíos, en orden de aparición
+        self.values: List[str] = list(dict.fromkeys(v for v in values if v))
+        self._automaton = LeakAutomaton(self.values) if len(self.values) >= AUTOMATON_MIN_VALUES else None
+        self._last: Tuple[Optional[str], Dict[str, List[int]]] = (None, {})
+
+    def _find_all(self, text: str) -> Dict[str, List[int]]:
+        found: Dict[str, List[int]] = {}
+        for value in self.values:
+            pos = text.find(value)
+            while pos >= 0:
+                found.setdefault(value, []).append(pos)
+                pos = text.find(value, pos + 1)
+        return found
+
+    def scan(self, text: str) -> Dict[str, List[int]]:
+        """
+        Busca todos los valores (también apariciones superpuestas).
+
+        Returns:
+            {valor: [offsets de inicio]} solo para los valores presentes;
+            cada llamada recibe su propia copia
+        """
+        last_text, last_result = self._last
+        if last_text is None or last_text != text:
+            last_result = self._automaton.scan(text) if self._automaton else self._find_all(text)
+            self._last = (text, last_result)
+        return {value: list(positions) for value, positions in last_result.items()}
+
+    def leaked(self, text: str) -> List[str]:
+        """Valores presentes en el texto, en el orden de las entidades."""
+        found = self.scan(text)
+        return [v for v in self.values if v in found]
+
+
+# =============================================================================
+# CACHE POR CASO
+# =============================================================================
+
+_scanners: "OrderedDict[object, Tuple[Tuple[str, ...], LeakScanner]]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def get_leak_scanner(entities: List[Dict], case_id: Optional[str] = None,
+                     value_key: str = "value") -> LeakScanner:
+    """
+    Scanner para las entidades de un caso, armado una sola vez.
+
+    Se cachea por case_id (o por el conjunto de valores si no hay id); si
+    las entidades de un id cambian, se rearma.
+    """
+    fingerprint = tuple(e.get(value_key, "") for e in entities)
+    key = case_id if case_id else fingerprint
+    with _lock:
+        cached = _scanners.get(key)
+        if cached is not None and cached[0] == fingerprint:
+            _scanners.move_to_end(key)
+            return cached[1]
+
+    scanner = LeakScanner(fingerprint)
+    with _lock:
+        _scanners[key] = (fingerprint, scanner)
+        _scanners.move_to_end(key)
+        while len(_scanners) > MAX_CACHED_SCANNERS:
+            _scanners.popitem(last=False)
+    return scanner
+
+
+def find_leaks(text: str, entities: List[Dict], case_id: Optional[str] = None,
+               value_key: str = "value") -> Dict[str, List[int]]:
+    """Valores de entidades que siguen en el texto, con sus offsets."""
+    return get_leak_scanner(entities, case_id, value_key).scan(text)
+
+
+def clear_leak_scanners():
+    """Descarta los scanners cacheados."""
+    with _lock:
+        _scanners.clear()
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+levenshtein.py - Distancia de Levenshtein bit-paralela
+Universidad de Montevideo - Tesis 2025
+
+Núcleo compartido por quality_metrics y experiment_runner_v3 (ALID, LR).
+La versión anterior era la programación dinámica fila por fila, O(n·m) en
+Python puro con una lista nueva por fila: segundos para una nota completa
+como la evolución de CTI.
+
+Implementa el algoritmo bit-paralelo de Myers (1999), en la formulación de
+Hyyrö para distancia global: cada columna de la matriz se representa como
+vectores de bits sobre enteros de Python (de largo arbitrario), de modo
+que el costo es O(n) operaciones sobre enteros de m bits.
+
+- Prefijos y sufijos comunes se descartan antes de empezar
+- max_distance acota el cálculo: si la distancia supera la cota se
+  corta temprano (LR solo necesita saber si se cruza el umbral)
+- La API por lotes reutiliza la tabla de bits de cada original
+
+Uso:
+    from metrics.levenshtein import levenshtein_distance, levenshtein_batch
+
+    d = levenshtein_distance(original, anonimizado)
+    sims = levenshtein_batch(pares, similarity=True)
+"""
+
+import math
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+
+# =============================================================================
+# NÚCLEO BIT-PARALELO
+# =============================================================================
+
+def _pattern_bits(pattern: str) -> Dict[str, int]:
+    """Peq: para cada carácter, máscara de sus posiciones en el patrón."""
+    peq: Dict[str, int] = {}
+    bit = 1
+    for c in pattern:
+        peq[c] = peq.get(c, 0) | bit
+        bit <<= 1
+    return peq
+
+
+def _strip_common(s1: str, s2: str) -> Tuple[str, str]:
+    """Descarta prefijo y sufijo común (no cambian la distancia)."""
+    start = 0
+    limit = min(len(s1), len(s2))
+    while start < limit and s1[start] == s2[start]:
+        start += 1
+    end1, end2 = len(s1), len(s2)
+    while end1 > start and end2 > start and s1[end1 - 1] == s2[end2 - 1]:
+        end1 -= 1
+        end2 -= 1
+    return s1[start:end1], s2[start:end2]
+
+
+def _myers(pattern: str, text: str, peq: Dict[str, int],
+           max_distance: Optional[int] = None) -> int:
+    """
+    Distancia entre pattern (m bits) y text, procesando text columna a columna.
+
+    Con max_distance retorna max_distance + 1 apenas la distancia final no
+    puede quedar dentro de la cota: tras j columnas score = D[m][j] y cada
+    columna restante la reduce a lo sumo en 1.
+    """
+    m = len(pattern)
+    if m == 0:
+        return len(text)
+    mask = (1 << m) - 1
+    high = 1 << (m - 1)
+    pv = mask
+    mv = 0
+    score = m
+    remaining = len(text)
+
+    for c in text:
+        eq = peq.get(c, 0)
+        xv = eq | mv
+        xh = ((((eq & pv) + pv) & mask) ^ pv) | eq
+        ph = (mv | ~(xh | pv)) & mask
+        mh = pv & xh
+        if ph & high:
+            score += 1
+        elif mh & high:
+            score -= 1
+        ph = ((ph << 1) | 1) & mask
+        mh = (mh << 1) & mask
+        pv = (mh | ~(xv | ph)) & mask
+        mv = ph & xv
+
+        remaining -= 1
+        if max_distance is not None and score - remaining > max_distance:
+            return max_distance + 1
+
+    return score
+
+
+# =============================================================================
+# API
+# =============================================================================
+
+def levenshtein_distance(s1: str, s2: str, max_distance: Optional[int] = None) -> int:
+    """
+    Calcula la distancia de Levenshtein entre dos strings.
+
+    La distancia de Levenshtein es el número mínimo de operaciones
+    (inserción, eliminación, sustitución) para transformar s1 en s2.
+
+    Args:
+        s1: Primer string
+        s2: Segundo string
+        max_distance: Cota opcional; si la distancia la supera se retorna
+            max_distance + 1 sin terminar el cálculo
+
+    Returns:
+        Distancia de Levenshtein (entero)
+    """
+    if max_distance is not None and abs(len(s1) - len(s2)) > max_distance:
+        return max_distance + 1
+    s1, s2 = _strip_common(s1, s2)
+    if len(s1) > len(s2):
+        s1, s2 = s2, s1
+    return _myers(s1, s2, _pattern_bits(s1), max_distance)
+
+
+def levenshtein_similarity(s1: str, s2: str) -> float:
+    """
+    Calcula la similitud de Levenshtein normalizada entre dos strings.
+
+    Fórmula: 1 - (distancia / max(len(s1), len(s2)))
+
+    Returns:
+        Valor entre 0 (completamente diferentes) y 1 (idénticos)
+    """
+    if len(s1) == 0 and len(s2) == 0:
+        return 1.0
+    return 1 - (levenshtein_distance(s1, s2) / max(len(s1), len(s2)))
+
+
+def dissimilarity_at_least(s1: str, s2: str, threshold: float) -> bool:
+    """
+    True si 1 - similitud >= threshold (criterio de LR).
+
+    Equivale a distancia >= ceil(threshold * max_len): se calcula con la
+    cota max_distance = ese valor - 1, que corta en cuanto se alcanza.
+    """
+    max_len = max(len(s1), len(s2))
+    if max_len == 0:
+        return threshold <= 0
+    required = math.ceil(threshold * max_len - 1e-9)
+    if required <= 0:
+        return True
+    return levenshtein_distance(s1, s2, max_distance=required - 1) >= required
+
+
+def levenshtein_batch(
+    pairs: Iterable[Tuple[str, str]],
+    max_distance: Optional[int] = None,
+    similarity: bool = False
+) -> List[Union[int, float]]:
+    """
+    Puntúa muchos pares (original, candidato) en una llamada.
+
+    La tabla de bits se construye una vez por original y se reutiliza para
+    todos sus candidatos (p. ej. un valor PHI contra varias salidas).
+
+    Args:
+        pairs: Pares (original, candidato)
+        max_distance: Cota por par (ver levenshtein_distance)
+        similarity: Retornar similitud normalizada en lugar de distancia
+
+    Returns:
+        Lista de distancias (o similitudes) en el orden de los pares
+    """
+    tables: Dict[str, Dict[str, int]] = {}
+    results: List[Union[int, float]] = []
+    for original, candidate in pairs:
+        if max_distance is not None and abs(len(original) - len(candidate)) > max_distance:
+            distance = max_distance + 1
+        elif not original:
+            distance = len(candidate)
+        else:
+            # El original es el patrón: sin recorte de prefijos para poder
+            # reutilizar su tabla
+            peq = tables.get(original)
+            if peq is None:
+                peq = tables[original] = _pattern_bits(original)
+            distance = _myers(original, candidate, peq, max_distance)
+
+        if similarity:
+            max_len = max(len(original), len(candidate))
+            results.append(1.0 if max_len == 0 else 1 - min(distance, max_len) / max_len)
+        else:
+            results.append(distance)
+    return results
@@ -0,0 +1,370 @@
+#!/usr/bin/env python3
+"""
+numa.py - Localidad NUMA del servidor llama.cpp durante un benchmark
+Universidad de Montevideo - Tesis 2025
+
+El Power10 de pruebas tiene dos nodos NUMA, pero el harness nunca mide si
+los hilos de llama.cpp y las páginas del modelo quedan en el mismo nodo:
+una caída de TPS puede venir de tráfico entre nodos sin que nada lo
+muestre.
+
+NumaCollector toma, durante una ventana del benchmark:
+
+- /sys/devices/system/node/node*/numastat al inicio y al final: deltas de
+  numa_hit/numa_miss/local_node/other_node por nodo (asignaciones de
+  páginas servidas desde el nodo local o uno remoto, de todo el sistema)
+- /proc/<pid>/numa_maps al final: páginas del proceso por nodo, separando
+  las del archivo del modelo (.gguf mapeado con mmap) del resto
+- /proc/<pid>/task/*/stat en segundo plano: CPU (y por lo tanto nodo) de
+  cada hilo que está corriendo (estado R) en cada muestra, más la afinidad
+  permitida (Cpus_allowed_list). Los hilos dormidos conservan la última
+  CPU que usaron y no cuentan
+
+Sin contadores de hardware (perf) el kernel no expone los accesos remotos
+reales; la estimación es remote_access_estimate = sum_n fraccion_hilos[n]
+* (1 - fraccion_paginas[n]): la probabilidad de que un hilo toque una
+página de otro nodo si accede a las páginas del proceso de forma
+uniforme. Con un solo nodo todos los ratios son 0.
+
+Uso:
+    from metrics.numa import NumaCollector
+
+    collector = NumaCollector(pid).start()
+    ...                                 # iteraciones del benchmark
+    report = collector.stop()
+    attach_numa(resultado, report)      # dict del runner o BenchmarkResult
+    print(report.remote_access_estimate)
+"""
+
+import os
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+import sys
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from metrics.performance_metrics import BenchmarkResult
+
+# =============================================================================
+# CONFIGURACIÓN
+# =============================================================================
+
+NODE_ROOT = Path("/sys/devices/system/node")
+DEFAULT_INTERVAL_S = 1.0
+MODEL_SUFFIXES = (".gguf", ".bin")      # Mapeos del archivo del modelo en numa_maps
+NUMASTAT_FIELDS = ("numa_hit", "numa_miss", "numa_foreign", "interleave_hit",
+                   "local_node", "other_node")
+
+
+def parse_cpulist(text: str) -> List[int]:
+    """'0-3,8-11' -> [0, 1, 2, 3, 8, 9, 10, 11]."""
+    cpus = []
+    for part in text.strip().split(","):
+        if not part:
+            continue
+        if "-" in part:
+            low, high = part.split("-")
+            cpus.extend(range(int(low), int(high) + 1))
+        else:
+            cpus.append(int(part))
+    return cpus
+
+
+# =============================================================================
+# LECTURA DE /sys Y /proc
+# =============================================================================
+
+def read_topology() -> Dict[int, List[int]]:
+    """{nodo: CPUs}; {} si el sistema no expone nodos NUMA."""
+    topology = {}
+    for path in sorted(NODE_ROOT.glob("node[0-9]*")):
+        try:
+            topology[int(path.name[4:])] = parse_cpulist((path / "cpulist").read_text())
+        except (OSError, ValueError):
+            continue
+    return topology
+
+
+def read_numastat() -> Dict[int, Dict[str, int]]:
+    """Contadores de numastat por nodo."""
+    stats = {}
+    for path in sorted(NODE_ROOT.glob("node[0-9]*")):
+        try:
+            lines = (path / "numastat").read_text().split("\n")
+        except OSError:
+            continue
+        stats[int(path.name[4:])] = {
+            key: int(value) for key, value in (line.split() for line in lines if line.strip())
+        }
+    return stats
+
+
+def read_numa_maps(pid: int) -> Dict[str, Dict[int, int]]:
+    """
+    Páginas residentes por nodo, en KB, de un proceso.
+
+    Returns:
+        {"total": {nodo: kB}, "model": {nodo: kB}} ("model" son los
+        mapeos de archivos MODEL_SUFFIXES)
+    """
+    totals: Counter = Counter()
+    model: Counter = Counter()
+    try:
+        with open(f"/proc/{pid}/numa_maps", "r") as f:
+            lines = f.readlines()
+    except OSError:
+        return {"total": {}, "model": {}}
+
+    for line in lines:
+        fields = line.split()
+        page_kb = 4
+        pages: Dict[int, int] = {}
+        is_model = False
+        for item in fields[2:]:
+            if item.startswith("N") and "=" in item:
+                node, count = item[1:].split("=", 1)
+                pages[int(node)] = int(count)
+            elif item.startswith("kernelpagesize_kB="):
+                page_kb = int(item.split("=", 1)[1])
+            elif item.startswith("file=") and item.endswith(MODEL_SUFFIXES):
+                is_model = True
+        for node, count in pages.items():
+            totals[node] += count * page_kb
+            if is_model:
+                model[node] += count * page_kb
+    return {"total": dict(totals), "model": dict(model)}
+
+
+def read_thread_cpus(pid: int, running_only: bool = True) -> Dict[int, int]:
+    """
+    {tid: CPU} de los hilos de un proceso. Con running_only solo los hilos
+    en estado R (corriendo o listos); el resto conserva la CPU en que corrió
+    por última vez, que no dice dónde trabaja ahora.
+    """
+    cpus = {}
+    try:
+        tasks = os.listdir(f"/proc/{pid}/task")
+    except OSError:
+        return cpus
+    for tid in tasks:
+        try:
+            with open(f"/proc/{pid}/task/{tid}/stat", "r") as f:
+                content = f.read()
+        except OSError:
+            continue
+        fields = content[content.rindex(")") + 2:].split()
+        if running_only and fields[0] != "R":   # Campo 3: state
+            continue
+        cpus[int(tid)] = int(fields[36])     # Campo 39: processor
+    return cpus
+
+
+def read_allowed_cpus(pid: int) -> List[int]:
+    """CPUs en que el proceso puede correr (Cpus_allowed_list)."""
+    try:
+        with open(f"/proc/{pid}/status", "r") as f:
+            for line in f:
+                if line.startswith("Cpus_allowed_list:"):
+                    return parse_cpulist(line.split(":", 1)[1])
+    except OSError:
+        pass
+    return []
+
+
+# =============================================================================
+# REPORTE
+# =============================================================================
+
+def _fractions(counts: Dict[int, float]) -> Dict[int, float]:
+    total = sum(counts.values())
+    return {node: value / total for node, value in counts.items()} if total else {}
+
+
+@dataclass
+class NumaReport:
+    """Localidad NUMA de una ventana del benchmark."""
+    nodes: List[int] = field(default_factory=list)
+    pid: Optional[int] = None
+    duration_s: float = 0.0
+    numastat_delta: Dict[int, Dict[str, int]] = field(default_factory=dict)
+    memory_kb_by_node: Dict[int, int] = field(default_factory=dict)
+    model_kb_by_node: Dict[int, int] = field(default_factory=dict)
+    thread_samples_by_node: Dict[int, int] = field(default_factory=dict)
+    affinity_nodes: List[int] = field(default_factory=list)
+
+    @property
+    def remote_allocation_ratio(self) -> float:
+        """other_node / (local_node + other_node) del sistema en la ventana."""
+        local = sum(d.get("local_node", 0) for d in self.numastat_delta.values())
+        other = sum(d.get("other_node", 0) for d in self.numastat_delta.values())
+        return other / (local + other) if local + other else 0.0
+
+    @property
+    def miss_ratio(self) -> float:
+        """numa_miss / (numa_hit + numa_miss): asignaciones fuera del nodo pedido."""
+        hit = sum(d.get("numa_hit", 0) for d in self.numastat_delta.values())
+        miss = sum(d.get("numa_miss", 0) for d in self.numastat_delta.values())
+        return miss / (hit + miss) if hit + miss else 0.0
+
+    @property
+    def home_node(self) -> Optional[int]:
+        """Nodo donde más corrieron los hilos del servidor."""
+        if not self.thread_samples_by_node:
+            return None
+        return max(self.thread_samples_by_node, key=self.thread_samples_by_node.get)
+
+    @property
+    def cross_node_threads(self) -> bool:
+        return sum(1 for count in self.thread_samples_by_node.values() if count) > 1
+
+    def _remote_estimate(self, memory: Dict[int, int]) -> float:
+        threads = _fractions(self.thread_samples_by_node)
+        pages = _fractions(memory)
+        if not threads or not pages:
+            return 0.0
+        return sum(fraction * (1 - pages.get(node, 0.0)) for node, fraction in threads.items())
+
+    @property
+    def remote_access_estimate(self) -> float:
+        """Fracción esperada de accesos a páginas remotas (acceso uniforme)."""
+        return self._remote_estimate(self.memory_kb_by_node)
+
+    @property
+    def model_remote_access_estimate(self) -> float:
+        """Igual que remote_access_estimate, solo sobre las páginas del modelo."""
+        return self._remote_estimate(self.model_kb_by_node)
+
+    def to_dict(self) -> Dict:
+        return {
+            "nodes": self.nodes,
+            "pid": self.pid,
+            "duration_s": round(self.duration_s, 2),
+            "home_node": self.home_node,
+            "cross_node_threads": self.cross_node_threads,
+            "affinity_nodes": self.affinity_nodes,
+            "remote_allocation_ratio": round(self.remote_allocation_ratio, 4),
+            "miss_ratio": round(self.miss_ratio, 4),
+            "remote_access_estimate": round(self.remote_access_estimate, 4),
+            "model_remote_access_estimate": round(self.model_remote_access_estimate, 4),
+            "memory_mb_by_node": {str(n): round(kb / 1024, 1) for n, kb in self.memory_kb_by_node.items()},
+            "model_mb_by_node": {str(n): round(kb / 1024, 1) for n, kb in self.model_kb_by_node.items()},
+            "thread_samples_by_node": {str(n): c for n, c in self.thread_samples_by_node.items()},
+            "numastat_delta": {str(n): d for n, d in self.numastat_delta.items()}
+        }
+
+
+# =============================================================================
+# COLECTOR
+# =============================================================================
+
+class NumaCollector:
+    """Mide la localidad NUMA de un proceso entre start() y stop()."""
+
+    def __init__(self, pid: Optional[int] = None, interval_s: float = DEFAULT_INTERVAL_S):
+        self.pid = pid
+        self.interval_s = interval_s
+        self.topology = read_topology()
+        self._cpu_node = {cpu: node for node, cpus in self.topology.items() for cpu in cpus}
+        self._thread_samples: Counter = Counter()
+        self._start_stat: Dict[int, Dict[str, int]] = {}
+        self._start_time = 0.0
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def available(self) -> bool:
+        """True si el sistema expone nodos NUMA."""
+        return bool(self.topology)
+
+    def sample_threads(self):
+        """Cuenta en qué nodo está corriendo cada hilo activo del proceso."""
+        if not self.pid:
+            return
+        for cpu in read_thread_cpus(self.pid).values():
+            node = self._cpu_node.get(cpu)
+            if node is not None:
+                self._thread_samples[node] += 1
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval_s):
+            self.sample_threads()
+
+    def start(self) -> "NumaCollector":
+        self._thread_samples.clear()
+        self._start_stat = read_numastat()
+        self._start_time = time.perf_counter()
+        self.sample_threads()
+        if self.pid and self.available:
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, name="numa-collector", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> NumaReport:
+        """Detiene el muestreo y arma el reporte de la ventana."""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.sample_threads()
+
+        end_stat = read_numastat()
+        delta = {
+            node: {key: end_stat[node].get(key, 0) - self._start_stat.get(node, {}).get(key, 0)
+                   for key in NUMASTAT_FIELDS}
+            for node in end_stat
+        }
+        report = NumaReport(
+            nodes=sorted(self.topology),
+            pid=self.pid,
+            duration_s=time.perf_counter() - self._start_time,
+            numastat_delta=delta,
+            thread_samples_by_node=dict(self._thread_samples)
+        )
+        if self.pid:
+            maps = read_numa_maps(self.pid)
+            report.memory_kb_by_node = maps["total"]
+            report.model_kb_by_node = maps["model"]
+            report.affinity_nodes = sorted({self._cpu_node[cpu] for cpu in read_allowed_cpus(self.pid)
+                                            if cpu in self._cpu_node})
+        return report
+
+
+def combine_reports(reports: List[NumaReport]) -> NumaReport:
+    """
+    Une ventanas consecutivas (p. ej. los casos de un modelo): suma los
+    deltas de numastat y las muestras de hilos; las páginas y la afinidad
+    son las de la última ventana.
+    """
+    if not reports:
+        return NumaReport()
+    combined = NumaReport(nodes=reports[-1].nodes, pid=reports[-1].pid,
+                          memory_kb_by_node=reports[-1].memory_kb_by_node,
+                          model_kb_by_node=reports[-1].model_kb_by_node,
+                          affinity_nodes=reports[-1].affinity_nodes)
+    threads: Counter = Counter()
+    for report in reports:
+        combined.duration_s += report.duration_s
+        threads.update(report.thread_samples_by_node)
+        for node, values in report.numastat_delta.items():
+            totals = combined.numastat_delta.setdefault(node, {key: 0 for key in NUMASTAT_FIELDS})
+            for key, value in values.items():
+                totals[key] = totals.get(key, 0) + value
+    combined.thread_samples_by_node = dict(threads)
+    return combined
+
+
+def attach_numa(result: Union[BenchmarkResult, Dict],
+                report: NumaReport) -> Union[BenchmarkResult, Dict]:
+    """
+    Agrega la localidad NUMA de la ventana medida a un BenchmarkResult o al
+    dict de resultados de un runner (clave "numa").
+    """
+    if isinstance(result, dict):
+        result["numa"] = report.to_dict()
+    else:
+        result.numa = report.to_dict()
+    return result
@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+"""
+partial_leaks.py - Detección de fugas parciales y aproximadas de PHI
+Universidad de Montevideo - Tesis 2025
+
+leak_scanner solo detecta valores que sobreviven exactos: si de
+"Roberto Carlos Méndez Aguilar" queda "Méndez Aguilar", la entidad cuenta
+como anonimizada. Este índice, construido una vez por caso, detecta:
+
+- Fugas parciales: apellido solo, calle sin número, parte del nombre
+- Cambios de formato: CI "3.847.291-6" como "38472916", teléfono con
+  otros separadores (se comparan solo los dígitos)
+- Casi-coincidencias: tildes, mayúsculas o un carácter distinto
+  ("Mendez" por "Méndez")
+
+Índices por caso:
+- token normalizado (sin tildes, minúsculas) -> tokens de entidades
+- trigrama de caracteres -> tokens de entidades (casi-coincidencias)
+- dígitos de cada identificador numérico
+
+Cada fragmento candidato se puntúa con el mismo criterio que LR
+(arXiv:2406.00062): la entidad se considera anonimizada solo si el
+ALID entre el valor original y el fragmento sobreviviente es >= umbral
+(lr_threshold de AnonymizationEvaluator).
+
+Uso:
+    from metrics.partial_leaks import find_partial_leaks
+
+    fugas = find_partial_leaks(texto_anonimizado, entidades, case_id="A1")
+"""
+
+import re
+import threading
+import unicodedata
+from collections import OrderedDict, defaultdict
+from dataclasses import dataclass, replace
+from functools import lru_cache
+from typing import Dict, List, Optional, Set, Tuple
+
+from metrics.levenshtein import levenshtein_similarity
+
+# =============================================================================
+# CONFIGURACIÓN
+# =============================================================================
+
+DEFAULT_LR_THRESHOLD = 0.85
+MIN_TOKEN_CHARS = 3             # Tokens más cortos no identifican a nadie
+MIN_DIGITS = 6                  # Largo mínimo de un identificador numérico
+NEAR_MISS_SIMILARITY = 0.8      # Similitud mínima token a token / dígitos sin solapamiento
+MIN_TRIGRAM_OVERLAP = 0.5       # Fracción de trigramas compartidos para verificar
+MAX_CACHED_INDEXES = 1024
+
+# Palabras frecuentes dentro de valores PHI que por sí solas no identifican
+STOPWORDS = {
+    "del", "las", "los", "con", "por", "para", "apto", "avda", "calle",
+    "bulevar", "avenida", "piso", "esq", "esquina", "hospital", "sanatorio",
+    "clinica", "clinicas", "servicio", "centro", "nro", "numero", "dra", "sra",
+    # Dominios de email
+    "com", "net", "org", "gmail", "hotmail", "yahoo", "outlook",
+    # Nombres de placeholders ([NOMBRE], [EMAIL], ...)
+    "nombre", "email", "fecha", "telefono", "direccion", "ubicacion", "registro",
+    "edad", "profesion", "phi"
+}
+
+_WORD = re.compile(r"\w+")
+_DIGIT_RUN = re.compile(r"\d(?:[\s.\-/]?\d)*")
+
+
+@lru_cache(maxsize=4096)
+def _fold_char(c: str) -> str:
+    """Minúscula sin tilde, preservando el largo (1 carácter -> 1 carácter)."""
+    folded = unicodedata.normalize("NFKD", c)[0].lower()
+    return folded[0] if folded else c
+
+
+def fold(text: str) -> str:
+    """Normaliza sin cambiar offsets: 'Méndez' -> 'mendez'."""
+    return "".join(_fold_char(c) for c in text)
+
+
+def _digits(text: str) -> str:
+    return "".join(c for c in text if c.isdigit())
+
+
+def _trigrams(token: str) -> Set[str]:
+    padded = f" {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+# =============================================================================
+# DATACLASSES
+# =============================================================================
+
+@dataclass
+class PartialLeak:
+    """Fragmento de una entidad que sobrevive en la salida."""
+    entity_index: int
+    category: str
+    kind: str                       # 'tokens' | 'digits'
+    start: int                      # Offsets en el texto anonimizado
+    end: int
+    fragment: str
+    alid: float                     # ALID entre el valor original y el fragmento
+
+    def to_dict(self) -> Dict:
+        return {
+            "category": self.category,
+            "kind": self.kind,
+            "span": [self.start, self.end],
+            "fragment": self.fragment,
+            "alid": round(self.alid, 4)
+        }
+
+
+# =============================================================================
+# ÍNDICE
+# =============================================================================
+
+class PartialLeakIndex:
+    """Índice de tokens, trigramas y dígitos de las entidades de un caso."""
+
+    def __init__(self, entities: List[Dict], value_key: str = "value",
+                 lr_threshold: float = DEFAULT_LR_THRESHOLD):
+        self.entities = entities
+        self.value_key = value_key
+        self.lr_threshold = lr_threshold
+        self._folded: List[str] = []
+        self._entity_digits: Dict[int, str] = {}
+        self._token_index: Dict[str, Set[int]] = defaultdict(set)
+        self._trigram_index: Dict[str, Set[str]] = defaultdict(set)
+        self._near_cache: Dict[str, Tuple[str, ...]] = {}
+        self._last: Tuple[Optional[str], frozenset, Dict[int, PartialLeak]] = (None, frozenset(), {})
+
+        for index, entity in enumerate(entities):
+            value = entity.get(value_key, "") or ""
+            self._folded.append(fold(value))
+            digits = _digits(value)
+            if len(digits) >= MIN_DIGITS:
+                # Identificador numérico (CI, teléfono, HC, fecha): solo dígitos;
+                # sus letras ("HC", "CTI") aparecen en cualquier nota
+                self._entity_digits[index] = digits
+                continue
+            for token in _WORD.findall(self._folded[-1]):
+                if len(token) < MIN_TOKEN_CHARS or token in STOPWORDS or token.isdigit():
+                    continue
+                if token not in self._token_index:
+                    for gram in _trigrams(token):
+                        self._trigram_index[gram].add(token)
+                self._token_index[token].add(index)
+
+    # -------------------------------------------------------------------------
+    # Tokens
+    # -------------------------------------------------------------------------
+
+    def _near_tokens(self, token: str) -> Tuple[str, ...]:
+        """Tokens de entidades casi iguales a token (trigramas + Levenshtein)."""
+        cached = self._near_cache.get(token)
+        if cached is not None:
+            return cached
+        grams = _trigrams(token)
+        shared: Dict[str, int] = defaultdict(int)
+        for gram in grams:
+            for candidate in self._trigram_index.get(gram, ()):
+                shared[candidate] += 1
+        near = tuple(
+            candidate for candidate, count in shared.items()
+            if count >= MIN_TRIGRAM_OVERLAP * len(grams)
+            and levenshtein_similarity(token, candidate) >= NEAR_MISS_SIMILARITY
+        )
+        self._near_cache[token] = near
+        return near
+
+    def _token_leaks(self, text: str, folded: str) -> List[PartialLeak]:
+        # Tokens de la salida que coinciden con tokens de cada entidad
+        hits: Dict[int, List[Tuple[int, int, int]]] = defaultdict(list)
+        for position, match in enumerate(_WORD.finditer(folded)):
+            token = match.group()
+            if len(token) < MIN_TOKEN_CHARS or token in STOPWORDS or token.isdigit():
+                continue
+            entity_ids = set(self._token_index.get(token, ()))
+            if not entity_ids and len(token) > MIN_TOKEN_CHARS:
+                for near in self._near_tokens(token):
+                    entity_ids |= self._token_index[near]
+            for entity_id in entity_ids:
+                hits[entity_id].append((position, match.start(), match.end()))
+
+        # Todos los spans candidatos: scan decide a qué entidad corresponde cada uno
+        leaks = []
+        for entity_id, tokens in hits.items():
+            for start, end in _runs(tokens):
+                alid = 1 - levenshtein_similarity(self._folded[entity_id], folded[start:end])
+                if alid < self.lr_threshold:
+                    leaks.append(PartialLeak(entity_id, self._category(entity_id), "tokens",
+                                             start, end, text[start:end], alid))
+        return leaks
+
+    # -------------------------------------------------------------------------
+    # Dígitos
+    # -------------------------------------------------------------------------
+
+    def _digit_leaks(self, text: str) -> List[PartialLeak]:
+        if not self._entity_digits:
+            return []
+        leaks = []
+        for match in _DIGIT_RUN.finditer(text):
+            run = _digits(match.group())
+            if len(run) < MIN_DIGITS:
+                continue
+            for entity_id, digits in self._entity_digits.items():
+                similarity = levenshtein_similarity(digits, run)
+                overlaps = digits in run or run in digits
+                if not overlaps and similarity < NEAR_MISS_SIMILARITY:
+                    continue
+                alid = 1 - similarity
+                if alid < self.lr_threshold:
+                    leaks.append(PartialLeak(entity_id, self._category(entity_id), "digits",
+                                             match.start(), match.end(), match.group(), alid))
+        return leaks
+
+    # -------------------------------------------------------------------------
+    # API
+    # -------------------------------------------------------------------------
+
+    def _category(self, entity_id: int) -> str:
+        return self.entities[entity_id].get("category", self.entities[entity_id].get("tipo", ""))
+
+    def scan(self, text: str, exclude: Optional[Dict[str, List[int]]] = None) -> Dict[int, PartialLeak]:
+        """
+        Busca fugas parciales en la salida.
+
+        Cada span de la salida se atribuye a una sola entidad, la de menor
+        ALID: un apellido compartido ("Martínez") o una fecha vecina no
+        cuentan como fuga de varias entidades a la vez.
+
+        Args:
+            text: Texto anonimizado
+            exclude: Fugas exactas ya detectadas, {valor: posiciones} como
+                las retorna find_leaks; esas entidades no se repiten y sus
+                spans no se atribuyen a otras
+
+        Returns:
+            {índice de entidad: fuga con menor ALID} (copia propia de cada llamada)
+        """
+        exclude = exclude or {}
+        key = frozenset((value, tuple(starts)) for value, starts in exclude.items())
+        last_text, last_exclude, last_result = self._last
+        if last_text is not None and last_exclude == key and last_text == text:
+            return {index: replace(leak) for index, leak in last_result.items()}
+
+        covered = [(start, start + len(value))
+                   for value, starts in exclude.items() for start in starts]
+        candidates = []
+        for leak in self._token_leaks(text, fold(text)) + self._digit_leaks(text):
+            value = self.entities[leak.entity_index].get(self.value_key, "")
+            if not value or value in exclude or _overlaps(leak.start, leak.end, covered):
+                continue
+            candidates.append(leak)
+
+        # Asignación greedy por ALID: cada entidad toma su mejor span libre
+        best: Dict[int, PartialLeak] = {}
+        claimed: List[Tuple[int, int]] = []
+        for leak in sorted(candidates, key=lambda l: (l.alid, l.entity_index, l.start)):
+            if leak.entity_index in best or _overlaps(leak.start, leak.end, claimed):
+                continue
+            best[leak.entity_index] = leak
+            claimed.append((leak.start, leak.end))
+        self._last = (text, key, best)
+        return {index: replace(leak) for index, leak in best.items()}
+
+
+def _overlaps(start: int, end: int, spans: List[Tuple[int, int]]) -> bool:
+    return any(start < span_end and span_start < end for span_start, span_end in spans)
+
+
+def _runs(tokens: List[Tuple[int, int, int]], max_gap: int = 1) -> List[Tuple[int, int]]:
+    """Agrupa tokens (posición, start, end) consecutivos en spans del texto."""
+    runs = []
+    run_start, run_end, last_position = None, None, None
+    for position, start, end in sorted(tokens):
+        if run_start is not None and position - last_position <= max_gap + 1:
+            run_end = end
+        else:
+            if run_start is not None:
+                runs.append((run_start, run_end))
+            run_start, run_end = start, end
+        last_position = position
+    if run_start is not None:
+        runs.append((run_start, run_end))
+    return runs
+
+
+# =============================================================================
+# CACHE POR CASO
+# =============================================================================
+
+_indexes: "OrderedDict[object, Tuple[Tuple, PartialLeakIndex]]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def get_partial_leak_index(entities: List[Dict], case_id: Optional[str] = None,
+                           value_key: str = "value",
+                           lr_threshold: float = DEFAULT_LR_THRESHOLD) -> PartialLeakIndex:
+    """Índice de un caso, construido una sola vez (cache por case_id y umbral)."""
+    fingerprint = tuple(e.get(value_key, "") for e in entities)
+    key = (case_id if case_id else fingerprint, lr_threshold)
+    with _lock:
+        cached = _indexes.get(key)
+        if cached is not None and cached[0] == fingerprint:
+            _indexes.move_to_end(key)
+            return cached[1]
+
+    index = PartialLeakIndex(entities, value_key, lr_threshold)
+    with _lock:
+        _indexes[key] = (fingerprint, index)
+        _indexes.move_to_end(key)
+        while len(_indexes) > MAX_CACHED_INDEXES:
+            _indexes.popitem(last=False)
+    return index
+
+
+def find_partial_leaks(text: str, entities: List[Dict], case_id: Optional[str] = None,
+                       value_key: str = "value", lr_threshold: float = DEFAULT_LR_THRESHOLD,
+                       exclude: Optional[Dict[str, List[int]]] = None) -> Dict[int, PartialLeak]:
+    """Fugas parciales de las entidades de un caso, por índice de entidad."""
+    return get_partial_leak_index(entities, case_id, value_key, lr_threshold).scan(text, exclude)
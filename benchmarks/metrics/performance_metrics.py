@@ -10,6 +10,7 @@ de rendimiento cuantificable para inferencia de IA Generativa on-premise.
 Métricas implementadas:
 - TPS (Tokens Per Second) - generación y evaluación
 - Latencia (time to first token, total)
+- Latencia entre tokens (streaming SSE: p50/p95/p99)
 - Throughput (queries per second)
 - Utilización de recursos (CPU, RAM)
 - Estabilidad (desviación estándar, tasa de errores)
@@ -17,12 +18,20 @@ Métricas implementadas:
 
 import time
 import statistics
+import os
 import subprocess
 import json
 from dataclasses import dataclass, field
-from typing import List, Dict, Optional, Tuple
+from typing import List, Dict, Iterable, Optional, Tuple
 from datetime import datetime
 
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from metrics.quantile_sketch import QuantileSketch, percentile
+from metrics.bootstrap import bootstrap_ci
+from metrics.resource_sampler import cpu_percent
+
 
 # =============================================================================
 # DATACLASSES PARA MÉTRICAS
@@ -51,6 +60,13 @@ class InferenceMetrics:
     latency_total_ms: float = 0.0      # Tiempo total (ms)
     time_to_first_token_ms: float = 0.0  # Tiempo hasta primer token
 
+    # Streaming (medido en el cliente, solo con stream=True)
+    streamed: bool = False
+    token_arrival_ms: List[float] = field(default_factory=list)  # Llegada de cada token desde el envío
+    inter_token_p50_ms: float = 0.0
+    inter_token_p95_ms: float = 0.0
+    inter_token_p99_ms: float = 0.0
+
     # Estado
     success: bool = True
     error_message: str = ""
@@ -95,9 +111,19 @@ class BenchmarkResult:
     success_rate: float = 100.0
     error_count: int = 0
 
-    # Datos crudos
+    # Datos crudos (vacío con keep_raw=False)
     raw_metrics: List[InferenceMetrics] = field(default_factory=list)
 
+    # Sketches serializados (QuantileSketch.to_dict) para combinar corridas
+    sketches: Dict[str, Dict] = field(default_factory=dict)
+
+    # IC bootstrap de las medias (ConfidenceInterval.to_dict; ver add_confidence_intervals)
+    tps_ci: Dict = field(default_factory=dict)
+    latency_ci_ms: Dict = field(default_factory=dict)
+
+    # Localidad NUMA de la ventana medida (NumaReport.to_dict, ver metrics/numa.py)
+    numa: Dict = field(default_factory=dict)
+
 
 @dataclass
 class SystemResources:
@@ -151,78 +177,221 @@ def parse_llama_cpp_timings(timings: dict) -> InferenceMetrics:
     metrics.tps_prompt_eval = timings.get("prompt_per_second", 0.0)
     metrics.tps_generation = timings.get("predicted_per_second", 0.0)
 
-    # Time to first token (aproximación)
+    # Time to first token (aproximación; con streaming se usa
+    # apply_stream_arrivals para medirlo en el cliente)
     if metrics.tokens_prompt > 0:
         metrics.time_to_first_token_ms = metrics.latency_prompt_ms
 
     return metrics
 
 
-def calculate_benchmark_stats(metrics_list: List[InferenceMetrics]) -> BenchmarkResult:
+def summarize_token_arrivals(arrival_ms: List[float]) -> Dict[str, float]:
     """
-    Calcula estadísticas agregadas de una lista de métricas.
+    Resume los tiempos de llegada de tokens de una respuesta streaming.
 
     Args:
-        metrics_list: Lista de métricas individuales
+        arrival_ms: Llegada de cada token en ms desde que se envió el request
 
     Returns:
-        BenchmarkResult con estadísticas calculadas
+        Dict con ttft_ms e inter_token_{mean,p50,p95,p99,max}_ms
     """
-    result = BenchmarkResult()
-    result.timestamp = datetime.now().isoformat()
-    result.iterations = len(metrics_list)
-    result.raw_metrics = metrics_list
+    summary = {
+        "ttft_ms": arrival_ms[0] if arrival_ms else 0.0,
+        "inter_token_mean_ms": 0.0,
+        "inter_token_p50_ms": 0.0,
+        "inter_token_p95_ms": 0.0,
+        "inter_token_p99_ms": 0.0,
+        "inter_token_max_ms": 0.0,
+    }
 
-    if not metrics_list:
-        return result
+    gaps = sorted(b - a for a, b in zip(arrival_ms, arrival_ms[1:]))
+    if gaps:
+        summary["inter_token_mean_ms"] = sum(gaps) / len(gaps)
+        summary["inter_token_p50_ms"] = percentile(gaps, 0.50)
+        summary["inter_token_p95_ms"] = percentile(gaps, 0.95)
+        summary["inter_token_p99_ms"] = percentile(gaps, 0.99)
+        summary["inter_token_max_ms"] = gaps[-1]
+
+    return summary
+
+
+def apply_stream_arrivals(metrics: InferenceMetrics, arrival_ms: List[float],
+                          total_ms: float = 0.0) -> InferenceMetrics:
+    """
+    Completa InferenceMetrics con las mediciones del cliente en modo streaming.
+
+    Reemplaza la aproximación TTFT = prompt_ms por el TTFT real observado
+    y agrega la distribución de latencia entre tokens.
+
+    Args:
+        metrics: Métricas parseadas de los timings del servidor
+        arrival_ms: Llegada de cada token en ms desde el envío del request
+        total_ms: Tiempo total del request visto por el cliente (ms)
+    """
+    summary = summarize_token_arrivals(arrival_ms)
+
+    metrics.streamed = True
+    metrics.token_arrival_ms = list(arrival_ms)
+    metrics.time_to_first_token_ms = summary["ttft_ms"]
+    metrics.inter_token_p50_ms = summary["inter_token_p50_ms"]
+    metrics.inter_token_p95_ms = summary["inter_token_p95_ms"]
+    metrics.inter_token_p99_ms = summary["inter_token_p99_ms"]
+    if total_ms > 0:
+        metrics.latency_total_ms = total_ms
 
-    # Filtrar métricas exitosas
-    successful = [m for m in metrics_list if m.success]
-    failed = [m for m in metrics_list if not m.success]
+    return metrics
+
+
+class StreamingBenchmarkStats:
+    """
+    Agregador de InferenceMetrics en memoria constante.
 
-    result.error_count = len(failed)
-    result.success_rate = (len(successful) / len(metrics_list)) * 100
+    Mantiene sketches de TPS y latencia (ver quantile_sketch.py) en lugar
+    de las muestras, de modo que una prueba de larga duración puede
+    agregar millones de requests. Los agregadores de corridas u hosts
+    distintos se combinan con merge().
+    """
 
-    if not successful:
+    def __init__(self):
+        self.iterations = 0
+        self.error_count = 0
+        self.tokens_total = 0
+        self.tokens_count = 0
+        self.tps = QuantileSketch()
+        self.latency = QuantileSketch()
+        self.model = ""
+        self.prompt_strategy = ""
+        self.case_id = ""
+
+    def add(self, m: InferenceMetrics):
+        self.iterations += 1
+        if not m.success:
+            self.error_count += 1
+            return
+        if self.tokens_count == 0:
+            # Identificadores del primer resultado exitoso
+            self.model, self.prompt_strategy, self.case_id = m.model, m.prompt_strategy, m.case_id
+        if m.tps_generation > 0:
+            self.tps.add(m.tps_generation)
+        if m.latency_total_ms > 0:
+            self.latency.add(m.latency_total_ms)
+        self.tokens_total += m.tokens_generated
+        self.tokens_count += 1
+
+    def merge(self, other: "StreamingBenchmarkStats") -> "StreamingBenchmarkStats":
+        if self.tokens_count == 0 and other.tokens_count > 0:
+            self.model, self.prompt_strategy, self.case_id = (
+                other.model, other.prompt_strategy, other.case_id)
+        self.iterations += other.iterations
+        self.error_count += other.error_count
+        self.tokens_total += other.tokens_total
+        self.tokens_count += other.tokens_count
+        self.tps.merge(other.tps)
+        self.latency.merge(other.latency)
+        return self
+
+    @classmethod
+    def from_result(cls, result: BenchmarkResult) -> "StreamingBenchmarkStats":
+        """Reconstruye el agregador desde un BenchmarkResult con sketches."""
+        stats = cls()
+        stats.iterations = result.iterations
+        stats.error_count = result.error_count
+        stats.tokens_total = result.tokens_total
+        stats.tokens_count = result.iterations - result.error_count
+        stats.model, stats.prompt_strategy, stats.case_id = (
+            result.model, result.prompt_strategy, result.case_id)
+        if "tps" in result.sketches:
+            stats.tps = QuantileSketch.from_dict(result.sketches["tps"])
+        if "latency_ms" in result.sketches:
+            stats.latency = QuantileSketch.from_dict(result.sketches["latency_ms"])
+        return stats
+
+    def result(self) -> BenchmarkResult:
+        result = BenchmarkResult()
+        result.timestamp = datetime.now().isoformat()
+        result.iterations = self.iterations
+        result.error_count = self.error_count
+        if self.iterations:
+            result.success_rate = (self.iterations - self.error_count) / self.iterations * 100
+
+        if self.tps.count:
+            result.tps_avg = self.tps.mean
+            result.tps_std = self.tps.stdev
+            result.tps_min = self.tps.min
+            result.tps_max = self.tps.max
+            result.tps_median = self.tps.quantile(0.50)
+
+        if self.latency.count:
+            result.latency_avg_ms = self.latency.mean
+            result.latency_std_ms = self.latency.stdev
+            result.latency_min_ms = self.latency.min
+            result.latency_max_ms = self.latency.max
+            result.latency_p95_ms = self.latency.quantile(0.95)
+            result.latency_p99_ms = self.latency.quantile(0.99)
+
+        if self.tokens_count:
+            result.tokens_avg = self.tokens_total / self.tokens_count
+            result.tokens_total = self.tokens_total
+
+        result.model = self.model
+        result.prompt_strategy = self.prompt_strategy
+        result.case_id = self.case_id
+        result.sketches = {"tps": self.tps.to_dict(), "latency_ms": self.latency.to_dict()}
         return result
 
-    # Extraer valores para estadísticas
-    tps_values = [m.tps_generation for m in successful if m.tps_generation > 0]
-    latency_values = [m.latency_total_ms for m in successful if m.latency_total_ms > 0]
-    token_values = [m.tokens_generated for m in successful]
 
-    # Estadísticas TPS
-    if tps_values:
-        result.tps_avg = statistics.mean(tps_values)
-        result.tps_std = statistics.stdev(tps_values) if len(tps_values) > 1 else 0.0
-        result.tps_min = min(tps_values)
-        result.tps_max = max(tps_values)
-        result.tps_median = statistics.median(tps_values)
+def calculate_benchmark_stats(metrics_list: Iterable[InferenceMetrics],
+                              keep_raw: bool = True, with_ci: bool = False) -> BenchmarkResult:
+    """
+    Calcula estadísticas agregadas de una lista de métricas.
 
-    # Estadísticas latencia
-    if latency_values:
-        result.latency_avg_ms = statistics.mean(latency_values)
-        result.latency_std_ms = statistics.stdev(latency_values) if len(latency_values) > 1 else 0.0
-        result.latency_min_ms = min(latency_values)
-        result.latency_max_ms = max(latency_values)
-
-        # Percentiles
-        sorted_latencies = sorted(latency_values)
-        n = len(sorted_latencies)
-        result.latency_p95_ms = sorted_latencies[int(n * 0.95)] if n >= 20 else result.latency_max_ms
-        result.latency_p99_ms = sorted_latencies[int(n * 0.99)] if n >= 100 else result.latency_max_ms
+    Los percentiles salen de StreamingBenchmarkStats: exactos con pocas
+    muestras y con error relativo <= 1% en corridas largas, sin retener
+    las muestras.
+
+    Args:
+        metrics_list: Métricas individuales (lista o cualquier iterable,
+            p. ej. un generador en una prueba de larga duración)
+        keep_raw: Guardar las métricas en raw_metrics (False para
+            memoria constante)
+        with_ci: Calcular ya los IC bootstrap de las medias (requiere
+            keep_raw). Si no, los reportes los calculan una vez al
+            formatear (add_confidence_intervals)
+
+    Returns:
+        BenchmarkResult con estadísticas calculadas
+    """
+    stats = StreamingBenchmarkStats()
+    raw = []
+    for m in metrics_list:
+        stats.add(m)
+        if keep_raw:
+            raw.append(m)
+
+    result = stats.result()
+    result.raw_metrics = raw
+    if with_ci:
+        add_confidence_intervals(result)
+    return result
 
-    # Tokens
-    if token_values:
-        result.tokens_avg = statistics.mean(token_values)
-        result.tokens_total = sum(token_values)
 
-    # Copiar identificadores del primer resultado
-    if successful:
-        result.model = successful[0].model
-        result.prompt_strategy = successful[0].prompt_strategy
-        result.case_id = successful[0].case_id
+def add_confidence_intervals(result: BenchmarkResult) -> BenchmarkResult:
+    """
+    Agrega los IC bootstrap al 95% de las medias de TPS y latencia
+    (tps_ci, latency_ci_ms) a partir de raw_metrics.
 
+    El bootstrap (2000 remuestreos) es caro sin NumPy, por eso no corre en
+    cada calculate_benchmark_stats; los IC ya calculados no se recalculan.
+    """
+    if result.tps_ci or result.latency_ci_ms:
+        return result
+    raw = result.raw_metrics
+    tps = [m.tps_generation for m in raw if m.success and m.tps_generation > 0]
+    latency = [m.latency_total_ms for m in raw if m.success and m.latency_total_ms > 0]
+    if tps:
+        result.tps_ci = bootstrap_ci(tps).to_dict()
+    if latency:
+        result.latency_ci_ms = bootstrap_ci(latency).to_dict()
     return result
 
 
@@ -264,16 +433,22 @@ def calculate_throughput_qps(total_queries: int, total_time_seconds: float) -> f
 # FUNCIONES DE RECURSOS DEL SISTEMA
 # =============================================================================
 
-def get_system_resources() -> SystemResources:
+def get_system_resources(cpu_interval_s: Optional[float] = None) -> SystemResources:
     """
     Obtiene métricas de recursos del sistema.
 
-    Funciona en Linux/Power, usa comandos del sistema.
+    Funciona en Linux/Power, usa comandos del sistema. cpu_percent solo se
+    mide si se pasa cpu_interval_s (bloquea durante esa ventana); para
+    seguir los recursos durante una corrida usar ResourceSampler
+    (metrics/resource_sampler.py).
     """
     resources = SystemResources()
     resources.timestamp = datetime.now().isoformat()
 
     try:
+        if cpu_interval_s is not None:
+            resources.cpu_percent = round(cpu_percent(cpu_interval_s), 1)
+
         # CPU y Load average
         with open('/proc/loadavg', 'r') as f:
             load_parts = f.read().split()
@@ -315,6 +490,19 @@ def check_mma_enabled() -> Tuple[bool, str]:
         Tuple de (bool: MMA habilitado, str: mensaje de información)
     """
     try:
+        # AT_HWCAP2 del kernel: "mma" si el CPU y el kernel lo soportan
+        result = subprocess.run(
+            ['/bin/true'],
+            capture_output=True,
+            text=True,
+            timeout=5,
+            env={**os.environ, 'LD_SHOW_AUXV': '1'}
+        )
+
+        for line in result.stdout.splitlines():
+            if line.startswith('AT_HWCAP2') and 'mma' in line.split():
+                return True, "MMA detectado via AT_HWCAP2"
+
         # Intentar verificar via lscpu
         result = subprocess.run(
             ['lscpu'],
@@ -387,6 +575,7 @@ def get_cpu_info() -> dict:
 
 def format_benchmark_report(result: BenchmarkResult) -> str:
     """Formatea un reporte de benchmark para consola."""
+    add_confidence_intervals(result)
     lines = [
         "",
         "=" * 70,
@@ -407,6 +596,10 @@ def format_benchmark_report(result: BenchmarkResult) -> str:
         f"  Desv. Estándar:  {result.tps_std:.2f}",
         f"  Mínimo:          {result.tps_min:.2f} tokens/seg",
         f"  Máximo:          {result.tps_max:.2f} tokens/seg",
+    ]
+    if result.tps_ci:
+        lines.append(f"  IC 95% media:    [{result.tps_ci['low']:.2f}, {result.tps_ci['high']:.2f}]")
+    lines += [
         "",
         "  MÉTRICAS DE LATENCIA",
         "  " + "-" * 40,
@@ -416,6 +609,11 @@ def format_benchmark_report(result: BenchmarkResult) -> str:
         f"  Máximo:          {result.latency_max_ms:.0f} ms",
         f"  P95:             {result.latency_p95_ms:.0f} ms",
         f"  P99:             {result.latency_p99_ms:.0f} ms",
+    ]
+    if result.latency_ci_ms:
+        lines.append(f"  IC 95% media:    [{result.latency_ci_ms['low']:.0f}, "
+                     f"{result.latency_ci_ms['high']:.0f}] ms")
+    lines += [
         "",
         "  TOKENS Y ESTABILIDAD",
         "  " + "-" * 40,
@@ -423,6 +621,20 @@ def format_benchmark_report(result: BenchmarkResult) -> str:
         f"  Tokens total:    {result.tokens_total}",
         f"  Tasa de éxito:   {result.success_rate:.1f}%",
         f"  Errores:         {result.error_count}",
+    ]
+    if result.numa:
+        numa = result.numa
+        lines += [
+            "",
+            "  LOCALIDAD NUMA",
+            "  " + "-" * 40,
+            f"  Nodos:           {numa['nodes']} (hilos en nodo {numa['home_node']}"
+            f"{', cruzan nodos' if numa['cross_node_threads'] else ''})",
+            f"  Accesos remotos: {numa['remote_access_estimate'] * 100:.1f}% estimado "
+            f"(modelo: {numa['model_remote_access_estimate'] * 100:.1f}%)",
+            f"  Asig. remotas:   {numa['remote_allocation_ratio'] * 100:.1f}% (numastat)",
+        ]
+    lines += [
         "",
         "=" * 70,
     ]
@@ -432,6 +644,7 @@ def format_benchmark_report(result: BenchmarkResult) -> str:
 
 def to_json(result: BenchmarkResult) -> dict:
     """Convierte BenchmarkResult a diccionario para JSON."""
+    add_confidence_intervals(result)
     return {
         "metadata": {
             "model": result.model,
@@ -451,6 +664,7 @@ def to_json(result: BenchmarkResult) -> dict:
                 "min": round(result.tps_min, 2),
                 "max": round(result.tps_max, 2),
                 "median": round(result.tps_median, 2),
+                "ci95": result.tps_ci or None,
             },
             "latency_ms": {
                 "avg": round(result.latency_avg_ms, 1),
@@ -459,6 +673,7 @@ def to_json(result: BenchmarkResult) -> dict:
                 "max": round(result.latency_max_ms, 1),
                 "p95": round(result.latency_p95_ms, 1),
                 "p99": round(result.latency_p99_ms, 1),
+                "ci95": result.latency_ci_ms or None,
             },
             "tokens": {
                 "avg": round(result.tokens_avg, 0),
@@ -469,6 +684,7 @@ def to_json(result: BenchmarkResult) -> dict:
             "success_rate": round(result.success_rate, 1),
             "error_count": result.error_count,
         },
+        "numa": result.numa or None,
     }
 
 
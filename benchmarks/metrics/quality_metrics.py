@@ -17,9 +17,13 @@ Implementa métricas basadas en:
 Métricas para caso de uso de anonimización clínica.
 """
 
+from contextlib import contextmanager
 from dataclasses import dataclass, field
-from typing import List, Dict, Optional, Tuple, Set
-from collections import defaultdict
+from typing import Callable, Iterable, Iterator, List, Dict, Optional, Tuple, Set
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
+import itertools
+import os
 import re
 import json
 
@@ -38,61 +42,14 @@ except ImportError:
     QUASI_IDENTIFIERS = set()
     PLACEHOLDERS = {}
 
-
-# =============================================================================
-# DISTANCIA DE LEVENSHTEIN
-# =============================================================================
-
-def levenshtein_distance(s1: str, s2: str) -> int:
-    """
-    Calcula la distancia de Levenshtein entre dos strings.
-
-    La distancia de Levenshtein es el número mínimo de operaciones
-    (inserción, eliminación, sustitución) para transformar s1 en s2.
-
-    Args:
-        s1: Primer string
-        s2: Segundo string
-
-    Returns:
-        Distancia de Levenshtein (entero)
-    """
-    if len(s1) < len(s2):
-        return levenshtein_distance(s2, s1)
-
-    if len(s2) == 0:
-        return len(s1)
-
-    previous_row = range(len(s2) + 1)
-    for i, c1 in enumerate(s1):
-        current_row = [i + 1]
-        for j, c2 in enumerate(s2):
-            # j+1 instead of j since previous_row and current_row are one character longer
-            insertions = previous_row[j + 1] + 1
-            deletions = current_row[j] + 1
-            substitutions = previous_row[j] + (c1 != c2)
-            current_row.append(min(insertions, deletions, substitutions))
-        previous_row = current_row
-
-    return previous_row[-1]
-
-
-def levenshtein_similarity(s1: str, s2: str) -> float:
-    """
-    Calcula la similitud de Levenshtein normalizada entre dos strings.
-
-    Fórmula: 1 - (distancia / max(len(s1), len(s2)))
-
-    Returns:
-        Valor entre 0 (completamente diferentes) y 1 (idénticos)
-    """
-    if len(s1) == 0 and len(s2) == 0:
-        return 1.0
-
-    distance = levenshtein_distance(s1, s2)
-    max_len = max(len(s1), len(s2))
-
-    return 1 - (distance / max_len)
+# Distancia de Levenshtein: núcleo bit-paralelo compartido con experiment_runner_v3
+from metrics.levenshtein import (
+    levenshtein_distance, levenshtein_similarity, dissimilarity_at_least, levenshtein_batch
+)
+# Valores escapados: un autómata por caso, una pasada por salida
+from metrics.leak_scanner import find_leaks
+from metrics.partial_leaks import find_partial_leaks
+from metrics.span_alignment import evaluate_spans
 
 
 # =============================================================================
@@ -135,11 +92,12 @@ def calculate_lr(original_value: str, anonymized_value: str, threshold: float =
     Returns:
         1.0 si ALID >= threshold, 0.0 en caso contrario
     """
-    alid = calculate_alid(original_value, anonymized_value)
-    return 1.0 if alid >= threshold else 0.0
+    # Solo importa si se cruza el umbral: cálculo acotado con corte temprano
+    return 1.0 if dissimilarity_at_least(original_value, anonymized_value, threshold) else 0.0
 
 
-def calculate_lrdi(entities: List[Dict], anonymized_text: str) -> float:
+def calculate_lrdi(entities: List[Dict], anonymized_text: str,
+                   case_id: Optional[str] = None, threshold: Optional[float] = None) -> float:
     """
     Calcula LRDI (Levenshtein Recall for Direct Identifiers).
 
@@ -151,6 +109,9 @@ def calculate_lrdi(entities: List[Dict], anonymized_text: str) -> float:
     Args:
         entities: Lista de entidades con 'category', 'value', 'is_direct'
         anonymized_text: Texto después de anonimización
+        case_id: Id del caso (cache del autómata de fugas)
+        threshold: Umbral LR; si se indica, las fugas parciales (ver
+            partial_leaks.py) también cuentan como escape
 
     Returns:
         100.0 si todos los identificadores directos fueron anonimizados
@@ -162,17 +123,25 @@ def calculate_lrdi(entities: List[Dict], anonymized_text: str) -> float:
     if not direct_entities:
         return 100.0  # No hay identificadores directos
 
+    leaks = find_leaks(anonymized_text, entities, case_id)
     for entity in direct_entities:
         original_value = entity.get('value', '')
         # Buscar si el valor original aparece en el texto anonimizado
-        if original_value and original_value in anonymized_text:
+        if original_value and original_value in leaks:
             return 0.0  # Un identificador directo escapó
 
+    if threshold is not None:
+        partial = find_partial_leaks(anonymized_text, entities, case_id,
+                                     lr_threshold=threshold, exclude=leaks)
+        direct_ids = {id(e) for e in direct_entities}
+        if any(id(entities[i]) in direct_ids for i in partial):
+            return 0.0  # Escapó parcialmente (apellido, CI reformateada, ...)
+
     return 100.0
 
 
 def calculate_lrqi(entities: List[Dict], anonymized_text: str,
-                   threshold: float = 0.85) -> float:
+                   threshold: Optional[float] = None, case_id: Optional[str] = None) -> float:
     """
     Calcula LRQI (Levenshtein Recall for Quasi-Identifiers).
 
@@ -184,7 +153,9 @@ def calculate_lrqi(entities: List[Dict], anonymized_text: str,
     Args:
         entities: Lista de entidades con 'category', 'value'
         anonymized_text: Texto después de anonimización
-        threshold: Umbral de similitud (default 0.85)
+        threshold: Umbral LR; si se indica, las fugas parciales (ver
+            partial_leaks.py) también cuentan como escape (igual que LRDI)
+        case_id: Id del caso (cache del autómata de fugas)
 
     Returns:
         Porcentaje de cuasi-identificadores anonimizados (0-100)
@@ -195,18 +166,20 @@ def calculate_lrqi(entities: List[Dict], anonymized_text: str,
     if not quasi_entities:
         return 100.0  # No hay cuasi-identificadores
 
+    leaks = find_leaks(anonymized_text, entities, case_id)
+    partial = {}
+    if threshold is not None:
+        partial = find_partial_leaks(anonymized_text, entities, case_id,
+                                     lr_threshold=threshold, exclude=leaks)
+    partial_values = {entities[i].get('value', '') for i in partial}
+
     anonymized_count = 0
     for entity in quasi_entities:
         original_value = entity.get('value', '')
         if original_value:
-            # Buscar el valor o algo similar en el texto
-            if original_value not in anonymized_text:
+            # Ni el valor exacto ni un fragmento por debajo del umbral LR
+            if original_value not in leaks and original_value not in partial_values:
                 anonymized_count += 1
-            else:
-                # Verificar si fue parcialmente anonimizado
-                # (esto es una simplificación - en implementación real se usaría
-                # matching más sofisticado)
-                pass
 
     return (anonymized_count / len(quasi_entities)) * 100
 
@@ -256,6 +229,7 @@ class QualityMetrics:
     total_predictions: int = 0
     direct_identifiers_escaped: List[Dict] = field(default_factory=list)
     quasi_identifiers_escaped: List[Dict] = field(default_factory=list)
+    partial_leaks: int = 0  # Escapadas por fragmento o formato (no exactas)
 
     def to_dict(self) -> Dict:
         """Convierte a diccionario para JSON."""
@@ -287,6 +261,7 @@ class QualityMetrics:
             "entidades_escapadas": {
                 "directos": len(self.direct_identifiers_escaped),
                 "cuasi": len(self.quasi_identifiers_escaped),
+                "parciales": self.partial_leaks,
                 "detalle_directos": self.direct_identifiers_escaped
             }
         }
@@ -319,7 +294,9 @@ def extract_placeholders_from_text(text: str) -> List[Dict]:
 def calculate_standard_metrics(
     ground_truth_entities: List[Dict],
     anonymized_text: str,
-    original_text: str
+    original_text: str,
+    case_id: Optional[str] = None,
+    lr_threshold: Optional[float] = None
 ) -> QualityMetrics:
     """
     Calcula métricas estándar de evaluación.
@@ -330,6 +307,17 @@ def calculate_standard_metrics(
         ground_truth_entities: Lista de entidades PHI esperadas
         anonymized_text: Texto después de anonimización
         original_text: Texto original
+        case_id: Id del caso (cache del autómata de fugas)
+        lr_threshold: Si se indica, una entidad cuyo fragmento sobreviviente
+            tiene ALID < lr_threshold (apellido solo, CI reformateada) cuenta
+            como escapada, no solo la que sobrevive exacta
+
+    Con original_text, TP/FP/FN, precision, recall, F1 y las métricas por
+    categoría salen del alineamiento de spans (ver span_alignment.py) y se
+    cuentan por aparición de cada entidad en el original: cada placeholder
+    se mapea al span original que reemplazó y las categorías se comparan
+    por etiqueta de placeholder (NOMBRE, CI, FECHA, ...). ALID, LR y las
+    entidades escapadas siguen siendo por entidad.
 
     Returns:
         QualityMetrics con todas las métricas calculadas
@@ -337,6 +325,21 @@ def calculate_standard_metrics(
     metrics = QualityMetrics()
     metrics.total_ground_truth = len(ground_truth_entities)
 
+    leaks = find_leaks(anonymized_text, ground_truth_entities, case_id)
+    partial = {}
+    if lr_threshold is not None:
+        partial = find_partial_leaks(anonymized_text, ground_truth_entities, case_id,
+                                     lr_threshold=lr_threshold, exclude=leaks)
+        metrics.partial_leaks = len(partial)
+
+    span_eval = None
+    if original_text:
+        leaked = defaultdict(list)
+        for index, leak in partial.items():
+            leaked[ground_truth_entities[index].get('value', '')].append((leak.start, leak.end))
+        span_eval = evaluate_spans(original_text, anonymized_text, ground_truth_entities,
+                                   case_id, leaked=leaked)
+
     # Contadores por categoría
     tp_per_cat = defaultdict(int)
     fp_per_cat = defaultdict(int)
@@ -346,14 +349,14 @@ def calculate_standard_metrics(
     alid_values = []
     lr_values = []
 
-    for entity in ground_truth_entities:
+    for index, entity in enumerate(ground_truth_entities):
         original_value = entity.get('value', '')
         category = entity.get('category', 'UNKNOWN')
         is_direct = entity.get('is_direct', category in DIRECT_IDENTIFIERS)
 
         if original_value:
             # Verificar si el valor original aparece en el texto anonimizado
-            if original_value not in anonymized_text:
+            if original_value not in leaks and index not in partial:
                 # TRUE POSITIVE: fue anonimizado
                 metrics.true_positives += 1
                 tp_per_cat[category] += 1
@@ -368,36 +371,52 @@ def calculate_standard_metrics(
                 metrics.false_negatives += 1
                 fn_per_cat[category] += 1
 
-                alid_values.append(0.0)
+                leak = partial.get(index)
+                alid_values.append(leak.alid if leak else 0.0)
                 lr_values.append(0.0)
 
                 # Registrar entidad escapada
                 if is_direct:
-                    metrics.direct_identifiers_escaped.append({
+                    escaped = {
                         'category': category,
                         'value': original_value,
                         'context': entity.get('context', '')
-                    })
+                    }
                 else:
-                    metrics.quasi_identifiers_escaped.append({
+                    escaped = {
                         'category': category,
                         'value': original_value
-                    })
+                    }
+                if leak:
+                    escaped['partial'] = leak.fragment
+                if is_direct:
+                    metrics.direct_identifiers_escaped.append(escaped)
+                else:
+                    metrics.quasi_identifiers_escaped.append(escaped)
 
     # Extraer placeholders del texto anonimizado
     placeholders_found = extract_placeholders_from_text(anonymized_text)
     metrics.total_predictions = len(placeholders_found)
 
     # FALSE POSITIVES: placeholders sin entidad correspondiente
-    # (simplificación: asumimos que cada placeholder corresponde a una entidad)
-    expected_placeholders = metrics.true_positives
-    if len(placeholders_found) > expected_placeholders:
-        metrics.false_positives = len(placeholders_found) - expected_placeholders
-
-    # Calcular Precision, Recall, F1
-    if metrics.true_positives + metrics.false_positives > 0:
-        metrics.precision = metrics.true_positives / (metrics.true_positives + metrics.false_positives)
-
+    if span_eval is not None:
+        # Todos los conteos por aparición: TP/FN por entidad con FP por
+        # placeholder daría una precisión distinta de TP / (TP + FP)
+        metrics.true_positives = span_eval.true_positives
+        metrics.false_negatives = span_eval.false_negatives
+        metrics.false_positives = span_eval.false_positives
+        metrics.total_ground_truth = span_eval.true_positives + span_eval.false_negatives
+        if metrics.true_positives + metrics.false_positives > 0:
+            metrics.precision = metrics.true_positives / (metrics.true_positives + metrics.false_positives)
+    else:
+        # Sin original: se asume que cada placeholder corresponde a una entidad
+        expected_placeholders = metrics.true_positives
+        if len(placeholders_found) > expected_placeholders:
+            metrics.false_positives = len(placeholders_found) - expected_placeholders
+        if metrics.true_positives + metrics.false_positives > 0:
+            metrics.precision = metrics.true_positives / (metrics.true_positives + metrics.false_positives)
+
+    # Calcular Recall, F1
     if metrics.true_positives + metrics.false_negatives > 0:
         metrics.recall = metrics.true_positives / (metrics.true_positives + metrics.false_negatives)
 
@@ -405,7 +424,9 @@ def calculate_standard_metrics(
         metrics.f1_micro = 2 * (metrics.precision * metrics.recall) / (metrics.precision + metrics.recall)
 
     # F1 por categoría y F1-macro
-    all_categories = set(tp_per_cat.keys()) | set(fn_per_cat.keys())
+    if span_eval is not None:
+        tp_per_cat, fp_per_cat, fn_per_cat = span_eval.tp, span_eval.fp, span_eval.fn
+    all_categories = set(tp_per_cat.keys()) | set(fn_per_cat.keys()) | set(fp_per_cat.keys())
     f1_values = []
 
     for cat in all_categories:
@@ -434,8 +455,8 @@ def calculate_standard_metrics(
         metrics.lr = (sum(lr_values) / len(lr_values)) * 100
 
     # LRDI y LRQI
-    metrics.lrdi = calculate_lrdi(ground_truth_entities, anonymized_text)
-    metrics.lrqi = calculate_lrqi(ground_truth_entities, anonymized_text)
+    metrics.lrdi = calculate_lrdi(ground_truth_entities, anonymized_text, case_id, lr_threshold)
+    metrics.lrqi = calculate_lrqi(ground_truth_entities, anonymized_text, lr_threshold, case_id)
 
     return metrics
 
@@ -457,7 +478,8 @@ class AnonymizationEvaluator:
         """
         Args:
             strict_mode: Si True, LRDI requiere 100% de anonimización
-            lr_threshold: Umbral para LR (default 0.85 del paper)
+            lr_threshold: Umbral para LR (default 0.85 del paper); también
+                decide cuándo un fragmento sobreviviente es una fuga parcial
         """
         self.strict_mode = strict_mode
         self.lr_threshold = lr_threshold
@@ -485,7 +507,9 @@ class AnonymizationEvaluator:
         metrics = calculate_standard_metrics(
             ground_truth_entities,
             anonymized_text,
-            original_text
+            original_text,
+            case_id or None,
+            self.lr_threshold
         )
 
         # Guardar en historial
@@ -498,62 +522,83 @@ class AnonymizationEvaluator:
 
     def evaluate_batch(
         self,
-        cases: List[Dict]
+        cases: Iterable[Dict],
+        workers: Optional[int] = 1,
+        chunksize: int = 16,
+        sink: Optional[Callable[[Dict], None]] = None
     ) -> Dict:
         """
         Evalúa múltiples casos y calcula métricas agregadas.
 
+        Con workers > 1 (o None = todos los CPUs, p. ej. los hilos SMT-8 de
+        Power10) el puntaje se reparte en procesos en bloques de chunksize
+        casos; los resultados se consumen en el orden de entrada y con a lo
+        sumo 2 bloques por proceso en vuelo, así cases puede ser un
+        generador sobre un archivo grande.
+
+        Con sink, cada resultado individual ({'case_id', 'metrics'}) se
+        entrega a sink en lugar de acumularse en results_history:
+
+            with jsonl_sink("results/individuales.jsonl") as sink:
+                evaluator.evaluate_batch(cases, workers=None, sink=sink)
+
         Args:
-            cases: Lista de casos con 'original', 'anonymized', 'entities', 'id'
+            cases: Casos con 'original', 'anonymized', 'entities', 'id'
+            workers: Procesos de puntaje (1 = en este proceso)
+            chunksize: Casos por bloque enviado a cada proceso
+            sink: Destino de los resultados individuales
 
         Returns:
             Diccionario con métricas individuales y agregadas
         """
-        all_metrics = []
-
-        for case in cases:
-            metrics = self.evaluate(
-                original_text=case.get('original', ''),
-                anonymized_text=case.get('anonymized', ''),
-                ground_truth_entities=case.get('entities', []),
-                case_id=case.get('id', '')
+        if workers is None:
+            workers = os.cpu_count() or 1
+
+        if workers <= 1:
+            scored = (
+                (case.get('id', ''), _score_case(case, self.lr_threshold))
+                for case in cases
             )
-            all_metrics.append(metrics)
+        else:
+            scored = _score_parallel(cases, self.lr_threshold, workers, max(1, chunksize))
+
+        keys = ("precision", "recall", "f1_micro", "f1_macro", "alid", "lr", "lrdi", "lrqi")
+        sums = dict.fromkeys(keys, 0.0)
+        evaluated = 0
+        total_escaped_direct = 0
+
+        for case_id, metrics in scored:
+            evaluated += 1
+            for key in keys:
+                sums[key] += getattr(metrics, key)
+            total_escaped_direct += len(metrics.direct_identifiers_escaped)
+
+            entry = {'case_id': case_id, 'metrics': metrics.to_dict()}
+            if sink is not None:
+                sink(entry)
+            else:
+                self.results_history.append(entry)
 
         # Calcular promedios
-        if all_metrics:
-            avg_precision = sum(m.precision for m in all_metrics) / len(all_metrics)
-            avg_recall = sum(m.recall for m in all_metrics) / len(all_metrics)
-            avg_f1_micro = sum(m.f1_micro for m in all_metrics) / len(all_metrics)
-            avg_f1_macro = sum(m.f1_macro for m in all_metrics) / len(all_metrics)
-            avg_alid = sum(m.alid for m in all_metrics) / len(all_metrics)
-            avg_lr = sum(m.lr for m in all_metrics) / len(all_metrics)
-            avg_lrdi = sum(m.lrdi for m in all_metrics) / len(all_metrics)
-            avg_lrqi = sum(m.lrqi for m in all_metrics) / len(all_metrics)
-
-            total_escaped_direct = sum(len(m.direct_identifiers_escaped) for m in all_metrics)
-        else:
-            avg_precision = avg_recall = avg_f1_micro = avg_f1_macro = 0.0
-            avg_alid = avg_lr = avg_lrdi = avg_lrqi = 0.0
-            total_escaped_direct = 0
+        averages = {key: (sums[key] / evaluated if evaluated else 0.0) for key in keys}
 
         return {
-            "casos_evaluados": len(cases),
+            "casos_evaluados": evaluated,
             "metricas_promedio": {
-                "precision": round(avg_precision, 4),
-                "recall": round(avg_recall, 4),
-                "f1_micro": round(avg_f1_micro, 4),
-                "f1_macro": round(avg_f1_macro, 4),
-                "alid": round(avg_alid, 2),
-                "lr": round(avg_lr, 2),
-                "lrdi": round(avg_lrdi, 2),
-                "lrqi": round(avg_lrqi, 2)
+                "precision": round(averages["precision"], 4),
+                "recall": round(averages["recall"], 4),
+                "f1_micro": round(averages["f1_micro"], 4),
+                "f1_macro": round(averages["f1_macro"], 4),
+                "alid": round(averages["alid"], 2),
+                "lr": round(averages["lr"], 2),
+                "lrdi": round(averages["lrdi"], 2),
+                "lrqi": round(averages["lrqi"], 2)
             },
             "resumen_privacidad": {
                 "total_directos_escapados": total_escaped_direct,
                 "riesgo_privacidad": "ALTO" if total_escaped_direct > 0 else "BAJO"
             },
-            "resultados_individuales": self.results_history
+            "resultados_individuales": self.results_history if sink is None else []
         }
 
     def get_summary_table(self) -> str:
@@ -584,6 +629,60 @@ class AnonymizationEvaluator:
         return "\n".join(lines)
 
 
+# =============================================================================
+# PUNTAJE EN PARALELO
+# =============================================================================
+
+def _score_case(case: Dict, lr_threshold: float) -> QualityMetrics:
+    return calculate_standard_metrics(
+        case.get('entities', []),
+        case.get('anonymized', ''),
+        case.get('original', ''),
+        case.get('id', '') or None,
+        lr_threshold
+    )
+
+
+def _score_chunk(chunk: List[Dict], lr_threshold: float) -> List[Tuple[str, QualityMetrics]]:
+    """Puntúa un bloque en un proceso; los autómatas de fugas quedan cacheados en él."""
+    return [(case.get('id', ''), _score_case(case, lr_threshold)) for case in chunk]
+
+
+def _score_parallel(cases: Iterable[Dict], lr_threshold: float, workers: int,
+                    chunksize: int) -> Iterator[Tuple[str, QualityMetrics]]:
+    """Reparte bloques de casos entre procesos y produce los resultados en orden."""
+    iterator = iter(cases)
+    max_pending = workers * 2
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        while True:
+            while len(pending) < max_pending:
+                chunk = list(itertools.islice(iterator, chunksize))
+                if not chunk:
+                    break
+                pending.append(pool.submit(_score_chunk, chunk, lr_threshold))
+            if not pending:
+                return
+            yield from pending.popleft().result()
+
+
+@contextmanager
+def jsonl_sink(path: str) -> Iterator[Callable[[Dict], None]]:
+    """
+    Sink que agrega cada resultado individual como una línea JSON.
+
+    El archivo se abre una vez para toda la corrida y se hace flush por
+    línea: si la corrida se corta, las líneas escritas quedan completas.
+    """
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a", encoding="utf-8") as f:
+        def write(entry: Dict):
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            f.flush()
+
+        yield write
+
+
 # =============================================================================
 # FUNCIONES DE UTILIDAD
 # =============================================================================
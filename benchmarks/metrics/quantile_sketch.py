@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+quantile_sketch.py - Sketch de percentiles en memoria constante y combinable
+Universidad de Montevideo - Tesis 2025
+
+calculate_benchmark_stats guardaba todas las muestras, las ordenaba y
+reportaba p95/p99 como el máximo con menos de 20/100 muestras. Para
+pruebas de larga duración (millones de requests) se necesita:
+
+- Memoria constante: histograma logarítmico con error relativo acotado
+  (DDSketch, Masson et al. 2019): cada cuantil reportado está a menos de
+  `relative_accuracy` (1% por defecto) del valor real, con cualquier n
+- Exactitud con pocas muestras: hasta `exact_limit` valores se guardan
+  tal cual y los percentiles son exactos (interpolación lineal)
+- Combinable: los sketches de corridas u hosts distintos se suman cubeta
+  a cubeta (merge) o se serializan a JSON (to_dict / from_dict)
+- Media y desvío con Welford (combinables con la fórmula de Chan)
+
+Uso:
+    from metrics.quantile_sketch import QuantileSketch
+
+    sketch = QuantileSketch()
+    for latency in latencias:
+        sketch.add(latency)
+    p99 = sketch.quantile(0.99)
+    total = QuantileSketch.from_dict(host_a).merge(QuantileSketch.from_dict(host_b))
+"""
+
+import math
+from typing import Dict, Iterable, List, Optional
+
+# =============================================================================
+# CONFIGURACIÓN
+# =============================================================================
+
+DEFAULT_RELATIVE_ACCURACY = 0.01
+DEFAULT_MAX_BUCKETS = 2048
+DEFAULT_EXACT_LIMIT = 128       # Muestras guardadas exactas antes de pasar a cubetas
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Percentil (q en [0, 1]) con interpolación lineal sobre una lista ordenada."""
+    if not sorted_values:
+        return 0.0
+    pos = (len(sorted_values) - 1) * q
+    lower = int(pos)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (pos - lower)
+
+
+# =============================================================================
+# SKETCH
+# =============================================================================
+
+class QuantileSketch:
+    """Sketch de cuantiles con error relativo acotado y memoria constante."""
+
+    def __init__(self, relative_accuracy: float = DEFAULT_RELATIVE_ACCURACY,
+                 max_buckets: int = DEFAULT_MAX_BUCKETS,
+                 exact_limit: int = DEFAULT_EXACT_LIMIT):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("relative_accuracy debe estar en (0, 1)")
+        self.relative_accuracy = relative_accuracy
+        self.max_buckets = max_buckets
+        self.exact_limit = exact_limit
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self._gamma)
+
+        self.count = 0
+        self.min = math.inf
+        self.max = -math.inf
+        self._mean = 0.0
+        self._m2 = 0.0                      # Suma de cuadrados de desvíos (Welford)
+        self._exact: Optional[List[float]] = []
+        self._buckets: Dict[int, int] = {}
+        self._zero_count = 0                # Valores <= 0
+
+    # -------------------------------------------------------------------------
+    # Carga
+    # -------------------------------------------------------------------------
+
+    def _bucket(self, value: float) -> int:
+        return math.ceil(math.log(value) / self._log_gamma)
+
+    def _add_to_buckets(self, value: float, count: int = 1):
+        if value <= 0:
+            self._zero_count += count
+            return
+        key = self._bucket(value)
+        self._buckets[key] = self._buckets.get(key, 0) + count
+        if len(self._buckets) > self.max_buckets:
+            self._collapse()
+
+    def _collapse(self):
+        """Une las cubetas más bajas: se pierde precisión solo en la cola inferior."""
+        keys = sorted(self._buckets)
+        excess = len(keys) - self.max_buckets
+        target = keys[excess]
+        for key in keys[:excess]:
+            self._buckets[target] += self._buckets.pop(key)
+
+    def _flush_exact(self):
+        for value in self._exact:
+            self._add_to_buckets(value)
+        self._exact = None
+
+    def add(self, value: float):
+        """Agrega una muestra."""
+        self.count += 1
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        delta = value - self._mean
+        self._mean += delta / self.count
+        self._m2 += delta * (value - self._mean)
+
+        if self._exact is not None:
+            self._exact.append(value)
+            if len(self._exact) > self.exact_limit:
+                self._flush_exact()
+        else:
+            self._add_to_buckets(value)
+
+    def extend(self, values: Iterable[float]) -> "QuantileSketch":
+        for value in values:
+            self.add(value)
+        return self
+
+    def merge(self, other: "QuantileSketch") -> "QuantileSketch":
+        """Suma otro sketch (misma precisión relativa) a este."""
+        if other.count == 0:
+            return self
+        if not math.isclose(other.relative_accuracy, self.relative_accuracy):
+            raise ValueError("Solo se combinan sketches con la misma relative_accuracy")
+
+        total = self.count + other.count
+        delta = other._mean - self._mean
+        self._m2 += other._m2 + delta * delta * self.count * other.count / total
+        self._mean += delta * other.count / total
+        self.count = total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+        if (self._exact is not None and other._exact is not None
+                and len(self._exact) + len(other._exact) <= self.exact_limit):
+            self._exact.extend(other._exact)
+            return self
+        if self._exact is not None:
+            self._flush_exact()
+        if other._exact is not None:
+            for value in other._exact:
+                self._add_to_buckets(value)
+        else:
+            self._zero_count += other._zero_count
+            for key, count in other._buckets.items():
+                self._buckets[key] = self._buckets.get(key, 0) + count
+            if len(self._buckets) > self.max_buckets:
+                self._collapse()
+        return self
+
+    # -------------------------------------------------------------------------
+    # Consultas
+    # -------------------------------------------------------------------------
+
+    @property
+    def exact(self) -> bool:
+        """True mientras las muestras se guardan sin aproximar."""
+        return self._exact is not None
+
+    @property
+    def mean(self) -> float:
+        return self._mean if self.count else 0.0
+
+    @property
+    def stdev(self) -> float:
+        """Desvío muestral (n - 1), como statistics.stdev."""
+        return math.sqrt(self._m2 / (self.count - 1)) if self.count > 1 else 0.0
+
+    def quantile(self, q: float) -> float:
+        """Cuantil q en [0, 1]; 0.0 si no hay muestras."""
+        if self.count == 0:
+            return 0.0
+        q = min(max(q, 0.0), 1.0)
+        if self._exact is not None:
+            return percentile(sorted(self._exact), q)
+        if q == 0:
+            return self.min
+        if q == 1:
+            return self.max
+
+        rank = q * (self.count - 1)
+        seen = self._zero_count
+        if rank < seen:
+            return self.min
+        for key in sorted(self._buckets):
+            seen += self._buckets[key]
+            if seen > rank:
+                # Punto medio (en escala relativa) de la cubeta (gamma^(k-1), gamma^k]
+                value = 2 * self._gamma ** key / (self._gamma + 1)
+                return min(max(value, self.min), self.max)
+        return self.max
+
+    # -------------------------------------------------------------------------
+    # Serialización
+    # -------------------------------------------------------------------------
+
+    def to_dict(self) -> Dict:
+        return {
+            "relative_accuracy": self.relative_accuracy,
+            "count": self.count,
+            "min": self.min if self.count else None,
+            "max": self.max if self.count else None,
+            "mean": self._mean,
+            "m2": self._m2,
+            "exact": self._exact,
+            "zero_count": self._zero_count,
+            "buckets": {str(k): v for k, v in self._buckets.items()}
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict, max_buckets: int = DEFAULT_MAX_BUCKETS,
+                  exact_limit: int = DEFAULT_EXACT_LIMIT) -> "QuantileSketch":
+        sketch = cls(data.get("relative_accuracy", DEFAULT_RELATIVE_ACCURACY),
+                     max_buckets, exact_limit)
+        sketch.count = data.get("count", 0)
+        if sketch.count:
+            sketch.min = data["min"]
+            sketch.max = data["max"]
+        sketch._mean = data.get("mean", 0.0)
+        sketch._m2 = data.get("m2", 0.0)
+        exact = data.get("exact")
+        sketch._exact = list(exact) if exact is not None else None
+        sketch._zero_count = data.get("zero_count", 0)
+        sketch._buckets = {int(k): v for k, v in data.get("buckets", {}).items()}
+        return sketch
@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+"""
+regression.py - Detección de regresiones de rendimiento entre corridas
+Universidad de Montevideo - Tesis 2025
+
+La imagen llama.cpp-mma se reconstruye y los flags -t/-b cambian seguido;
+calculate_speedup da el cociente de dos medias pero no dice si una caída
+de TPS (o una suba del p95 de latencia) es real o ruido de la corrida.
+
+Este módulo compara las distribuciones de una corrida base y una
+candidata con pruebas no paramétricas (los TPS y latencias no son
+normales: colas largas, outliers por swapping o throttling):
+
+- Mann-Whitney U (bilateral): exacta sin empates y con muestras chicas,
+  aproximación normal con corrección por empates y continuidad en otro caso
+- Tamaño de efecto: delta de Cliff, P(candidata > base) - P(candidata < base),
+  con los umbrales de Romano et al. (2006): despreciable < 0.147 <= chico
+  < 0.33 <= mediano < 0.474 <= grande
+- Magnitud: cambio relativo de la mediana (calculate_speedup de la
+  candidata sobre la base) y, en latencias, también del p95
+
+Una métrica es regresión solo si las tres cosas coinciden: la diferencia
+es significativa (p < alfa), el efecto no es despreciable y el
+empeoramiento supera el umbral (5% por defecto). Con pocas iteraciones
+la prueba no puede alcanzar significancia (3 contra 3 da p >= 0.1): esos
+casos se reportan como 'insuficiente' en lugar de pasar en silencio.
+
+Uso:
+    from metrics.regression import check_regression, compare_benchmark_results
+
+    check = check_regression(tps_base, tps_nueva, metric="tps")
+    if check.status == "regresion":
+        print(check.summary())
+    checks = compare_benchmark_results(resultado_base, resultado_nuevo)
+"""
+
+import math
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence
+
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from metrics.performance_metrics import BenchmarkResult, calculate_speedup
+from metrics.quantile_sketch import percentile
+
+# =============================================================================
+# CONFIGURACIÓN
+# =============================================================================
+
+DEFAULT_THRESHOLD = 0.05        # Empeoramiento relativo mínimo (5%)
+DEFAULT_ALPHA = 0.05
+DEFAULT_MIN_EFFECT = 0.147      # |delta de Cliff| mínimo (efecto no despreciable)
+EXACT_MAX_SAMPLES = 40          # n1 + n2 máximo para la distribución exacta de U
+
+# True si valores más altos son mejores
+METRIC_DIRECTION = {
+    "tps": True,
+    "tps_prompt": True,
+    "latency_ms": False,
+}
+
+STATUS_REGRESSION = "regresion"
+STATUS_IMPROVEMENT = "mejora"
+STATUS_UNCHANGED = "sin cambios"
+STATUS_INSUFFICIENT = "insuficiente"
+
+
+# =============================================================================
+# MANN-WHITNEY
+# =============================================================================
+
+@dataclass
+class MannWhitneyResult:
+    """Resultado de la prueba de Mann-Whitney de b contra a."""
+    u: float                        # U de b: #(b > a) + 0.5 * #(b == a)
+    p_value: float                  # Bilateral
+    cliffs_delta: float             # P(b > a) - P(b < a), en [-1, 1]
+    exact: bool
+    min_p_value: float              # p más chico alcanzable con estos tamaños
+
+
+def _ranks(values: Sequence[float]) -> List[float]:
+    """Rangos (desde 1) con rango medio para los empates."""
+    order = sorted(range(len(values)), key=lambda i: values[i])
+    ranks = [0.0] * len(values)
+    i = 0
+    while i < len(order):
+        j = i
+        while j + 1 < len(order) and values[order[j + 1]] == values[order[i]]:
+            j += 1
+        for k in range(i, j + 1):
+            ranks[order[k]] = (i + j) / 2 + 1
+        i = j + 1
+    return ranks
+
+
+def _u_distribution(n1: int, n2: int) -> List[int]:
+    """
+    Cantidad de ordenamientos con cada valor de U (0..n1*n2), sin empates.
+
+    Son los coeficientes del binomial gaussiano [n1+n2 choose n1]_q,
+    producto de (1 - q^(n2+i)) / (1 - q^i) para i = 1..n1.
+    """
+    coefficients = [1]
+    for i in range(1, n1 + 1):
+        # Multiplicar por (1 - q^(n2+i))
+        shift = n2 + i
+        product = coefficients + [0] * shift
+        for k, c in enumerate(coefficients):
+            product[k + shift] -= c
+        # Dividir por (1 - q^i): división exacta, serie geométrica acumulada
+        for k in range(i, len(product)):
+            product[k] += product[k - i]
+        coefficients = product[:len(product) - i]
+    return coefficients
+
+
+def mann_whitney(a: Sequence[float], b: Sequence[float]) -> MannWhitneyResult:
+    """
+    Prueba U de Mann-Whitney bilateral de b contra a, con delta de Cliff.
+
+    Exacta si no hay empates y n1 + n2 <= EXACT_MAX_SAMPLES; si no,
+    aproximación normal con corrección por empates y por continuidad.
+    """
+    n1, n2 = len(a), len(b)
+    if n1 == 0 or n2 == 0:
+        return MannWhitneyResult(0.0, 1.0, 0.0, False, 1.0)
+
+    combined = list(a) + list(b)
+    ranks = _ranks(combined)
+    u = sum(ranks[n1:]) - n2 * (n2 + 1) / 2
+    delta = 2 * u / (n1 * n2) - 1
+
+    total = n1 + n2
+    ties = len(set(combined)) < total
+    if not ties and total <= EXACT_MAX_SAMPLES:
+        counts = _u_distribution(n1, n2)
+        orderings = sum(counts)
+        k = int(round(u))
+        lower = sum(counts[:k + 1]) / orderings
+        upper = sum(counts[k:]) / orderings
+        p_value = min(1.0, 2 * min(lower, upper))
+        min_p = min(1.0, 2 * counts[0] / orderings)
+        return MannWhitneyResult(u, p_value, delta, True, min_p)
+
+    mean = n1 * n2 / 2
+    tie_term = 0.0
+    value_counts: Dict[float, int] = {}
+    for value in combined:
+        value_counts[value] = value_counts.get(value, 0) + 1
+    for t in value_counts.values():
+        tie_term += t ** 3 - t
+    variance = n1 * n2 / 12 * ((total + 1) - tie_term / (total * (total - 1)))
+    if variance <= 0:
+        return MannWhitneyResult(u, 1.0, delta, False, 1.0)
+    sigma = math.sqrt(variance)
+    z = max(abs(u - mean) - 0.5, 0.0) / sigma
+    p_value = min(1.0, math.erfc(z / math.sqrt(2)))
+    min_p = min(1.0, math.erfc(max(mean - 0.5, 0.0) / sigma / math.sqrt(2)))
+    return MannWhitneyResult(u, p_value, delta, False, min_p)
+
+
+def effect_size_label(delta: float) -> str:
+    """Magnitud del delta de Cliff (Romano et al., 2006)."""
+    magnitude = abs(delta)
+    if magnitude < 0.147:
+        return "despreciable"
+    if magnitude < 0.33:
+        return "chico"
+    if magnitude < 0.474:
+        return "mediano"
+    return "grande"
+
+
+# =============================================================================
+# COMPARACIÓN
+# =============================================================================
+
+@dataclass
+class RegressionCheck:
+    """Comparación de una métrica entre la corrida base y la candidata."""
+    metric: str
+    higher_is_better: bool
+    baseline_n: int
+    candidate_n: int
+    baseline_median: float
+    candidate_median: float
+    baseline_p95: float
+    candidate_p95: float
+    speedup: float                  # > 1: la candidata es mejor (mediana)
+    degradation: float              # Empeoramiento relativo (mediana o p95); < 0 si mejora
+    p_value: float
+    cliffs_delta: float             # Delta de Cliff de la candidata contra la base
+    exact: bool
+    status: str
+
+    @property
+    def effect(self) -> str:
+        return effect_size_label(self.cliffs_delta)
+
+    @property
+    def median_change(self) -> float:
+        """Cambio relativo de la mediana (candidata / base - 1)."""
+        if self.baseline_median == 0:
+            return 0.0
+        return self.candidate_median / self.baseline_median - 1
+
+    def summary(self) -> str:
+        return (f"{self.metric}: {self.baseline_median:.2f} -> {self.candidate_median:.2f} "
+                f"({self.median_change * 100:+.1f}%, p={self.p_value:.3g}, "
+                f"delta={self.cliffs_delta:+.2f} {self.effect}) {self.status}")
+
+    def to_dict(self, digits: int = 4) -> Dict:
+        return {
+            "metric": self.metric,
+            "higher_is_better": self.higher_is_better,
+            "baseline": {"n": self.baseline_n, "median": round(self.baseline_median, digits),
+                         "p95": round(self.baseline_p95, digits)},
+            "candidate": {"n": self.candidate_n, "median": round(self.candidate_median, digits),
+                          "p95": round(self.candidate_p95, digits)},
+            "speedup": round(self.speedup, digits),
+            "degradation": round(self.degradation, digits),
+            "p_value": round(self.p_value, 6),
+            "cliffs_delta": round(self.cliffs_delta, digits),
+            "effect": self.effect,
+            "exact": self.exact,
+            "status": self.status
+        }
+
+
+def _relative_loss(baseline: float, candidate: float, higher_is_better: bool) -> float:
+    """Empeoramiento relativo de candidate respecto de baseline (< 0 si mejora)."""
+    if baseline == 0:
+        return 0.0
+    change = (candidate - baseline) / abs(baseline)
+    return -change if higher_is_better else change
+
+
+def check_regression(
+    baseline: Sequence[float],
+    candidate: Sequence[float],
+    metric: str = "tps",
+    higher_is_better: Optional[bool] = None,
+    threshold: float = DEFAULT_THRESHOLD,
+    alpha: float = DEFAULT_ALPHA,
+    min_effect: float = DEFAULT_MIN_EFFECT
+) -> RegressionCheck:
+    """
+    Compara la distribución de una métrica entre dos corridas.
+
+    Args:
+        baseline: Valores de la corrida base
+        candidate: Valores de la corrida candidata
+        metric: Nombre de la métrica (define la dirección si no se da)
+        higher_is_better: True para TPS, False para latencias
+        threshold: Empeoramiento relativo mínimo para marcar regresión
+        alpha: Nivel de significancia de Mann-Whitney
+        min_effect: |delta de Cliff| mínimo
+
+    Returns:
+        RegressionCheck con status 'regresion', 'mejora', 'sin cambios'
+        o 'insuficiente' (la prueba no puede llegar a p < alfa)
+    """
+    if higher_is_better is None:
+        higher_is_better = METRIC_DIRECTION.get(metric, True)
+    base_sorted, cand_sorted = sorted(baseline), sorted(candidate)
+    base_median, cand_median = percentile(base_sorted, 0.5), percentile(cand_sorted, 0.5)
+    base_p95, cand_p95 = percentile(base_sorted, 0.95), percentile(cand_sorted, 0.95)
+
+    if higher_is_better:
+        speedup = calculate_speedup(cand_median, base_median)
+    else:
+        speedup = calculate_speedup(base_median, cand_median)
+
+    degradation = _relative_loss(base_median, cand_median, higher_is_better)
+    if not higher_is_better:
+        # En latencias también cuenta la cola: p95 más alto es regresión
+        degradation = max(degradation, _relative_loss(base_p95, cand_p95, False))
+
+    test = mann_whitney(baseline, candidate)
+    # Delta orientado: > 0 si la candidata es mejor
+    oriented = test.cliffs_delta if higher_is_better else -test.cliffs_delta
+    significant = test.p_value < alpha and abs(test.cliffs_delta) >= min_effect
+
+    if test.min_p_value >= alpha:
+        status = STATUS_INSUFFICIENT
+    elif significant and oriented < 0 and degradation >= threshold:
+        status = STATUS_REGRESSION
+    elif significant and oriented > 0 and degradation <= -threshold:
+        status = STATUS_IMPROVEMENT
+    else:
+        status = STATUS_UNCHANGED
+
+    return RegressionCheck(
+        metric=metric,
+        higher_is_better=higher_is_better,
+        baseline_n=len(baseline),
+        candidate_n=len(candidate),
+        baseline_median=base_median,
+        candidate_median=cand_median,
+        baseline_p95=base_p95,
+        candidate_p95=cand_p95,
+        speedup=speedup,
+        degradation=degradation,
+        p_value=test.p_value,
+        cliffs_delta=test.cliffs_delta,
+        exact=test.exact,
+        status=status
+    )
+
+
+def compare_benchmark_results(
+    baseline: BenchmarkResult,
+    candidate: BenchmarkResult,
+    threshold: float = DEFAULT_THRESHOLD,
+    alpha: float = DEFAULT_ALPHA,
+    min_effect: float = DEFAULT_MIN_EFFECT
+) -> List[RegressionCheck]:
+    """
+    Compara TPS y latencia total de dos BenchmarkResult.
+
+    Requiere raw_metrics (calculate_benchmark_stats con keep_raw=True).
+    """
+    checks = []
+    for metric, attribute in (("tps", "tps_generation"), ("latency_ms", "latency_total_ms")):
+        base = [getattr(m, attribute) for m in baseline.raw_metrics
+                if m.success and getattr(m, attribute) > 0]
+        cand = [getattr(m, attribute) for m in candidate.raw_metrics
+                if m.success and getattr(m, attribute) > 0]
+        if base and cand:
+            checks.append(check_regression(base, cand, metric, None, threshold, alpha, min_effect))
+    return checks
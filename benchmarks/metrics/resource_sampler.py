@@ -0,0 +1,492 @@
+#!/usr/bin/env python3
+"""
+resource_sampler.py - Muestreo de recursos del sistema durante una corrida
+Universidad de Montevideo - Tesis 2025
+
+get_system_resources toma una sola foto de /proc/loadavg y /proc/meminfo
+y ningún runner la llama durante la corrida: no hay forma de saber si un
+modelo saturó los cores o si una fase empezó a usar swap.
+
+ResourceSampler corre en un hilo de fondo y, cada `interval_s`, lee:
+
+- /proc/stat: porcentaje de uso de cada core (deltas entre lecturas),
+  iowait y cantidad de cores saturados (>= SATURATION_PERCENT). El steal
+  (tiempo que el hipervisor le dio a otra partición, en LPAR o VMs
+  compartidas) no cuenta como ocupado: el uso es sobre el tiempo
+  disponible y el steal se reporta aparte
+- /proc/meminfo: memoria usada, disponible y swap
+- /proc/<pid>/stat del servidor llama.cpp (si se conoce el pid): CPU del
+  proceso (100% = un core), RSS, hilos y fallos de página mayores
+
+Todas las muestras usan el reloj de la línea de tiempo (timeline_now:
+time.perf_counter() desde que se importó el módulo), el mismo con el que
+call_model marca el inicio y fin de cada request, de modo que muestras,
+requests y fases se alinean sin conversiones. Las fases (modelo,
+experimento, estrategia) se marcan con resource_phase(label) y el resumen
+por fase da CPU media/máxima, fracción del tiempo saturado y presión de
+memoria de cada una.
+
+Uso:
+    from metrics.resource_sampler import configure_resource_sampler, resource_phase
+
+    sampler = configure_resource_sampler(interval_s=0.5, pid=find_server_pid(8080))
+    with resource_phase("qwen2.5-7b/performance"):
+        run_performance_benchmark(...)
+    sampler.stop()
+    print(sampler.summary_by_phase())
+"""
+
+import os
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field, asdict
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# =============================================================================
+# CONFIGURACIÓN
+# =============================================================================
+
+DEFAULT_INTERVAL_S = 0.5
+DEFAULT_MAX_SAMPLES = 100_000   # ~14 h a 0.5 s; las más viejas se descartan
+SATURATION_PERCENT = 90.0       # Core (o CPU total) considerado saturado
+
+_ORIGIN = time.perf_counter()
+_CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+_GB = 1024 ** 3
+_HOST_PORT = re.compile(r":(\d+)(?:/|$)")     # host:8080, http://host:8080/...
+
+
+def timeline_now() -> float:
+    """Segundos en la línea de tiempo de la corrida (time.perf_counter)."""
+    return time.perf_counter() - _ORIGIN
+
+
+# =============================================================================
+# LECTURA DE /proc
+# =============================================================================
+
+CpuTimes = Tuple[int, int, int, int]     # (ocupado, iowait, steal, total)
+
+
+def read_cpu_times() -> Dict[str, CpuTimes]:
+    """
+    {'cpu' | 'cpuN': (ocupado, iowait, steal, total)} en ticks desde el
+    arranque. El steal no es tiempo ocupado de esta máquina: ocupado lo
+    excluye y total lo incluye.
+    """
+    times = {}
+    with open("/proc/stat", "r") as f:
+        for line in f:
+            if not line.startswith("cpu"):
+                break
+            parts = line.split()
+            # user nice system idle iowait irq softirq steal (guest va incluido en user)
+            values = [int(v) for v in parts[1:9]]
+            idle = values[3]
+            iowait = values[4] if len(values) > 4 else 0
+            steal = values[7] if len(values) > 7 else 0
+            total = sum(values)
+            times[parts[0]] = (total - idle - iowait - steal, iowait, steal, total)
+    return times
+
+
+def _busy_percent(current: CpuTimes, previous: CpuTimes) -> float:
+    """Uso (%) sobre el tiempo disponible (total menos steal) entre dos lecturas."""
+    available = (current[3] - current[2]) - (previous[3] - previous[2])
+    return 100.0 * (current[0] - previous[0]) / available if available > 0 else 0.0
+
+
+def read_meminfo() -> Dict[str, int]:
+    """Campos de /proc/meminfo en kB."""
+    meminfo = {}
+    with open("/proc/meminfo", "r") as f:
+        for line in f:
+            key, _, value = line.partition(":")
+            parts = value.split()
+            if parts:
+                meminfo[key.strip()] = int(parts[0])
+    return meminfo
+
+
+def read_process_stat(pid: int) -> Optional[Dict[str, int]]:
+    """CPU (ticks), RSS (bytes), hilos y fallos mayores de un proceso; None si no existe."""
+    try:
+        with open(f"/proc/{pid}/stat", "r") as f:
+            content = f.read()
+    except OSError:
+        return None
+    # El nombre (campo 2) puede tener espacios: los campos siguen al último ')'
+    fields = content[content.rindex(")") + 2:].split()
+    return {
+        "cpu_ticks": int(fields[11]) + int(fields[12]),     # utime + stime
+        "major_faults": int(fields[9]),
+        "threads": int(fields[17]),
+        "rss_bytes": int(fields[21]) * _PAGE_SIZE
+    }
+
+
+def cmdline_ports(args: List[str]) -> List[int]:
+    """
+    Puertos que aparecen en un cmdline: `--port 8080`, `--port=8080` o
+    `host:8080`. Un número suelto (p. ej. `-c 8080`) no cuenta.
+    """
+    ports = []
+    for index, arg in enumerate(args):
+        if arg == "--port":
+            value = args[index + 1] if index + 1 < len(args) else ""
+        elif arg.startswith("--port="):
+            value = arg.split("=", 1)[1]
+        else:
+            match = _HOST_PORT.search(arg)
+            value = match.group(1) if match else ""
+        if value.isdigit():
+            ports.append(int(value))
+    return ports
+
+
+def find_server_pid(port: Optional[int] = None, name: str = "llama") -> Optional[int]:
+    """
+    Pid del servidor llama.cpp: el proceso cuyo cmdline contiene `name`
+    (y escucha en `port`, si se da; ver cmdline_ports). None si no se
+    encuentra (p. ej. en otro contenedor).
+    """
+    candidates = []
+    for entry in os.scandir("/proc"):
+        if not entry.name.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry.name}/cmdline", "rb") as f:
+                args = f.read().decode(errors="replace").split("\0")
+        except OSError:
+            continue
+        if not args or name not in os.path.basename(args[0]):
+            continue
+        if port is not None and int(port) not in cmdline_ports(args):
+            continue
+        candidates.append(int(entry.name))
+    return min(candidates) if candidates else None
+
+
+def cpu_percent(interval_s: float = 0.1) -> float:
+    """Uso total de CPU (%) en una ventana de interval_s."""
+    before = read_cpu_times()["cpu"]
+    time.sleep(interval_s)
+    return _busy_percent(read_cpu_times()["cpu"], before)
+
+
+# =============================================================================
+# DATACLASSES
+# =============================================================================
+
+@dataclass
+class ResourceSample:
+    """Una lectura del sampler (porcentajes sobre el intervalo anterior)."""
+    t: float                                # timeline_now() de la lectura
+    cpu_percent: float = 0.0                # Promedio de todos los cores (sin steal)
+    iowait_percent: float = 0.0
+    steal_percent: float = 0.0              # Tiempo tomado por el hipervisor
+    cpu_max_core_percent: float = 0.0
+    saturated_cores: int = 0
+    memory_percent: float = 0.0
+    memory_available_gb: float = 0.0
+    swap_used_gb: float = 0.0
+    process_cpu_percent: Optional[float] = None     # 100 = un core
+    process_rss_gb: Optional[float] = None
+    process_threads: Optional[int] = None
+    process_major_faults: Optional[int] = None      # En el intervalo
+    per_core_percent: List[float] = field(default_factory=list)
+
+    def to_dict(self, per_core: bool = False) -> Dict:
+        data = {k: (round(v, 3) if isinstance(v, float) else v)
+                for k, v in asdict(self).items() if v is not None}
+        if per_core:
+            data["per_core_percent"] = [round(v, 1) for v in self.per_core_percent]
+        else:
+            data.pop("per_core_percent", None)
+        return data
+
+
+@dataclass
+class ResourcePhase:
+    """Intervalo de la línea de tiempo con una etiqueta (modelo, experimento, ...)."""
+    label: str
+    start: float
+    end: Optional[float] = None
+
+
+def summarize_samples(samples: List[ResourceSample]) -> Dict:
+    """CPU media/máxima, fracción saturada y presión de memoria de un conjunto de muestras."""
+    if not samples:
+        return {"samples": 0}
+    n = len(samples)
+    summary = {
+        "samples": n,
+        "cpu_mean_percent": round(sum(s.cpu_percent for s in samples) / n, 1),
+        "cpu_max_percent": round(max(s.cpu_percent for s in samples), 1),
+        "cpu_saturated_fraction": round(sum(s.cpu_percent >= SATURATION_PERCENT
+                                            for s in samples) / n, 3),
+        "saturated_cores_max": max(s.saturated_cores for s in samples),
+        "iowait_mean_percent": round(sum(s.iowait_percent for s in samples) / n, 1),
+        "steal_mean_percent": round(sum(s.steal_percent for s in samples) / n, 1),
+        "memory_max_percent": round(max(s.memory_percent for s in samples), 1),
+        "memory_available_min_gb": round(min(s.memory_available_gb for s in samples), 2),
+        "swap_max_gb": round(max(s.swap_used_gb for s in samples), 2),
+    }
+    process = [s for s in samples if s.process_cpu_percent is not None]
+    if process:
+        summary.update({
+            "process_cpu_mean_percent": round(sum(s.process_cpu_percent for s in process) / len(process), 1),
+            "process_cpu_max_percent": round(max(s.process_cpu_percent for s in process), 1),
+            "process_rss_max_gb": round(max(s.process_rss_gb for s in process), 2),
+            "process_threads_max": max(s.process_threads for s in process),
+            "process_major_faults": sum(s.process_major_faults for s in process)
+        })
+    return summary
+
+
+# =============================================================================
+# SAMPLER
+# =============================================================================
+
+class ResourceSampler:
+    """
+    Hilo de fondo que muestrea /proc a intervalo fijo.
+
+    Con per_core cada muestra guarda además el uso de cada core (para
+    gráficos por core); sin él, solo el máximo y los cores saturados, que
+    es lo que va a los JSON de resultados.
+    """
+
+    def __init__(self, interval_s: float = DEFAULT_INTERVAL_S, pid: Optional[int] = None,
+                 max_samples: int = DEFAULT_MAX_SAMPLES, per_core: bool = False):
+        if interval_s <= 0:
+            raise ValueError("interval_s debe ser positivo")
+        self.interval_s = interval_s
+        self.pid = pid
+        self.per_core = per_core
+        self.samples: "deque[ResourceSample]" = deque(maxlen=max_samples)
+        self.phases: List[ResourcePhase] = []
+        self.cores = 0
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._previous: Optional[Tuple[float, Dict[str, CpuTimes], Optional[Dict]]] = None
+
+    # -------------------------------------------------------------------------
+    # Muestreo
+    # -------------------------------------------------------------------------
+
+    def _read(self) -> Tuple[float, Dict[str, CpuTimes], Optional[Dict]]:
+        process = read_process_stat(self.pid) if self.pid else None
+        return timeline_now(), read_cpu_times(), process
+
+    def sample(self) -> Optional[ResourceSample]:
+        """Toma una lectura; la primera solo fija la referencia de los deltas."""
+        t, cpu, process = self._read()
+        previous, self._previous = self._previous, (t, cpu, process)
+        if previous is None:
+            return None
+        prev_t, prev_cpu, prev_process = previous
+
+        sample = ResourceSample(t=t)
+        cores = []
+        for name, times in cpu.items():
+            previous_times = prev_cpu.get(name, times)
+            percent = _busy_percent(times, previous_times)
+            if name == "cpu":
+                elapsed = times[3] - previous_times[3]
+                sample.cpu_percent = percent
+                if elapsed > 0:
+                    sample.iowait_percent = 100.0 * (times[1] - previous_times[1]) / elapsed
+                    sample.steal_percent = 100.0 * (times[2] - previous_times[2]) / elapsed
+            else:
+                cores.append(percent)
+        self.cores = len(cores)
+        if cores:
+            sample.cpu_max_core_percent = max(cores)
+            sample.saturated_cores = sum(c >= SATURATION_PERCENT for c in cores)
+            if self.per_core:
+                sample.per_core_percent = cores
+
+        meminfo = read_meminfo()
+        total_kb = meminfo.get("MemTotal", 0)
+        available_kb = meminfo.get("MemAvailable", meminfo.get("MemFree", 0))
+        sample.memory_percent = 100.0 * (total_kb - available_kb) / total_kb if total_kb else 0.0
+        sample.memory_available_gb = available_kb / (1024 * 1024)
+        sample.swap_used_gb = (meminfo.get("SwapTotal", 0) - meminfo.get("SwapFree", 0)) / (1024 * 1024)
+
+        if process is not None and prev_process is not None and t > prev_t:
+            ticks = process["cpu_ticks"] - prev_process["cpu_ticks"]
+            sample.process_cpu_percent = 100.0 * ticks / _CLOCK_TICKS / (t - prev_t)
+            sample.process_rss_gb = process["rss_bytes"] / _GB
+            sample.process_threads = process["threads"]
+            sample.process_major_faults = process["major_faults"] - prev_process["major_faults"]
+
+        with self._lock:
+            self.samples.append(sample)
+        return sample
+
+    def _run(self):
+        deadline = time.perf_counter()
+        while not self._stop_event.is_set():
+            try:
+                self.sample()
+            except OSError:
+                # /proc no disponible (sistema no Linux): nada que muestrear
+                return
+            # Plazos fijos: el costo de leer /proc no corre la grilla
+            deadline += self.interval_s
+            self._stop_event.wait(max(deadline - time.perf_counter(), 0.0))
+
+    def start(self) -> "ResourceSampler":
+        if self._thread is None or not self._thread.is_alive():
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, name="resource-sampler", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """Detiene el hilo con una última lectura y cierra las fases abiertas."""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+            try:
+                self.sample()
+            except OSError:
+                pass
+        now = timeline_now()
+        with self._lock:
+            for phase in self.phases:
+                if phase.end is None:
+                    phase.end = now
+
+    # -------------------------------------------------------------------------
+    # Fases
+    # -------------------------------------------------------------------------
+
+    @contextmanager
+    def phase(self, label: str) -> Iterator[ResourcePhase]:
+        """Marca [inicio, fin] de un bloque en la línea de tiempo."""
+        marker = ResourcePhase(label, timeline_now())
+        with self._lock:
+            self.phases.append(marker)
+        try:
+            yield marker
+        finally:
+            marker.end = timeline_now()
+
+    # -------------------------------------------------------------------------
+    # Consultas
+    # -------------------------------------------------------------------------
+
+    def window(self, start: float, end: Optional[float] = None) -> List[ResourceSample]:
+        """
+        Muestras que cubren [start, end]: cada muestra resume el intervalo
+        que termina en su t, así que se incluye la primera posterior a end.
+        """
+        end = timeline_now() if end is None else end
+        with self._lock:
+            samples = list(self.samples)
+        selected = [s for s in samples if start < s.t <= end]
+        following = next((s for s in samples if s.t > end), None)
+        if following is not None and following.t - end < self.interval_s:
+            selected.append(following)
+        return selected
+
+    def summarize(self, start: float = 0.0, end: Optional[float] = None) -> Dict:
+        return summarize_samples(self.window(start, end))
+
+    def summary_by_phase(self) -> Dict[str, Dict]:
+        """Resumen de cada fase (fases con la misma etiqueta se juntan)."""
+        windows: Dict[str, List[ResourceSample]] = {}
+        with self._lock:
+            phases = list(self.phases)
+        for phase in phases:
+            windows.setdefault(phase.label, []).extend(self.window(phase.start, phase.end))
+        return {label: summarize_samples(samples) for label, samples in windows.items()}
+
+    def to_dict(self, per_core: Optional[bool] = None) -> Dict:
+        """
+        Muestras, fases y resúmenes para el JSON de resultados. El uso por
+        core solo se incluye con per_core (default: el del sampler).
+        """
+        per_core = self.per_core if per_core is None else per_core
+        with self._lock:
+            samples = list(self.samples)
+            phases = list(self.phases)
+        return {
+            "clock": "time.perf_counter",
+            "interval_s": self.interval_s,
+            "pid": self.pid,
+            "cores": self.cores,
+            "saturation_percent": SATURATION_PERCENT,
+            "summary": summarize_samples(samples),
+            "phases": [
+                {"label": p.label, "start": round(p.start, 3),
+                 "end": round(p.end, 3) if p.end is not None else None}
+                for p in phases
+            ],
+            "by_phase": self.summary_by_phase(),
+            "samples": [s.to_dict(per_core) for s in samples]
+        }
+
+
+def format_phase_table(by_phase: Dict[str, Dict]) -> str:
+    """Tabla de CPU y memoria por fase para consola."""
+    lines = [
+        f"  {'Fase':<32} {'CPU media':>10} {'CPU máx':>8} {'Saturado':>9} "
+        f"{'Mem máx':>8} {'Swap':>7} {'Proc CPU':>9} {'Proc RSS':>9}",
+        "  " + "-" * 100
+    ]
+    for label, s in by_phase.items():
+        if not s.get("samples"):
+            lines.append(f"  {label[:32]:<32} {'(sin muestras)':>10}")
+            continue
+        proc_cpu = f"{s['process_cpu_mean_percent']:.0f}%" if "process_cpu_mean_percent" in s else "-"
+        proc_rss = f"{s['process_rss_max_gb']:.2f} GB" if "process_rss_max_gb" in s else "-"
+        lines.append(
+            f"  {label[:32]:<32} {s['cpu_mean_percent']:>9.1f}% {s['cpu_max_percent']:>7.1f}% "
+            f"{s['cpu_saturated_fraction'] * 100:>8.0f}% {s['memory_max_percent']:>7.1f}% "
+            f"{s['swap_max_gb']:>5.2f}GB {proc_cpu:>9} {proc_rss:>9}"
+        )
+    return "\n".join(lines)
+
+
+# =============================================================================
+# SAMPLER COMPARTIDO
+# =============================================================================
+
+_default_sampler: Optional[ResourceSampler] = None
+
+
+def get_resource_sampler() -> Optional[ResourceSampler]:
+    """Retorna el sampler configurado, o None si está desactivado."""
+    return _default_sampler
+
+
+def configure_resource_sampler(interval_s: float = DEFAULT_INTERVAL_S,
+                               pid: Optional[int] = None,
+                               max_samples: int = DEFAULT_MAX_SAMPLES,
+                               per_core: bool = False) -> ResourceSampler:
+    """Crea y arranca el sampler compartido (detiene el anterior)."""
+    global _default_sampler
+    if _default_sampler is not None:
+        _default_sampler.stop()
+    _default_sampler = ResourceSampler(interval_s, pid, max_samples, per_core).start()
+    return _default_sampler
+
+
+@contextmanager
+def resource_phase(label: str):
+    """Marca una fase en el sampler compartido; no hace nada si no hay sampler."""
+    sampler = get_resource_sampler()
+    if sampler is None:
+        yield None
+        return
+    with sampler.phase(label) as marker:
+        yield marker
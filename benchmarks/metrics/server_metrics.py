@@ -0,0 +1,357 @@
+#!/usr/bin/env python3
+"""
+server_metrics.py - Métricas del servidor llama.cpp (/metrics y /slots)
+Universidad de Montevideo - Tesis 2025
+
+Los runners solo leen el bloque `timings` de cada respuesta, que describe
+el request en sí pero no lo que pasaba en el servidor mientras tanto: si
+el request esperó un slot libre, cuánto KV cache estaba ocupado o cuántos
+otros requests compartían los núcleos.
+
+ServerMetricsCollector corre en un hilo de fondo y, cada `interval_s`,
+consulta:
+
+- GET /metrics (llama-server con --metrics, formato Prometheus): uso del
+  KV cache, requests en proceso y diferidos, y contadores de tokens de
+  prompt/generación y de llamadas a llama_decode
+- GET /slots: slots ocupados sobre el total
+
+Las lecturas usan la línea de tiempo de resource_sampler (timeline_now),
+la misma de started_at/finished_at de call_model, de modo que `join`
+agrega a cada request lo observado en el servidor durante su ejecución:
+máximo y media del uso del KV cache, máximo de diferidos y de slots
+ocupados, y los tokens que el servidor procesó en esa ventana (deltas de
+los contadores, de todos los requests en vuelo).
+
+Si el servidor no expone /metrics (sin --metrics responde 501) o /slots,
+ese endpoint se deja de consultar y el resto sigue funcionando.
+
+Uso:
+    from metrics.server_metrics import ServerMetricsCollector
+
+    collector = ServerMetricsCollector("localhost", 8080, interval_s=0.5).start()
+    result = run_performance_benchmark(...)
+    collector.stop()
+    collector.join(result["results"])       # row["server"] por request
+    print(collector.summarize())
+"""
+
+import http.client
+import json
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional
+
+from metrics.resource_sampler import timeline_now
+
+# =============================================================================
+# CONFIGURACIÓN
+# =============================================================================
+
+DEFAULT_INTERVAL_S = 0.5
+DEFAULT_MAX_SNAPSHOTS = 100_000
+METRIC_PREFIX = "llamacpp:"
+
+# Contadores monótonos de llama-server: en una ventana se reporta el delta
+COUNTERS = ("prompt_tokens_total", "tokens_predicted_total", "n_decode_total")
+
+
+# =============================================================================
+# PARSEO
+# =============================================================================
+
+def parse_prometheus(text: str) -> Dict[str, float]:
+    """
+    Valores del formato de exposición de Prometheus, sin el prefijo
+    'llamacpp:'. Las series con etiquetas conservan '{...}' en el nombre.
+    """
+    metrics: Dict[str, float] = {}
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        if "}" in line:
+            name, _, rest = line.partition("}")
+            name += "}"
+        else:
+            name, _, rest = line.partition(" ")
+        parts = rest.split()
+        if not parts:
+            continue
+        try:
+            value = float(parts[0])
+        except ValueError:
+            continue
+        if name.startswith(METRIC_PREFIX):
+            name = name[len(METRIC_PREFIX):]
+        metrics[name] = value
+    return metrics
+
+
+def _slot_busy(slot: Dict) -> bool:
+    """Slot ocupado: 'is_processing' (actual) o 'state' != 0 (versiones viejas)."""
+    if "is_processing" in slot:
+        return bool(slot["is_processing"])
+    return slot.get("state", 0) != 0
+
+
+# =============================================================================
+# DATACLASSES
+# =============================================================================
+
+@dataclass
+class ServerSnapshot:
+    """Una lectura de /metrics y /slots."""
+    t: float                                        # timeline_now() de la lectura
+    metrics: Dict[str, float] = field(default_factory=dict)
+    busy_slots: Optional[int] = None
+    total_slots: Optional[int] = None
+
+    @property
+    def kv_cache_usage_ratio(self) -> Optional[float]:
+        return self.metrics.get("kv_cache_usage_ratio")
+
+    @property
+    def requests_processing(self) -> Optional[float]:
+        return self.metrics.get("requests_processing")
+
+    @property
+    def requests_deferred(self) -> Optional[float]:
+        return self.metrics.get("requests_deferred")
+
+    def to_dict(self) -> Dict:
+        data = {"t": round(self.t, 3)}
+        for name in ("kv_cache_usage_ratio", "kv_cache_tokens", "requests_processing",
+                     "requests_deferred") + COUNTERS:
+            if name in self.metrics:
+                data[name] = round(self.metrics[name], 4)
+        if self.busy_slots is not None:
+            data["busy_slots"] = self.busy_slots
+            data["total_slots"] = self.total_slots
+        return data
+
+
+def summarize_snapshots(snapshots: List[ServerSnapshot],
+                        before: Optional[ServerSnapshot] = None,
+                        after: Optional[ServerSnapshot] = None) -> Dict:
+    """
+    Uso de KV cache, diferidos y ocupación de slots de un conjunto de
+    lecturas. Los contadores se restan entre `before` (última lectura
+    anterior a la ventana) y `after` (primera posterior), o entre la
+    primera y la última lectura si no se dan.
+    """
+    if not snapshots and not (before and after):
+        return {"snapshots": 0}
+    summary: Dict = {"snapshots": len(snapshots)}
+
+    def values(attr: str) -> List[float]:
+        return [getattr(s, attr) for s in snapshots if getattr(s, attr) is not None]
+
+    kv = values("kv_cache_usage_ratio")
+    if kv:
+        summary["kv_cache_usage_mean"] = round(sum(kv) / len(kv), 4)
+        summary["kv_cache_usage_max"] = round(max(kv), 4)
+    deferred = values("requests_deferred")
+    if deferred:
+        summary["requests_deferred_max"] = int(max(deferred))
+        summary["requests_deferred_mean"] = round(sum(deferred) / len(deferred), 2)
+        summary["deferred_fraction"] = round(sum(d > 0 for d in deferred) / len(deferred), 3)
+    processing = values("requests_processing")
+    if processing:
+        summary["requests_processing_max"] = int(max(processing))
+    slots = [s for s in snapshots if s.busy_slots is not None and s.total_slots]
+    if slots:
+        summary["busy_slots_max"] = max(s.busy_slots for s in slots)
+        summary["total_slots"] = slots[-1].total_slots
+        summary["slot_occupancy_mean"] = round(
+            sum(s.busy_slots / s.total_slots for s in slots) / len(slots), 3)
+
+    first = before or (snapshots[0] if snapshots else None)
+    last = after or (snapshots[-1] if snapshots else None)
+    if first is not None and last is not None and first is not last:
+        for name in COUNTERS:
+            if name in first.metrics and name in last.metrics:
+                # Un reinicio del servidor pone los contadores en 0
+                summary[name.replace("_total", "")] = int(max(last.metrics[name] - first.metrics[name], 0))
+    return summary
+
+
+# =============================================================================
+# COLECTOR
+# =============================================================================
+
+class ServerMetricsCollector:
+    """Hilo de fondo que consulta /metrics y /slots de un servidor llama.cpp."""
+
+    def __init__(self, host: str = "localhost", port: int = 8080,
+                 interval_s: float = DEFAULT_INTERVAL_S,
+                 max_snapshots: int = DEFAULT_MAX_SNAPSHOTS, timeout: float = 5.0):
+        if interval_s <= 0:
+            raise ValueError("interval_s debe ser positivo")
+        self.host = host
+        self.port = port
+        self.interval_s = interval_s
+        self.timeout = timeout
+        self.snapshots: "deque[ServerSnapshot]" = deque(maxlen=max_snapshots)
+        self.metrics_available: Optional[bool] = None
+        self.slots_available: Optional[bool] = None
+        self.errors = 0
+        # Conexión propia (no el pool de http_transport): con el pool lleno
+        # de requests en vuelo el colector esperaría justo cuando más
+        # importa medir
+        self._conn: Optional[http.client.HTTPConnection] = None
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def endpoint(self) -> str:
+        return f"{self.host}:{self.port}"
+
+    # -------------------------------------------------------------------------
+    # Muestreo
+    # -------------------------------------------------------------------------
+
+    def _get(self, path: str) -> Optional[str]:
+        """Cuerpo de GET path; None si el servidor no lo soporta (404/501)."""
+        if self._conn is None:
+            self._conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        try:
+            self._conn.request("GET", path)
+            response = self._conn.getresponse()
+            body = response.read().decode("utf-8", errors="replace")
+        except (OSError, http.client.HTTPException):
+            self._close()
+            raise
+        if response.will_close:
+            self._close()
+        if response.status in (404, 501):
+            return None
+        if response.status >= 400:
+            raise http.client.HTTPException(f"HTTP {response.status}: {body[:200]}")
+        return body
+
+    def _close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def sample(self) -> Optional[ServerSnapshot]:
+        """Consulta los endpoints disponibles y guarda la lectura."""
+        snapshot = ServerSnapshot(t=timeline_now())
+        try:
+            if self.metrics_available is not False:
+                body = self._get("/metrics")
+                self.metrics_available = body is not None
+                if body is not None:
+                    snapshot.metrics = parse_prometheus(body)
+            if self.slots_available is not False:
+                body = self._get("/slots")
+                self.slots_available = body is not None
+                if body is not None:
+                    slots = json.loads(body)
+                    snapshot.busy_slots = sum(_slot_busy(slot) for slot in slots)
+                    snapshot.total_slots = len(slots)
+        except Exception:
+            self.errors += 1
+            return None
+        if not snapshot.metrics and snapshot.busy_slots is None:
+            return None
+        with self._lock:
+            self.snapshots.append(snapshot)
+        return snapshot
+
+    def _run(self):
+        deadline = time.perf_counter()
+        while not self._stop_event.is_set():
+            self.sample()
+            if self.metrics_available is False and self.slots_available is False:
+                return
+            deadline += self.interval_s
+            self._stop_event.wait(max(deadline - time.perf_counter(), 0.0))
+
+    def start(self) -> "ServerMetricsCollector":
+        if self._thread is None or not self._thread.is_alive():
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, name="server-metrics", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """Detiene el hilo con una última lectura (cierra la ventana del último request)."""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+            self.sample()
+        self._close()
+
+    # -------------------------------------------------------------------------
+    # Consultas
+    # -------------------------------------------------------------------------
+
+    def summarize(self, start: float = 0.0, end: Optional[float] = None) -> Dict:
+        """Resumen de las lecturas en [start, end] (contadores con deltas)."""
+        end = timeline_now() if end is None else end
+        with self._lock:
+            snapshots = list(self.snapshots)
+        inside = [s for s in snapshots if start <= s.t <= end]
+        before = next((s for s in reversed(snapshots) if s.t < start), None)
+        after = next((s for s in snapshots if s.t > end), None)
+        return summarize_snapshots(inside, before, after)
+
+    def join(self, records: Iterable[Dict], key: str = "server") -> int:
+        """
+        Agrega record[key] con el resumen del servidor durante cada request.
+
+        Los tiempos se buscan en el record o en record["performance"] (filas
+        de calidad); el resumen se guarda junto a ellos. Retorna cuántos
+        records se completaron.
+        """
+        joined = 0
+        for record in records:
+            target = record if "started_at" in record else record.get("performance", {})
+            if "started_at" not in target or "finished_at" not in target:
+                continue
+            summary = self.summarize(target["started_at"], target["finished_at"])
+            summary.pop("snapshots", None)
+            if summary:
+                target[key] = summary
+                joined += 1
+        return joined
+
+    def to_dict(self) -> Dict:
+        """Lecturas y resumen para el JSON de resultados."""
+        with self._lock:
+            snapshots = list(self.snapshots)
+        return {
+            "clock": "time.perf_counter",
+            "endpoint": self.endpoint,
+            "interval_s": self.interval_s,
+            "metrics_available": bool(self.metrics_available),
+            "slots_available": bool(self.slots_available),
+            "errors": self.errors,
+            "summary": summarize_snapshots(snapshots),
+            "snapshots": [s.to_dict() for s in snapshots]
+        }
+
+
+def format_server_summary(endpoint: str, summary: Dict) -> str:
+    """Línea de consola con lo principal del resumen."""
+    if not summary.get("snapshots"):
+        return f"  {endpoint}: sin lecturas de /metrics ni /slots"
+    parts = []
+    if "kv_cache_usage_max" in summary:
+        parts.append(f"KV cache media {summary['kv_cache_usage_mean']:.1%} / máx {summary['kv_cache_usage_max']:.1%}")
+    if "requests_deferred_max" in summary:
+        parts.append(f"diferidos máx {summary['requests_deferred_max']} "
+                     f"({summary['deferred_fraction']:.0%} del tiempo)")
+    if "slot_occupancy_mean" in summary:
+        parts.append(f"slots {summary['slot_occupancy_mean']:.0%} ocupados "
+                     f"(máx {summary['busy_slots_max']}/{summary['total_slots']})")
+    if "prompt_tokens" in summary:
+        parts.append(f"tokens prompt {summary['prompt_tokens']}, "
+                     f"generados {summary.get('tokens_predicted', 0)}")
+    return f"  {endpoint}: " + ", ".join(parts)
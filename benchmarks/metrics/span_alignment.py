@@ -0,0 +1,495 @@
+#!/usr/bin/env python3
+"""
+span_alignment.py - Evaluación por alineamiento de spans
+Universidad de Montevideo - Tesis 2025
+
+calculate_standard_metrics suponía que cada placeholder corresponde a una
+entidad (FP = placeholders - TP) y nunca llenaba los FP por categoría, con
+lo que la precisión por categoría era siempre 1.
+
+Este módulo alinea el texto original con el anonimizado y recupera, para
+cada placeholder, el span del original que reemplazó:
+
+1. Tokeniza ambos textos (placeholders como un solo token)
+2. Ancla los tokens únicos en ambos textos y toma la subsecuencia
+   creciente más larga (patience diff, O(n log n)); si un hueco no tiene
+   tokens únicos (secciones repetidas o plantillas) usa los de baja
+   frecuencia, apareando sus apariciones en orden
+3. Recursa entre anclas; los huecos chicos sin anclas se resuelven con
+   difflib y los grandes con difflib por ventanas de CHUNK_TOKENS, que
+   avanzan hasta el último bloque igual (lineal en el largo del hueco)
+4. Cada placeholder en un bloque reemplazado toma una entidad ground
+   truth de ese bloque (primero de su etiqueta); si no quedan, los tokens
+   originales del bloque en proporción
+5. Si la salida parafrasea y un placeholder queda sin entidad de su
+   etiqueta, toma la más cercana libre entre sus vecinos alineados
+
+Con los spans alineados, un placeholder es TP si cubre una entidad ground
+truth de su misma etiqueta, FP si no cubre ninguna (o la etiqueta no
+coincide), y cada entidad sin placeholder correcto es FN. Las categorías
+se comparan por etiqueta de placeholder (NOMBRE, CI, FECHA, ...), que es
+lo que el modelo produce.
+
+Uso:
+    from metrics.span_alignment import evaluate_spans
+
+    evaluation = evaluate_spans(original, anonimizado, entidades, case_id="A1")
+    print(evaluation.to_dict())
+"""
+
+import bisect
+import difflib
+import re
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from metrics.leak_scanner import find_leaks
+
+try:
+    from dataset.phi_categories import PLACEHOLDERS
+except ImportError:
+    PLACEHOLDERS = {}
+
+# =============================================================================
+# CONFIGURACIÓN
+# =============================================================================
+
+_TOKEN = re.compile(r"\[[A-ZÁÉÍÓÚÑ_]+\]|\w+|[^\w\s]")
+_PLACEHOLDER = re.compile(r"\[([A-ZÁÉÍÓÚÑ_]+)\]")
+_WORD_TOKEN = re.compile(r"\w")
+
+SMALL_GAP_TOKENS = 64           # Huecos menores se alinean directo con difflib
+MAX_ANCHOR_COUNT = 4            # Apariciones máximas de un token ancla de baja frecuencia
+CHUNK_TOKENS = 256              # Ventana de difflib para huecos grandes sin anclas
+
+Token = Tuple[str, int, int]    # (texto, start, end)
+
+
+def tokenize(text: str) -> List[Token]:
+    return [(m.group(), m.start(), m.end()) for m in _TOKEN.finditer(text)]
+
+
+def placeholder_label(category: str) -> str:
+    """Etiqueta de placeholder de una categoría ('NAME_PATIENT' -> 'NOMBRE')."""
+    placeholder = PLACEHOLDERS.get(category)
+    if placeholder is None:
+        # Categorías genéricas de los casos v3 (p. ej. CONTACT_PHONE)
+        placeholder = next((v for k, v in PLACEHOLDERS.items() if k.startswith(category + "_")),
+                           f"[{category}]")
+    return placeholder.strip("[]")
+
+
+# =============================================================================
+# DIFF POR ANCLAS
+# =============================================================================
+
+def _longest_increasing(pairs: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """LIS sobre el segundo índice de pares ordenados por el primero."""
+    tails: List[int] = []
+    tail_index: List[int] = []
+    previous = [-1] * len(pairs)
+    for i, (_, b) in enumerate(pairs):
+        k = bisect.bisect_left(tails, b)
+        if k == len(tails):
+            tails.append(b)
+            tail_index.append(i)
+        else:
+            tails[k] = b
+            tail_index[k] = i
+        previous[i] = tail_index[k - 1] if k > 0 else -1
+    result = []
+    i = tail_index[-1] if tail_index else -1
+    while i >= 0:
+        result.append(pairs[i])
+        i = previous[i]
+    return result[::-1]
+
+
+def _anchors(a: List[str], b: List[str], a0: int, a1: int,
+             b0: int, b1: int) -> List[Tuple[int, int]]:
+    """
+    Anclas del hueco: tokens únicos en ambos lados o, si no hay, tokens con
+    la misma cantidad de apariciones (<= MAX_ANCHOR_COUNT) en ambos, con
+    la k-ésima aparición de a apareada con la k-ésima de b.
+    """
+    count_a = Counter(a[a0:a1])
+    count_b = Counter(b[b0:b1])
+    for limit in (1, MAX_ANCHOR_COUNT):
+        positions_b: Dict[str, List[int]] = defaultdict(list)
+        for j in range(b0, b1):
+            if count_b[b[j]] <= limit and count_a[b[j]] == count_b[b[j]]:
+                positions_b[b[j]].append(j)
+        if not positions_b:
+            continue
+        seen: Counter = Counter()
+        pairs = []
+        for i in range(a0, a1):
+            positions = positions_b.get(a[i])
+            if positions:
+                pairs.append((i, positions[seen[a[i]]]))
+                seen[a[i]] += 1
+        return _longest_increasing(pairs)
+    return []
+
+
+def _diff_windows(a: List[str], b: List[str], a0: int, a1: int, b0: int, b1: int,
+                  opcodes: List[Tuple[str, int, int, int, int]]):
+    """
+    difflib sobre un hueco grande sin anclas, por ventanas de CHUNK_TOKENS
+    (proporcionales en b). De cada ventana se conservan los opcodes hasta
+    el último bloque igual que termina en sus primeros 3/4 y la siguiente
+    empieza ahí: O(n * CHUNK_TOKENS) en lugar de cuadrático.
+    """
+    while a1 - a0 > CHUNK_TOKENS and b1 - b0 > CHUNK_TOKENS:
+        window_a = CHUNK_TOKENS
+        window_b = min(b1 - b0, max(1, round(CHUNK_TOKENS * (b1 - b0) / (a1 - a0))))
+        matcher = difflib.SequenceMatcher(None, a[a0:a0 + window_a], b[b0:b0 + window_b],
+                                          autojunk=False)
+        cut = None
+        for block in matcher.get_matching_blocks():
+            if block.size and block.a + block.size <= window_a * 3 // 4:
+                cut = (block.a + block.size, block.b + block.size)
+        if cut is None:
+            # Sin coincidencias en el primer tramo: la ventana entera es un reemplazo
+            cut = (window_a, window_b)
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+            if i1 >= cut[0] and j1 >= cut[1]:
+                break
+            i2, j2 = min(i2, cut[0]), min(j2, cut[1])
+            opcodes.append((tag, a0 + i1, a0 + i2, b0 + j1, b0 + j2))
+        a0 += cut[0]
+        b0 += cut[1]
+
+    if a0 < a1 and b0 < b1:
+        matcher = difflib.SequenceMatcher(None, a[a0:a1], b[b0:b1], autojunk=False)
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+            opcodes.append((tag, a0 + i1, a0 + i2, b0 + j1, b0 + j2))
+    elif a0 < a1:
+        opcodes.append(("delete", a0, a1, b0, b0))
+    elif b0 < b1:
+        opcodes.append(("insert", a0, a0, b0, b1))
+
+
+def _diff(a: List[str], b: List[str], a0: int, a1: int, b0: int, b1: int,
+          opcodes: List[Tuple[str, int, int, int, int]]):
+    """Agrega a opcodes (formato difflib) el alineamiento de a[a0:a1] con b[b0:b1]."""
+    # Prefijo y sufijo comunes
+    start_a, start_b = a0, b0
+    while a0 < a1 and b0 < b1 and a[a0] == b[b0]:
+        a0 += 1
+        b0 += 1
+    if a0 > start_a:
+        opcodes.append(("equal", start_a, a0, start_b, b0))
+    suffix = 0
+    while a1 - suffix > a0 and b1 - suffix > b0 and a[a1 - suffix - 1] == b[b1 - suffix - 1]:
+        suffix += 1
+    end_a, end_b = a1, b1
+    a1 -= suffix
+    b1 -= suffix
+
+    if a0 < a1 or b0 < b1:
+        anchors = []
+        if a0 < a1 and b0 < b1 and (a1 - a0) + (b1 - b0) > SMALL_GAP_TOKENS:
+            anchors = _anchors(a, b, a0, a1, b0, b1)
+        if anchors:
+            ia, ib = a0, b0
+            for i, j in anchors:
+                _diff(a, b, ia, i, ib, j, opcodes)
+                opcodes.append(("equal", i, i + 1, j, j + 1))
+                ia, ib = i + 1, j + 1
+            _diff(a, b, ia, a1, ib, b1, opcodes)
+        elif a0 == a1:
+            opcodes.append(("insert", a0, a0, b0, b1))
+        elif b0 == b1:
+            opcodes.append(("delete", a0, a1, b0, b0))
+        else:
+            _diff_windows(a, b, a0, a1, b0, b1, opcodes)
+
+    if suffix:
+        opcodes.append(("equal", a1, end_a, b1, end_b))
+
+
+def diff_tokens(a: List[str], b: List[str]) -> List[Tuple[str, int, int, int, int]]:
+    """Opcodes (tag, i1, i2, j1, j2) que transforman a en b."""
+    opcodes: List[Tuple[str, int, int, int, int]] = []
+    _diff(a, b, 0, len(a), 0, len(b), opcodes)
+    return opcodes
+
+
+# =============================================================================
+# DATACLASSES
+# =============================================================================
+
+@dataclass
+class AlignedPlaceholder:
+    """Placeholder del texto anonimizado y el span del original que reemplazó."""
+    label: str
+    start: int                      # Offsets en el texto anonimizado
+    end: int
+    source_start: int               # Offsets en el texto original
+    source_end: int
+
+
+@dataclass
+class SpanEvaluation:
+    """TP/FP/FN por etiqueta de placeholder."""
+    tp: Dict[str, int] = field(default_factory=dict)
+    fp: Dict[str, int] = field(default_factory=dict)
+    fn: Dict[str, int] = field(default_factory=dict)
+    placeholders: List[AlignedPlaceholder] = field(default_factory=list)
+
+    @property
+    def true_positives(self) -> int:
+        return sum(self.tp.values())
+
+    @property
+    def false_positives(self) -> int:
+        return sum(self.fp.values())
+
+    @property
+    def false_negatives(self) -> int:
+        return sum(self.fn.values())
+
+    def categories(self) -> List[str]:
+        return sorted(set(self.tp) | set(self.fp) | set(self.fn))
+
+    def per_category(self) -> Dict[str, Dict[str, float]]:
+        """precision, recall y f1 por etiqueta."""
+        result = {}
+        for label in self.categories():
+            tp, fp, fn = self.tp.get(label, 0), self.fp.get(label, 0), self.fn.get(label, 0)
+            precision = tp / (tp + fp) if tp + fp else 0.0
+            recall = tp / (tp + fn) if tp + fn else 0.0
+            f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+            result[label] = {"tp": tp, "fp": fp, "fn": fn,
+                             "precision": precision, "recall": recall, "f1": f1}
+        return result
+
+    def to_dict(self) -> Dict:
+        return {
+            "true_positives": self.true_positives,
+            "false_positives": self.false_positives,
+            "false_negatives": self.false_negatives,
+            "por_categoria": {
+                label: {k: round(v, 4) if isinstance(v, float) else v for k, v in values.items()}
+                for label, values in self.per_category().items()
+            }
+        }
+
+
+# =============================================================================
+# ALINEAMIENTO Y EVALUACIÓN
+# =============================================================================
+
+def _align(original: str, anonymized: str) -> Tuple[List[Token], List[Token], List[Tuple[str, int, int, int, int]]]:
+    source = tokenize(original)
+    target = tokenize(anonymized)
+    return source, target, diff_tokens([t[0] for t in source], [t[0] for t in target])
+
+
+def _typed_spans(labels: List[str], gold: List[Tuple[int, int, str, str]]) -> Dict[int, Tuple[int, int]]:
+    """
+    Asigna placeholders de un bloque a entidades del mismo bloque: primero
+    por etiqueta, después en orden. Cuando la salida parafrasea, el reparto
+    proporcional de tokens no tiene relación con dónde estaba cada entidad.
+    """
+    assigned: Dict[int, Tuple[int, int]] = {}
+    free = list(gold)
+    for same_label in (True, False):
+        for k, label in enumerate(labels):
+            if k in assigned:
+                continue
+            match = next((g for g in free if not same_label or g[2] == label), None)
+            if match is not None:
+                assigned[k] = (match[0], match[1])
+                free.remove(match)
+    return assigned
+
+
+def align_placeholders(original: str, anonymized: str,
+                       gold: Optional[List[Tuple[int, int, str, str]]] = None) -> List[AlignedPlaceholder]:
+    """
+    Mapea cada placeholder del texto anonimizado al span original que reemplazó.
+
+    Con `gold` (spans de _gold_spans), los placeholders de un bloque
+    reemplazado toman las entidades de ese bloque (ver _typed_spans); el
+    resto se reparte en proporción a los tokens.
+    """
+    source, target, opcodes = _align(original, anonymized)
+    return _placeholders(original, source, target, opcodes, gold or [])
+
+
+def _placeholders(original: str, source: List[Token], target: List[Token],
+                  opcodes: List[Tuple[str, int, int, int, int]],
+                  gold: List[Tuple[int, int, str, str]]) -> List[AlignedPlaceholder]:
+    aligned = []
+    for tag, i1, i2, j1, j2 in opcodes:
+        if tag in ("equal", "delete"):
+            continue
+        positions = [j for j in range(j1, j2) if _PLACEHOLDER.fullmatch(target[j][0])]
+        if not positions:
+            continue
+        # Los tokens originales del bloque se reparten en orden entre sus placeholders
+        count = len(positions)
+        spans = []
+        for k in range(count):
+            lo = i1 + (i2 - i1) * k // count
+            hi = i1 + (i2 - i1) * (k + 1) // count
+            if hi > lo:
+                spans.append((source[lo][1], source[hi - 1][2]))
+            else:
+                anchor = source[i1][1] if i1 < len(source) else len(original)
+                spans.append((anchor, anchor))
+        if i2 > i1 and gold:
+            block_start, block_end = source[i1][1], source[i2 - 1][2]
+            inside = [g for g in gold if g[0] < block_end and block_start < g[1]]
+            labels = [target[j][0][1:-1] for j in positions]
+            for k, span in _typed_spans(labels, inside).items():
+                spans[k] = span
+        for j, span in zip(positions, spans):
+            token, start, end = target[j]
+            aligned.append(AlignedPlaceholder(token[1:-1], start, end, span[0], span[1]))
+    if gold:
+        _realign_by_label(aligned, gold, source, opcodes)
+    return aligned
+
+
+def _realign_by_label(aligned: List[AlignedPlaceholder], gold: List[Tuple[int, int, str, str]],
+                      source: List[Token], opcodes: List[Tuple[str, int, int, int, int]]):
+    """
+    Un placeholder que no cubre una entidad de su etiqueta toma la entidad
+    libre más cercana de esa etiqueta entre los placeholders bien alineados
+    vecinos. Cubre las paráfrasis, donde el placeholder cae en un bloque
+    insertado y la entidad en el bloque reemplazado de al lado. Las
+    entidades que sobreviven en la salida no se reasignan: siguen siendo FN.
+    """
+    survived = {source[i][1] for tag, i1, i2, _, _ in opcodes if tag == "equal"
+                for i in range(i1, i2) if _WORD_TOKEN.match(source[i][0])}
+
+    def covers(p: AlignedPlaceholder, g: Tuple[int, int, str, str]) -> bool:
+        return g[2] == p.label and p.source_start < g[1] and g[0] < p.source_end
+
+    good = [any(covers(p, g) for g in gold) for p in aligned]
+    claimed = {g for p, ok in zip(aligned, good) if ok for g in gold if covers(p, g)}
+    for k, p in enumerate(aligned):
+        if good[k]:
+            continue
+        low = max((q.source_end for q, ok in zip(aligned[:k], good[:k]) if ok), default=0)
+        high = min((q.source_start for q, ok in zip(aligned[k + 1:], good[k + 1:]) if ok),
+                   default=float("inf"))
+        candidates = [g for g in gold
+                      if g[2] == p.label and g not in claimed and low <= g[0] and g[1] <= high
+                      and not any(g[0] <= start < g[1] for start in survived)]
+        if candidates:
+            g = min(candidates, key=lambda g: abs(g[0] - p.source_start))
+            aligned[k] = AlignedPlaceholder(p.label, p.start, p.end, g[0], g[1])
+            good[k] = True
+            claimed.add(g)
+
+
+def _source_span(source: List[Token], target: List[Token],
+                 opcodes: List[Tuple[str, int, int, int, int]],
+                 start: int, end: int) -> Optional[Tuple[int, int]]:
+    """Span del original del que proviene el span [start, end) de la salida."""
+    lo, hi = None, None
+    for tag, i1, i2, j1, j2 in opcodes:
+        if tag == "insert" or i1 == i2:
+            continue
+        for j in range(j1, j2):
+            if not (target[j][1] < end and start < target[j][2]):
+                continue
+            first, last = (i1 + j - j1,) * 2 if tag == "equal" else (i1, i2 - 1)
+            lo = source[first][1] if lo is None else min(lo, source[first][1])
+            hi = source[last][2] if hi is None else max(hi, source[last][2])
+    return (lo, hi) if lo is not None else None
+
+
+def _gold_spans(original: str, entities: List[Dict], case_id: Optional[str],
+                value_key: str) -> List[Tuple[int, int, str, str]]:
+    """Apariciones de cada entidad en el original; se descartan las anidadas."""
+    labels = {}
+    for entity in entities:
+        value = entity.get(value_key, "")
+        if value and value not in labels:
+            labels[value] = placeholder_label(entity.get("category", entity.get("tipo", "")))
+
+    spans = sorted(
+        ((start, start + len(value), labels[value], value)
+         for value, starts in find_leaks(original, entities, case_id, value_key).items()
+         for start in starts),
+        key=lambda s: (s[0], -s[1])
+    )
+    gold = []
+    for span in spans:
+        if gold and span[1] <= gold[-1][1]:
+            continue                # Contenida en una entidad más larga
+        gold.append(span)
+    return gold
+
+
+def evaluate_spans(original: str, anonymized: str, entities: List[Dict],
+                   case_id: Optional[str] = None, value_key: str = "value",
+                   leaked: Optional[Dict[str, List[Tuple[int, int]]]] = None) -> SpanEvaluation:
+    """
+    TP/FP/FN por etiqueta a partir del alineamiento. La unidad es la
+    aparición de cada entidad en el original.
+
+    - TP: aparición cubierta por un placeholder de su etiqueta
+    - FN: aparición sin placeholder de su etiqueta (escapada o mal
+      etiquetada), o de la que sobrevive un fragmento de `leaked`
+    - FP: placeholder que no cubre ninguna aparición de su etiqueta
+
+    Args:
+        leaked: {valor: spans en el texto anonimizado} de fugas parciales
+            (ver partial_leaks.py); cada span se proyecta al original y la
+            aparición de la que proviene cuenta como FN
+    """
+    gold = _gold_spans(original, entities, case_id, value_key)
+    source, target, opcodes = _align(original, anonymized)
+    placeholders = sorted(_placeholders(original, source, target, opcodes, gold),
+                          key=lambda p: p.source_start)
+
+    # Cada fragmento filtrado anula la aparición de la que proviene: la del
+    # mismo valor si la proyección la toca, si no la de mayor solapamiento
+    leaked_gold = set()
+    for value, spans in (leaked or {}).items():
+        for start, end in spans:
+            span = _source_span(source, target, opcodes, start, end)
+            if span is None:
+                continue
+            overlapping = [g for g in gold if g[0] < span[1] and span[0] < g[1]]
+            same_value = [g for g in overlapping if g[3] == value]
+            if same_value or overlapping:
+                leaked_gold.add(max(same_value or overlapping,
+                                    key=lambda g: min(g[1], span[1]) - max(g[0], span[0])))
+
+    evaluation = SpanEvaluation(placeholders=placeholders)
+    tp, fp, fn = defaultdict(int), defaultdict(int), defaultdict(int)
+    matched = [False] * len(placeholders)
+
+    first = 0
+    for g in gold:
+        start, end, label, _ = g
+        # Ordenados por inicio; los que terminan antes de esta entidad no cubren las siguientes
+        while first < len(placeholders) and placeholders[first].source_end <= start:
+            first += 1
+        hit = False
+        k = first
+        while k < len(placeholders) and placeholders[k].source_start < end:
+            p = placeholders[k]
+            if p.source_end > start and p.label == label:
+                matched[k] = True
+                hit = True
+            k += 1
+        if hit and g not in leaked_gold:
+            tp[label] += 1
+        else:
+            fn[label] += 1
+
+    for p, was_matched in zip(placeholders, matched):
+        if not was_matched:
+            fp[p.label] += 1
+
+    evaluation.tp, evaluation.fp, evaluation.fn = dict(tp), dict(fp), dict(fn)
+    return evaluation
@@ -0,0 +1,390 @@
+#!/usr/bin/env python3
+"""
+mma_ab.py - Benchmark A/B intercalado: build llama.cpp con MMA vs sin MMA
+Universidad de Montevideo - Tesis 2025
+
+El argumento de la tesis es calculate_speedup(tps_mma, tps_baseline), pero
+medir cada build en una corrida separada mezcla el speedup con la deriva
+térmica y la carga de fondo entre corridas. Este runner envía los mismos
+requests a dos endpoints con el mismo modelo (uno compilado con MMA y otro
+sin MMA) en orden aleatorio e intercalado:
+
+- Cada bloque es un par (caso, repetición) con un request a cada build,
+  en orden aleatorio dentro del bloque; los bloques también se barajan
+- Los requests son secuenciales: las dos builds nunca compiten por CPU
+- Sin cache_prompt y con ignore_eos, ambas builds evalúan el prompt
+  completo y generan la misma cantidad de tokens
+
+El speedup se reporta por caso y en total, por separado para la fase de
+prompt (TPS de evaluación) y la de generación, con IC bootstrap pareado
+por bloque (por caso en el total) del cociente de medias.
+
+Uso:
+    python mma_ab.py --mma localhost:8089 --baseline localhost:8092
+    python mma_ab.py --mma 8089 --baseline 8092 --casos A1 A2 B1 --repeticiones 10
+    python mma_ab.py --mma 8089 --baseline 8092 --seed 7 --n-predict 256
+"""
+
+import argparse
+import json
+import random
+import sys
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from experiment_runner_v3 import CASOS_CLINICOS, PROMPT_STRATEGIES
+from http_transport import get_transport
+from metrics.bootstrap import bootstrap_ratio, DEFAULT_CONFIDENCE
+from metrics.performance_metrics import calculate_speedup, check_mma_enabled
+from metrics.resource_sampler import timeline_now
+
+# =============================================================================
+# CONFIGURACIÓN
+# =============================================================================
+
+DEFAULT_REPETITIONS = 5
+DEFAULT_N_PREDICT = 128
+DEFAULT_WARMUP = 2
+DEFAULT_SEED = 2025
+REQUEST_TIMEOUT_S = 300
+
+ARMS = ("mma", "baseline")
+
+# Fase -> campo de TPS de cada request
+PHASES = {
+    "prompt": "tps_prompt",
+    "generacion": "tps_generation",
+}
+PHASE_LABELS = {"prompt": "Prompt", "generacion": "Generación"}
+
+
+@dataclass
+class Endpoint:
+    """Servidor llama.cpp de una de las builds."""
+    host: str
+    port: int
+
+    @classmethod
+    def parse(cls, value: str) -> "Endpoint":
+        """'host:port' o solo 'port' (localhost)."""
+        host, _, port = value.rpartition(":")
+        return cls(host or "localhost", int(port))
+
+    @property
+    def label(self) -> str:
+        return f"{self.host}:{self.port}"
+
+
+# =============================================================================
+# ENDPOINTS
+# =============================================================================
+
+def endpoint_info(endpoint: Endpoint) -> Dict:
+    """Modelo y build que reporta /props (vacío si no responde)."""
+    try:
+        response = get_transport().get(endpoint.host, endpoint.port, "/props", timeout=10)
+        response.raise_for_status()
+        props = response.json()
+    except Exception as e:
+        return {"endpoint": endpoint.label, "error": str(e)}
+    info = {
+        "endpoint": endpoint.label,
+        "model_path": props.get("model_path", ""),
+        "build_info": props.get("build_info", ""),
+        "total_slots": props.get("total_slots", 0),
+    }
+    if props.get("system_info"):
+        info["system_info"] = props["system_info"]
+        info["mma_in_system_info"] = "MMA = 1" in props["system_info"]
+    return info
+
+
+def same_model(infos: Dict[str, Dict]) -> bool:
+    """True si ambas builds sirven el mismo archivo de modelo."""
+    names = {Path(info.get("model_path", "")).name for info in infos.values()}
+    return len(names) == 1 and "" not in names
+
+
+# =============================================================================
+# PLAN INTERCALADO
+# =============================================================================
+
+def build_schedule(case_ids: Sequence[str], repetitions: int,
+                   seed: Optional[int] = DEFAULT_SEED) -> List[Dict]:
+    """
+    Orden de ejecución: bloques (caso, repetición) barajados, cada uno con
+    un request por build en orden aleatorio.
+    """
+    rng = random.Random(seed)
+    blocks = [(case_id, rep) for case_id in case_ids for rep in range(repetitions)]
+    rng.shuffle(blocks)
+    schedule = []
+    for block, (case_id, rep) in enumerate(blocks):
+        arms = list(ARMS)
+        rng.shuffle(arms)
+        for position, arm in enumerate(arms):
+            schedule.append({"block": block, "case_id": case_id, "repetition": rep,
+                             "arm": arm, "position": position})
+    return schedule
+
+
+# =============================================================================
+# EJECUCIÓN
+# =============================================================================
+
+def measure(endpoint: Endpoint, prompt: str, n_predict: int) -> Dict:
+    """Un request sin cache de prompt; TPS por fase según los timings del servidor."""
+    payload = {
+        "prompt": prompt,
+        "n_predict": n_predict,
+        "temperature": 0.1,
+        "seed": DEFAULT_SEED,
+        "cache_prompt": False,
+        "ignore_eos": True,
+        "stream": False
+    }
+    started_at = timeline_now()
+    start = time.perf_counter()
+    try:
+        response = get_transport().post_json(endpoint.host, endpoint.port, "/completion",
+                                             payload, REQUEST_TIMEOUT_S)
+        response.raise_for_status()
+        timings = response.json().get("timings", {})
+    except Exception as e:
+        return {"success": False, "error": str(e), "started_at": round(started_at, 3)}
+    return {
+        "success": True,
+        "tokens_prompt": timings.get("prompt_n", 0),
+        "tokens_generated": timings.get("predicted_n", 0),
+        "tps_prompt": round(timings.get("prompt_per_second", 0.0), 3),
+        "tps_generation": round(timings.get("predicted_per_second", 0.0), 3),
+        "latency_ms": round((time.perf_counter() - start) * 1000, 1),
+        "started_at": round(started_at, 3)
+    }
+
+
+def run_ab(endpoints: Dict[str, Endpoint], prompts: Dict[str, str],
+           schedule: List[Dict], n_predict: int, warmup: int = DEFAULT_WARMUP) -> List[Dict]:
+    """Ejecuta el plan en orden; retorna una fila por request."""
+    first_prompt = next(iter(prompts.values()))
+    for _ in range(warmup):
+        for arm in ARMS:
+            measure(endpoints[arm], first_prompt, n_predict)
+
+    rows = []
+    for i, step in enumerate(schedule, 1):
+        result = measure(endpoints[step["arm"]], prompts[step["case_id"]], n_predict)
+        rows.append({**step, **result})
+        if result["success"]:
+            status = (f"prompt {result['tps_prompt']:>7.1f}  "
+                      f"gen {result['tps_generation']:>6.1f} TPS")
+        else:
+            status = f"✗ {result['error']}"
+        print(f"  [{i:>3}/{len(schedule)}] {step['case_id']:<3} {step['arm']:<8} {status}")
+    return rows
+
+
+# =============================================================================
+# ANÁLISIS
+# =============================================================================
+
+def complete_pairs(rows: List[Dict]) -> List[Tuple[Dict, Dict]]:
+    """Bloques en los que ambas builds respondieron: (fila mma, fila baseline)."""
+    by_block: Dict[int, Dict[str, Dict]] = {}
+    for row in rows:
+        if row.get("success"):
+            by_block.setdefault(row["block"], {})[row["arm"]] = row
+    return [(arms["mma"], arms["baseline"]) for _, arms in sorted(by_block.items())
+            if len(arms) == len(ARMS)]
+
+
+def speedup_by_phase(pairs: List[Tuple[Dict, Dict]], cluster_key: str,
+                     confidence: float = DEFAULT_CONFIDENCE) -> Dict:
+    """Speedup de cada fase con su IC, remuestreando por cluster_key."""
+    clusters = [mma[cluster_key] for mma, _ in pairs]
+    result = {"pairs": len(pairs)}
+    for phase, key in PHASES.items():
+        tps_mma = [mma[key] for mma, _ in pairs]
+        tps_base = [base[key] for _, base in pairs]
+        mean_mma = sum(tps_mma) / len(tps_mma)
+        mean_base = sum(tps_base) / len(tps_base)
+        ci = bootstrap_ratio(tps_mma, tps_base, clusters, clusters, confidence=confidence)
+        result[phase] = {
+            "tps_mma": round(mean_mma, 2),
+            "tps_baseline": round(mean_base, 2),
+            "speedup": round(calculate_speedup(mean_mma, mean_base), 4),
+            "ci": ci.to_dict(),
+            "significant": not ci.contains(1.0)
+        }
+    return result
+
+
+def drift(rows: List[Dict]) -> Dict:
+    """
+    Deriva de cada build durante la corrida: TPS de generación medio del
+    último tercio de sus requests respecto del primero. El intercalado la
+    cancela en el speedup; se reporta para dimensionarla.
+    """
+    result = {}
+    for arm in ARMS:
+        values = [r["tps_generation"] for r in sorted(rows, key=lambda r: r["started_at"])
+                  if r["arm"] == arm and r.get("success")]
+        third = len(values) // 3
+        if third == 0:
+            continue
+        first = sum(values[:third]) / third
+        last = sum(values[-third:]) / third
+        result[arm] = round(last / first - 1, 4) if first > 0 else 0.0
+    return result
+
+
+def summarize(rows: List[Dict], confidence: float = DEFAULT_CONFIDENCE) -> Dict:
+    """Speedup por caso (IC por bloque) y total (IC por caso)."""
+    pairs = complete_pairs(rows)
+    if not pairs:
+        return {"pairs": 0, "by_case": {}}
+    by_case: Dict[str, List[Tuple[Dict, Dict]]] = {}
+    for pair in pairs:
+        by_case.setdefault(pair[0]["case_id"], []).append(pair)
+    return {
+        **speedup_by_phase(pairs, "case_id", confidence),
+        "by_case": {case_id: speedup_by_phase(case_pairs, "block", confidence)
+                    for case_id, case_pairs in sorted(by_case.items())},
+        "drift": drift(rows)
+    }
+
+
+def format_ab_report(summary: Dict) -> str:
+    """Tabla de speedup por caso y fase."""
+    def cell(phase: Dict) -> str:
+        ci = phase["ci"]
+        mark = "" if phase["significant"] else " ~"
+        return f"{phase['speedup']:.2f}x [{ci['low']:.2f}, {ci['high']:.2f}]{mark}"
+
+    lines = [
+        "",
+        "=" * 78,
+        "  SPEEDUP MMA vs BASELINE (A/B intercalado)",
+        "=" * 78,
+        f"  {'Caso':<8} {'Pares':>5}  {'Prompt':<26} {'Generación':<26}",
+        f"  {'-' * 8} {'-' * 5}  {'-' * 26} {'-' * 26}",
+    ]
+    for case_id, case in summary["by_case"].items():
+        lines.append(f"  {case_id:<8} {case['pairs']:>5}  {cell(case['prompt']):<26} "
+                     f"{cell(case['generacion']):<26}")
+    lines.append(f"  {'-' * 8} {'-' * 5}  {'-' * 26} {'-' * 26}")
+    lines.append(f"  {'TOTAL':<8} {summary['pairs']:>5}  {cell(summary['prompt']):<26} "
+                 f"{cell(summary['generacion']):<26}")
+    lines.append("")
+    for phase in PHASES:
+        p = summary[phase]
+        lines.append(f"  {PHASE_LABELS[phase]:<11} MMA {p['tps_mma']:>8.2f} TPS   "
+                     f"baseline {p['tps_baseline']:>8.2f} TPS")
+    if summary.get("drift"):
+        drifts = ", ".join(f"{arm} {value * 100:+.1f}%" for arm, value in summary["drift"].items())
+        lines.append(f"  Deriva (último vs primer tercio, generación): {drifts}")
+    lines.append(f"  IC {summary['prompt']['ci']['confidence'] * 100:.0f}% bootstrap pareado; "
+                 "~ = el IC incluye 1.0x")
+    lines.append("=" * 78)
+    return "\n".join(lines)
+
+
+# =============================================================================
+# CLI
+# =============================================================================
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Benchmark A/B intercalado de una build llama.cpp con MMA contra una sin MMA",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Ejemplos:
+  python mma_ab.py --mma localhost:8089 --baseline localhost:8092
+  python mma_ab.py --mma 8089 --baseline 8092 --casos A1 A2 B1 --repeticiones 10
+        """
+    )
+    parser.add_argument("--mma", required=True, help="Endpoint de la build con MMA (host:puerto)")
+    parser.add_argument("--baseline", required=True, help="Endpoint de la build sin MMA (host:puerto)")
+    parser.add_argument("--casos", nargs="+", default=sorted(CASOS_CLINICOS),
+                        choices=sorted(CASOS_CLINICOS), help="Casos a evaluar (default: todos)")
+    parser.add_argument("--prompt", default="baseline", choices=sorted(PROMPT_STRATEGIES),
+                        help="Estrategia de prompt (default: baseline)")
+    parser.add_argument("--repeticiones", type=int, default=DEFAULT_REPETITIONS,
+                        help=f"Pares por caso (default: {DEFAULT_REPETITIONS})")
+    parser.add_argument("--n-predict", type=int, default=DEFAULT_N_PREDICT,
+                        help=f"Tokens generados por request (default: {DEFAULT_N_PREDICT})")
+    parser.add_argument("--calentamiento", type=int, default=DEFAULT_WARMUP,
+                        help=f"Requests descartados por build al inicio (default: {DEFAULT_WARMUP})")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED,
+                        help="Semilla del orden intercalado")
+    parser.add_argument("--confianza", type=float, default=DEFAULT_CONFIDENCE,
+                        help=f"Nivel de confianza de los IC (default: {DEFAULT_CONFIDENCE})")
+    parser.add_argument("--output", default="results", help="Directorio de resultados")
+
+    args = parser.parse_args()
+    endpoints = {"mma": Endpoint.parse(args.mma), "baseline": Endpoint.parse(args.baseline)}
+
+    print("=" * 78)
+    print("  A/B MMA vs BASELINE")
+    print("=" * 78)
+    infos = {arm: endpoint_info(endpoint) for arm, endpoint in endpoints.items()}
+    for arm, info in infos.items():
+        if "error" in info:
+            print(f"  ✗ {arm} ({info['endpoint']}) no responde: {info['error']}")
+            return 1
+        print(f"  {arm:<9} {info['endpoint']:<20} {Path(info['model_path']).name} "
+              f"{info['build_info']}")
+    if not same_model(infos):
+        print("  ⚠ Las builds sirven modelos distintos: el speedup mezcla modelo y build")
+    host_mma, host_mma_msg = check_mma_enabled()
+    print(f"  Host: {host_mma_msg}")
+
+    template = PROMPT_STRATEGIES[args.prompt]["template"]
+    prompts = {case_id: template.format(text=CASOS_CLINICOS[case_id]["texto"])
+               for case_id in args.casos}
+    schedule = build_schedule(args.casos, args.repeticiones, args.seed)
+    print(f"  {len(schedule)} requests en {len(schedule) // len(ARMS)} bloques "
+          f"(seed {args.seed}, n_predict {args.n_predict})\n")
+
+    rows = run_ab(endpoints, prompts, schedule, args.n_predict, args.calentamiento)
+    summary = summarize(rows, args.confianza)
+    if not summary["pairs"]:
+        print("\n  ✗ Ningún bloque con respuesta de ambas builds")
+        return 1
+    print(format_ab_report(summary))
+
+    output_dir = Path(args.output)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    timestamp = datetime.now()
+    output_file = output_dir / f"mma_ab_{timestamp.strftime('%Y%m%d_%H%M%S')}.json"
+    data = {
+        "experimento": "mma_ab",
+        "timestamp": timestamp.isoformat(),
+        "metadata": {
+            "endpoints": infos,
+            "same_model": same_model(infos),
+            "host_mma_detected": host_mma,
+            "host_mma_info": host_mma_msg,
+            "prompt": args.prompt,
+            "cases": args.casos,
+            "repetitions": args.repeticiones,
+            "n_predict": args.n_predict,
+            "warmup": args.calentamiento,
+            "seed": args.seed
+        },
+        "summary": summary,
+        "rows": rows
+    }
+    with open(output_file, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+    print(f"\n  Resultados guardados: {output_file}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
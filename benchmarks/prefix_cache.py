@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+prefix_cache.py - Reutilización del KV cache del prefijo de cada prompt
+Universidad de Montevideo - Tesis 2025
+
+Todas las estrategias de prompting (PROMPT_STRATEGIES en experiment_runner_v3
+y PROMPTS en prompts_anonimizacion) tienen un bloque fijo de instrucciones
+antes de {text}. En few_shot e hybrid ese prefijo es la mayor parte de los
+tokens del prompt.
+
+Con cache_prompt=True, llama.cpp conserva el KV cache del último prompt de
+cada slot y solo evalúa la parte que cambia. Este módulo:
+- Separa cada template en prefijo fijo y sufijo variable
+- Asigna un slot del servidor a cada estrategia (id_slot) para que su prefijo
+  no sea desalojado por otra estrategia
+- Precalienta el prefijo en su slot (n_predict=0) y mide su costo en frío
+- Resume, por estrategia, el tiempo de evaluación de prompt ahorrado
+
+Uso:
+    from prefix_cache import assign_prefix_slots, warm_prefix, summarize_prefix_cache
+
+    slots = assign_prefix_slots(PROMPT_STRATEGIES.keys(), total_slots=4)
+    warm = warm_prefix(host, port, prefix, slots["few_shot"])
+    stats = summarize_prefix_cache(results, warm)
+"""
+
+from typing import Dict, Iterable, List, Tuple
+
+from http_transport import get_transport
+
+# =============================================================================
+# CONFIGURACIÓN
+# =============================================================================
+
+TEXT_PLACEHOLDER = "{text}"
+
+
+# =============================================================================
+# PREFIJOS Y SLOTS
+# =============================================================================
+
+def split_template(template: str) -> Tuple[str, str]:
+    """
+    Separa un template en (prefijo fijo, sufijo con {text}).
+
+    El prefijo es todo lo anterior a {text}; es la parte cacheable.
+    """
+    index = template.find(TEXT_PLACEHOLDER)
+    if index < 0:
+        return template, ""
+    return template[:index], template[index:]
+
+
+def assign_prefix_slots(strategy_ids: Iterable[str], total_slots: int) -> Dict[str, int]:
+    """
+    Asigna un slot del servidor a cada estrategia (round-robin).
+
+    Con al menos tantos slots como estrategias, cada prefijo queda fijo en
+    su slot durante toda la corrida. Con menos slots, las estrategias que
+    comparten slot se desalojan entre sí y el ahorro medido baja.
+    """
+    total_slots = max(1, total_slots)
+    return {sid: i % total_slots for i, sid in enumerate(strategy_ids)}
+
+
+def cache_call_options(call_options: Dict, id_slot: int) -> Dict:
+    """Opciones de call_model para un request con prefijo cacheado en id_slot."""
+    return {**(call_options or {}), "cache_prompt": True, "id_slot": id_slot}
+
+
+def warm_prefix(host: str, port: int, prefix: str, id_slot: int,
+                timeout: float = 300) -> Dict:
+    """
+    Evalúa el prefijo en su slot sin generar tokens (n_predict=0).
+
+    Deja el KV cache del slot cargado con el prefijo y retorna el costo en
+    frío de evaluarlo: {'prefix_tokens', 'prefix_prompt_ms'}.
+    """
+    payload = {
+        "prompt": prefix,
+        "n_predict": 0,
+        "cache_prompt": True,
+        "id_slot": id_slot
+    }
+    try:
+        response = get_transport().post_json(host, port, "/completion", payload, timeout)
+        response.raise_for_status()
+        result = response.json()
+    except Exception as e:
+        return {"prefix_tokens": 0, "prefix_prompt_ms": 0.0, "error": str(e)}
+
+    timings = result.get("timings", {})
+    return {
+        "prefix_tokens": timings.get("prompt_n", result.get("tokens_evaluated", 0)),
+        "prefix_prompt_ms": timings.get("prompt_ms", 0.0)
+    }
+
+
+# =============================================================================
+# RESUMEN
+# =============================================================================
+
+def summarize_prefix_cache(results: List[Dict], warm: Dict) -> Dict:
+    """
+    Resume el ahorro de evaluación de prompt de una estrategia.
+
+    Args:
+        results: Salidas exitosas de call_model con cache_prompt=True
+                 (tokens_prompt, tokens_cached, time_prompt_ms)
+        warm: Resultado de warm_prefix para la estrategia
+
+    El ahorro por request se estima como tokens_cached multiplicado por el
+    costo por token del prefijo en frío; si no hubo precalentamiento se usa
+    el costo por token de la parte evaluada del mismo request.
+    """
+    prefix_tokens = warm.get("prefix_tokens", 0)
+    prefix_ms = warm.get("prefix_prompt_ms", 0.0)
+    cold_ms_per_token = prefix_ms / prefix_tokens if prefix_tokens > 0 else 0.0
+
+    prompt_tokens = 0
+    cached_tokens = 0
+    prompt_ms = 0.0
+    saved_ms = 0.0
+
+    for r in results:
+        cached = r.get("tokens_cached", 0)
+        evaluated = max(r.get("tokens_prompt", 0) - cached, 0)
+        ms_per_token = cold_ms_per_token
+        if ms_per_token == 0.0 and evaluated > 0:
+            ms_per_token = r.get("time_prompt_ms", 0.0) / evaluated
+
+        prompt_tokens += r.get("tokens_prompt", 0)
+        cached_tokens += cached
+        prompt_ms += r.get("time_prompt_ms", 0.0)
+        saved_ms += cached * ms_per_token
+
+    return {
+        "requests": len(results),
+        "prefix_tokens": prefix_tokens,
+        "prefix_cold_prompt_ms": round(prefix_ms, 2),
+        "prompt_tokens": prompt_tokens,
+        "cached_tokens": cached_tokens,
+        "cached_ratio": round(cached_tokens / prompt_tokens, 4) if prompt_tokens > 0 else 0.0,
+        "prompt_eval_ms": round(prompt_ms, 2),
+        "prompt_eval_saved_ms": round(saved_ms, 2),
+        "prompt_eval_saved_ms_per_request": round(saved_ms / len(results), 2) if results else 0.0
+    }
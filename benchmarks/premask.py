@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+premask.py - Pre-enmascarado determinístico con PATTERNS_URUGUAY
+Universidad de Montevideo - Tesis 2025
+
+phi_categories.PATTERNS_URUGUAY define regex para CI, teléfonos, emails,
+fechas y números de historia clínica. Este módulo los aplica antes de
+enviar el prompt al modelo y reemplaza cada coincidencia por su
+placeholder ([CI], [TELEFONO], [EMAIL], [FECHA], [REGISTRO]).
+
+- Menos identificadores para el LLM: generaciones más cortas y menos
+  fugas de identificadores directos (mejora LRDI)
+- Mapa de spans (offsets en el texto original y en el enmascarado) para
+  auditoría
+- Estimación de tokens de entrada y salida eliminados
+
+Uso:
+    from premask import premask
+
+    masked = premask(texto)
+    prompt = template.format(text=masked.text)
+    print(masked.summary())
+"""
+
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Pattern, Tuple
+
+from chunking import estimate_tokens
+from dataset.phi_categories import PATTERNS_URUGUAY, get_placeholder
+
+# =============================================================================
+# CONFIGURACIÓN
+# =============================================================================
+
+# Patrón de PATTERNS_URUGUAY -> categoría PHI (ver PLACEHOLDERS)
+PATTERN_CATEGORIES = {
+    "CI": "ID_CI",
+    "PHONE_MOBILE": "CONTACT_PHONE_MOBILE",
+    "PHONE_FIXED": "CONTACT_PHONE_FIXED",
+    "PHONE_MVD": "CONTACT_PHONE_FIXED",
+    "PHONE_INTERIOR": "CONTACT_PHONE_FIXED",
+    "EMAIL": "CONTACT_EMAIL",
+    "DATE": "DATE",
+    "HC": "ID_MEDICAL_RECORD",
+}
+
+# Compilados una sola vez, en el orden de PATTERNS_URUGUAY (desempate)
+COMPILED_PATTERNS: List[Tuple[str, Pattern]] = [
+    (name, re.compile(pattern)) for name, pattern in PATTERNS_URUGUAY.items()
+]
+
+
+# =============================================================================
+# DATACLASSES
+# =============================================================================
+
+@dataclass
+class MaskedSpan:
+    """Un identificador enmascarado."""
+    pattern: str                    # Nombre en PATTERNS_URUGUAY
+    category: str
+    placeholder: str
+    value: str
+    start: int                      # Offsets en el texto original
+    end: int
+    out_start: int = 0              # Offsets del placeholder en el texto enmascarado
+    out_end: int = 0
+
+    def to_dict(self) -> Dict:
+        """Entrada del mapa de auditoría (sin el valor, que es PHI)."""
+        return {
+            "pattern": self.pattern,
+            "category": self.category,
+            "placeholder": self.placeholder,
+            "source_span": [self.start, self.end],
+            "masked_span": [self.out_start, self.out_end]
+        }
+
+
+@dataclass
+class PremaskResult:
+    """Texto enmascarado y su mapa de spans."""
+    original: str
+    text: str
+    spans: List[MaskedSpan] = field(default_factory=list)
+
+    @property
+    def tokens_removed(self) -> int:
+        """Tokens estimados que el modelo ya no lee (y no necesita reescribir)."""
+        return max(estimate_tokens(self.original) - estimate_tokens(self.text), 0)
+
+    def summary(self) -> Dict:
+        by_category: Dict[str, int] = {}
+        for span in self.spans:
+            by_category[span.category] = by_category.get(span.category, 0) + 1
+        removed = self.tokens_removed
+        return {
+            "masked_spans": len(self.spans),
+            "by_category": by_category,
+            "chars_removed": len(self.original) - len(self.text),
+            # La anonimización reescribe el texto: la salida se acorta lo mismo
+            "input_tokens_removed_est": removed,
+            "output_tokens_removed_est": removed,
+            "span_map": [s.to_dict() for s in self.spans]
+        }
+
+
+# =============================================================================
+# ENMASCARADO
+# =============================================================================
+
+def find_spans(text: str, patterns: Optional[List[Tuple[str, Pattern]]] = None) -> List[MaskedSpan]:
+    """
+    Busca todas las coincidencias y resuelve solapamientos.
+
+    Ante coincidencias solapadas gana la que empieza antes; si empiezan en
+    el mismo lugar, la más larga (p. ej. un CI frente a un teléfono fijo).
+    """
+    patterns = patterns or COMPILED_PATTERNS
+    candidates = []
+    for priority, (name, regex) in enumerate(patterns):
+        category = PATTERN_CATEGORIES.get(name, name)
+        for match in regex.finditer(text):
+            candidates.append((match.start(), -(match.end() - match.start()), priority,
+                               name, category, match.group()))
+
+    spans = []
+    last_end = -1
+    for start, neg_len, _, name, category, value in sorted(candidates):
+        if start < last_end:
+            continue
+        end = start - neg_len
+        spans.append(MaskedSpan(name, category, get_placeholder(category), value, start, end))
+        last_end = end
+    return spans
+
+
+def premask(text: str, patterns: Optional[List[Tuple[str, Pattern]]] = None) -> PremaskResult:
+    """Reemplaza cada identificador detectado por su placeholder."""
+    spans = find_spans(text, patterns)
+    parts = []
+    cursor = 0
+    out_len = 0
+    for span in spans:
+        parts.append(text[cursor:span.start])
+        out_len += span.start - cursor
+        span.out_start = out_len
+        parts.append(span.placeholder)
+        out_len += len(span.placeholder)
+        span.out_end = out_len
+        cursor = span.end
+    parts.append(text[cursor:])
+    return PremaskResult(original=text, text="".join(parts), spans=spans)
@@ -206,6 +206,35 @@ NO incluyas explicaciones, listas de entidades encontradas, ni comentarios adici
 TEXTO A ANONIMIZAR:
 {text}"""
 
+# =============================================================================
+# PROMPT SPAN EXTRACTION - Solo la lista de entidades (modo extracción)
+# =============================================================================
+
+# Mismas categorías que structured_output, pero el modelo devuelve solo los
+# spans PHI y el cliente aplica los reemplazos (ver span_extraction.py).
+# Las llaves del JSON van duplicadas por str.format.
+PROMPT_SPAN_EXTRACTION = """Identifica la Información de Salud Protegida (PHI) del siguiente texto clínico.
+
+CATEGORÍAS PHI A DETECTAR:
+1. NOMBRE: Nombres de pacientes, médicos, familiares, enfermeros
+2. CI: Cédula de identidad, documentos de identificación
+3. TELEFONO: Números de teléfono (fijos y móviles)
+4. DIRECCION: Calles, avenidas, números, apartamentos
+5. UBICACION: Ciudades, departamentos, hospitales, clínicas
+6. FECHA: Fechas de ingreso, alta, nacimiento, procedimientos
+7. REGISTRO: Números de historia clínica, expedientes
+
+FORMATO DE SALIDA:
+Devuelve ÚNICAMENTE una lista JSON, una entrada por entidad, con el texto copiado exactamente como aparece:
+[{{"category": "NOMBRE", "text": "Juan Pérez"}}, {{"category": "CI", "text": "1.234.567-8"}}]
+
+NO reescribas el texto, NO incluyas explicaciones.
+
+TEXTO:
+{text}
+
+JSON:"""
+
 # =============================================================================
 # PROMPT HYBRID - Combina Few-Shot + Chain-of-Thought
 # =============================================================================
@@ -312,6 +341,20 @@ PROMPTS = {
 }
 
 
+# Prompts de extracción: la salida es una lista de spans, no el texto
+# anonimizado, por eso no forman parte de PROMPTS
+PROMPTS_EXTRACCION = {
+    "span_extraction": {
+        "id": "span_extraction",
+        "nombre": "Span Extraction",
+        "descripcion": "Categorías de structured_output, salida como lista JSON de spans",
+        "template": PROMPT_SPAN_EXTRACTION,
+        "esperado": "Muchos menos tokens generados que reescribir la nota",
+        "tokens_estimados": 230
+    }
+}
+
+
 # =============================================================================
 # FUNCIONES AUXILIARES
 # =============================================================================
@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+"""
+regression_check.py - Detección de regresiones de rendimiento entre corridas
+Universidad de Montevideo - Tesis 2025
+
+Compara corridas guardadas en el almacén de resultados (results_store.py)
+y sale con código distinto de cero si alguna combinación de modelo, caso
+y prompt empeoró, para usarlo como compuerta antes de publicar una imagen
+llama.cpp-mma reconstruida o un cambio de flags -t/-b.
+
+Por cada grupo (experimento, modelo, prompt) y métrica (TPS y latencia
+por defecto) se comparan las distribuciones con Mann-Whitney y delta de
+Cliff (metrics/regression.py). Los runners hacen 1 (v3) o 3 iteraciones
+por caso, y 3 contra 3 muestras no pueden dar p < 0.1, así que el grupo
+junta los casos, pero estratificado: solo entran los casos presentes en
+ambas corridas y cada valor se escala por la mediana base de su caso.
+Así la comparación es caso contra caso y un cambio en la mezcla de casos
+(una nota larga de más o de menos) no puede dar vuelta el veredicto. Sin
+--base/--candidata, cada grupo compara su corrida más reciente con la
+anterior que lo incluya; con --base se pueden juntar varias corridas de
+referencia.
+
+Códigos de salida:
+    0  Sin regresiones
+    1  Al menos una regresión (o, con --estricto, evidencia insuficiente
+       con un empeoramiento mayor al umbral)
+    2  No hay grupos comparables
+
+Uso:
+    python regression_check.py                                  # Última corrida vs anterior
+    python regression_check.py --importar results               # Importar JSON nuevos antes
+    python regression_check.py --base run_a run_b --candidata run_c
+    python regression_check.py --umbral 3 --alfa 0.01 --modelo qwen2.5-7b
+    python regression_check.py --agrupar model prompt case_id   # Por caso (requiere más iteraciones)
+    python regression_check.py --json results/regresiones.json
+"""
+
+import argparse
+import json
+import sys
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from metrics.quantile_sketch import percentile
+from metrics.regression import (
+    check_regression, METRIC_DIRECTION, DEFAULT_THRESHOLD, DEFAULT_ALPHA, DEFAULT_MIN_EFFECT,
+    STATUS_REGRESSION, STATUS_IMPROVEMENT, STATUS_INSUFFICIENT
+)
+from results_store import ResultsStore, DEFAULT_STORE_PATH
+
+# =============================================================================
+# CONFIGURACIÓN
+# =============================================================================
+
+DEFAULT_METRICS = ("tps", "latency_ms")
+DEFAULT_GROUP_BY = ("experiment", "model", "prompt")   # Casos juntos, estratificados
+
+EXIT_OK = 0
+EXIT_REGRESSION = 1
+EXIT_NO_DATA = 2
+
+
+# =============================================================================
+# SELECCIÓN DE CORRIDAS
+# =============================================================================
+
+# {run_id: {case_id: valores}}
+ValoresPorCorrida = Dict[str, Dict[str, List[float]]]
+
+
+def _valores_por_corrida(store: ResultsStore, metric: str, group_by: Sequence[str],
+                         since: Optional[str], filtros: Dict) -> Dict[Tuple, ValoresPorCorrida]:
+    """{clave del grupo: {run_id: {case_id: valores}}} con las filas exitosas."""
+    columnas = tuple(group_by) + tuple(c for c in ("run_id", "case_id") if c not in group_by)
+    filas = store.query(columnas + (metric,), since, success=1, **filtros)
+    grupos: Dict[Tuple, ValoresPorCorrida] = defaultdict(
+        lambda: defaultdict(lambda: defaultdict(list)))
+    for fila in filas:
+        valor = fila[metric]
+        if valor is None or valor <= 0:
+            continue
+        grupos[tuple(fila[c] for c in group_by)][fila["run_id"]][fila["case_id"]].append(valor)
+    return grupos
+
+
+def _por_caso(por_corrida: ValoresPorCorrida, corridas: List[str]) -> Dict[str, List[float]]:
+    """Valores de varias corridas juntos, por caso."""
+    casos: Dict[str, List[float]] = defaultdict(list)
+    for run in corridas:
+        for caso, valores in por_corrida[run].items():
+            casos[caso].extend(valores)
+    return casos
+
+
+def estratificar_por_caso(base: Dict[str, List[float]], candidata: Dict[str, List[float]]
+                          ) -> Tuple[List[float], List[float], List[str]]:
+    """
+    Junta los casos de un grupo para una sola prueba, comparando caso
+    contra caso.
+
+    Solo se usan los casos presentes en ambas partes, y cada valor se
+    multiplica por mediana_base_global / mediana_base_del_caso: las
+    diferencias entre casos (una nota larga tiene menos TPS) desaparecen
+    y queda solo el cambio dentro de cada caso, en las unidades de la
+    métrica.
+
+    Returns:
+        (valores base, valores candidatos, casos comparados)
+    """
+    casos = sorted(set(base) & set(candidata), key=str)
+    if not casos:
+        return [], [], []
+    global_median = percentile(sorted(v for caso in casos for v in base[caso]), 0.5)
+    valores_base, valores_candidata = [], []
+    for caso in casos:
+        escala = global_median / percentile(sorted(base[caso]), 0.5)
+        valores_base.extend(v * escala for v in base[caso])
+        valores_candidata.extend(v * escala for v in candidata[caso])
+    return valores_base, valores_candidata, casos
+
+
+def seleccionar_muestras(por_corrida: ValoresPorCorrida, orden: Dict[str, int],
+                         base: Optional[Sequence[str]] = None,
+                         candidata: Optional[Sequence[str]] = None
+                         ) -> Optional[Tuple[List[str], List[float], List[str], List[float], List[str]]]:
+    """
+    Muestras base y candidata de un grupo, estratificadas por caso.
+
+    Con corridas explícitas se juntan sus valores; si no, la candidata es
+    la corrida más reciente del grupo y la base la anterior.
+
+    Returns:
+        (corridas base, valores base, corridas candidatas, valores
+        candidatos, casos comparados) o None si el grupo no tiene ambas
+        partes con al menos un caso en común
+    """
+    corridas = sorted(por_corrida, key=lambda run: orden.get(run, -1))
+    if candidata:
+        candidatas = [run for run in corridas if run in candidata]
+    else:
+        candidatas = corridas[-1:]
+    if base:
+        bases = [run for run in corridas if run in base and run not in candidatas]
+    else:
+        previas = [run for run in corridas if run not in candidatas
+                   and (not candidatas or orden.get(run, -1) < orden.get(candidatas[0], -1))]
+        bases = previas[-1:]
+    if not bases or not candidatas:
+        return None
+    valores_base, valores_candidata, casos = estratificar_por_caso(
+        _por_caso(por_corrida, bases), _por_caso(por_corrida, candidatas))
+    if not casos:
+        return None
+    return bases, valores_base, candidatas, valores_candidata, casos
+
+
+def detectar_regresiones(
+    store: ResultsStore,
+    metrics: Sequence[str] = DEFAULT_METRICS,
+    group_by: Sequence[str] = DEFAULT_GROUP_BY,
+    base: Optional[Sequence[str]] = None,
+    candidata: Optional[Sequence[str]] = None,
+    threshold: float = DEFAULT_THRESHOLD,
+    alpha: float = DEFAULT_ALPHA,
+    min_effect: float = DEFAULT_MIN_EFFECT,
+    since: Optional[str] = None,
+    **filtros
+) -> List[Dict]:
+    """
+    Compara corridas del almacén por grupo y métrica.
+
+    Returns:
+        Lista de {<claves de group_by>, "metric", "base", "candidata",
+        "cases", "check"} con check un RegressionCheck
+    """
+    orden = {run["run_id"]: i for i, run in enumerate(store.runs())}
+    comparaciones = []
+    for metric in metrics:
+        grupos = _valores_por_corrida(store, metric, group_by, since, filtros)
+        for clave in sorted(grupos, key=lambda k: tuple(str(v) for v in k)):
+            seleccion = seleccionar_muestras(grupos[clave], orden, base, candidata)
+            if seleccion is None:
+                continue
+            bases, valores_base, candidatas, valores_candidata, casos = seleccion
+            check = check_regression(valores_base, valores_candidata, metric,
+                                     METRIC_DIRECTION.get(metric, True),
+                                     threshold, alpha, min_effect)
+            comparaciones.append({
+                **dict(zip(group_by, clave)),
+                "metric": metric,
+                "base": bases,
+                "candidata": candidatas,
+                "cases": casos,
+                "check": check
+            })
+    return comparaciones
+
+
+def es_falla(comparacion: Dict, threshold: float, estricto: bool = False) -> bool:
+    """Regresión, o (estricto) evidencia insuficiente con empeoramiento >= umbral."""
+    check = comparacion["check"]
+    if check.status == STATUS_REGRESSION:
+        return True
+    return estricto and check.status == STATUS_INSUFFICIENT and check.degradation >= threshold
+
+
+# =============================================================================
+# REPORTE
+# =============================================================================
+
+_MARCAS = {STATUS_REGRESSION: "✗", STATUS_IMPROVEMENT: "✓", STATUS_INSUFFICIENT: "?"}
+
+
+def imprimir_comparaciones(comparaciones: List[Dict], group_by: Sequence[str],
+                           threshold: float, alpha: float, estricto: bool = False):
+    print("\n" + "=" * 110)
+    print("  DETECCIÓN DE REGRESIONES DE RENDIMIENTO")
+    print("=" * 110)
+    print(f"  Umbral: {threshold * 100:.1f}% | alfa: {alpha} | "
+          f"Mann-Whitney bilateral + delta de Cliff")
+
+    encabezado = "  ".join(f"{c:<16}" for c in group_by)
+    print(f"\n  {encabezado}  {'Métrica':<10} {'Base':>16} {'Candidata':>16} "
+          f"{'Cambio':>8} {'p':>8} {'δ Cliff':>8}  Estado")
+    print("  " + "-" * (len(encabezado) + 88))
+    for comparacion in comparaciones:
+        check = comparacion["check"]
+        claves = "  ".join(f"{str(comparacion[c])[:16]:<16}" for c in group_by)
+        base = f"{check.baseline_median:.2f} (n={check.baseline_n})"
+        candidata = f"{check.candidate_median:.2f} (n={check.candidate_n})"
+        marca = "✗" if es_falla(comparacion, threshold, estricto) else _MARCAS.get(check.status, " ")
+        print(f"  {claves}  {check.metric:<10} {base:>16} {candidata:>16} "
+              f"{check.median_change * 100:>+7.1f}% {check.p_value:>8.3g} "
+              f"{check.cliffs_delta:>+8.2f}  {marca} {check.status}")
+
+    insuficientes = [c for c in comparaciones if c["check"].status == STATUS_INSUFFICIENT]
+    if insuficientes:
+        print(f"\n  ? {len(insuficientes)} comparación(es) sin muestras suficientes para p < {alpha}: "
+              f"aumentar --iterations o no agrupar por case_id")
+    print("  Cambio: mediana candidata vs base; en latencia también se evalúa el p95")
+    print("  Solo casos presentes en ambas corridas, escalados por la mediana base de cada caso")
+
+
+def _a_json(comparaciones: List[Dict], args) -> Dict:
+    return {
+        "timestamp": datetime.now().isoformat(),
+        "umbral": args.umbral / 100,
+        "alfa": args.alfa,
+        "efecto_minimo": args.efecto_minimo,
+        "comparaciones": [
+            {**{k: v for k, v in c.items() if k != "check"}, **c["check"].to_dict(),
+             "falla": es_falla(c, args.umbral / 100, args.estricto)}
+            for c in comparaciones
+        ]
+    }
+
+
+# =============================================================================
+# CLI
+# =============================================================================
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Detección de regresiones de rendimiento entre corridas del almacén de resultados",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Ejemplos:
+  python regression_check.py                                  # Última corrida vs anterior
+  python regression_check.py --base run_a run_b --candidata run_c
+  python regression_check.py --umbral 3 --metricas tps latency_ms tps_prompt
+  python regression_check.py --agrupar model prompt case_id --estricto
+        """
+    )
+    parser.add_argument("--db", default=DEFAULT_STORE_PATH,
+                        help=f"Almacén SQLite (default: {DEFAULT_STORE_PATH})")
+    parser.add_argument("--importar", metavar="DIR",
+                        help="Importar al almacén los JSON nuevos o modificados de DIR")
+    parser.add_argument("--base", nargs="+", metavar="RUN",
+                        help="Corrida(s) de referencia (default: la anterior de cada grupo)")
+    parser.add_argument("--candidata", nargs="+", metavar="RUN",
+                        help="Corrida(s) a evaluar (default: la más reciente de cada grupo)")
+    parser.add_argument("--metricas", nargs="+", default=list(DEFAULT_METRICS),
+                        choices=sorted(METRIC_DIRECTION),
+                        help="Métricas a comparar (default: tps latency_ms)")
+    parser.add_argument("--agrupar", nargs="+", default=list(DEFAULT_GROUP_BY),
+                        choices=["experiment", "model", "prompt", "case_id"],
+                        help="Claves de cada comparación (default: experiment model prompt)")
+    parser.add_argument("--umbral", type=float, default=DEFAULT_THRESHOLD * 100,
+                        help=f"Empeoramiento mínimo en %% (default: {DEFAULT_THRESHOLD * 100:.0f})")
+    parser.add_argument("--alfa", type=float, default=DEFAULT_ALPHA,
+                        help=f"Nivel de significancia (default: {DEFAULT_ALPHA})")
+    parser.add_argument("--efecto-minimo", type=float, default=DEFAULT_MIN_EFFECT,
+                        help=f"|delta de Cliff| mínimo (default: {DEFAULT_MIN_EFFECT})")
+    parser.add_argument("--estricto", action="store_true",
+                        help="Fallar también si la evidencia es insuficiente y el empeoramiento supera el umbral")
+    parser.add_argument("--modelo", nargs="+", help="Filtrar por modelo")
+    parser.add_argument("--prompt", nargs="+", help="Filtrar por prompt")
+    parser.add_argument("--experimento", nargs="+", help="Filtrar por experimento")
+    parser.add_argument("--desde", help="Solo corridas desde esta fecha ISO")
+    parser.add_argument("--json", metavar="ARCHIVO", help="Guardar las comparaciones en JSON")
+
+    args = parser.parse_args()
+    threshold = args.umbral / 100
+
+    store = ResultsStore(args.db)
+    if args.importar:
+        importados = store.import_directory(args.importar)
+        print(f"  Importados {len(importados)} archivo(s) de {args.importar}")
+
+    comparaciones = detectar_regresiones(
+        store, args.metricas, args.agrupar, args.base, args.candidata,
+        threshold, args.alfa, args.efecto_minimo, args.desde,
+        model=args.modelo, prompt=args.prompt, experiment=args.experimento
+    )
+    store.close()
+
+    if not comparaciones:
+        print("\n  No hay grupos con corrida base y candidata para comparar")
+        return EXIT_NO_DATA
+
+    imprimir_comparaciones(comparaciones, args.agrupar, threshold, args.alfa, args.estricto)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(_a_json(comparaciones, args), f, indent=2, ensure_ascii=False)
+        print(f"\n  Comparaciones guardadas: {args.json}")
+
+    fallas = [c for c in comparaciones if es_falla(c, threshold, args.estricto)]
+    if fallas:
+        print(f"\n  ✗ {len(fallas)} regresión(es) detectada(s)")
+        return EXIT_REGRESSION
+    print("\n  ✓ Sin regresiones")
+    return EXIT_OK
+
+
+if __name__ == "__main__":
+    sys.exit(main())
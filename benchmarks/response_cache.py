@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+response_cache.py - Cache persistente de respuestas del modelo
+Universidad de Montevideo - Tesis 2025
+
+Cuando cambian las métricas o results_analyzer se vuelven a correr las
+evaluaciones de calidad (run_quality_evaluation, ejecutar_evaluacion_calidad),
+que regeneran completions idénticas a baja temperatura durante horas de CPU.
+
+Este cache guarda cada respuesta en SQLite, direccionada por contenido:
+    clave = sha256(modelo, prompt completo, parámetros de muestreo, variante)
+
+- modelo: sha256 del archivo GGUF (o su nombre si no está en disco)
+- parámetros: temperature, top_k, top_p, n_predict, stop
+- variante: distingue iteraciones de un mismo prompt (p. ej. "iter2")
+
+El tamaño total se acota con desalojo LRU. En modo solo-cache las
+evaluaciones re-puntúan salidas viejas sin contactar al servidor.
+
+Uso:
+    from response_cache import configure_response_cache, resolve_model_id
+
+    cache = configure_response_cache("results/response_cache.sqlite", max_mb=512)
+    model_id = resolve_model_id("Qwen2.5-7B-Instruct-Q4_K_M.gguf")
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+# =============================================================================
+# CONFIGURACIÓN
+# =============================================================================
+
+DEFAULT_CACHE_PATH = "results/response_cache.sqlite"
+DEFAULT_MAX_MB = 512
+DEFAULT_MODELS_DIR = os.path.expanduser("~/models")
+
+# Parámetros del payload de /completion que afectan la salida
+SAMPLING_KEYS = ("temperature", "top_k", "top_p", "n_predict", "stop")
+
+HASH_CHUNK_BYTES = 8 * 1024 * 1024
+
+
+# =============================================================================
+# IDENTIDAD DEL MODELO
+# =============================================================================
+
+def _find_model_file(model_file: str, models_dir: str) -> Optional[Path]:
+    for candidate in (Path(model_file), Path(models_dir) / Path(model_file).name):
+        if candidate.is_file():
+            return candidate
+    return None
+
+
+def resolve_model_id(model_file: str, models_dir: str = DEFAULT_MODELS_DIR,
+                     cache: Optional["ResponseCache"] = None) -> str:
+    """
+    Identificador del modelo para la clave del cache.
+
+    Si el GGUF está en disco retorna 'sha256:<hash>' (memoizado en el cache
+    por ruta, tamaño y mtime); si no, 'file:<nombre>'.
+    """
+    path = _find_model_file(model_file, models_dir)
+    if path is None:
+        return f"file:{Path(model_file).name}"
+    if cache is not None:
+        return f"sha256:{cache.model_file_hash(path)}"
+    return f"sha256:{hash_file(path)}"
+
+
+def hash_file(path: Path) -> str:
+    """sha256 de un archivo leído por bloques."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_BYTES), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def server_model_file(host: str, port: int) -> Optional[str]:
+    """Nombre del GGUF que sirve llama.cpp según /props (model_path)."""
+    from http_transport import get_transport
+    try:
+        response = get_transport().get(host, port, "/props", timeout=5)
+        model_path = response.json().get("model_path", "")
+        return Path(model_path).name or None
+    except Exception:
+        return None
+
+
+# =============================================================================
+# CACHE
+# =============================================================================
+
+class ResponseCache:
+    """
+    Cache de respuestas en SQLite con desalojo LRU por tamaño.
+
+    Es thread-safe (una conexión compartida protegida por lock), de modo que
+    el motor concurrente puede consultarlo desde varios threads.
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, max_mb: float = DEFAULT_MAX_MB,
+                 cache_only: bool = False):
+        """
+        Args:
+            path: Archivo SQLite
+            max_mb: Tamaño máximo de las respuestas guardadas (MB)
+            cache_only: No contactar al servidor; un miss es un error
+        """
+        self.path = path
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.cache_only = cache_only
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                model_id TEXT NOT NULL,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_responses_access ON responses(last_access);
+            CREATE TABLE IF NOT EXISTS model_hashes (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime REAL NOT NULL,
+                sha256 TEXT NOT NULL
+            );
+        """)
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(model_id: str, payload: Dict, variant: str = "") -> str:
+        """Clave sha256 de (modelo, prompt, parámetros de muestreo, variante)."""
+        material = {
+            "model": model_id,
+            "prompt": payload.get("prompt", ""),
+            "params": {k: payload.get(k) for k in SAMPLING_KEYS},
+            "variant": variant
+        }
+        canonical = json.dumps(material, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict]:
+        """Retorna la respuesta guardada (y la marca como usada) o None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute(
+                "UPDATE responses SET last_access = ? WHERE key = ?", (time.time(), key)
+            )
+            self._conn.commit()
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key: str, model_id: str, value: Dict):
+        """Guarda una respuesta y desaloja las menos usadas si se excede max_mb."""
+        data = json.dumps(value, ensure_ascii=False)
+        size = len(data.encode("utf-8"))
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model_id, data, size, now, now)
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self._conn.execute(
+            "SELECT key, size FROM responses ORDER BY last_access ASC"
+        ).fetchall()
+        evict = []
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            evict.append((key,))
+            total -= size
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", evict)
+
+    def model_file_hash(self, path: Path) -> str:
+        """sha256 del GGUF, recalculado solo si cambia tamaño o mtime."""
+        path = Path(path).resolve()
+        stat = path.stat()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT size, mtime, sha256 FROM model_hashes WHERE path = ?", (str(path),)
+            ).fetchone()
+        if row and row[0] == stat.st_size and row[1] == stat.st_mtime:
+            return row[2]
+
+        sha = hash_file(path)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO model_hashes VALUES (?, ?, ?, ?)",
+                (str(path), stat.st_size, stat.st_mtime, sha)
+            )
+            self._conn.commit()
+        return sha
+
+    def stats(self) -> Dict:
+        """Hits/misses de la sesión y ocupación del cache."""
+        with self._lock:
+            entries, total = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+        return {
+            "path": self.path,
+            "cache_only": self.cache_only,
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": entries,
+            "size_mb": round(total / (1024 * 1024), 2),
+            "max_mb": round(self.max_bytes / (1024 * 1024), 2)
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+# =============================================================================
+# CACHE COMPARTIDO
+# =============================================================================
+
+_default_cache: Optional[ResponseCache] = None
+
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """Retorna el cache configurado, o None si está desactivado."""
+    return _default_cache
+
+
+def configure_response_cache(path: str = DEFAULT_CACHE_PATH, max_mb: float = DEFAULT_MAX_MB,
+                             cache_only: bool = False) -> ResponseCache:
+    """Activa el cache compartido por los runners."""
+    global _default_cache
+    if _default_cache is not None:
+        _default_cache.close()
+    _default_cache = ResponseCache(path, max_mb, cache_only)
+    return _default_cache
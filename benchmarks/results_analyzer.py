@@ -8,6 +8,14 @@ Analiza los resultados de los experimentos y genera:
 - Gráficos de rendimiento y calidad
 - Reportes en formato Markdown
 - Estadísticas agregadas
+- Intervalos de confianza bootstrap (95%) y empates con el mejor
+- Speedup MMA vs baseline del A/B intercalado (mma_ab.py)
+- Consultas sobre el almacén SQLite de resultados (results_store.py)
+
+Los archivos se indexan en un manifiesto (.manifiesto_resultados.json en el
+directorio de resultados) con mtime, tipo, modelos y métricas resumen: al
+recargar solo se parsean los archivos nuevos o modificados, y el reporte
+completo reutiliza las secciones cuyos archivos de entrada no cambiaron.
 
 Para la tesis: Demostración del valor de MMA en IBM Power10.
 """
@@ -22,6 +30,10 @@ from typing import List, Dict, Optional, Tuple
 from dataclasses import dataclass
 import statistics
 
+from metrics.bootstrap import ConfidenceInterval, bootstrap_ci, bootstrap_metrics, compare_groups
+from metrics.resource_sampler import SATURATION_PERCENT
+from results_store import ResultsStore, DEFAULT_STORE_PATH
+
 # Para gráficos (opcional - se generan si matplotlib está disponible)
 try:
     import matplotlib.pyplot as plt
@@ -36,24 +48,193 @@ except ImportError:
 # CARGA DE RESULTADOS
 # =============================================================================
 
+MANIFIESTO = ".manifiesto_resultados.json"
+VERSION_MANIFIESTO = 2
+
+# JSON ya parseados en este proceso: {ruta: (tamaño, mtime_ns, datos)}
+_json_cache: Dict[str, Tuple[int, int, Dict]] = {}
+
+
 def cargar_resultados_json(filepath: str) -> Dict:
-    """Carga resultados de un archivo JSON."""
+    """Carga resultados de un archivo JSON (se re-parsea solo si cambió)."""
+    stat = os.stat(filepath)
+    cached = _json_cache.get(filepath)
+    if cached and cached[0] == stat.st_size and cached[1] == stat.st_mtime_ns:
+        return cached[2]
     with open(filepath, "r", encoding="utf-8") as f:
-        return json.load(f)
+        data = json.load(f)
+    _json_cache[filepath] = (stat.st_size, stat.st_mtime_ns, data)
+    return data
+
+
+def _tipo_resultado(nombre: str, data: Dict) -> str:
+    """Tipo de experimento: campo 'experimento', v3, o el nombre sin el timestamp."""
+    if isinstance(data, dict):
+        if data.get("experimento"):
+            return data["experimento"]
+        if "experiments" in data:
+            return "experiment_v3"
+        if "raw_results" in data:
+            return "benchmark_anon"
+    partes = Path(nombre).stem.split("_")
+    while partes and partes[-1].isdigit():
+        partes.pop()
+    return "_".join(partes) or Path(nombre).stem
+
+
+def _resumen_resultado(data: Dict) -> Tuple[List[str], Dict]:
+    """Modelos y métricas resumen de un archivo, para el manifiesto."""
+    if not isinstance(data, dict):
+        return [], {}
+    if "experiments" in data:
+        metadata = data.get("metadata", {})
+        modelo = metadata.get("model") or f"{metadata.get('host', '')}:{metadata.get('port', '')}"
+        experimentos = data["experiments"]
+        metricas = {
+            "tps": experimentos.get("performance", {}).get("summary", {}).get("tps_mean"),
+            "f1_micro": experimentos.get("quality", {}).get("summary", {}).get("f1_micro_mean"),
+            "lrdi": experimentos.get("quality", {}).get("summary", {}).get("lrdi_mean"),
+            "mejor_prompt": (experimentos.get("prompts", {}).get("ranking") or [None])[0]
+        }
+        if data.get("resources"):
+            # La sección de recursos se arma con esto, sin volver a parsear cada corrida
+            metricas["recursos"] = {"cores": data["resources"].get("cores", 0),
+                                    "by_phase": data["resources"].get("by_phase", {})}
+        return [modelo], {k: v for k, v in metricas.items() if v is not None}
+
+    tipo = data.get("experimento")
+    if tipo == "benchmark_rendimiento":
+        por_modelo = {m: d.get("metricas_agregadas", {}).get("tps_promedio_global")
+                      for m, d in data.get("resultados_por_modelo", {}).items()
+                      if d.get("estado") == "completado"}
+        return list(por_modelo), {"tps": por_modelo}
+    if tipo == "evaluacion_calidad":
+        por_modelo = {m: s.get("f1_micro", {}).get("promedio")
+                      for m, s in data.get("estadisticas_por_modelo", {}).items()}
+        return list(por_modelo), {"f1_micro": por_modelo}
+    if tipo == "comparativa_prompts":
+        por_prompt = {p: d.get("metricas_agregadas", {}).get("f1_promedio")
+                      for p, d in data.get("resultados_por_prompt", {}).items()}
+        return [data.get("modelo", "")], {"f1_micro": por_prompt}
+    if tipo == "benchmark_power10_v3":
+        return ([data.get("modelo", {}).get("nombre", "")],
+                {"tps": data.get("resumen", {}).get("tps_generacion_promedio")})
+    if "raw_results" in data:
+        return ([data.get("modelo") or f"port:{data.get('port', '')}"],
+                {"tps": data.get("tps_avg"), "recall": data.get("evaluacion", {}).get("recall")})
+    return [], {}
+
+
+def actualizar_manifiesto(directory: str) -> Dict[str, Dict]:
+    """
+    Índice de los archivos de resultados del directorio.
+
+    Se guarda en MANIFIESTO dentro del directorio con, por archivo, tamaño,
+    mtime, tipo de experimento, fecha, modelos y métricas resumen. Solo se
+    parsean los archivos nuevos o modificados; los borrados se descartan.
+
+    Returns:
+        {nombre de archivo: entrada}
+    """
+    ruta_manifiesto = Path(directory) / MANIFIESTO
+    anterior: Dict[str, Dict] = {}
+    try:
+        with open(ruta_manifiesto, "r", encoding="utf-8") as f:
+            guardado = json.load(f)
+        if guardado.get("version") == VERSION_MANIFIESTO:
+            anterior = guardado.get("archivos", {})
+    except (OSError, json.JSONDecodeError):
+        pass
+
+    archivos: Dict[str, Dict] = {}
+    cambios = False
+    try:
+        entradas = list(os.scandir(directory))
+    except FileNotFoundError:
+        return {}
+    for entry in entradas:
+        if not entry.is_file() or not entry.name.endswith(".json") or entry.name == MANIFIESTO:
+            continue
+        stat = entry.stat()
+        previa = anterior.get(entry.name)
+        if previa and previa["size"] == stat.st_size and previa["mtime_ns"] == stat.st_mtime_ns:
+            archivos[entry.name] = previa
+            continue
+
+        cambios = True
+        try:
+            data = cargar_resultados_json(entry.path)
+        except (OSError, json.JSONDecodeError):
+            data = None
+        modelos, metricas = _resumen_resultado(data)
+        timestamp = data.get("timestamp") if isinstance(data, dict) else None
+        if not timestamp and isinstance(data, dict):
+            timestamp = data.get("metadata", {}).get("timestamp")
+        archivos[entry.name] = {
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "tipo": _tipo_resultado(entry.name, data),
+            "timestamp": timestamp or datetime.fromtimestamp(stat.st_mtime).isoformat(),
+            "modelos": modelos,
+            "metricas": metricas,
+            "valido": data is not None
+        }
+
+    if cambios or set(archivos) != set(anterior):
+        tmp = ruta_manifiesto.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"version": VERSION_MANIFIESTO, "archivos": archivos}, f, ensure_ascii=False)
+        os.replace(tmp, ruta_manifiesto)
+    return archivos
+
+
+def buscar_archivos_resultados(directory: str, patron: str = "*.json",
+                               tipo: Optional[str] = None) -> List[str]:
+    """
+    Archivos de resultados del directorio según el manifiesto, ordenados
+    por fecha del experimento.
+    """
+    from fnmatch import fnmatch
 
+    manifiesto = actualizar_manifiesto(directory)
+    seleccion = [
+        (entrada["timestamp"], nombre) for nombre, entrada in manifiesto.items()
+        if entrada["valido"] and fnmatch(nombre, patron)
+        and (tipo is None or entrada["tipo"] == tipo)
+    ]
+    return [str(Path(directory) / nombre) for _, nombre in sorted(seleccion)]
 
-def buscar_archivos_resultados(directory: str, patron: str = "*.json") -> List[str]:
-    """Busca archivos de resultados en un directorio."""
-    path = Path(directory)
-    return sorted([str(f) for f in path.glob(patron)])
+
+def ultimo_archivo(directory: str, tipo: str) -> Optional[str]:
+    """Archivo más reciente (por fecha del experimento) de un tipo."""
+    archivos = buscar_archivos_resultados(directory, tipo=tipo)
+    return archivos[-1] if archivos else None
 
 
 def cargar_ultimo_resultado(directory: str, tipo: str) -> Optional[Dict]:
     """Carga el resultado más reciente de un tipo de experimento."""
-    archivos = buscar_archivos_resultados(directory, f"{tipo}_*.json")
-    if archivos:
-        return cargar_resultados_json(archivos[-1])  # Último por orden alfabético/fecha
-    return None
+    archivo = ultimo_archivo(directory, tipo)
+    return cargar_resultados_json(archivo) if archivo else None
+
+
+# =============================================================================
+# INTERVALOS DE CONFIANZA
+# =============================================================================
+
+def formato_ic(valor: float, ci: Optional[ConfidenceInterval], digitos: int = 2) -> str:
+    """'media [low, high]' si hay IC, si no solo la media."""
+    if ci is None or ci.clusters < 2:
+        return f"{valor:.{digitos}f}"
+    return f"{valor:.{digitos}f} [{ci.low:.{digitos}f}, {ci.high:.{digitos}f}]"
+
+
+def marcar_empates(valores: Dict[str, List[float]], casos: Dict[str, List[str]]) -> Dict[str, bool]:
+    """
+    {grupo: True si no se distingue del mejor} según el IC bootstrap de la
+    diferencia de medias, pareado por caso.
+    """
+    ranking = compare_groups(valores, clusters=casos)
+    return {entry["name"]: entry["tied_with_best"] for entry in ranking}
 
 
 # =============================================================================
@@ -70,11 +251,15 @@ class RendimientoModelo:
     tps_std: float
     latencia_promedio_ms: float
     casos_evaluados: int
+    tps_ci: Optional[ConfidenceInterval] = None
+    empate_con_mejor: bool = False
+    numa: Optional[Dict] = None
 
 
 def analizar_benchmark_rendimiento(resultados: Dict) -> List[RendimientoModelo]:
     """Analiza resultados del benchmark de rendimiento."""
     analisis = []
+    tps_por_modelo, casos_por_modelo = {}, {}
 
     for modelo_id, datos in resultados.get("resultados_por_modelo", {}).items():
         if datos.get("estado") != "completado":
@@ -82,6 +267,10 @@ def analizar_benchmark_rendimiento(resultados: Dict) -> List[RendimientoModelo]:
 
         config = datos.get("configuracion", {})
         metricas = datos.get("metricas_agregadas", {})
+        por_caso = datos.get("metricas_por_caso", [])
+        if por_caso:
+            tps_por_modelo[modelo_id] = [c["tps_promedio"] for c in por_caso]
+            casos_por_modelo[modelo_id] = [c["caso_id"] for c in por_caso]
 
         analisis.append(RendimientoModelo(
             modelo_id=modelo_id,
@@ -90,9 +279,15 @@ def analizar_benchmark_rendimiento(resultados: Dict) -> List[RendimientoModelo]:
             tps_promedio=metricas.get("tps_promedio_global", 0),
             tps_std=metricas.get("tps_std_global", 0),
             latencia_promedio_ms=metricas.get("latencia_promedio_global_ms", 0),
-            casos_evaluados=metricas.get("casos_evaluados", 0)
+            casos_evaluados=metricas.get("casos_evaluados", 0),
+            tps_ci=bootstrap_ci(tps_por_modelo[modelo_id]) if modelo_id in tps_por_modelo else None,
+            numa=datos.get("numa")
         ))
 
+    empates = marcar_empates(tps_por_modelo, casos_por_modelo)
+    for m in analisis:
+        m.empate_con_mejor = empates.get(m.modelo_id, False)
+
     # Ordenar por TPS descendente
     analisis.sort(key=lambda x: x.tps_promedio, reverse=True)
     return analisis
@@ -102,15 +297,37 @@ def generar_tabla_rendimiento(analisis: List[RendimientoModelo]) -> str:
     """Genera tabla de rendimiento en formato Markdown."""
     lines = []
     lines.append("## Tabla de Rendimiento - Benchmark MMA Power10\n")
-    lines.append("| Modelo | Parámetros | TPS (gen) | Std Dev | Latencia (ms) | Casos |")
-    lines.append("|--------|------------|-----------|---------|---------------|-------|")
+    lines.append("| Modelo | Parámetros | TPS (gen) [IC 95%] | Std Dev | Latencia (ms) | Casos |")
+    lines.append("|--------|------------|--------------------|---------|---------------|-------|")
 
-    for m in analisis:
+    for i, m in enumerate(analisis):
+        empate = " ≈" if i > 0 and m.empate_con_mejor else ""
         lines.append(
             f"| {m.nombre} | {m.parametros} | "
-            f"{m.tps_promedio:.2f} | ±{m.tps_std:.2f} | "
+            f"{formato_ic(m.tps_promedio, m.tps_ci)}{empate} | ±{m.tps_std:.2f} | "
             f"{m.latencia_promedio_ms:.0f} | {m.casos_evaluados} |"
         )
+    if any(m.empate_con_mejor for m in analisis[1:]):
+        lines.append("\n≈ Sin diferencia significativa con el más rápido (bootstrap pareado por caso, 95%)")
+
+    con_numa = [m for m in analisis if m.numa and m.numa.get("nodes")]
+    if con_numa:
+        lines.append("\n### Localidad NUMA")
+        lines.append("| Modelo | Nodos | Nodo de los hilos | Hilos cruzan nodos | Acceso remoto (est.) "
+                     "| Acceso remoto al modelo (est.) | Asignaciones remotas |")
+        lines.append("|--------|-------|-------------------|--------------------|----------------------"
+                     "|--------------------------------|----------------------|")
+        for m in con_numa:
+            numa = m.numa
+            lines.append(
+                f"| {m.nombre} | {len(numa['nodes'])} | {numa['home_node']} | "
+                f"{'Sí' if numa['cross_node_threads'] else 'No'} | "
+                f"{numa['remote_access_estimate'] * 100:.1f}% | "
+                f"{numa['model_remote_access_estimate'] * 100:.1f}% | "
+                f"{numa['remote_allocation_ratio'] * 100:.1f}% |"
+            )
+        lines.append("\n*Acceso remoto estimado: fracción de hilos por nodo × páginas fuera de ese nodo "
+                     "(numa_maps); asignaciones remotas: other_node/numastat.*")
 
     # Agregar comparativa GPU teórica
     lines.append("\n### Comparativa con GPU (Referencias)")
@@ -140,13 +357,34 @@ class CalidadModelo:
     lrdi_100_pct: int
     tps_promedio: float
     muestras: int
+    f1_ci: Optional[ConfidenceInterval] = None
+    recall_ci: Optional[ConfidenceInterval] = None
+    lrdi_ci: Optional[ConfidenceInterval] = None
+    empate_con_mejor: bool = False
 
 
 def analizar_evaluacion_calidad(resultados: Dict) -> List[CalidadModelo]:
     """Analiza resultados de evaluación de calidad."""
     analisis = []
 
+    # Filas individuales (caso x iteración) para los IC, remuestreando casos
+    filas: Dict[str, List[Dict]] = {}
+    for r in resultados.get("resultados", []):
+        filas.setdefault(r["modelo"], []).append(r)
+    intervalos = {
+        modelo: bootstrap_metrics(
+            {metrica: [r["calidad"][metrica] for r in datos] for metrica in ("f1_micro", "recall", "lrdi")},
+            clusters=[r["caso"] for r in datos]
+        )
+        for modelo, datos in filas.items()
+    }
+    empates = marcar_empates(
+        {modelo: [r["calidad"]["f1_micro"] for r in datos] for modelo, datos in filas.items()},
+        {modelo: [r["caso"] for r in datos] for modelo, datos in filas.items()}
+    )
+
     for modelo_id, stats in resultados.get("estadisticas_por_modelo", {}).items():
+        ic = intervalos.get(modelo_id, {})
         analisis.append(CalidadModelo(
             modelo_id=modelo_id,
             f1_micro_promedio=stats.get("f1_micro", {}).get("promedio", 0),
@@ -155,7 +393,11 @@ def analizar_evaluacion_calidad(resultados: Dict) -> List[CalidadModelo]:
             lrdi_promedio=stats.get("lrdi", {}).get("promedio", 0),
             lrdi_100_pct=stats.get("lrdi", {}).get("casos_100_pct", 0),
             tps_promedio=stats.get("tps", {}).get("promedio", 0),
-            muestras=stats.get("muestras", 0)
+            muestras=stats.get("muestras", 0),
+            f1_ci=ic.get("f1_micro"),
+            recall_ci=ic.get("recall"),
+            lrdi_ci=ic.get("lrdi"),
+            empate_con_mejor=empates.get(modelo_id, False)
         ))
 
     # Ordenar por F1-micro descendente
@@ -168,17 +410,22 @@ def generar_tabla_calidad(analisis: List[CalidadModelo]) -> str:
     lines = []
     lines.append("## Métricas de Calidad - Evaluación de Anonimización\n")
     lines.append("*Basado en métricas de arXiv:2412.10918 y arXiv:2406.00062*\n")
-    lines.append("| Modelo | F1-micro | Std | Recall | LRDI (%) | LRDI=100% | TPS |")
-    lines.append("|--------|----------|-----|--------|----------|-----------|-----|")
+    lines.append("| Modelo | F1-micro [IC 95%] | Std | Recall [IC 95%] | LRDI (%) | LRDI=100% | TPS |")
+    lines.append("|--------|-------------------|-----|-----------------|----------|-----------|-----|")
 
     for m in analisis:
-        # Marcar el mejor con negrita
-        f1_str = f"**{m.f1_micro_promedio:.4f}**" if m == analisis[0] else f"{m.f1_micro_promedio:.4f}"
+        # Marcar el mejor con negrita y los que no se distinguen de él con ≈
+        f1_str = formato_ic(m.f1_micro_promedio, m.f1_ci, 4)
+        if m == analisis[0]:
+            f1_str = f"**{f1_str}**"
+        elif m.empate_con_mejor:
+            f1_str += " ≈"
         lrdi_warning = "⚠️" if m.lrdi_promedio < 100 else "✅"
 
         lines.append(
             f"| {m.modelo_id} | {f1_str} | ±{m.f1_micro_std:.4f} | "
-            f"{m.recall_promedio:.4f} | {m.lrdi_promedio:.1f} {lrdi_warning} | "
+            f"{formato_ic(m.recall_promedio, m.recall_ci, 4)} | "
+            f"{formato_ic(m.lrdi_promedio, m.lrdi_ci, 1)} {lrdi_warning} | "
             f"{m.lrdi_100_pct}/{m.muestras} | {m.tps_promedio:.1f} |"
         )
 
@@ -187,6 +434,8 @@ def generar_tabla_calidad(analisis: List[CalidadModelo]) -> str:
     lines.append("- Recall: Proporción de PHI detectado (crítico para privacidad)")
     lines.append("- LRDI: Levenshtein Recall para Identificadores Directos (debe ser 100%)")
     lines.append("- LRDI=100%: Casos donde TODOS los identificadores directos fueron anonimizados")
+    lines.append("- [IC 95%]: Intervalo bootstrap de la media, remuestreando casos")
+    lines.append("- ≈: Sin diferencia significativa de F1 con el mejor (bootstrap pareado por caso)")
 
     return "\n".join(lines)
 
@@ -202,8 +451,19 @@ def analizar_comparativa_prompts(resultados: Dict) -> Dict:
         "prompts": []
     }
 
+    f1_por_prompt, casos_por_prompt = {}, {}
     for prompt_id, datos in resultados.get("resultados_por_prompt", {}).items():
         metricas = datos.get("metricas_agregadas", {})
+        por_caso = datos.get("metricas_por_caso", [])
+        intervalos = {}
+        if por_caso:
+            casos = [c["caso_id"] for c in por_caso]
+            intervalos = bootstrap_metrics(
+                {metrica: [c[metrica] for c in por_caso] for metrica in ("f1_micro", "recall", "lrdi", "tps")},
+                clusters=casos
+            )
+            f1_por_prompt[prompt_id] = [c["f1_micro"] for c in por_caso]
+            casos_por_prompt[prompt_id] = casos
         analisis["prompts"].append({
             "id": prompt_id,
             "nombre": datos.get("configuracion", {}).get("nombre", prompt_id),
@@ -211,9 +471,17 @@ def analizar_comparativa_prompts(resultados: Dict) -> Dict:
             "recall_promedio": metricas.get("recall_promedio", 0),
             "lrdi_promedio": metricas.get("lrdi_promedio", 0),
             "tps_promedio": metricas.get("tps_promedio", 0),
-            "casos": metricas.get("casos_evaluados", 0)
+            "casos": metricas.get("casos_evaluados", 0),
+            "f1_ci": intervalos.get("f1_micro"),
+            "recall_ci": intervalos.get("recall"),
+            "lrdi_ci": intervalos.get("lrdi"),
+            "tps_ci": intervalos.get("tps")
         })
 
+    empates = marcar_empates(f1_por_prompt, casos_por_prompt)
+    for p in analisis["prompts"]:
+        p["empate_con_mejor"] = empates.get(p["id"], False)
+
     # Ordenar por F1
     analisis["prompts"].sort(key=lambda x: x["f1_promedio"], reverse=True)
     return analisis
@@ -224,10 +492,10 @@ def generar_tabla_prompts(analisis: Dict) -> str:
     lines = []
     lines.append(f"## Comparativa de Estrategias de Prompting\n")
     lines.append(f"*Modelo utilizado: {analisis['modelo']}*\n")
-    lines.append("| Prompt | F1 | Recall | LRDI (%) | TPS | Trade-off |")
-    lines.append("|--------|-----|--------|----------|-----|-----------|")
+    lines.append("| Prompt | F1 [IC 95%] | Recall [IC 95%] | LRDI (%) | TPS | Trade-off |")
+    lines.append("|--------|-------------|-----------------|----------|-----|-----------|")
 
-    for p in analisis["prompts"]:
+    for i, p in enumerate(analisis["prompts"]):
         # Determinar trade-off
         if p["f1_promedio"] > 0.9 and p["tps_promedio"] > 10:
             tradeoff = "✅ Óptimo"
@@ -238,12 +506,69 @@ def generar_tabla_prompts(analisis: Dict) -> str:
         else:
             tradeoff = "Baseline"
 
+        empate = " ≈" if i > 0 and p.get("empate_con_mejor") else ""
         lines.append(
-            f"| {p['nombre']} | {p['f1_promedio']:.3f} | "
-            f"{p['recall_promedio']:.3f} | {p['lrdi_promedio']:.0f} | "
+            f"| {p['nombre']} | {formato_ic(p['f1_promedio'], p.get('f1_ci'), 3)}{empate} | "
+            f"{formato_ic(p['recall_promedio'], p.get('recall_ci'), 3)} | {p['lrdi_promedio']:.0f} | "
             f"{p['tps_promedio']:.1f} | {tradeoff} |"
         )
 
+    if any(p.get("empate_con_mejor") for p in analisis["prompts"][1:]):
+        lines.append("\n≈ Sin diferencia significativa de F1 con el mejor prompt "
+                     "(bootstrap pareado por caso, 95%)")
+
+    return "\n".join(lines)
+
+
+# =============================================================================
+# CONSULTAS AL ALMACÉN DE RESULTADOS
+# =============================================================================
+
+def generar_tabla_almacen(
+    store: ResultsStore,
+    metricas: List[str],
+    agrupar: Tuple[str, ...] = ("model", "prompt"),
+    desde: Optional[str] = None,
+    **filtros
+) -> str:
+    """
+    Tabla de medias con IC 95% por grupo, a partir de las filas del almacén
+    (sin leer los JSON). Los IC remuestrean casos.
+
+    Args:
+        store: Almacén de resultados
+        metricas: Columnas a agregar (tps, latency_ms, f1_micro, recall, ...)
+        agrupar: Columnas de agrupación
+        desde: Solo corridas con fecha ISO >= desde
+        **filtros: model, prompt, experiment, case_id, run_id (valor o lista)
+    """
+    agregados = store.aggregate(metricas, agrupar, desde, **filtros)
+    muestras = {m: store.samples(m, agrupar, desde, **filtros) for m in metricas}
+
+    lines = []
+    lines.append("## Resultados agregados (almacén)\n")
+    condiciones = [f"{k}={v}" for k, v in filtros.items() if v is not None]
+    if desde:
+        condiciones.append(f"desde {desde}")
+    if condiciones:
+        lines.append(f"*Filtros: {', '.join(condiciones)}*\n")
+    lines.append("| " + " | ".join(list(agrupar) + ["N"] + [f"{m} [IC 95%]" for m in metricas]) + " |")
+    lines.append("|" + "|".join("---" for _ in range(len(agrupar) + 1 + len(metricas))) + "|")
+
+    for fila in agregados:
+        clave = tuple(fila[c] for c in agrupar)
+        celdas = [str(c) for c in clave] + [str(fila["n"])]
+        for m in metricas:
+            if fila[f"{m}_mean"] is None:
+                celdas.append("-")
+                continue
+            valores, casos = muestras[m].get(clave, ([], []))
+            digitos = 4 if m in ("precision", "recall", "f1_micro", "f1_macro") else 2
+            celdas.append(formato_ic(fila[f"{m}_mean"], bootstrap_ci(valores, casos), digitos))
+        lines.append("| " + " | ".join(celdas) + " |")
+
+    if not agregados:
+        lines.append("\n*Sin filas para los filtros dados*")
     return "\n".join(lines)
 
 
@@ -314,13 +639,188 @@ def generar_grafico_calidad_vs_velocidad(calidad: List[CalidadModelo], output_pa
 # GENERACIÓN DE REPORTE COMPLETO
 # =============================================================================
 
+CACHE_REPORTE = ".cache_reporte.json"
+VERSION_CACHE_REPORTE = 1
+
+
+def _seccion_rendimiento(datos: Dict, output_dir: str) -> Dict:
+    analisis = analizar_benchmark_rendimiento(datos)
+    lines = [generar_tabla_rendimiento(analisis), "\n---\n"]
+    if MATPLOTLIB_AVAILABLE:
+        generar_grafico_tps_por_modelo(analisis, os.path.join(output_dir, "grafico_tps_modelos.png"))
+        lines.append("![Rendimiento TPS](grafico_tps_modelos.png)\n")
+
+    conclusiones = []
+    if analisis:
+        mejor_modelo = analisis[0]
+        conclusiones.append(f"1. **Rendimiento MMA:** El modelo más rápido fue {mejor_modelo.nombre} "
+                            f"con {mejor_modelo.tps_promedio:.2f} TPS (±{mejor_modelo.tps_std:.2f}).\n")
+    return {"markdown": "\n".join(lines), "conclusiones": conclusiones}
+
+
+def _seccion_calidad(datos: Dict, output_dir: str) -> Dict:
+    analisis = analizar_evaluacion_calidad(datos)
+    lines = [generar_tabla_calidad(analisis), "\n---\n"]
+    if MATPLOTLIB_AVAILABLE:
+        generar_grafico_calidad_vs_velocidad(analisis,
+                                             os.path.join(output_dir, "grafico_calidad_velocidad.png"))
+        lines.append("![Calidad vs Velocidad](grafico_calidad_velocidad.png)\n")
+
+    conclusiones = []
+    if analisis:
+        mejor_calidad = analisis[0]
+        conclusiones.append(f"2. **Calidad:** El modelo con mejor F1-micro fue {mejor_calidad.modelo_id} "
+                            f"con {mejor_calidad.f1_micro_promedio:.4f}.\n")
+
+        modelos_lrdi_100 = [m for m in analisis if m.lrdi_promedio == 100]
+        if modelos_lrdi_100:
+            conclusiones.append(f"3. **Privacidad (LRDI=100%):** {len(modelos_lrdi_100)} modelo(s) lograron "
+                                f"anonimizar el 100% de identificadores directos.\n")
+        else:
+            conclusiones.append("3. **Privacidad:** Ningún modelo logró LRDI=100% en todos los casos. "
+                                "Se requiere revisión humana.\n")
+    return {"markdown": "\n".join(lines), "conclusiones": conclusiones}
+
+
+def _seccion_prompts(datos: Dict, output_dir: str) -> Dict:
+    analisis = analizar_comparativa_prompts(datos)
+    return {"markdown": "\n".join([generar_tabla_prompts(analisis), "\n---\n"]), "conclusiones": []}
+
+
+def generar_tabla_recursos(por_modelo: Dict[str, Dict]) -> str:
+    """
+    Tabla de CPU y memoria por modelo y fase (muestreo --recursos de
+    experiment_runner_v3).
+
+    Args:
+        por_modelo: {modelo: {"cores", "by_phase"}} como en el manifiesto
+    """
+    lines = [
+        "## Utilización de Recursos por Fase\n",
+        "| Modelo | Fase | Muestras | CPU media | CPU máx | Tiempo saturado | Cores saturados (máx) "
+        "| Memoria máx | Swap máx | CPU servidor | RSS servidor |",
+        "|--------|------|----------|-----------|---------|-----------------|-----------------------"
+        "|-------------|----------|--------------|--------------|"
+    ]
+    for modelo, recursos in por_modelo.items():
+        modelo = Path(modelo).name
+        for fase, r in recursos.get("by_phase", {}).items():
+            if not r.get("samples"):
+                continue
+            cpu_servidor = f"{r['process_cpu_mean_percent']:.0f}%" if "process_cpu_mean_percent" in r else "-"
+            rss_servidor = f"{r['process_rss_max_gb']:.2f} GB" if "process_rss_max_gb" in r else "-"
+            lines.append(
+                f"| {modelo} | {fase} | {r['samples']} | {r['cpu_mean_percent']:.1f}% "
+                f"| {r['cpu_max_percent']:.1f}% | {r['cpu_saturated_fraction'] * 100:.0f}% "
+                f"| {r['saturated_cores_max']}/{recursos.get('cores', 0)} | {r['memory_max_percent']:.1f}% "
+                f"| {r['swap_max_gb']:.2f} GB | {cpu_servidor} | {rss_servidor} |"
+            )
+    lines.append(f"\n*Saturado: CPU total >= {SATURATION_PERCENT:.0f}%. CPU servidor: 100% = un core.*\n")
+    return "\n".join(lines)
+
+
+def _seccion_recursos(entradas: List[Dict], output_dir: str) -> Dict:
+    """Última corrida v3 de cada modelo con muestreo de recursos (entradas del manifiesto)."""
+    por_modelo: Dict[str, Dict] = {}
+    for entrada in entradas:
+        recursos = entrada.get("metricas", {}).get("recursos")
+        if recursos and entrada.get("modelos"):
+            por_modelo[entrada["modelos"][0]] = recursos
+    if not por_modelo:
+        return {"markdown": "", "conclusiones": []}
+
+    conclusiones = []
+    saturadas = [
+        f"{Path(modelo).name}/{fase}"
+        for modelo, recursos in por_modelo.items()
+        for fase, r in recursos.get("by_phase", {}).items()
+        if r.get("cpu_saturated_fraction", 0) >= 0.5
+    ]
+    if saturadas:
+        conclusiones.append(f"4. **Recursos:** CPU saturada más de la mitad del tiempo en "
+                            f"{', '.join(saturadas)}.\n")
+    return {"markdown": "\n".join([generar_tabla_recursos(por_modelo), "\n---\n"]),
+            "conclusiones": conclusiones}
+
+
+def generar_tabla_speedup_mma(datos: Dict) -> str:
+    """Tabla de speedup MMA vs baseline por caso y fase (A/B intercalado de mma_ab.py)."""
+    resumen = datos["summary"]
+
+    def celda(fase: Dict) -> str:
+        ci = fase["ci"]
+        marca = "" if fase["significant"] else " (n.s.)"
+        return f"{fase['speedup']:.2f}x [{ci['low']:.2f}, {ci['high']:.2f}]{marca}"
+
+    lines = [
+        "## Speedup MMA vs Baseline (A/B intercalado)\n",
+        "| Caso | Pares | Speedup prompt | Speedup generación |",
+        "|------|-------|----------------|--------------------|"
+    ]
+    for caso_id, caso in resumen["by_case"].items():
+        lines.append(f"| {caso_id} | {caso['pairs']} | {celda(caso['prompt'])} | {celda(caso['generacion'])} |")
+    lines.append(f"| **Total** | {resumen['pairs']} | {celda(resumen['prompt'])} "
+                 f"| {celda(resumen['generacion'])} |")
+    confianza = resumen["prompt"]["ci"]["confidence"]
+    lines.append(f"\n*IC {confianza * 100:.0f}% bootstrap pareado por bloque (por caso en el total). "
+                 "n.s.: el IC incluye 1.0x.*\n")
+    return "\n".join(lines)
+
+
+def _seccion_mma_ab(datos: Dict, output_dir: str) -> Dict:
+    if not datos.get("summary", {}).get("pairs"):
+        return {"markdown": "", "conclusiones": []}
+    generacion = datos["summary"]["generacion"]
+    ci = generacion["ci"]
+    conclusiones = [f"5. **Speedup MMA:** generación {generacion['speedup']:.2f}x "
+                    f"(IC [{ci['low']:.2f}, {ci['high']:.2f}]) frente a la build sin MMA "
+                    f"en un A/B intercalado{'' if generacion['significant'] else ', no significativo'}.\n"]
+    return {"markdown": "\n".join([generar_tabla_speedup_mma(datos), "\n---\n"]),
+            "conclusiones": conclusiones}
+
+
+# (tipo de experimento, mensaje, función que arma la sección, True: la arma con las
+# entradas del manifiesto de todos los archivos del tipo en vez del último JSON)
+SECCIONES_REPORTE = [
+    ("benchmark_rendimiento", "Analizando benchmark de rendimiento...", _seccion_rendimiento, False),
+    ("evaluacion_calidad", "Analizando evaluación de calidad...", _seccion_calidad, False),
+    ("comparativa_prompts", "Analizando comparativa de prompts...", _seccion_prompts, False),
+    ("experiment_v3", "Analizando utilización de recursos...", _seccion_recursos, True),
+    ("mma_ab", "Analizando speedup MMA (A/B)...", _seccion_mma_ab, False),
+]
+
+
+def _cargar_cache_reporte(output_dir: str) -> Dict[str, Dict]:
+    try:
+        with open(os.path.join(output_dir, CACHE_REPORTE), "r", encoding="utf-8") as f:
+            cache = json.load(f)
+        if cache.get("version") == VERSION_CACHE_REPORTE:
+            return cache.get("secciones", {})
+    except (OSError, json.JSONDecodeError):
+        pass
+    return {}
+
+
 def generar_reporte_completo(
     results_dir: str,
-    output_dir: str
+    output_dir: str,
+    forzar: bool = False
 ) -> str:
     """
     Genera reporte completo en Markdown con todos los análisis.
 
+    Cada sección depende del último archivo de su tipo (o de todos, en la
+    de recursos) según el manifiesto; si esos archivos no cambiaron desde
+    el reporte anterior, la sección y sus conclusiones se reutilizan del
+    cache del reporte sin volver a parsear ni analizar el JSON. La de
+    recursos se arma con los resúmenes del manifiesto: un archivo nuevo
+    solo se parsea una vez, al actualizarlo.
+
+    Args:
+        results_dir: Directorio con resultados JSON
+        output_dir: Directorio del reporte
+        forzar: Recalcular todas las secciones
+
     Returns:
         Path al archivo de reporte generado
     """
@@ -329,6 +829,36 @@ def generar_reporte_completo(
     print("=" * 70)
 
     os.makedirs(output_dir, exist_ok=True)
+    manifiesto = actualizar_manifiesto(results_dir)
+    cache = {} if forzar else _cargar_cache_reporte(output_dir)
+    secciones: Dict[str, Dict] = {}
+
+    for tipo, mensaje, construir, todos in SECCIONES_REPORTE:
+        archivos = buscar_archivos_resultados(results_dir, tipo=tipo)
+        if not archivos:
+            continue
+        if not todos:
+            archivos = archivos[-1:]
+        huella = "|".join(
+            f"{nombre}:{manifiesto[nombre]['size']}:{manifiesto[nombre]['mtime_ns']}"
+            for nombre in (Path(a).name for a in archivos)
+        ) + f":{MATPLOTLIB_AVAILABLE}"
+
+        previa = cache.get(tipo)
+        if previa and previa.get("huella") == huella:
+            print(f"  {tipo}: sin cambios, se reutiliza la sección")
+            secciones[tipo] = previa
+            continue
+
+        print(f"  {mensaje}")
+        if todos:
+            datos = [manifiesto[Path(a).name] for a in archivos]
+        else:
+            datos = cargar_resultados_json(archivos[0])
+        secciones[tipo] = {"huella": huella, **construir(datos, output_dir)}
+
+    with open(os.path.join(output_dir, CACHE_REPORTE), "w", encoding="utf-8") as f:
+        json.dump({"version": VERSION_CACHE_REPORTE, "secciones": secciones}, f, ensure_ascii=False)
 
     lines = []
     lines.append("# Resultados de Experimentos - Benchmark MMA Power10\n")
@@ -336,67 +866,16 @@ def generar_reporte_completo(
     lines.append("**Tesis:** Universidad de Montevideo 2025\n")
     lines.append("---\n")
 
-    # Cargar y analizar rendimiento
-    rendimiento = cargar_ultimo_resultado(results_dir, "benchmark_rendimiento")
-    if rendimiento:
-        print("  Analizando benchmark de rendimiento...")
-        analisis_rend = analizar_benchmark_rendimiento(rendimiento)
-        lines.append(generar_tabla_rendimiento(analisis_rend))
-        lines.append("\n---\n")
-
-        # Generar gráfico
-        if MATPLOTLIB_AVAILABLE:
-            generar_grafico_tps_por_modelo(
-                analisis_rend,
-                os.path.join(output_dir, "grafico_tps_modelos.png")
-            )
-            lines.append("![Rendimiento TPS](grafico_tps_modelos.png)\n")
-
-    # Cargar y analizar calidad
-    calidad = cargar_ultimo_resultado(results_dir, "evaluacion_calidad")
-    if calidad:
-        print("  Analizando evaluación de calidad...")
-        analisis_cal = analizar_evaluacion_calidad(calidad)
-        lines.append(generar_tabla_calidad(analisis_cal))
-        lines.append("\n---\n")
-
-        # Generar gráfico
-        if MATPLOTLIB_AVAILABLE:
-            generar_grafico_calidad_vs_velocidad(
-                analisis_cal,
-                os.path.join(output_dir, "grafico_calidad_velocidad.png")
-            )
-            lines.append("![Calidad vs Velocidad](grafico_calidad_velocidad.png)\n")
-
-    # Cargar y analizar prompts
-    prompts = cargar_ultimo_resultado(results_dir, "comparativa_prompts")
-    if prompts:
-        print("  Analizando comparativa de prompts...")
-        analisis_prompts = analizar_comparativa_prompts(prompts)
-        lines.append(generar_tabla_prompts(analisis_prompts))
-        lines.append("\n---\n")
+    for tipo, _, _, _ in SECCIONES_REPORTE:
+        if tipo in secciones:
+            lines.append(secciones[tipo]["markdown"])
 
     # Conclusiones
     lines.append("## Conclusiones\n")
     lines.append("### Hallazgos Principales\n")
-
-    if rendimiento and analisis_rend:
-        mejor_modelo = analisis_rend[0]
-        lines.append(f"1. **Rendimiento MMA:** El modelo más rápido fue {mejor_modelo.nombre} "
-                     f"con {mejor_modelo.tps_promedio:.2f} TPS (±{mejor_modelo.tps_std:.2f}).\n")
-
-    if calidad and analisis_cal:
-        mejor_calidad = analisis_cal[0]
-        lines.append(f"2. **Calidad:** El modelo con mejor F1-micro fue {mejor_calidad.modelo_id} "
-                     f"con {mejor_calidad.f1_micro_promedio:.4f}.\n")
-
-        modelos_lrdi_100 = [m for m in analisis_cal if m.lrdi_promedio == 100]
-        if modelos_lrdi_100:
-            lines.append(f"3. **Privacidad (LRDI=100%):** {len(modelos_lrdi_100)} modelo(s) lograron "
-                         f"anonimizar el 100% de identificadores directos.\n")
-        else:
-            lines.append("3. **Privacidad:** Ningún modelo logró LRDI=100% en todos los casos. "
-                         "Se requiere revisión humana.\n")
+    for tipo, _, _, _ in SECCIONES_REPORTE:
+        if tipo in secciones:
+            lines.extend(secciones[tipo]["conclusiones"])
 
     lines.append("\n### Argumento 'Best Fit'\n")
     lines.append("> IBM Power10 con aceleradores MMA proporciona rendimiento suficiente (13-17 TPS) "
@@ -460,6 +939,17 @@ def imprimir_resumen_rapido(results_dir: str):
     print("\n" + "=" * 70)
 
 
+def imprimir_manifiesto(results_dir: str):
+    """Lista los archivos de resultados indexados, del más viejo al más nuevo."""
+    manifiesto = actualizar_manifiesto(results_dir)
+    print(f"\n  {'Fecha':<20} {'Tipo':<24} {'Modelos':<30} Archivo")
+    print("  " + "-" * 100)
+    for nombre, entrada in sorted(manifiesto.items(), key=lambda e: e[1]["timestamp"]):
+        modelos = ", ".join(m for m in entrada["modelos"] if m)[:30]
+        print(f"  {entrada['timestamp'][:19]:<20} {entrada['tipo']:<24} {modelos:<30} {nombre}")
+    print(f"\n  {len(manifiesto)} archivo(s) en {results_dir}")
+
+
 # =============================================================================
 # CLI
 # =============================================================================
@@ -480,14 +970,50 @@ def main():
                         help="Imprimir resumen rápido en consola")
     parser.add_argument("--graficos", action="store_true",
                         help="Generar solo gráficos")
+    parser.add_argument("--listar", action="store_true",
+                        help="Listar los archivos de resultados indexados en el manifiesto")
+    parser.add_argument("--forzar", action="store_true",
+                        help="Recalcular todas las secciones del reporte (ignorar el cache)")
+
+    # Almacén SQLite (results_store.py)
+    parser.add_argument("--db", type=str, default=DEFAULT_STORE_PATH,
+                        help="Almacén SQLite de resultados")
+    parser.add_argument("--importar", action="store_true",
+                        help="Importar al almacén los JSON nuevos o modificados de --results-dir")
+    parser.add_argument("--consulta", action="store_true",
+                        help="Tabla agregada desde el almacén (con --modelo/--prompt/--experimento/--desde)")
+    parser.add_argument("--metricas", nargs="+", default=["tps", "latency_ms", "f1_micro", "recall", "lrdi"],
+                        help="Métricas de la consulta")
+    parser.add_argument("--agrupar", nargs="+", default=["model", "prompt"],
+                        help="Columnas de agrupación de la consulta")
+    parser.add_argument("--modelo", nargs="+", default=None, help="Filtrar por modelo(s)")
+    parser.add_argument("--prompt", nargs="+", default=None, help="Filtrar por prompt(s)")
+    parser.add_argument("--experimento", nargs="+", default=None, help="Filtrar por experimento(s)")
+    parser.add_argument("--desde", type=str, default=None,
+                        help="Solo corridas desde esta fecha ISO (p. ej. 2025-12-01)")
 
     args = parser.parse_args()
 
+    if args.importar or args.consulta:
+        store = ResultsStore(args.db)
+        if args.importar:
+            importados = store.import_directory(args.results_dir)
+            print(f"  Importados {len(importados)} archivo(s), "
+                  f"{sum(importados.values())} filas -> {args.db}")
+        if args.consulta:
+            print(generar_tabla_almacen(store, args.metricas, tuple(args.agrupar), args.desde,
+                                        model=args.modelo, prompt=args.prompt,
+                                        experiment=args.experimento))
+        store.close()
+
+    if args.listar:
+        imprimir_manifiesto(args.results_dir)
+
     if args.resumen:
         imprimir_resumen_rapido(args.results_dir)
 
     if args.reporte:
-        generar_reporte_completo(args.results_dir, args.output_dir)
+        generar_reporte_completo(args.results_dir, args.output_dir, args.forzar)
 
     if args.graficos:
         if not MATPLOTLIB_AVAILABLE:
@@ -512,7 +1038,8 @@ def main():
                 os.path.join(args.output_dir, "grafico_calidad_velocidad.png")
             )
 
-    if not (args.reporte or args.resumen or args.graficos):
+    if not (args.reporte or args.resumen or args.graficos or args.importar or args.consulta
+            or args.listar):
         parser.print_help()
 
 
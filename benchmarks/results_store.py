@@ -0,0 +1,524 @@
+#!/usr/bin/env python3
+"""
+results_store.py - Almacén de resultados por request en SQLite
+Universidad de Montevideo - Tesis 2025
+
+Cada corrida escribe un JSON grande e indentado (experiment_v3_*.json,
+benchmark_rendimiento_*.json, los archivos por modelo de run_all_models.sh)
+y results_analyzer los vuelve a parsear enteros con json.load.
+
+Este almacén guarda cada request como una fila, con claves
+(run_id, experiment, model, prompt, case_id, iteration) y las métricas en
+columnas (tps, latencia, tokens, precision, recall, F1, LRDI, LRQI), de
+modo que filtrar y agregar sobre cientos de corridas es una consulta SQL
+indexada en lugar de parsear cada archivo.
+
+- Solo se agregan filas: una corrida re-importada reemplaza sus propias
+  filas y no toca las demás
+- Los runners escriben directo al almacén con --results-db; los JSON
+  existentes se importan una vez (import_directory recuerda tamaño y mtime
+  de cada archivo y salta los ya importados)
+- Los requests fallidos se guardan con success=0 y sin métricas
+  (aggregate y samples usan solo los exitosos; query permite contar fallos)
+- Formatos reconocidos: experiment_runner_v3, experiment_runner
+  (rendimiento, prompts, calidad), benchmark_anon y run_benchmark_power10
+
+Uso:
+    from results_store import configure_results_store
+
+    store = configure_results_store("results/results.sqlite")
+    store.import_directory("results")
+    filas = store.aggregate(["tps", "f1_micro"], group_by=("model", "prompt"),
+                            experiment="quality")
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+# =============================================================================
+# CONFIGURACIÓN
+# =============================================================================
+
+DEFAULT_STORE_PATH = "results/results.sqlite"
+
+KEY_COLUMNS = ("run_id", "experiment", "model", "prompt", "case_id", "iteration")
+METRIC_COLUMNS = (
+    "tps", "tps_prompt", "latency_ms", "tokens_generated", "tokens_prompt",
+    "precision", "recall", "f1_micro", "f1_macro", "lrdi", "lrqi"
+)
+COLUMNS = KEY_COLUMNS + ("success",) + METRIC_COLUMNS
+
+# Filtros de query/aggregate: columna de requests o de runs
+_FILTERS = {
+    "run_id": "r.run_id", "experiment": "r.experiment", "model": "r.model",
+    "prompt": "r.prompt", "case_id": "r.case_id", "iteration": "r.iteration",
+    "success": "r.success"
+}
+
+_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS runs (
+        run_id TEXT PRIMARY KEY,
+        source TEXT NOT NULL,
+        created_at TEXT NOT NULL,
+        metadata TEXT NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS requests (
+        run_id TEXT NOT NULL,
+        experiment TEXT NOT NULL,
+        model TEXT NOT NULL,
+        prompt TEXT NOT NULL,
+        case_id TEXT NOT NULL,
+        iteration INTEGER,
+        success INTEGER NOT NULL,
+        tps REAL,
+        tps_prompt REAL,
+        latency_ms REAL,
+        tokens_generated INTEGER,
+        tokens_prompt INTEGER,
+        precision REAL,
+        recall REAL,
+        f1_micro REAL,
+        f1_macro REAL,
+        lrdi REAL,
+        lrqi REAL,
+        extra TEXT
+    );
+    CREATE INDEX IF NOT EXISTS idx_requests_run ON requests(run_id);
+    CREATE INDEX IF NOT EXISTS idx_requests_keys ON requests(experiment, model, prompt, case_id);
+    CREATE TABLE IF NOT EXISTS sources (
+        path TEXT PRIMARY KEY,
+        size INTEGER NOT NULL,
+        mtime REAL NOT NULL,
+        runs TEXT NOT NULL
+    );
+"""
+
+
+# =============================================================================
+# CONVERSIÓN DE FORMATOS
+# =============================================================================
+
+def _quality_columns(quality: Dict, percent: bool = False) -> Dict:
+    """Métricas de calidad a columnas (precision/recall en [0, 1], LRDI/LRQI en %)."""
+    scale = 100.0 if percent else 1.0
+    columns = {}
+    for key in ("precision", "recall", "f1_micro", "f1_macro"):
+        if quality.get(key) is not None:
+            columns[key] = quality[key] / scale
+    for key in ("lrdi", "lrqi"):
+        if quality.get(key) is not None:
+            columns[key] = quality[key]
+    return columns
+
+
+def _failure_rows(failures: List[Dict], model: str, prompt: str = "",
+                  iteration: Optional[int] = None) -> List[Dict]:
+    """Requests fallidos (claves en inglés o en español) como filas con success=0."""
+    return [{
+        "model": f.get("modelo", model), "prompt": f.get("prompt_id", f.get("prompt", prompt)),
+        "case_id": f.get("case_id", f.get("caso")),
+        "iteration": f.get("iteration", f.get("iteracion", iteration)),
+        "success": False, "error": f.get("error")
+    } for f in failures]
+
+
+def _rows_v3(data: Dict) -> List[Tuple[str, List[Dict]]]:
+    metadata = data.get("metadata", {})
+    model = (metadata.get("model") or metadata.get("response_cache_model")
+             or f"{metadata.get('host', 'localhost')}:{metadata.get('port', '')}")
+    experiments = data.get("experiments", {})
+    converted = []
+
+    performance = experiments.get("performance")
+    if performance:
+        converted.append(("performance", [{
+            "model": model, "prompt": "baseline", "case_id": r["case_id"],
+            "iteration": r.get("iteration"),
+            "tps": r.get("tps_generation"), "tps_prompt": r.get("tps_prompt"),
+            "latency_ms": r["total_time_s"] * 1000 if r.get("total_time_s") is not None else None,
+            "tokens_generated": r.get("tokens_generated"),
+            "ttft_ms": r.get("ttft_ms")
+        } for r in performance.get("results", [])]
+            + _failure_rows(performance.get("failures", []), model=model, prompt="baseline")))
+
+    prompts = experiments.get("prompts")
+    if prompts:
+        converted.append(("prompts", [{
+            "model": model, "prompt": r["prompt_id"], "case_id": d["case_id"], "iteration": 1,
+            "tps": d.get("tps"), **_quality_columns(d.get("quality", {}))
+        } for r in prompts.get("results", []) for d in r.get("details", [])]
+            + _failure_rows(prompts.get("failures", []), model=model, iteration=1)))
+
+    quality = experiments.get("quality")
+    if quality:
+        converted.append(("quality", [{
+            "model": model, "prompt": quality.get("prompt_used", ""), "case_id": r["case_id"],
+            "iteration": r.get("iteration"),
+            "tps": r.get("performance", {}).get("tps"),
+            "latency_ms": (r["performance"]["time_s"] * 1000
+                           if r.get("performance", {}).get("time_s") is not None else None),
+            **_quality_columns(r.get("quality", {}))
+        } for r in quality.get("results", [])]
+            + _failure_rows(quality.get("failures", []), model=model,
+                            prompt=quality.get("prompt_used", ""))))
+    return converted
+
+
+def _rows_runner(data: Dict) -> List[Tuple[str, List[Dict]]]:
+    """Formatos de experiment_runner.py (un experimento por archivo)."""
+    experiment = data.get("experimento")
+    rows = []
+    if experiment == "benchmark_rendimiento":
+        prompt = data.get("configuracion", {}).get("prompt_id", "")
+        for model, datos in data.get("resultados_por_modelo", {}).items():
+            for c in datos.get("metricas_por_caso", []):
+                if "tps_valores" in c:
+                    rows.extend({"model": model, "prompt": prompt, "case_id": c["caso_id"],
+                                 "iteration": i, "tps": tps, "latency_ms": latency}
+                                for i, (tps, latency) in enumerate(zip(c["tps_valores"],
+                                                                       c["latencias_ms"]), 1))
+                else:
+                    # Archivos viejos: solo el promedio por caso
+                    rows.append({"model": model, "prompt": prompt, "case_id": c["caso_id"],
+                                 "tps": c.get("tps_promedio"), "latency_ms": c.get("latencia_promedio_ms"),
+                                 "iterations": c.get("iteraciones_exitosas")})
+    elif experiment == "comparativa_prompts":
+        for prompt, datos in data.get("resultados_por_prompt", {}).items():
+            for c in datos.get("metricas_por_caso", []):
+                rows.append({"model": data.get("modelo", ""), "prompt": prompt, "case_id": c["caso_id"],
+                             "iteration": 1, "tps": c.get("tps"), "latency_ms": c.get("latencia_ms"),
+                             "tokens_generated": c.get("tokens_generados"), **_quality_columns(c)})
+    elif experiment == "evaluacion_calidad":
+        for r in data.get("resultados", []):
+            rendimiento = r.get("rendimiento", {})
+            rows.append({"model": r["modelo"], "prompt": r["prompt"], "case_id": r["caso"],
+                         "iteration": r.get("iteracion"), "tps": rendimiento.get("tps_generacion"),
+                         "tps_prompt": rendimiento.get("tps_prompt"),
+                         "latency_ms": rendimiento.get("latencia_total_ms"),
+                         "tokens_generated": rendimiento.get("tokens_generados"),
+                         **_quality_columns(r.get("calidad", {}))})
+    elif experiment == "benchmark_power10_v3":
+        model = data.get("modelo", {}).get("nombre", "")
+        iterations: Dict[Tuple[str, str], int] = {}
+        for r in data.get("resultados", []):
+            key = (r["prompt"], r["caso"])
+            iterations[key] = iterations.get(key, 0) + 1
+            rows.append({"model": model, "prompt": r["prompt"], "case_id": r["caso"],
+                         "iteration": iterations[key], "tps": r.get("tps_gen"),
+                         "tps_prompt": r.get("tps_prompt"),
+                         "latency_ms": (r.get("tiempo_gen_ms") or 0) + (r.get("tiempo_prompt_ms") or 0),
+                         "tokens_generated": r.get("tokens_gen"), "tokens_prompt": r.get("tokens_prompt")})
+    prompt = data.get("configuracion", {}).get("prompt_id", "")
+    rows.extend(_failure_rows(data.get("fallos", []), model=data.get("modelo", ""), prompt=prompt))
+    return [(experiment, rows)] if experiment else []
+
+
+def _rows_benchmark_anon(data: Dict) -> List[Tuple[str, List[Dict]]]:
+    """Archivo de benchmark_anon.save_results (también los de run_all_models.sh)."""
+    evaluacion = data.get("evaluacion", {})
+    rows = []
+    for i, r in enumerate(data.get("raw_results", []), 1):
+        row = {"model": data.get("modelo") or f"port:{data.get('port', '')}",
+               "prompt": data.get("prompt_id", ""), "case_id": data.get("caso_id", ""),
+               "iteration": i, "tps": r.get("tps"), "latency_ms": r.get("time_ms"),
+               "tokens_generated": r.get("tokens")}
+        if i == 1:
+            # La calidad se evalúa sobre la primera respuesta (en %)
+            row.update(_quality_columns(evaluacion, percent=True))
+        rows.append(row)
+    return [("benchmark_anon", rows)]
+
+
+def convert_result(data: Dict) -> List[Tuple[str, List[Dict]]]:
+    """[(experimento, filas)] de un JSON de resultados; [] si el formato no se reconoce."""
+    if "experiments" in data:
+        return _rows_v3(data)
+    if "experimento" in data:
+        return _rows_runner(data)
+    if "raw_results" in data and "caso_id" in data:
+        return _rows_benchmark_anon(data)
+    return []
+
+
+def run_id_for(path: str) -> str:
+    """
+    Id de corrida de un archivo: su nombre más un hash corto de la ruta
+    absoluta, para que archivos homónimos en directorios distintos (p. ej.
+    los de run_all_models.sh por modelo) no se pisen.
+    """
+    resolved = str(Path(path).resolve())
+    digest = hashlib.sha1(resolved.encode("utf-8")).hexdigest()[:8]
+    return f"{Path(resolved).stem}-{digest}"
+
+
+def _metadata(data: Dict) -> Dict:
+    """Metadatos de la corrida sin los bloques de resultados."""
+    if "metadata" in data:
+        return data["metadata"]
+    skip = {"resultados", "resultados_por_modelo", "resultados_por_prompt", "raw_results",
+            "estadisticas_por_modelo", "first_response_preview", "evaluacion", "fallos"}
+    return {k: v for k, v in data.items() if k not in skip}
+
+
+# =============================================================================
+# ALMACÉN
+# =============================================================================
+
+class ResultsStore:
+    """
+    Filas por request en SQLite.
+
+    Thread-safe (una conexión compartida protegida por lock), como
+    ResponseCache.
+    """
+
+    def __init__(self, path: str = DEFAULT_STORE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+
+    # -------------------------------------------------------------------------
+    # Escritura
+    # -------------------------------------------------------------------------
+
+    def add_run(self, run_id: str, experiment: str, rows: Iterable[Dict],
+                metadata: Optional[Dict] = None, source: str = "") -> int:
+        """
+        Guarda (o reemplaza) las filas de una corrida.
+
+        Cada fila es un dict con claves de COLUMNS; las claves restantes
+        se guardan como JSON en la columna extra. Retorna la cantidad de filas.
+        """
+        records = []
+        for row in rows:
+            extra = {k: v for k, v in row.items() if k not in COLUMNS and v is not None}
+            record = {**row, "run_id": run_id, "experiment": experiment}
+            records.append(tuple(
+                [record.get(c) if record.get(c) is not None else "" for c in KEY_COLUMNS[:5]]
+                + [record.get("iteration"), int(record.get("success", True))]
+                + [record.get(c) for c in METRIC_COLUMNS]
+                + [json.dumps(extra, ensure_ascii=False) if extra else None]
+            ))
+
+        with self._lock:
+            with self._conn:
+                self._conn.execute("DELETE FROM requests WHERE run_id = ? AND experiment = ?",
+                                   (run_id, experiment))
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO runs VALUES (?, ?, ?, ?)",
+                    (run_id, source, (metadata or {}).get("timestamp") or datetime.now().isoformat(),
+                     json.dumps(metadata or {}, ensure_ascii=False, default=str))
+                )
+                self._conn.executemany(
+                    f"INSERT INTO requests VALUES ({', '.join('?' * (len(COLUMNS) + 1))})", records
+                )
+        return len(records)
+
+    def import_result(self, data: Dict, run_id: str, source: str = "") -> int:
+        """Importa un dict de resultados (el mismo que se escribe a JSON)."""
+        metadata = _metadata(data)
+        return sum(self.add_run(run_id, experiment, rows, metadata, source)
+                   for experiment, rows in convert_result(data))
+
+    def import_file(self, path: str, force: bool = False) -> int:
+        """
+        Importa un archivo JSON; se salta si ya se importó con el mismo
+        tamaño y mtime. Retorna las filas importadas.
+        """
+        path = str(Path(path).resolve())
+        stat = os.stat(path)
+        with self._lock:
+            row = self._conn.execute("SELECT size, mtime, runs FROM sources WHERE path = ?",
+                                     (path,)).fetchone()
+        if not force and row and row[0] == stat.st_size and row[1] == stat.st_mtime:
+            return 0
+
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return 0
+        run_id = run_id_for(path)
+        if row and row[2] != run_id:
+            # Importado antes con otro id (versiones que usaban solo el nombre)
+            self.delete_run(row[2])
+        count = self.import_result(data, run_id, path) if isinstance(data, dict) else 0
+        self.mark_source(path)
+        return count
+
+    def delete_run(self, run_id: str):
+        """Borra una corrida y todas sus filas."""
+        with self._lock:
+            with self._conn:
+                self._conn.execute("DELETE FROM requests WHERE run_id = ?", (run_id,))
+                self._conn.execute("DELETE FROM runs WHERE run_id = ?", (run_id,))
+
+    def mark_source(self, path: str):
+        """Registra un archivo como importado (tamaño y mtime actuales)."""
+        path = str(Path(path).resolve())
+        stat = os.stat(path)
+        with self._lock:
+            with self._conn:
+                self._conn.execute("INSERT OR REPLACE INTO sources VALUES (?, ?, ?, ?)",
+                                   (path, stat.st_size, stat.st_mtime, run_id_for(path)))
+
+    def import_directory(self, directory: str, pattern: str = "**/*.json") -> Dict[str, int]:
+        """Importa los JSON nuevos o modificados de un directorio."""
+        imported = {}
+        for path in sorted(Path(directory).glob(pattern)):
+            count = self.import_file(str(path))
+            if count:
+                imported[str(path)] = count
+        return imported
+
+    # -------------------------------------------------------------------------
+    # Consultas
+    # -------------------------------------------------------------------------
+
+    @staticmethod
+    def _where(filters: Dict, since: Optional[str] = None) -> Tuple[str, List]:
+        clauses, params = [], []
+        for key, value in filters.items():
+            if value is None:
+                continue
+            if key not in _FILTERS:
+                raise ValueError(f"Filtro desconocido: {key}")
+            if isinstance(value, (list, tuple, set)):
+                values = list(value)
+                clauses.append(f"{_FILTERS[key]} IN ({', '.join('?' * len(values))})")
+                params.extend(values)
+            else:
+                clauses.append(f"{_FILTERS[key]} = ?")
+                params.append(value)
+        if since:
+            clauses.append("u.created_at >= ?")
+            params.append(since)
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def query(self, columns: Sequence[str] = COLUMNS, since: Optional[str] = None,
+              **filters) -> List[Dict]:
+        """Filas que cumplen los filtros (p. ej. model="qwen2.5-7b", prompt=["detailed"])."""
+        for column in columns:
+            if column not in COLUMNS:
+                raise ValueError(f"Columna desconocida: {column}")
+        where, params = self._where(filters, since)
+        sql = (f"SELECT {', '.join('r.' + c for c in columns)} FROM requests r "
+               f"JOIN runs u ON u.run_id = r.run_id{where} "
+               f"ORDER BY u.created_at, r.rowid")
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [dict(zip(columns, row)) for row in rows]
+
+    def aggregate(self, metrics: Sequence[str], group_by: Sequence[str] = ("model", "prompt"),
+                  since: Optional[str] = None, **filters) -> List[Dict]:
+        """
+        Media, mínimo, máximo y cantidad de cada métrica por grupo.
+
+        Returns:
+            [{<claves de group_by>, "n", "<métrica>_mean", "<métrica>_min", "<métrica>_max"}]
+        """
+        for column in list(metrics) + list(group_by):
+            if column not in COLUMNS:
+                raise ValueError(f"Columna desconocida: {column}")
+        where, params = self._where({"success": 1, **filters}, since)
+        keys = ", ".join(f"r.{c}" for c in group_by)
+        selects = ", ".join(f"AVG(r.{m}), MIN(r.{m}), MAX(r.{m})" for m in metrics)
+        sql = (f"SELECT {keys + ', ' if keys else ''}COUNT(*), {selects} FROM requests r "
+               f"JOIN runs u ON u.run_id = r.run_id{where}"
+               f"{' GROUP BY ' + keys + ' ORDER BY ' + keys if keys else ''}")
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+
+        result = []
+        for row in rows:
+            entry = dict(zip(group_by, row[:len(group_by)]))
+            entry["n"] = row[len(group_by)]
+            values = row[len(group_by) + 1:]
+            for i, metric in enumerate(metrics):
+                entry[f"{metric}_mean"], entry[f"{metric}_min"], entry[f"{metric}_max"] = values[3 * i:3 * i + 3]
+            result.append(entry)
+        return result
+
+    def samples(self, metric: str, group_by: Sequence[str] = ("model", "prompt"),
+                since: Optional[str] = None, **filters) -> Dict[Tuple, Tuple[List[float], List[str]]]:
+        """
+        Valores individuales de una métrica por grupo, con el caso de cada
+        valor (para bootstrap por caso).
+
+        Returns:
+            {claves del grupo: (valores, case_ids)}
+        """
+        rows = self.query(tuple(group_by) + (metric, "case_id"), since, success=1, **filters)
+        groups: Dict[Tuple, Tuple[List[float], List[str]]] = {}
+        for row in rows:
+            if row[metric] is None:
+                continue
+            values, cases = groups.setdefault(tuple(row[c] for c in group_by), ([], []))
+            values.append(row[metric])
+            cases.append(row["case_id"])
+        return groups
+
+    def runs(self, since: Optional[str] = None, **filters) -> List[Dict]:
+        """Corridas con filas que cumplen los filtros, de la más vieja a la más nueva."""
+        where, params = self._where(filters, since)
+        sql = (f"SELECT u.run_id, u.source, u.created_at, COUNT(*) FROM requests r "
+               f"JOIN runs u ON u.run_id = r.run_id{where} "
+               f"GROUP BY u.run_id ORDER BY u.created_at")
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [{"run_id": r[0], "source": r[1], "created_at": r[2], "rows": r[3]} for r in rows]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            runs = self._conn.execute("SELECT COUNT(*) FROM runs").fetchone()[0]
+            requests = self._conn.execute("SELECT COUNT(*) FROM requests").fetchone()[0]
+        return {"path": self.path, "runs": runs, "requests": requests}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+# =============================================================================
+# ALMACÉN COMPARTIDO
+# =============================================================================
+
+_default_store: Optional[ResultsStore] = None
+
+
+def get_results_store() -> Optional[ResultsStore]:
+    """Retorna el almacén configurado, o None si está desactivado."""
+    return _default_store
+
+
+def configure_results_store(path: str = DEFAULT_STORE_PATH) -> ResultsStore:
+    """Activa el almacén compartido por los runners."""
+    global _default_store
+    if _default_store is not None:
+        _default_store.close()
+    _default_store = ResultsStore(path)
+    return _default_store
+
+
+def record_result(data: Dict, output_file: str) -> int:
+    """
+    Guarda en el almacén configurado (si hay) el dict que un runner acaba
+    de escribir a output_file. El id de la corrida es run_id_for(output_file).
+    """
+    store = get_results_store()
+    if store is None:
+        return 0
+    count = store.import_result(data, run_id_for(output_file), str(Path(output_file).resolve()))
+    if Path(output_file).is_file():
+        store.mark_source(output_file)
+    print(f"  Almacén de resultados: {count} filas en {store.path}")
+    return count
@@ -4,7 +4,8 @@
 # Uso: ./run_all_models.sh
 #
 # Este script ejecuta el benchmark de anonimización en todos los modelos
-# configurados y guarda los resultados en el directorio results/
+# configurados y guarda los resultados en el directorio results/ (un JSON
+# por modelo y una fila por request en results/results.sqlite)
 
 set -e
 
@@ -57,7 +58,8 @@ for model in "${!MODELS[@]}"; do
     # Ejecutar benchmark
     OUTPUT_FILE="$RESULTS_DIR/${model}_$TIMESTAMP.json"
 
-    python3 "$BENCHMARK_SCRIPT" --port "$port" --save --output "$OUTPUT_FILE"
+    python3 "$BENCHMARK_SCRIPT" --port "$port" --save --output "$OUTPUT_FILE" \
+        --modelo "$model" --results-db "$RESULTS_DIR/results.sqlite"
 
     if [ -f "$OUTPUT_FILE" ]; then
         # Extraer TPS del resultado
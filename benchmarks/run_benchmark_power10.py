@@ -4,12 +4,13 @@ Benchmark de Rendimiento - IBM Power10
 Universidad de Montevideo - Tesis 2025
 """
 
-import urllib.request
 import json
 import time
 import statistics
 from datetime import datetime
 
+from http_transport import get_transport
+
 # Casos clínicos de prueba
 CASOS = {
     "A1": {
@@ -95,13 +96,10 @@ def llamar_modelo(prompt, host="localhost", port=8080, timeout=120):
         "stream": False
     }
 
-    url = f"http://{host}:{port}/completion"
-    data = json.dumps(payload).encode("utf-8")
-    req = urllib.request.Request(url, data=data, headers={"Content-Type": "application/json"})
-
     inicio = time.time()
-    with urllib.request.urlopen(req, timeout=timeout) as response:
-        result = json.loads(response.read().decode("utf-8"))
+    response = get_transport().post_json(host, port, "/completion", payload, timeout=timeout)
+    response.raise_for_status()
+    result = response.json()
     tiempo_total = time.time() - inicio
 
     tokens_gen = result.get("tokens_predicted", 0)
@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+"""
+span_extraction.py - Anonimización por extracción de spans
+Universidad de Montevideo - Tesis 2025
+
+Todas las estrategias de prompting piden al modelo reescribir la nota
+completa: los tokens generados son aproximadamente los de entrada y, a
+13-17 TPS en Power10, la generación domina el costo.
+
+En modo extracción el modelo devuelve solo la lista de entidades PHI
+(prompt span_extraction, con las categorías de structured_output):
+
+    [{"category": "NOMBRE", "text": "Juan Pérez"}, ...]
+
+y el cliente aplica los reemplazos localmente ([NOMBRE], [CI], ...). La
+salida crece con la cantidad de entidades y no con el largo de la nota.
+
+El benchmark compara, caso por caso, tokens generados, tiempo total y
+métricas de calidad del modo extracción contra la reescritura con
+structured_output.
+
+Uso:
+    python span_extraction.py --port 8080 --iterations 3
+
+    from span_extraction import extract_and_apply
+    result = extract_and_apply(texto, "localhost", 8080)
+"""
+
+import json
+import re
+import statistics
+import sys
+import unicodedata
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from prompts_anonimizacion import PROMPTS, PROMPTS_EXTRACCION
+
+# =============================================================================
+# CONFIGURACIÓN
+# =============================================================================
+
+EXTRACTION_PROMPT_ID = "span_extraction"
+REWRITE_PROMPT_ID = "structured_output"
+
+# Objetos {"category": ..., "text": ...} sueltos, para salidas con la lista
+# truncada (n_predict) o con texto alrededor que no es JSON válido
+_SPAN_OBJECT = re.compile(
+    r'\{\s*"category"\s*:\s*"((?:[^"\\]|\\.)*)"\s*,\s*"text"\s*:\s*"((?:[^"\\]|\\.)*)"\s*\}'
+)
+_CATEGORY = re.compile(r"[^A-Z_]")
+
+
+# =============================================================================
+# DATACLASSES
+# =============================================================================
+
+@dataclass
+class ExtractedSpan:
+    """Entidad PHI devuelta por el modelo."""
+    category: str
+    text: str
+    occurrences: int = 0            # Reemplazos aplicados en la nota
+
+    @property
+    def placeholder(self) -> str:
+        return f"[{self.category}]"
+
+    def to_dict(self) -> Dict:
+        return {
+            "category": self.category,
+            "placeholder": self.placeholder,
+            "chars": len(self.text),
+            "occurrences": self.occurrences
+        }
+
+
+# =============================================================================
+# PARSEO Y REEMPLAZO
+# =============================================================================
+
+def _normalize_category(category: str) -> str:
+    """'Teléfono' -> 'TELEFONO': placeholders sin tildes, como en el resto del repo."""
+    category = unicodedata.normalize("NFKD", category.strip().strip("[]").upper())
+    category = "".join(c for c in category if not unicodedata.combining(c))
+    return _CATEGORY.sub("", category.replace(" ", "_"))
+
+
+def parse_spans(output: str) -> List[ExtractedSpan]:
+    """
+    Extrae la lista de spans de la salida del modelo.
+
+    Intenta primero la lista JSON completa (entre el primer '[' y el último
+    ']'); si no es válida, recupera los objetos individuales. Descarta
+    entradas sin texto y duplicados.
+    """
+    items: List[Tuple[str, str]] = []
+    start, end = output.find("["), output.rfind("]")
+    if 0 <= start < end:
+        try:
+            data = json.loads(output[start:end + 1])
+            if isinstance(data, list):
+                items = [(str(d.get("category", "")), str(d.get("text", "")))
+                         for d in data if isinstance(d, dict)]
+        except json.JSONDecodeError:
+            items = []
+    if not items:
+        for match in _SPAN_OBJECT.finditer(output):
+            try:
+                items.append((json.loads(f'"{match.group(1)}"'), json.loads(f'"{match.group(2)}"')))
+            except json.JSONDecodeError:
+                continue
+
+    spans = []
+    seen = set()
+    for category, text in items:
+        category, text = _normalize_category(category), text.strip()
+        if not category or not text or text in seen:
+            continue
+        seen.add(text)
+        spans.append(ExtractedSpan(category, text))
+    return spans
+
+
+def _span_regex(text: str) -> str:
+    """
+    El modelo puede colapsar espacios o saltos de línea del original. El
+    span debe ser una palabra completa: "Ana" no toca "Anamnesis".
+    """
+    return r"(?<!\w)" + r"\s+".join(re.escape(part) for part in text.split()) + r"(?!\w)"
+
+
+def apply_spans(text: str, spans: List[ExtractedSpan]) -> str:
+    """
+    Reemplaza todas las apariciones de cada span por su placeholder.
+
+    Se hace en una sola pasada con las alternativas ordenadas de más larga
+    a más corta, así "Roberto Carlos Méndez" gana sobre "Méndez" y un
+    placeholder ya insertado nunca vuelve a coincidir.
+    """
+    ordered = sorted(spans, key=lambda s: len(s.text), reverse=True)
+    if not ordered:
+        return text
+    pattern = re.compile("|".join(f"({_span_regex(s.text)})" for s in ordered))
+
+    def replace(match: re.Match) -> str:
+        span = ordered[match.lastindex - 1]
+        span.occurrences += 1
+        return span.placeholder
+
+    return pattern.sub(replace, text)
+
+
+# =============================================================================
+# ANONIMIZACIÓN
+# =============================================================================
+
+def extract_and_apply(
+    text: str,
+    host: str = "localhost",
+    port: int = 8080,
+    call_fn: Optional[Callable[..., Dict]] = None,
+    call_options: Optional[Dict] = None
+) -> Dict:
+    """
+    Anonimiza una nota en modo extracción.
+
+    Retorna un dict con la forma de experiment_runner_v3.call_model, donde
+    'text' es la nota con los reemplazos aplicados localmente, más 'spans'
+    (sin los valores, que son PHI), 'spans_not_found' (entidades que no
+    aparecen en la nota) y 'raw_output' (la salida del modelo).
+    """
+    if call_fn is None:
+        from experiment_runner_v3 import call_model
+        call_fn = call_model
+
+    prompt = PROMPTS_EXTRACCION[EXTRACTION_PROMPT_ID]["template"].format(text=text)
+    result = call_fn(prompt, host, port, **(call_options or {}))
+    if not result.get("success", False):
+        return result
+
+    spans = parse_spans(result.get("text", ""))
+    anonymized = apply_spans(text, spans)
+    return {
+        **result,
+        "text": anonymized,
+        "raw_output": result.get("text", ""),
+        "spans": [s.to_dict() for s in spans],
+        "spans_not_found": sum(1 for s in spans if s.occurrences == 0)
+    }
+
+
+# =============================================================================
+# BENCHMARK EXTRACCIÓN VS REESCRITURA
+# =============================================================================
+
+def _mode_summary(rows: List[Dict]) -> Dict:
+    ok = [r for r in rows if r["success"]]
+    if not ok:
+        return {"runs": len(rows), "successful": 0}
+    return {
+        "runs": len(rows),
+        "successful": len(ok),
+        "tokens_generated_mean": round(statistics.mean(r["tokens_generated"] for r in ok), 1),
+        "tokens_generated_total": sum(r["tokens_generated"] for r in ok),
+        "time_s_mean": round(statistics.mean(r["time_s"] for r in ok), 2),
+        "time_s_total": round(sum(r["time_s"] for r in ok), 2),
+        "f1_mean": round(statistics.mean(r["quality"]["f1_micro"] for r in ok), 4),
+        "recall_mean": round(statistics.mean(r["quality"]["recall"] for r in ok), 4),
+        "lrdi_mean": round(statistics.mean(r["quality"]["lrdi"] for r in ok), 2),
+        "lrqi_mean": round(statistics.mean(r["quality"]["lrqi"] for r in ok), 2)
+    }
+
+
+def _row(caso_id: str, iteration: int, result: Dict, entities: List[Dict]) -> Dict:
+    from experiment_runner_v3 import calculate_quality_metrics
+
+    row = {
+        "case_id": caso_id,
+        "iteration": iteration,
+        "success": bool(result.get("success", False)),
+        "tokens_generated": result.get("tokens_generated", 0),
+        "tokens_prompt": result.get("tokens_prompt", 0),
+        "time_s": result.get("total_time_s", 0.0),
+        "tps": result.get("tps_generation", 0)
+    }
+    if row["success"]:
+        row["quality"] = calculate_quality_metrics(result["text"], entities, caso_id)
+    else:
+        row["error"] = result.get("error", "")
+    if "spans" in result:
+        row["spans"] = len(result["spans"])
+        row["spans_not_found"] = result["spans_not_found"]
+    return row
+
+
+def compare_modes(
+    host: str = "localhost",
+    port: int = 8080,
+    iterations: int = 1,
+    casos: Optional[Dict] = None,
+    call_fn: Optional[Callable[..., Dict]] = None
+) -> Dict:
+    """
+    Corre cada caso en modo reescritura (structured_output) y en modo
+    extracción, alternando el orden para no favorecer a ninguno, y compara
+    tokens generados, tiempo y calidad.
+    """
+    from experiment_runner_v3 import CASOS_CLINICOS, call_model
+
+    casos = casos or CASOS_CLINICOS
+    call_fn = call_fn or call_model
+    rewrite_template = PROMPTS[REWRITE_PROMPT_ID]["template"]
+
+    print("\n" + "=" * 70)
+    print("  EXTRACCIÓN DE SPANS vs REESCRITURA")
+    print("=" * 70)
+    print(f"  Reescritura: {REWRITE_PROMPT_ID} | Extracción: {EXTRACTION_PROMPT_ID}")
+
+    rows = {"rewrite": [], "extraction": []}
+    for iteration in range(1, iterations + 1):
+        print(f"\n  --- Iteración {iteration}/{iterations} ---")
+        for i, (caso_id, caso) in enumerate(casos.items()):
+            modes = ["rewrite", "extraction"]
+            if (i + iteration) % 2:
+                modes.reverse()
+            for mode in modes:
+                if mode == "rewrite":
+                    result = call_fn(rewrite_template.format(text=caso["texto"]), host, port)
+                else:
+                    result = extract_and_apply(caso["texto"], host, port, call_fn)
+                rows[mode].append(_row(caso_id, iteration, result, caso["entidades"]))
+
+            rw, ex = rows["rewrite"][-1], rows["extraction"][-1]
+            print(f"    {caso_id}: reescritura {rw['tokens_generated']:>4} tok {rw['time_s']:>6.2f}s | "
+                  f"extracción {ex['tokens_generated']:>4} tok {ex['time_s']:>6.2f}s")
+
+    summary = {mode: _mode_summary(mode_rows) for mode, mode_rows in rows.items()}
+    rw, ex = summary["rewrite"], summary["extraction"]
+    if rw.get("successful") and ex.get("successful"):
+        summary["tokens_ratio"] = (round(ex["tokens_generated_total"] / rw["tokens_generated_total"], 3)
+                                   if rw["tokens_generated_total"] else None)
+        summary["speedup"] = (round(rw["time_s_total"] / ex["time_s_total"], 2)
+                              if ex["time_s_total"] else None)
+        summary["f1_delta"] = round(ex["f1_mean"] - rw["f1_mean"], 4)
+
+        print(f"\n  Tokens generados: reescritura {rw['tokens_generated_mean']} | "
+              f"extracción {ex['tokens_generated_mean']} (ratio {summary['tokens_ratio']})")
+        print(f"  Tiempo medio: reescritura {rw['time_s_mean']}s | "
+              f"extracción {ex['time_s_mean']}s (speedup {summary['speedup']}x)")
+        print(f"  F1 medio: reescritura {rw['f1_mean']} | extracción {ex['f1_mean']}")
+
+    return {"summary": summary, "results": rows}
+
+
+# =============================================================================
+# MAIN
+# =============================================================================
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark extracción de spans vs reescritura")
+    parser.add_argument("--host", default="localhost", help="Host del servidor llama.cpp")
+    parser.add_argument("--port", type=int, default=8080, help="Puerto del servidor")
+    parser.add_argument("--iterations", type=int, default=1, help="Iteraciones por caso")
+    parser.add_argument("--output", default="results", help="Directorio de salida")
+    args = parser.parse_args()
+
+    comparison = compare_modes(args.host, args.port, args.iterations)
+
+    output = {
+        "metadata": {
+            "timestamp": datetime.now().isoformat(),
+            "host": args.host,
+            "port": args.port,
+            "iterations": args.iterations,
+            "rewrite_prompt": REWRITE_PROMPT_ID,
+            "extraction_prompt": EXTRACTION_PROMPT_ID
+        },
+        "span_extraction": comparison
+    }
+    output_dir = Path(args.output)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    output_file = output_dir / f"span_extraction_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    with open(output_file, "w", encoding="utf-8") as f:
+        json.dump(output, f, indent=2, ensure_ascii=False)
+    print(f"\n  Resultados guardados en: {output_file}")
+
+
+if __name__ == "__main__":
+    main()
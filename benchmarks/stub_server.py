@@ -0,0 +1,410 @@
+#!/usr/bin/env python3
+"""
+stub_server.py - Servidor simulado compatible con la API de llama.cpp
+Universidad de Montevideo - Tesis 2025
+
+Acepta los mismos flags que llama-server (--host, --port, -m, -c, -b, -t,
+-np, --metrics) y expone /health, /props, /slots, /metrics (formato
+Prometheus, solo con --metrics) y /completion (con y sin streaming SSE),
+pero en lugar de ejecutar un modelo responde con un eco del prompt y con
+timings calculados a partir de un modelo de rendimiento sintético:
+
+- Generación (limitada por ancho de banda de memoria): crece con -t hasta
+  un óptimo cercano al 75% de los núcleos y cae al sobresuscribirlos
+- Evaluación del prompt (limitada por cómputo): crece con -t y con -b
+- Contextos (-c) más grandes penalizan ambas fases por el KV cache
+- Con --deriva, los TPS caen a medida que atiende requests (deriva térmica)
+
+Los slots (-np) se asignan como en llama-server: un request sin slot libre
+queda diferido hasta que se libere uno, y el KV cache de cada slot retiene
+el prompt y lo generado mientras cache_prompt esté activo. /slots y los
+contadores de /metrics (tokens procesados, uso del KV cache, requests en
+proceso y diferidos) reflejan ese estado.
+
+Sirve para probar el autotuner, los runners y el balanceador sin hardware
+Power10 ni modelos descargados. Los tiempos reportados son los simulados;
+la espera real es esa duración multiplicada por --escala-tiempo.
+
+Uso:
+    python stub_server.py --port 8080 -c 4096 -b 256 -t 12
+    python stub_server.py --port 8080 -t 8 --nucleos 16 --escala-tiempo 0
+    python stub_server.py --port 8080 -c 8192 -np 4 --metrics
+"""
+
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Tuple
+
+# =============================================================================
+# CONFIGURACIÓN
+# =============================================================================
+
+DEFAULT_CORES = 16
+DEFAULT_TPS_GENERATION = 12.0    # TPS de generación en el óptimo de threads
+DEFAULT_TPS_PROMPT = 150.0       # TPS de prompt con todos los núcleos y -b 512
+DEFAULT_TIME_SCALE = 0.02
+DEFAULT_LOAD_TIME_S = 0.5
+DEFAULT_NOISE = 0.02
+DEFAULT_DRIFT = 0.0              # Caída relativa de TPS cada 100 requests
+DEFAULT_N_PREDICT = 128          # Con n_predict -1 (sin límite)
+
+CHARS_PER_TOKEN = 4
+BATCH_HALF_SATURATION = 96       # -b con el que el prompt alcanza la mitad de su techo
+KV_CACHE_SCALE = 65536           # Contexto que duplica el costo por token
+
+
+# =============================================================================
+# MODELO DE RENDIMIENTO
+# =============================================================================
+
+@dataclass
+class PerformanceModel:
+    """TPS simulados en función de threads, batch y contexto."""
+    cores: int = DEFAULT_CORES
+    tps_generation: float = DEFAULT_TPS_GENERATION
+    tps_prompt: float = DEFAULT_TPS_PROMPT
+    noise: float = DEFAULT_NOISE
+
+    @property
+    def optimal_threads(self) -> float:
+        return max(1.0, self.cores * 0.75)
+
+    def _oversubscription(self, threads: int) -> float:
+        return 1.0 / (1.0 + 0.2 * max(0, threads - self.cores))
+
+    def generation_tps(self, threads: int, ctx: int) -> float:
+        x = threads / self.optimal_threads
+        bandwidth = 2 * x / (1 + x * x)
+        kv = 1.0 / (1.0 + ctx / KV_CACHE_SCALE)
+        return self.tps_generation * bandwidth * kv * self._oversubscription(threads)
+
+    def prompt_tps(self, threads: int, batch: int, ctx: int) -> float:
+        compute = (min(threads, self.cores) / self.cores) ** 0.9
+        reference = 512 / (512 + BATCH_HALF_SATURATION)
+        batching = (batch / (batch + BATCH_HALF_SATURATION)) / reference
+        kv = 1.0 / (1.0 + ctx / KV_CACHE_SCALE)
+        return self.tps_prompt * compute * batching * kv * self._oversubscription(threads)
+
+    def jitter(self, rng: random.Random) -> float:
+        return max(0.5, rng.gauss(1.0, self.noise)) if self.noise > 0 else 1.0
+
+
+# =============================================================================
+# ESTADO DEL SERVIDOR
+# =============================================================================
+
+class StubState:
+    """Parámetros de lanzamiento y contadores compartidos por los handlers."""
+
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.model = PerformanceModel(args.nucleos, args.tps_generacion,
+                                      args.tps_prompt, args.ruido)
+        self.ready_at = time.monotonic() + args.tiempo_carga
+        n_slots = max(1, args.parallel)
+        self.slots = [
+            {"id": i, "id_task": -1, "n_ctx": args.ctx_size // n_slots,
+             "is_processing": False, "n_past": 0, "n_decoded": 0}
+            for i in range(n_slots)
+        ]
+        self._rng = random.Random(args.seed)
+        self._lock = threading.Lock()
+        self._slot_free = threading.Condition(self._lock)
+        self.requests_total = 0
+        self.requests_deferred = 0
+        self.counters = {
+            "prompt_tokens_total": 0,
+            "prompt_seconds_total": 0.0,
+            "tokens_predicted_total": 0,
+            "tokens_predicted_seconds_total": 0.0,
+            "n_decode_total": 0,
+        }
+
+    @property
+    def ready(self) -> bool:
+        return time.monotonic() >= self.ready_at
+
+    def acquire_slot(self, n_prompt: int) -> Dict:
+        """Asigna un slot libre; sin slots libres el request queda diferido."""
+        with self._slot_free:
+            deferred = not any(not slot["is_processing"] for slot in self.slots)
+            if deferred:
+                self.requests_deferred += 1
+                self._slot_free.wait_for(lambda: any(not slot["is_processing"] for slot in self.slots))
+                self.requests_deferred -= 1
+            # Como llama-server: preferir el slot libre con menos KV ocupado
+            slot = min((s for s in self.slots if not s["is_processing"]), key=lambda s: s["n_past"])
+            slot.update(is_processing=True, id_task=self.requests_total,
+                        n_past=n_prompt, n_decoded=0)
+            return slot
+
+    def release_slot(self, slot: Dict, timings: Dict, keep_cache: bool):
+        with self._slot_free:
+            self.counters["prompt_tokens_total"] += timings["prompt_n"]
+            self.counters["prompt_seconds_total"] += timings["prompt_ms"] / 1000
+            self.counters["tokens_predicted_total"] += timings["predicted_n"]
+            self.counters["tokens_predicted_seconds_total"] += timings["predicted_ms"] / 1000
+            self.counters["n_decode_total"] += (
+                -(-timings["prompt_n"] // self.args.batch_size) + timings["predicted_n"]
+            )
+            slot.update(is_processing=False, id_task=-1, n_decoded=timings["predicted_n"],
+                        n_past=timings["prompt_n"] + timings["predicted_n"] if keep_cache else 0)
+            self._slot_free.notify()
+
+    def slots_snapshot(self) -> List[Dict]:
+        """Estado de los slots con el formato de GET /slots."""
+        with self._lock:
+            return [
+                {"id": s["id"], "id_task": s["id_task"], "n_ctx": s["n_ctx"],
+                 "is_processing": s["is_processing"],
+                 "next_token": {"n_decoded": s["n_decoded"]}}
+                for s in self.slots
+            ]
+
+    def prometheus(self) -> str:
+        """Métricas de GET /metrics con los nombres de llama-server."""
+        with self._lock:
+            counters = dict(self.counters)
+            kv_tokens = sum(s["n_past"] + (s["n_decoded"] if s["is_processing"] else 0)
+                            for s in self.slots)
+            processing = sum(s["is_processing"] for s in self.slots)
+            deferred = self.requests_deferred
+        prompt_s = counters["prompt_seconds_total"]
+        predicted_s = counters["tokens_predicted_seconds_total"]
+        metrics = [
+            ("prompt_tokens_total", "counter", "Number of prompt tokens processed.",
+             counters["prompt_tokens_total"]),
+            ("prompt_seconds_total", "counter", "Prompt process time", prompt_s),
+            ("tokens_predicted_total", "counter", "Number of generation tokens processed.",
+             counters["tokens_predicted_total"]),
+            ("tokens_predicted_seconds_total", "counter", "Predict process time", predicted_s),
+            ("n_decode_total", "counter", "Total number of llama_decode() calls",
+             counters["n_decode_total"]),
+            ("prompt_tokens_seconds", "gauge", "Average prompt throughput in tokens/s.",
+             counters["prompt_tokens_total"] / prompt_s if prompt_s else 0.0),
+            ("predicted_tokens_seconds", "gauge", "Average generation throughput in tokens/s.",
+             counters["tokens_predicted_total"] / predicted_s if predicted_s else 0.0),
+            ("kv_cache_usage_ratio", "gauge", "KV-cache usage. 1 means 100 percent usage.",
+             kv_tokens / self.args.ctx_size),
+            ("kv_cache_tokens", "gauge", "KV-cache tokens.", kv_tokens),
+            ("requests_processing", "gauge", "Number of requests processing.", processing),
+            ("requests_deferred", "gauge", "Number of requests deferred.", deferred),
+        ]
+        lines = []
+        for name, kind, help_text, value in metrics:
+            lines += [f"# HELP llamacpp:{name} {help_text}",
+                      f"# TYPE llamacpp:{name} {kind}",
+                      f"llamacpp:{name} {value:g}"]
+        return "\n".join(lines) + "\n"
+
+    def simulate(self, n_prompt: int, n_predict: int) -> Dict:
+        """Timings al estilo llama.cpp para un request."""
+        args = self.args
+        with self._lock:
+            self.requests_total += 1
+            slowdown = 1.0 + args.deriva * self.requests_total / 100
+            jitter_prompt = self.model.jitter(self._rng) / slowdown
+            jitter_gen = self.model.jitter(self._rng) / slowdown
+        prompt_tps = self.model.prompt_tps(args.threads, args.batch_size, args.ctx_size) * jitter_prompt
+        gen_tps = self.model.generation_tps(args.threads, args.ctx_size) * jitter_gen
+        prompt_ms = n_prompt / prompt_tps * 1000
+        predicted_ms = n_predict / gen_tps * 1000
+        return {
+            "prompt_n": n_prompt,
+            "prompt_ms": round(prompt_ms, 3),
+            "prompt_per_token_ms": round(prompt_ms / max(n_prompt, 1), 3),
+            "prompt_per_second": round(prompt_tps, 3),
+            "predicted_n": n_predict,
+            "predicted_ms": round(predicted_ms, 3),
+            "predicted_per_token_ms": round(predicted_ms / max(n_predict, 1), 3),
+            "predicted_per_second": round(gen_tps, 3)
+        }
+
+
+def _echo_tokens(prompt: str, n_predict: int):
+    """Tokens de la respuesta simulada: eco del final del prompt."""
+    text = prompt[-n_predict * CHARS_PER_TOKEN:] or " "
+    pieces = [text[i:i + CHARS_PER_TOKEN] for i in range(0, len(text), CHARS_PER_TOKEN)]
+    return (pieces + [" "] * n_predict)[:n_predict]
+
+
+# =============================================================================
+# HANDLER HTTP
+# =============================================================================
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    state: StubState = None
+
+    def log_message(self, format, *args):
+        if self.state.args.verbose:
+            super().log_message(format, *args)
+
+    def _send(self, status: int, body: bytes, content_type: str):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _json(self, status: int, data: Dict):
+        self._send(status, json.dumps(data).encode("utf-8"), "application/json")
+
+    def _error(self, status: int, message: str, error_type: str):
+        self._json(status, {"error": {"code": status, "message": message, "type": error_type}})
+
+    def _chunk(self, data: bytes):
+        self.wfile.write(b"%x\r\n" % len(data) + data + b"\r\n")
+        self.wfile.flush()
+
+    def do_GET(self):
+        if self.path == "/health":
+            if self.state.ready:
+                self._json(200, {"status": "ok"})
+            else:
+                self._error(503, "Loading model", "unavailable_error")
+        elif self.path == "/slots":
+            self._send(200, json.dumps(self.state.slots_snapshot()).encode("utf-8"), "application/json")
+        elif self.path == "/metrics":
+            if self.state.args.metrics:
+                self._send(200, self.state.prometheus().encode("utf-8"), "text/plain; version=0.0.4")
+            else:
+                self._error(501, "This server does not support metrics endpoint.",
+                            "not_supported_error")
+        elif self.path == "/props":
+            args = self.state.args
+            self._json(200, {
+                "total_slots": args.parallel,
+                "model_path": args.model,
+                "default_generation_settings": {"n_ctx": args.ctx_size},
+                "build_info": "stub"
+            })
+        else:
+            self._error(404, "File Not Found", "not_found_error")
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            payload = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError:
+            self._error(400, "Invalid JSON", "invalid_request_error")
+            return
+        if self.path != "/completion":
+            self._error(404, "File Not Found", "not_found_error")
+            return
+        if not self.state.ready:
+            self._error(503, "Loading model", "unavailable_error")
+            return
+
+        prompt = str(payload.get("prompt", ""))
+        n_predict = int(payload.get("n_predict", self.state.args.n_predict))
+        if n_predict < 0:
+            n_predict = DEFAULT_N_PREDICT
+        n_prompt = max(1, len(prompt) // CHARS_PER_TOKEN)
+        if n_prompt + n_predict > self.state.slots[0]["n_ctx"]:
+            self._error(400, "the request exceeds the available context size",
+                        "exceed_context_size_error")
+            return
+
+        slot = self.state.acquire_slot(n_prompt)
+        timings = self.state.simulate(n_prompt, n_predict)
+        try:
+            self._respond(payload, _echo_tokens(prompt, n_predict), timings, slot)
+        finally:
+            self.state.release_slot(slot, timings, payload.get("cache_prompt", True))
+
+    def _respond(self, payload: Dict, tokens, timings: Dict, slot: Dict):
+        scale = self.state.args.escala_tiempo
+        final = {
+            "stop": True,
+            "tokens_predicted": timings["predicted_n"],
+            "tokens_evaluated": timings["prompt_n"],
+            "tokens_cached": 0,
+            "timings": timings
+        }
+        time.sleep(timings["prompt_ms"] / 1000 * scale)
+
+        if not payload.get("stream"):
+            time.sleep(timings["predicted_ms"] / 1000 * scale)
+            self._json(200, {"content": "".join(tokens), **final})
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        per_token_s = timings["predicted_per_token_ms"] / 1000 * scale
+        for i, token in enumerate(tokens, 1):
+            time.sleep(per_token_s)
+            slot["n_decoded"] = i
+            self._chunk(("data: " + json.dumps({"content": token, "stop": False}) + "\n\n").encode())
+        self._chunk(("data: " + json.dumps({"content": "", **final}) + "\n\n").encode())
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+
+# =============================================================================
+# CLI
+# =============================================================================
+
+def parse_args(argv=None) -> Tuple[argparse.Namespace, list]:
+    parser = argparse.ArgumentParser(
+        description="Servidor simulado compatible con llama.cpp (sin modelo)",
+        allow_abbrev=False
+    )
+    # Flags de llama-server
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("-m", "--model", default="/models/stub.gguf")
+    parser.add_argument("-c", "--ctx-size", type=int, default=4096)
+    parser.add_argument("-b", "--batch-size", type=int, default=2048)
+    parser.add_argument("-t", "--threads", type=int, default=DEFAULT_CORES)
+    parser.add_argument("-np", "--parallel", type=int, default=1)
+    parser.add_argument("-n", "--n-predict", type=int, default=-1)
+    parser.add_argument("--metrics", action="store_true", help="Habilitar /metrics (Prometheus)")
+    # Parámetros de la simulación
+    parser.add_argument("--nucleos", type=int, default=DEFAULT_CORES,
+                        help=f"Núcleos simulados (default: {DEFAULT_CORES})")
+    parser.add_argument("--tps-generacion", type=float, default=DEFAULT_TPS_GENERATION,
+                        help="TPS de generación en el óptimo de threads")
+    parser.add_argument("--tps-prompt", type=float, default=DEFAULT_TPS_PROMPT,
+                        help="TPS de prompt con todos los núcleos y -b 512")
+    parser.add_argument("--escala-tiempo", type=float, default=DEFAULT_TIME_SCALE,
+                        help=f"Fracción del tiempo simulado que se espera (default: {DEFAULT_TIME_SCALE})")
+    parser.add_argument("--tiempo-carga", type=float, default=DEFAULT_LOAD_TIME_S,
+                        help="Segundos en que /health responde 503 al arrancar")
+    parser.add_argument("--ruido", type=float, default=DEFAULT_NOISE,
+                        help="Desvío relativo de los TPS entre requests")
+    parser.add_argument("--deriva", type=float, default=DEFAULT_DRIFT,
+                        help="Caída relativa de los TPS cada 100 requests")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--verbose", action="store_true")
+    # El resto de los flags de llama-server (--mlock, --numa, ...) se ignoran
+    return parser.parse_known_args(argv)
+
+
+def main():
+    args, ignored = parse_args()
+    StubHandler.state = StubState(args)
+    server = ThreadingHTTPServer((args.host, args.port), StubHandler)
+    server.daemon_threads = True
+    print(f"Stub llama.cpp en http://{args.host}:{args.port} "
+          f"(-t {args.threads} -b {args.batch_size} -c {args.ctx_size})", flush=True)
+    if ignored:
+        print(f"  Flags ignorados: {' '.join(ignored)}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
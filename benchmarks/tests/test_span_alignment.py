@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+test_span_alignment.py - Alineamiento de placeholders en notas largas
+Universidad de Montevideo - Tesis 2025
+
+Uso:
+    python -m pytest tests
+"""
+
+import random
+import sys
+import time
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from casos_sinteticos import CASO_OLAF_ENTIDADES, CASO_OLAF_TEXTO
+from metrics.span_alignment import align_placeholders, diff_tokens
+
+# Con difflib sobre todo el hueco, estas notas tardaban 5 s y más de 40 s
+TIME_BUDGET_S = 5.0
+
+
+def _anonimizar(texto: str, entidades) -> str:
+    for entidad in sorted(entidades, key=lambda e: -len(e["valor"])):
+        texto = texto.replace(entidad["valor"], f"[{entidad['tipo']}]")
+    return texto
+
+
+def _nota_repetitiva(tokens: int, seed: int = 0) -> str:
+    """Evoluciones diarias con plantilla: ningún token es único."""
+    rng = random.Random(seed)
+    vocabulario = "el paciente presenta dolor control signos vitales estables sin cambios".split()
+    palabras = []
+    while len(palabras) < tokens:
+        palabras += ["Control", "diario", ":"] + [rng.choice(vocabulario) for _ in range(12)]
+        palabras += ["Firma", "Dr", ".", "Pérez", "."]
+    return " ".join(palabras)
+
+
+class DiffTokensTest(unittest.TestCase):
+
+    def test_opcodes_cubren_ambas_secuencias(self):
+        rng = random.Random(1)
+        a = [rng.choice("abcde") for _ in range(3000)]
+        b = [t for t in a if rng.random() > 0.05]
+        ia = ib = 0
+        for tag, i1, i2, j1, j2 in diff_tokens(a, b):
+            self.assertEqual((i1, j1), (ia, ib))
+            if tag == "equal":
+                self.assertEqual(a[i1:i2], b[j1:j2])
+            ia, ib = i2, j2
+        self.assertEqual((ia, ib), (len(a), len(b)))
+
+
+class LongNoteTest(unittest.TestCase):
+
+    def _alinear(self, original: str, anonimizado: str):
+        inicio = time.perf_counter()
+        alineados = align_placeholders(original, anonimizado)
+        self.assertLess(time.perf_counter() - inicio, TIME_BUDGET_S)
+        return alineados
+
+    def test_caso_olaf_repetido(self):
+        original = CASO_OLAF_TEXTO * 16
+        alineados = self._alinear(original, _anonimizar(original, CASO_OLAF_ENTIDADES))
+        self.assertEqual(len(alineados), 16 * len(self._alinear(
+            CASO_OLAF_TEXTO, _anonimizar(CASO_OLAF_TEXTO, CASO_OLAF_ENTIDADES))))
+
+    def test_nota_sin_tokens_unicos(self):
+        original = _nota_repetitiva(32000)
+        rng = random.Random(2)
+        anonimizado = " ".join(w for w in original.replace("Pérez", "[NOMBRE]").split(" ")
+                               if w == "[NOMBRE]" or rng.random() > 0.02)
+        alineados = self._alinear(original, anonimizado)
+        self.assertEqual(len(alineados), original.count("Pérez"))
+        for placeholder in alineados:
+            self.assertIn("Pérez", original[placeholder.source_start:placeholder.source_end])
+
+
+if __name__ == "__main__":
+    unittest.main()
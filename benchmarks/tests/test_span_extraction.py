@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+test_span_extraction.py - Reemplazo de spans extraídos
+Universidad de Montevideo - Tesis 2025
+
+Uso:
+    python -m pytest tests
+"""
+
+import sys
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from span_extraction import ExtractedSpan, apply_spans, parse_spans
+
+
+class ApplySpansTest(unittest.TestCase):
+
+    def test_nombre_prefijo_de_termino_clinico(self):
+        texto = "Anamnesis: Ana refiere dolor. Analgesia con dipirona; control de Ana."
+        spans = [ExtractedSpan("NOMBRE", "Ana")]
+        resultado = apply_spans(texto, spans)
+        self.assertEqual(
+            resultado, "Anamnesis: [NOMBRE] refiere dolor. Analgesia con dipirona; control de [NOMBRE]."
+        )
+        self.assertEqual(spans[0].occurrences, 2)
+
+    def test_span_con_espacios_colapsados(self):
+        spans = [ExtractedSpan("NOMBRE", "Juan Pérez")]
+        self.assertEqual(apply_spans("Paciente Juan\n  Pérez, 45 años.", spans),
+                         "Paciente [NOMBRE], 45 años.")
+
+    def test_span_mas_largo_gana(self):
+        spans = [ExtractedSpan("NOMBRE", "Méndez"), ExtractedSpan("NOMBRE", "Roberto Carlos Méndez")]
+        self.assertEqual(apply_spans("Dr. Roberto Carlos Méndez y Sra. Méndez", spans),
+                         "Dr. [NOMBRE] y Sra. [NOMBRE]")
+
+
+class ParseSpansTest(unittest.TestCase):
+
+    def test_categorias_sin_tildes(self):
+        salida = '[{"category": "Teléfono", "text": "099 123 456"}, {"category": "dirección", "text": "Av. Italia 2345"}]'
+        self.assertEqual([s.placeholder for s in parse_spans(salida)], ["[TELEFONO]", "[DIRECCION]"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -8,13 +8,19 @@ Uso:
 
 Requisitos:
     pip install requests
+    (los percentiles usan benchmarks/metrics/quantile_sketch.py del repo)
 """
 
 import requests
 import json
+import sys
 import time
+from pathlib import Path
 from typing import Optional, List, Dict, Any
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "benchmarks"))
+from metrics.quantile_sketch import percentile
+
 
 class LLMClient:
     """Cliente para interactuar con el servidor llama.cpp"""
@@ -45,7 +51,8 @@ class LLMClient:
         temperature: float = 0.7,
         top_k: int = 40,
         top_p: float = 0.9,
-        stop: Optional[List[str]] = None
+        stop: Optional[List[str]] = None,
+        stream: bool = False
     ) -> Dict[str, Any]:
         """
         Genera una completación de texto.
@@ -57,9 +64,12 @@ class LLMClient:
             top_k: Top-K sampling
             top_p: Nucleus sampling
             stop: Lista de secuencias para detener
+            stream: Consumir la respuesta como server-sent events y medir
+                TTFT y latencia entre tokens en el cliente
 
         Returns:
-            Diccionario con la respuesta del modelo
+            Diccionario con la respuesta del modelo. Con stream=True incluye
+            además 'stream_metrics'.
         """
         payload = {
             "prompt": prompt,
@@ -67,18 +77,61 @@ class LLMClient:
             "temperature": temperature,
             "top_k": top_k,
             "top_p": top_p,
+            "stream": stream,
         }
 
         if stop:
             payload["stop"] = stop
 
+        start = time.perf_counter()
         response = self.session.post(
             f"{self.base_url}/completion",
             json=payload,
-            timeout=120
+            timeout=120,
+            stream=stream
         )
         response.raise_for_status()
-        return response.json()
+
+        if not stream:
+            return response.json()
+
+        return self._read_stream(response, start)
+
+    def _read_stream(self, response: requests.Response, start: float) -> Dict[str, Any]:
+        """Consume los eventos SSE de /completion registrando la llegada de cada token."""
+        chunks = []
+        arrival_ms = []
+        result: Dict[str, Any] = {}
+
+        for line in response.iter_lines(decode_unicode=True):
+            if not line or not line.startswith("data:"):
+                continue
+            event = json.loads(line[len("data:"):].strip())
+
+            if event.get("content"):
+                arrival_ms.append((time.perf_counter() - start) * 1000)
+                chunks.append(event["content"])
+
+            if event.get("stop"):
+                result = event
+                break
+
+        result["content"] = "".join(chunks)
+        result["stream_metrics"] = self._stream_metrics(arrival_ms)
+        return result
+
+    @staticmethod
+    def _stream_metrics(arrival_ms: List[float]) -> Dict[str, float]:
+        """TTFT y percentiles de latencia entre tokens (ms)."""
+        gaps = sorted(b - a for a, b in zip(arrival_ms, arrival_ms[1:]))
+
+        return {
+            "ttft_ms": arrival_ms[0] if arrival_ms else 0.0,
+            "inter_token_p50_ms": percentile(gaps, 0.50),
+            "inter_token_p95_ms": percentile(gaps, 0.95),
+            "inter_token_p99_ms": percentile(gaps, 0.99),
+            "tokens_received": len(arrival_ms)
+        }
 
     def chat(
         self,
@@ -126,13 +179,15 @@ class LLMClient:
     def get_metrics(self, response: Dict[str, Any]) -> Dict[str, float]:
         """Extrae métricas de rendimiento de una respuesta."""
         timings = response.get("timings", {})
-        return {
+        metrics = {
             "prompt_tokens_per_sec": timings.get("prompt_per_second", 0),
             "generation_tokens_per_sec": timings.get("predicted_per_second", 0),
             "prompt_ms": timings.get("prompt_ms", 0),
             "generation_ms": timings.get("predicted_ms", 0),
             "tokens_generated": timings.get("predicted_n", 0)
         }
+        metrics.update(response.get("stream_metrics", {}))
+        return metrics
 
 
 class ClinicalAnonymizer:
@@ -215,6 +270,18 @@ def demo_basic():
     print(f"   - Prompt: {metrics['prompt_tokens_per_sec']:.1f} tokens/seg")
     print(f"   - Generación: {metrics['generation_tokens_per_sec']:.1f} tokens/seg")
 
+    # Streaming: TTFT y jitter entre tokens vistos por el usuario
+    print("\n3. Completación en modo streaming...")
+    response = client.complete(
+        prompt="La inteligencia artificial es",
+        max_tokens=50,
+        stream=True
+    )
+    metrics = client.get_metrics(response)
+    print(f"   - TTFT: {metrics['ttft_ms']:.0f} ms")
+    print(f"   - Latencia entre tokens p50/p95/p99: {metrics['inter_token_p50_ms']:.0f} / "
+          f"{metrics['inter_token_p95_ms']:.0f} / {metrics['inter_token_p99_ms']:.0f} ms")
+
 
 def demo_chat():
     """Demostración del modo chat."""